@@ -1,212 +1,52 @@
+import os
+
 import numpy as np
 import pandas as pd
 
-from linearmodels.panel import PanelOLS
-import matplotlib.pyplot as plt
-
-dt = pd.read_csv("data_pubinv_final.csv")
-
-dt["year"] = dt["year"].astype(str).str.strip()
-dt["year_int"] = dt["year"].astype(int)
-
-#filtro 2000-2023
-dt = dt[(dt["year_int"] >= 2000) & (dt["year_int"] <= 2023)].copy()
-
-
-def add_panel_lags(df, group_col, cols, max_lag):
-    """
-    Aggiunge colonne laggate 1..max_lag per ciascuna variabile in cols, per gruppo (paese).
-    """
-    out = df.copy()
-    out = out.sort_values([group_col, "year_int"])
-    for c in cols:
-        for L in range(1, max_lag + 1):
-            out[f"L{L}_{c}"] = out.groupby(group_col)[c].shift(L)
-    return out
-
-
-def add_panel_lead(df, group_col, y_col, h):
-    """
-    Crea la colonna y_lead_h = y_{t+h} per ciascun paese.
-    """
-    out = df.copy()
-    out = out.sort_values([group_col, "year_int"])
-    out[f"LEAD{h}_{y_col}"] = out.groupby(group_col)[y_col].shift(-h)
-    return out
-
-
-def add_panel_lag1(df, group_col, y_col):
-    """
-    Crea la colonna y_lag1 = y_{t-1} per ciascun paese.
-    """
-    out = df.copy()
-    out = out.sort_values([group_col, "year_int"])
-    out[f"L1_{y_col}"] = out.groupby(group_col)[y_col].shift(1)
-    return out
-
-
-def lp_lin_panel_py(
-    data_set: pd.DataFrame,
-    endog_data: str,
-    shock: str,
-    l_exog_data: list[str],
-    lags_exog_data: int,
-    hor: int,
-    entity_col: str = "ccode",
-    time_col: str = "year_int",
-    confint: float = 1.0,
-    cumul_mult: bool = True,          # <-- replica default lpirfs
-    dk_bandwidth: int | None = None,  # <-- per provare a matchare vcovSCC
-):
-    """
-    Local Projections panel per h=0..hor.
-
-    Replica lpirfs (default cumul_mult=TRUE):
-      y_{t+h} - y_{t-1} = a_i + g_t + b_h * shock_t + sum_{k=1..p} Gamma_{h,k} * X_{t-k} + e
-
-    Ritorna un dict con:
-      - irf_panel_mean: array dei b_h
-      - irf_panel_low / up: bande +/- confint*SE
-    """
-    df = data_set.copy()
-
-    # lags dei controlli (1..p) come l_exog_data in lpirfs
-    df = add_panel_lags(df, entity_col, l_exog_data, lags_exog_data)
-
-    # lag(1) della dipendente per cumul_mult = TRUE
-    df = add_panel_lag1(df, entity_col, endog_data)
-
-    means, lows, ups = [], [], []
-
-    for h in range(0, hor + 1):
-        dff = add_panel_lead(df, entity_col, endog_data, h)
-
-        y_lead = f"LEAD{h}_{endog_data}"
-        y_lag1 = f"L1_{endog_data}"
-
-        # endog: y_{t+h} - y_{t-1} (lpirfs cumul_mult=TRUE)
-        if cumul_mult:
-            dff[f"YH_{h}"] = dff[y_lead] - dff[y_lag1]
-            y_col = f"YH_{h}"
-        else:
-            y_col = y_lead
-
-        # regressori: shock contemporaneo + lags 1..p dei controlli
-        x_cols = [shock] + [
-            f"L{L}_{c}"
-            for c in l_exog_data
-            for L in range(1, lags_exog_data + 1)
-        ]
-
-        # keep only needed cols and drop NA
-        use_cols = [entity_col, time_col, y_col] + x_cols
-        tmp = dff[use_cols].dropna().copy()
-
-        # index panel
-        tmp = tmp.set_index([entity_col, time_col])
-
-        y = tmp[y_col]
-        X = tmp[x_cols]  # <-- NO costante con two-way FE
-
-        # two-way FE: entity_effects + time_effects
-        mod = PanelOLS(y, X, entity_effects=True, time_effects=True)
-
-        fit_kwargs = {"cov_type": "driscoll-kraay"}
-        if dk_bandwidth is not None:
-            fit_kwargs["bandwidth"] = dk_bandwidth
-
-        res = mod.fit(**fit_kwargs)
-
-        b = res.params[shock]
-        se = res.std_errors[shock]
-
-        means.append(b)
-        lows.append(b - confint * se)
-        ups.append(b + confint * se)
-
-    return {
-        "irf_panel_mean": np.array(means),
-        "irf_panel_low":  np.array(lows),
-        "irf_panel_up":   np.array(ups),
-    }
-
-
-def cum_irf(obj, scale=1.0):
-    mu = np.asarray(obj["irf_panel_mean"], dtype=float) * scale
-    lo = np.asarray(obj["irf_panel_low"], dtype=float)  * scale
-    hi = np.asarray(obj["irf_panel_up"], dtype=float)   * scale
-
-    h = np.arange(len(mu))
-    return pd.DataFrame({
-        "h": h,
-        "cum": np.cumsum(mu),
-        "lo":  np.cumsum(lo),
-        "hi":  np.cumsum(hi),
-    })
-
-
-def se_from_bands(mid, lo, hi):
-    mid = np.asarray(mid)
-    lo  = np.asarray(lo)
-    hi  = np.asarray(hi)
-    return 0.5 * ((hi - mid) + (mid - lo))
-
-
-def mult_from_ratio(gdp_lp, ratio_lp, r_share):
-    gdp_c = cum_irf(gdp_lp, scale=100.0).rename(columns={"cum": "X", "lo": "X_lo", "hi": "X_hi"})
-    ratio_c = cum_irf(ratio_lp, scale=1.0).rename(columns={"cum": "R", "lo": "R_lo", "hi": "R_hi"})
-
-    out = gdp_c.merge(ratio_c, on="h", how="left")
+from figures import band_figure, render_figures, render_report, show_figure
+from lp_engine import mult_system_panel
+from lp_bootstrap import bootstrap_mult_from_ratio
+from lp_cache import enable_cache
+from lp_country import lp_country_panel
+from lp_grid import LPSpec, grid_mult_table, run_spec_grid, sample_r_share
+from lp_groups import lp_group_panel
+from lp_jackknife import loo_multipliers, loo_r_share
+from lp_panel import (
+    cum_irf, lp_interaction_low_high, lp_lin_panel_multi, lp_lin_panel_py,
+    mult_from_ratio, mult_from_ratio_windows,
+)
+from lp_profile import profile_from_env, report_from_env
+from lp_smooth import lp_smooth_panel
+from lp_window import lp_window_panel, window_list, window_r_share
+from panel_store import load_panel
 
-    se_X = se_from_bands(out["X"], out["X_lo"], out["X_hi"])
-    se_R = se_from_bands(out["R"], out["R_lo"], out["R_hi"])
+# cache su disco delle stime LP (.lp_cache/, LP_CACHE=0 per disattivarla)
+enable_cache()
 
-    se_X = np.asarray(se_X, dtype=float)
-    se_R = np.asarray(se_R, dtype=float)
+# tempi per fase della pipeline (LP_PROFILE=1, LP_PROFILE=mem anche memoria)
+PROF = profile_from_env()
 
-    den_pp = out["R"] + r_share * out["X"]
-    Dsafe = np.maximum(np.asarray(den_pp, dtype=float), 1e-12)
+# panel pulito e tipizzato dallo store colonnare (year_int intero, ordinato
+# per paese/anno), filtro 2000-2023 applicato in lettura
+dt = load_panel("data_pubinv_final.csv", years=(2000, 2023))
 
-    X = np.asarray(out["X"], dtype=float)
-    R = np.asarray(out["R"], dtype=float)
 
-    mult = X / Dsafe
-    dMdX = R / (Dsafe**2)
-    dMdR = -X / (Dsafe**2)
+def mult_figure(path, tbl, ttl="Real GDP: cumulative investment multiplier"):
+    return band_figure(path, tbl["h"], tbl["multiplier"], tbl["lo_1se"], tbl["hi_1se"],
+                       ttl=ttl, ylab="multiplier")
 
-    se_M = np.sqrt((dMdX**2) * (se_X**2) + (dMdR**2) * (se_R**2))
 
-    return pd.DataFrame({
-        "h": out["h"].to_numpy(),
-        "multiplier": mult,
-        "lo_1se": mult - se_M,
-        "hi_1se": mult + se_M
-    })
+def cum_figure(path, obj, scale=1.0, ttl="", ylab=""):
+    cc = cum_irf(obj, scale=scale)
+    return band_figure(path, cc["h"], cc["cum"], cc["lo"], cc["hi"], ttl=ttl, ylab=ylab)
 
 
 def plot_mult(tbl, ttl="Real GDP: cumulative investment multiplier"):
-    fig, ax = plt.subplots()
-    ax.fill_between(tbl["h"], tbl["lo_1se"], tbl["hi_1se"], alpha=0.4)
-    ax.plot(tbl["h"], tbl["multiplier"], linewidth=2)
-    ax.scatter(tbl["h"], tbl["multiplier"], s=20)
-    ax.axhline(0, linestyle="--", linewidth=1)
-    ax.set_title(ttl)
-    ax.set_xlabel("Years after the shock")
-    ax.set_ylabel("multiplier")
-    plt.show()
+    show_figure(mult_figure(None, tbl, ttl))
 
 
 def plot_cum(obj, scale=1.0, ttl="", ylab=""):
-    cc = cum_irf(obj, scale=scale)
-    fig, ax = plt.subplots()
-    ax.fill_between(cc["h"], cc["lo"], cc["hi"], alpha=0.4)
-    ax.plot(cc["h"], cc["cum"], linewidth=2)
-    ax.scatter(cc["h"], cc["cum"], s=20)
-    ax.axhline(0, linestyle="--", linewidth=1)
-    ax.set_title(ttl)
-    ax.set_xlabel("Years after the shock")
-    ax.set_ylabel(ylab)
-    plt.show()
+    show_figure(cum_figure(None, obj, scale, ttl, ylab))
 
 
 # Controlli baseline (come in R)
@@ -215,25 +55,11 @@ ctrl_base = ["growth_RGDP", "PDEBT", "forecasterror", "NOMLRATE", "REER"]
 # (Opzionale) 
 DK_BW = None  
 
-# GDP LP
-lp_gdp = lp_lin_panel_py(
+# GDP, Public investment ratio e Debt condividono ctrl_base:
+# una sola stima multi-outcome invece di tre LP separate
+lp_base = lp_lin_panel_multi(
     data_set=dt,
-    endog_data="log_RGDP",
-    shock="forecasterror",
-    l_exog_data=ctrl_base,
-    lags_exog_data=2,
-    confint=1,
-    hor=3,
-    entity_col="ccode",
-    time_col="year_int",
-    cumul_mult=True,
-    dk_bandwidth=DK_BW,
-)
-
-# Public investment ratio LP
-lp_ratio = lp_lin_panel_py(
-    data_set=dt,
-    endog_data="PUBINVRATIO",
+    endog_list=["log_RGDP", "PUBINVRATIO", "PDEBT"],
     shock="forecasterror",
     l_exog_data=ctrl_base,
     lags_exog_data=2,
@@ -244,16 +70,88 @@ lp_ratio = lp_lin_panel_py(
     cumul_mult=True,
     dk_bandwidth=DK_BW,
 )
+lp_gdp = lp_base["log_RGDP"]
+lp_ratio = lp_base["PUBINVRATIO"]
+lp_debt = lp_base["PDEBT"]
 
 # rbar (media quota)
 rbar = dt["PUBINVRATIO"].mean(skipna=True)
 if np.isfinite(rbar) and rbar > 1:
     rbar = rbar / 100.0
 
+# Bande: in tutto lo script (grafici, robustezze, sistema GDP/ratio) SE
+# sommati tra orizzonti come cum_irf / mult_from_ratio. La covarianza DK
+# congiunta (bands="joint" in lp_engine) sottostima la dispersione delle
+# stime su 27 paesi x 24 anni: nel Monte Carlo calibrato (lp_montecarlo,
+# 500 repliche) copre 0.87 al 95% nominale per il PIL cumulato a h=3 e 0.88
+# per il moltiplicatore, contro 0.91 e 0.93 delle bande sommate.
 mult_base = mult_from_ratio(lp_gdp, lp_ratio, rbar)
 print(mult_base)
 
-plot_mult(mult_base)
+# Sistema GDP/ratio sul campione comune: moltiplicatore per piu quote in
+# una sola chiamata (bande come mult_from_ratio, vedi sopra). Le IRF sono
+# quelle del campione intero: cambia solo la quota usata per convertirle
+# (media 2000-2023, prima e dopo la crisi del 2008, ultimi 5 anni). Il jackknife per paese e in
+# mult_from_ratio(..., r_share_loo=...) piu sotto, che ristima le IRF.
+years = dt["year_int"]
+r_periods = pd.Series({
+    "2000-2023": rbar,
+    "2000-2007": sample_r_share(dt[years <= 2007]),
+    "2008-2023": sample_r_share(dt[years >= 2008]),
+    "2019-2023": sample_r_share(dt[years >= 2019]),
+})
+mult_sys = mult_system_panel(
+    dt, "forecasterror", ctrl_base, lags_exog_data=2, hor=3,
+    r_share=r_periods, cumul_mult=True, dk_bandwidth=DK_BW, bands="ratio",
+)
+print(mult_sys[mult_sys["h"] == 3])
+
+# Bande percentili bootstrap (wild cluster per anno, 10k repliche)
+mult_base_boot = bootstrap_mult_from_ratio(
+    dt, "forecasterror", ctrl_base, lags_exog_data=2, hor=3, r_share=rbar,
+    method="wild", n_boot=10000,
+    n_jobs=1,  # script senza guardia __main__: niente process pool (spawn su macOS)
+)
+print(mult_base_boot)
+
+# Jackknife leave-one-country-out: SE jackknife del moltiplicatore e paesi
+# piu influenti (estende il robustness "senza IRL" a tutti i paesi)
+lp_jk = lp_lin_panel_multi(
+    dt, ["log_RGDP", "PUBINVRATIO"], "forecasterror", ctrl_base,
+    lags_exog_data=2, hor=3, cumul_mult=True, dk_bandwidth=DK_BW, jackknife=True,
+)
+mult_base_jk = mult_from_ratio(lp_jk["log_RGDP"], lp_jk["PUBINVRATIO"], rbar,
+                               r_share_loo=loo_r_share(dt))
+print(mult_base_jk)
+mult_loo = loo_multipliers(lp_jk["log_RGDP"]["irf_loo"], lp_jk["PUBINVRATIO"]["irf_loo"],
+                           loo_r_share(dt))
+print("Moltiplicatore senza il paese (h=3), estremi:")
+print(mult_loo[3].dropna().sort_values().iloc[[0, 1, -2, -1]])
+
+# Smooth LP (B-spline + ridge su tutti gli orizzonti, lam per
+# cross-validation): IRF meno rumorose, anche su orizzonti piu lunghi
+lp_sm = lp_smooth_panel(
+    dt, ["log_RGDP", "PUBINVRATIO"], "forecasterror", ctrl_base,
+    lags_exog_data=2, hor=3, cumul_mult=True, dk_bandwidth=DK_BW
+)
+mult_base_smooth = mult_from_ratio(lp_sm["log_RGDP"], lp_sm["PUBINVRATIO"], rbar)
+print(mult_base_smooth)
+lp_sm_long = lp_smooth_panel(
+    dt, ["log_RGDP", "PUBINVRATIO"], "forecasterror", ctrl_base,
+    lags_exog_data=2, hor=6, cumul_mult=True, dk_bandwidth=DK_BW
+)
+# la CV e quasi piatta (MSE che varia di pochi decimi di punto sulla
+# griglia): se lam cade al bordo alto la IRF e una retta in h imposta dalla
+# penalita e il moltiplicatore a 6 anni riflette quel vincolo, non i dati
+for name, sm in (("hor=3", lp_sm), ("hor=6", lp_sm_long)):
+    for endog, res in sm.items():
+        print(f"smooth {name} {endog}: lam_rel={res['lam_rel']:.3g}, "
+              f"variazione MSE CV={res['cv_spread']:.2%}"
+              + (f", AL BORDO {res['cv_edge']} DELLA GRIGLIA" if res["cv_edge"] else ""))
+if any(res["cv_edge"] for res in lp_sm_long.values()):
+    print("Moltiplicatore smooth hor=6 (IRF vincolata dalla penalita, da non "
+          "interpretare come stima del moltiplicatore di lungo periodo):")
+print(mult_from_ratio(lp_sm_long["log_RGDP"], lp_sm_long["PUBINVRATIO"], rbar))
 
 # Private inv
 ctrl_priv = ["growth_RGDP", "PDEBT", "forecasterror", "NOMLRATE", "INVGDP_diff", "REER"]
@@ -263,13 +161,6 @@ lp_priv = lp_lin_panel_py(
     cumul_mult=True, dk_bandwidth=DK_BW
 )
 
-# Debt
-lp_debt = lp_lin_panel_py(
-    dt, "PDEBT", "forecasterror", ctrl_base,
-    lags_exog_data=2, confint=1, hor=3,
-    cumul_mult=True, dk_bandwidth=DK_BW
-)
-
 # Unemployment
 ctrl_unemp = ["growth_RGDP", "PDEBT", "forecasterror", "NOMLRATE", "UNRATE", "REER"]
 lp_unemp = lp_lin_panel_py(
@@ -278,51 +169,174 @@ lp_unemp = lp_lin_panel_py(
     cumul_mult=True, dk_bandwidth=DK_BW
 )
 
-plot_cum(lp_priv, scale=1, ttl="Private investment ratio", ylab="percentage points")
-plot_cum(lp_debt, scale=1, ttl="Public debt ratio", ylab="percentage points")
-plot_cum(lp_unemp, scale=1, ttl="Unemployment rate", ylab="percentage points")
-
+# grafici in graphs/ (disegnati tutti insieme alla fine, vedi GRAFICI)
+FIGS = [
+    mult_figure("BASELINE/gdp.png", mult_base),
+    cum_figure("BASELINE/private_investment.png", lp_priv, scale=1,
+               ttl="Private investment ratio", ylab="percentage points"),
+    cum_figure("BASELINE/public_debt.png", lp_debt, scale=1,
+               ttl="Public debt ratio", ylab="percentage points"),
+    cum_figure("BASELINE/unemployment.png", lp_unemp, scale=1,
+               ttl="Unemployment rate", ylab="percentage points"),
+]
+
+
+# Robustezze: una sola griglia di specificazioni (design per campione
+# condivisi, GDP + ratio stimati insieme, stime in parallelo)
+ROB_CONTROLS = {
+    "base": ctrl_base,
+    # Robustness 1: OUTPUTGAP instead of growth_RGDP
+    "outputgap": ["OUTPUTGAP", "PDEBT", "forecasterror", "NOMLRATE", "REER"],
+    # Robustness 3: add PRIMARYBAL
+    "primarybal": ["growth_RGDP", "PDEBT", "forecasterror", "NOMLRATE", "PRIMARYBAL", "REER"],
+}
+ROB_SAMPLES = {
+    # Robustness 4: exclude Ireland
+    "no_irl": "ccode != 'IRL'",
+    # Robustness 5: stop sample in 2019
+    "pre_covid": "year_int <= 2019",
+}
+ROB_SPECS = [
+    LPSpec("outputgap", 2, name="rob1"),
+    LPSpec("base", 3, name="rob2"),            # Robustness 2: lags = 3
+    LPSpec("primarybal", 2, name="rob3"),
+    LPSpec("base", 2, "no_irl", name="rob4"),
+    LPSpec("base", 2, "pre_covid", name="rob5"),
+]
+
+rob_tbl = run_spec_grid(
+    dt, ROB_SPECS, ["log_RGDP", "PUBINVRATIO"], ROB_CONTROLS, ROB_SAMPLES,
+    shock="forecasterror", dk_bandwidth=DK_BW,
+    multiplier=("log_RGDP", "PUBINVRATIO"), bands="ratio",  # bande di mult_from_ratio
+    n_jobs=1,  # vedi sopra: per il pool lanciare da un modulo con guardia __main__
+)
 
-def run_mult(ctrls, lags, data_set, r_share, dk_bw=None):
-    gdp_lp = lp_lin_panel_py(
-        data_set, "log_RGDP", "forecasterror", ctrls,
-        lags_exog_data=lags, confint=1, hor=3,
-        cumul_mult=True, dk_bandwidth=dk_bw
+for spec in ROB_SPECS:
+    print(spec.name)
+    print(grid_mult_table(rob_tbl, spec.spec_id))
+
+# Robustness 6: moltiplicatore per anno finale del campione (finestra
+# crescente dal 2000) e su finestre mobili di 12 anni: 2008, crisi del
+# debito sovrano e COVID anno per anno invece del solo taglio al 2019
+for label, wins in [
+    ("finestra crescente", window_list(dt["year_int"], "expanding", first_end=2008)),
+    ("finestra mobile 12 anni", window_list(dt["year_int"], "rolling", 12)),
+]:
+    win_tbl = lp_window_panel(
+        dt, ["log_RGDP", "PUBINVRATIO"], "forecasterror", ctrl_base,
+        lags_exog_data=2, hor=3, windows=wins, cumul_mult=True, dk_bandwidth=DK_BW,
     )
-    ratio_lp = lp_lin_panel_py(
-        data_set, "PUBINVRATIO", "forecasterror", ctrls,
-        lags_exog_data=lags, confint=1, hor=3,
-        cumul_mult=True, dk_bandwidth=dk_bw
+    mult_win = mult_from_ratio_windows(win_tbl, window_r_share(dt, wins))
+    print(f"Moltiplicatore per finestra ({label}):")
+    print(mult_win.pivot(index=["start", "end"], columns="h", values="multiplier").round(3))
+
+
+# ============================================================
+# CORRUZIONE: IRF a bassa / alta qualita istituzionale (GE_EST, 25/75)
+# ============================================================
+
+dt_wgi = load_panel("data_pubinv_final_with_WGI.csv", years=(2000, 2023))
+CORR_SETS = [
+    # (dipendenti, controlli)
+    (["log_RGDP", "PUBINVRATIO", "PDEBT"], ctrl_base),
+    (["INVGDP"], ctrl_priv),
+    (["UNRATE"], ctrl_unemp),
+]
+irf_corr = {}
+for endogs, ctrls in CORR_SETS:
+    res, (corr_low, corr_high) = lp_interaction_low_high(
+        dt_wgi, endogs, "forecasterror", "GE_EST", ctrls, lags_exog_data=2, hor=3,
+        confint=1.0, cumul_mult=True, dk_bandwidth=DK_BW,
     )
-    return mult_from_ratio(gdp_lp, ratio_lp, r_share)
-
-
-# Robustness 1: OUTPUTGAP instead of growth_RGDP
-ctrl_rob1 = ["OUTPUTGAP", "PDEBT", "forecasterror", "NOMLRATE", "REER"]
-mult_rob1 = run_mult(ctrl_rob1, lags=2, data_set=dt, r_share=rbar, dk_bw=DK_BW)
-print(mult_rob1)
-
-# Robustness 2: lags = 3
-mult_rob2 = run_mult(ctrl_base, lags=3, data_set=dt, r_share=rbar, dk_bw=DK_BW)
-print(mult_rob2)
-
-# Robustness 3: add PRIMARYBAL
-ctrl_rob3 = ["growth_RGDP", "PDEBT", "forecasterror", "NOMLRATE", "PRIMARYBAL", "REER"]
-mult_rob3 = run_mult(ctrl_rob3, lags=2, data_set=dt, r_share=rbar, dk_bw=DK_BW)
-print(mult_rob3)
-
-# Robustness 4: exclude Ireland
-dt_no_irl = dt[dt["ccode"] != "IRL"].copy()
-rbar_no_irl = np.nanmean(dt_no_irl["PUBINVRATIO"].to_numpy(dtype=float))
-if np.isfinite(rbar_no_irl) and rbar_no_irl > 1:
-    rbar_no_irl = rbar_no_irl / 100.0
-mult_rob4 = run_mult(ctrl_base, lags=2, data_set=dt_no_irl, r_share=rbar_no_irl, dk_bw=DK_BW)
-print(mult_rob4)
-
-# Robustness 5: stop sample in 2019
-dt_pre_covid = dt[dt["year_int"] <= 2019].copy()
-rbar_pre_covid = np.nanmean(dt_pre_covid["PUBINVRATIO"].to_numpy(dtype=float))
-if np.isfinite(rbar_pre_covid) and rbar_pre_covid > 1:
-    rbar_pre_covid = rbar_pre_covid / 100.0
-mult_rob5 = run_mult(ctrl_base, lags=2, data_set=dt_pre_covid, r_share=rbar_pre_covid, dk_bw=DK_BW)
-print(mult_rob5)
+    irf_corr.update(res)
+print("corr_low (centered):", corr_low)
+print("corr_high (centered):", corr_high)
+
+# Terzili di GE_EST (laggato) in un solo modello interagito: effetti fissi
+# comuni, covarianza congiunta tra gruppi e test di uguaglianza delle IRF
+lp_ge = lp_group_panel(
+    dt_wgi, ["log_RGDP", "PUBINVRATIO"], "forecasterror", ctrl_base,
+    lags_exog_data=2, hor=3, groups="GE_EST", n_quantiles=3,
+    cumul_mult=True, dk_bandwidth=DK_BW,
+)
+for endog in ["log_RGDP", "PUBINVRATIO"]:
+    print(f"{endog}: IRF uguali tra terzili GE_EST", lp_ge.test_equal(endog))
+
+for endog, fname, scale, ttl in [
+    ("log_RGDP", "gdp", 100.0, "GDP IRF (cumulative)"),
+    ("PUBINVRATIO", "public_investment", 1.0, "Public investment ratio IRF (cumulative)"),
+    ("INVGDP", "private_investment", 1.0, "Private investment ratio IRF (cumulative)"),
+    ("PDEBT", "public_debt", 1.0, "Public debt ratio IRF (cumulative)"),
+    ("UNRATE", "unemployment", 1.0, "Unemployment rate IRF (cumulative)"),
+]:
+    for level in ["low", "high"]:
+        FIGS.append(cum_figure(f"CORRUPTION/{fname}_{level}.png", irf_corr[endog][level],
+                               scale=scale, ttl=f"{ttl} ({level.upper()} corruption)",
+                               ylab="percentage points"))
+
+
+# ============================================================
+# PAESI PERIFERICI (Sud Europa)
+# ============================================================
+
+south = ["Italy", "Spain", "Portugal", "Greece", "Cyprus", "Malta"]
+dt_south = dt[dt["Country"].isin(south)].copy()
+
+lp_south = lp_lin_panel_multi(
+    dt_south, ["log_RGDP", "PUBINVRATIO", "PDEBT"], "forecasterror", ctrl_base,
+    lags_exog_data=2, hor=3, confint=1, cumul_mult=True, dk_bandwidth=DK_BW,
+)
+mult_south = mult_from_ratio(lp_south["log_RGDP"], lp_south["PUBINVRATIO"],
+                             sample_r_share(dt_south))
+print(mult_south)
+
+# Coefficienti eterogenei: una LP per paese (medie cross-sezionali al posto
+# degli effetti anno, 1 lag: pochi anni per paese), poi mean-group e pooled;
+# i gruppi (Sud, BadCountries) si ricompongono dalle stime per paese
+bad = ["Italy", "Spain", "Portugal", "Greece", "Cyprus", "Malta", "Romania", "Bulgaria",
+       "Croatia", "Hungary", "Slovakia", "Poland", "Czechia", "Slovenia", "Latvia"]
+lp_cty = lp_country_panel(
+    dt, ["log_RGDP", "PUBINVRATIO"], "forecasterror", ctrl_base,
+    lags_exog_data=1, hor=3, cumul_mult=True, dk_bandwidth=DK_BW,
+)
+grp_tbl = lp_cty.group_table({"all": None, "south": south, "bad": bad})
+print(grp_tbl[grp_tbl["term"] == "multiplier"].pivot(
+    index=["group", "estimator"], columns="h", values="estimate"))
+
+# Sud contro resto in un solo modello interagito (stessi effetti fissi)
+lp_sv = lp_group_panel(
+    dt, ["log_RGDP", "PUBINVRATIO"], "forecasterror", ctrl_base,
+    lags_exog_data=2, hor=3, groups={"south": south},
+    cumul_mult=True, dk_bandwidth=DK_BW,
+)
+print(lp_sv.table().pivot(index=["endog", "group", "term"], columns="h", values="estimate"))
+print("log_RGDP: IRF uguali Sud / resto", lp_sv.test_equal("log_RGDP"))
+lp_priv_south = lp_lin_panel_py(dt_south, "INVGDP", "forecasterror", ctrl_priv,
+                                lags_exog_data=2, confint=1, hor=3,
+                                cumul_mult=True, dk_bandwidth=DK_BW)
+lp_unemp_south = lp_lin_panel_py(dt_south, "UNRATE", "forecasterror", ctrl_unemp,
+                                 lags_exog_data=2, confint=1, hor=3,
+                                 cumul_mult=True, dk_bandwidth=DK_BW)
+
+FIGS += [
+    mult_figure("PAESI_PERIFERICI/gdp.png", mult_south),
+    cum_figure("PAESI_PERIFERICI/private_investment.png", lp_priv_south, scale=1,
+               ttl="Private investment ratio", ylab="percentage points"),
+    cum_figure("PAESI_PERIFERICI/public_debt.png", lp_south["PDEBT"], scale=1,
+               ttl="Public debt ratio", ylab="percentage points"),
+    cum_figure("PAESI_PERIFERICI/unemployment.png", lp_unemp_south, scale=1,
+               ttl="Unemployment rate", ylab="percentage points"),
+]
+
+
+# ============================================================
+# GRAFICI: senza display, in parallelo, ridisegnati solo se cambiati
+# ============================================================
+
+# graphs/ accanto allo script, qualunque sia la cartella di lavoro
+fig_tbl = render_figures(FIGS, root=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                 "graphs"))
+print(render_report(fig_tbl))
+
+if PROF is not None:
+    print(report_from_env(PROF))
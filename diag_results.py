@@ -0,0 +1,268 @@
+"""
+diag_results.py
+===============
+Risultati strutturati dei test diagnostici e loro salvataggio su file.
+
+Ogni test di diagnostic_tests ritorna un DiagResult: nome del test,
+statistiche scalari (stat, p-value, decisione), tabelle (DataFrame per h,
+per variabile, per specificazione) e metadati della specificazione
+(dipendente, moderatore, lag, ...). write_battery salva tutti i risultati
+di una esecuzione in UN file:
+
+  - .json: un documento con la lista dei risultati (tabelle come record);
+  - .parquet: una tabella lunga (key, test, table, row, column, value,
+    text) con statistiche e tabelle di tutti i test; titoli e metadati
+    nei metadati dello schema.
+
+read_battery ricostruisce i DiagResult dal file, senza ristimare nulla
+(es. per le tabelle di latex/section_diagnostics.tex o per dashboard).
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - dipende dall'ambiente
+    pa = None
+
+
+FORMAT_VERSION = 1
+
+
+@dataclass
+class DiagResult:
+    """
+    Esito di un test diagnostico.
+
+    test: identificativo stabile (es. "joint_wald", "pesaran_cd");
+    stats: scalari (float, int, bool, str); tables: {nome: DataFrame};
+    meta: specificazione (endog, moderatore, lag, orizzonte, ...).
+    L'accesso r["pval"] legge da stats.
+    """
+    test: str
+    title: str
+    stats: dict = field(default_factory=dict)
+    tables: dict = field(default_factory=dict)
+    meta: dict = field(default_factory=dict)
+
+    def __getitem__(self, key):
+        return self.stats[key]
+
+    def table(self, name=None):
+        if name is None:
+            name = next(iter(self.tables))
+        return self.tables[name]
+
+
+# ============================================================
+# CONVERSIONI
+# ============================================================
+
+def _scalar(v):
+    """
+    numpy -> tipi Python (JSON); NaN -> None.
+    """
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float) and not np.isfinite(v):
+        return None
+    return v
+
+
+def _frame_to_records(df):
+    df = df.reset_index() if not isinstance(df.index, pd.RangeIndex) else df
+    return {
+        "columns": [str(c) for c in df.columns],
+        "data": [[_scalar(v) for v in row] for row in df.itertuples(index=False)],
+    }
+
+
+def _records_to_frame(rec):
+    return pd.DataFrame(rec["data"], columns=rec["columns"])
+
+
+def result_to_dict(res):
+    return {
+        "test": res.test,
+        "title": res.title,
+        "stats": {k: _scalar(v) for k, v in res.stats.items()},
+        "tables": {k: _frame_to_records(v) for k, v in res.tables.items()},
+        "meta": {k: _scalar(v) if not isinstance(v, (list, tuple)) else list(v)
+                 for k, v in res.meta.items()},
+    }
+
+
+def result_from_dict(d):
+    return DiagResult(
+        test=d["test"], title=d["title"], stats=dict(d["stats"]),
+        tables={k: _records_to_frame(v) for k, v in d["tables"].items()},
+        meta=dict(d["meta"]),
+    )
+
+
+def _kind(v):
+    v = _scalar(v)
+    if isinstance(v, bool):
+        return "bool"
+    if isinstance(v, int):
+        return "int"
+    if isinstance(v, float) or v is None:
+        return "float"
+    return "str"
+
+
+def _cast(v, kind):
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return None
+    if kind == "bool":
+        return v in (True, "True")
+    return {"int": int, "float": float, "str": str}[kind](v)
+
+
+def _dtypes(df):
+    """
+    Colonne -> tipo (bool / int / float / str) per ricostruire la tabella.
+    """
+    df = df.reset_index() if not isinstance(df.index, pd.RangeIndex) else df
+    out = {}
+    for c in df.columns:
+        dt = df[c].dtype
+        out[str(c)] = ("bool" if pd.api.types.is_bool_dtype(dt) else
+                       "int" if pd.api.types.is_integer_dtype(dt) else
+                       "float" if pd.api.types.is_float_dtype(dt) else "str")
+    return out
+
+
+def _cast_column(col, kind):
+    if kind == "float":
+        return pd.to_numeric(col, errors="coerce").astype(float)
+    if kind == "int":
+        return pd.to_numeric(col).astype(int)
+    if kind == "bool":
+        return col.map(lambda v: v in (True, "True")).astype(bool)
+    return col.astype(str) if col.notna().all() else col.astype(object)
+
+
+def _long_rows(key, res):
+    """
+    Un DiagResult -> righe (key, test, table, row, column, value, text).
+    Le statistiche scalari stanno nella tabella "stats" (row 0).
+    """
+    rows = []
+
+    def cell(table, i, col, v):
+        v = _scalar(v)
+        num = isinstance(v, (int, float)) and not isinstance(v, bool)
+        rows.append((key, res.test, table, i, str(col),
+                     float(v) if num else np.nan,
+                     None if num or v is None else str(v)))
+
+    for col, v in res.stats.items():
+        cell("stats", 0, col, v)
+    for name, df in res.tables.items():
+        df = df.reset_index() if not isinstance(df.index, pd.RangeIndex) else df
+        for i, row in enumerate(df.itertuples(index=False)):
+            for col, v in zip(df.columns, row):
+                cell(name, i, col, v)
+    return rows
+
+
+# ============================================================
+# SCRITTURA E LETTURA
+# ============================================================
+
+def collect_results(results):
+    """
+    Dal dict {nome compito: risultato} di task_dag.run_dag solo i DiagResult.
+    """
+    return {k: v for k, v in results.items() if isinstance(v, DiagResult)}
+
+
+def default_path(root="diag_results", fmt="parquet"):
+    """
+    Un file per esecuzione: diag_results/diagnostics_YYYYmmdd_HHMMSS.<fmt>.
+    """
+    ext = "parquet" if fmt == "parquet" and pa is not None else "json"
+    return os.path.join(root, time.strftime("diagnostics_%Y%m%d_%H%M%S") + "." + ext)
+
+
+def write_battery(results, path, run_meta=None):
+    """
+    Salva {chiave: DiagResult} in un solo file (.json o .parquet).
+    run_meta: metadati dell'esecuzione (configurazione, campione, ...).
+    Ritorna il percorso scritto.
+    """
+    results = collect_results(results)
+    head = {"version": FORMAT_VERSION, "run": run_meta or {},
+            "written": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+
+    if path.endswith(".parquet"):
+        if pa is None:
+            raise ImportError("pyarrow necessario per il formato Parquet")
+        rows = [r for key, res in results.items() for r in _long_rows(key, res)]
+        df = pd.DataFrame(rows, columns=["key", "test", "table", "row", "column",
+                                         "value", "text"])
+        head["results"] = {
+            key: {"test": res.test, "title": res.title,
+                  "meta": result_to_dict(res)["meta"],
+                  "stats": {k: _kind(v) for k, v in res.stats.items()},
+                  "tables": {name: _dtypes(t) for name, t in res.tables.items()}}
+            for key, res in results.items()
+        }
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b"diag_results": json.dumps(head).encode(),
+        })
+        pq.write_table(table, tmp)
+    else:
+        head["results"] = {key: result_to_dict(res) for key, res in results.items()}
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(head, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    return path
+
+
+def read_battery(path):
+    """
+    File di write_battery -> (dict {chiave: DiagResult}, metadati run).
+    """
+    if path.endswith(".parquet"):
+        table = pq.read_table(path)
+        head = json.loads(table.schema.metadata[b"diag_results"])
+        df = table.to_pandas()
+        out = {}
+        for key, info in head["results"].items():
+            sub = df[df["key"] == key]
+            stats, tables = {}, {}
+            for name, grp in sub.groupby("table", sort=False):
+                vals = grp["value"].astype(object).where(grp["text"].isna(), grp["text"])
+                wide = (pd.DataFrame({"row": grp["row"], "column": grp["column"],
+                                      "v": vals.to_numpy(dtype=object)})
+                        .pivot(index="row", columns="column", values="v"))
+                if name == "stats":
+                    stats = {c: _cast(wide[c].iloc[0], kind)
+                             for c, kind in info["stats"].items()}
+                else:
+                    dtypes = info["tables"][name]
+                    tbl = wide.reindex(columns=list(dtypes)).reset_index(drop=True)
+                    for c, kind in dtypes.items():
+                        tbl[c] = _cast_column(tbl[c], kind)
+                    tbl.columns.name = None
+                    tables[name] = tbl
+            out[key] = DiagResult(test=info["test"], title=info["title"], stats=stats,
+                                  tables=tables, meta=info["meta"])
+        return out, head["run"]
+
+    with open(path, encoding="utf-8") as f:
+        head = json.load(f)
+    return {k: result_from_dict(v) for k, v in head["results"].items()}, head["run"]
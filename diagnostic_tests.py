@@ -21,104 +21,67 @@ Test implementati:
  10. Test di Granger-non-causalita dello shock
 """
 
+import os
 import warnings
 warnings.filterwarnings("ignore")
 
 import numpy as np
 import pandas as pd
 from scipy import stats
-from linearmodels.panel import PanelOLS
-import matplotlib.pyplot as plt
 
-
-# ============================================================
-# FUNZIONI HELPER (dal tuo codice originale)
-# ============================================================
-
-def add_panel_lags(df, group_col, cols, max_lag):
-    out = df.copy()
-    out = out.sort_values([group_col, "year_int"])
-    for c in cols:
-        for L in range(1, max_lag + 1):
-            out[f"L{L}_{c}"] = out.groupby(group_col)[c].shift(L)
-    return out
-
-
-def add_panel_lead(df, group_col, y_col, h):
-    out = df.copy()
-    out = out.sort_values([group_col, "year_int"])
-    out[f"LEAD{h}_{y_col}"] = out.groupby(group_col)[y_col].shift(-h)
-    return out
-
-
-def add_panel_lag1(df, group_col, y_col):
-    out = df.copy()
-    out = out.sort_values([group_col, "year_int"])
-    out[f"L1_{y_col}"] = out.groupby(group_col)[y_col].shift(1)
-    return out
+from diag_results import DiagResult, default_path, write_battery
+from lp_engine import (
+    PanelDesign, fit_lp_horizons, fit_lp_joint, fit_twoway_dk, interaction_regressors,
+)
+from lp_cache import enable_cache
+from lp_grid import run_spec_grid, spec_grid
+from lp_jackknife import jackknife_interaction
+from lp_profile import profile_from_env, profiled, report_from_env
+from lp_window import lp_window_panel, window_list
+from panel_stats import panel_matrix, panel_unit_root, pesaran_cd
+from panel_store import load_panel
+from task_dag import Task, run_dag, timing_report
 
 
 # ============================================================
 # FUNZIONE DI STIMA ESTESA (restituisce anche residui e risultati completi)
 # ============================================================
 
+@profiled()
 def estimate_lp_interaction(
     data_set, endog_data, shock, corr_col, l_exog_data,
     lags_exog_data, hor, entity_col="ccode", time_col="year_int",
     corr_lag=1, cumul_mult=True, dk_bandwidth=None, center_corr=True,
+    engine="numpy", design=None, jackknife=False, shock_lead=0,
 ):
     """
     Stima LP con interazione e restituisce risultati completi per ogni h,
-    inclusi residui e oggetti PanelOLS result.
+    inclusi residui e oggetti result (PanelOLS o LPFitResult, vedi engine).
+
+    design: PanelDesign gia costruito su data_set (lag/lead come viste,
+    riusabile tra piu stime sullo stesso dataset).
+    jackknife=True aggiunge per ogni h le stime senza ciascun paese
+    (beta_loo, theta_loo: Serie per paese escluso) e gli SE jackknife.
+    shock_lead > 0: shock al tempo t + shock_lead come lead del design
+    (placebo), con nome {shock}_lead{k} nei risultati.
     """
-    df = data_set.copy()
-    df = add_panel_lags(df, entity_col, l_exog_data, lags_exog_data)
-    df = add_panel_lag1(df, entity_col, endog_data)
-
-    df = df.sort_values([entity_col, time_col])
-    df[f"L{corr_lag}_{corr_col}"] = df.groupby(entity_col)[corr_col].shift(corr_lag)
+    if design is None:
+        design = PanelDesign(data_set, [endog_data, shock, corr_col] + list(l_exog_data),
+                             entity_col, time_col)
 
-    corr_lag_name = f"L{corr_lag}_{corr_col}"
-    if center_corr:
-        corr_mean = df[corr_lag_name].mean(skipna=True)
-        df[corr_lag_name] = df[corr_lag_name] - corr_mean
+    regressors, inter_name = interaction_regressors(
+        design, shock, corr_col, l_exog_data, lags_exog_data,
+        corr_lag=corr_lag, center_corr=center_corr, shock_lead=shock_lead,
+    )
+    shock = regressors[0][0]
 
-    inter_name = f"{shock}_x_{corr_col}_L{corr_lag}"
-    df[inter_name] = df[shock] * df[corr_lag_name]
+    fits = fit_lp_horizons(design, endog_data, regressors, hor,
+                           cumul_mult=cumul_mult, dk_bandwidth=dk_bandwidth,
+                           engine=engine)
 
     results = []
 
-    for h in range(0, hor + 1):
-        dff = add_panel_lead(df, entity_col, endog_data, h)
-
-        y_lead = f"LEAD{h}_{endog_data}"
-        y_lag1 = f"L1_{endog_data}"
-
-        if cumul_mult:
-            dff[f"YH_{h}"] = dff[y_lead] - dff[y_lag1]
-            y_col = f"YH_{h}"
-        else:
-            y_col = y_lead
-
-        x_cols = [shock, inter_name] + [
-            f"L{L}_{c}"
-            for c in l_exog_data
-            for L in range(1, lags_exog_data + 1)
-        ]
-
-        use_cols = [entity_col, time_col, y_col] + x_cols
-        tmp = dff[use_cols].dropna().copy()
-        tmp = tmp.set_index([entity_col, time_col])
-
-        y = tmp[y_col]
-        X = tmp[x_cols]
-
-        mod = PanelOLS(y, X, entity_effects=True, time_effects=True)
-        fit_kwargs = {"cov_type": "driscoll-kraay"}
-        if dk_bandwidth is not None:
-            fit_kwargs["bandwidth"] = dk_bandwidth
-        res = mod.fit(**fit_kwargs)
-
+    for h, res in enumerate(fits):
         results.append({
             "h": h,
             "result": res,
@@ -135,9 +98,69 @@ def estimate_lp_interaction(
             "r2_within": res.rsquared_within,
         })
 
+    if jackknife:
+        jk, _ = jackknife_interaction(
+            design, endog_data, shock, corr_col, l_exog_data, lags_exog_data, hor,
+            corr_lag=corr_lag, center_corr=center_corr, cumul_mult=cumul_mult,
+        )
+        beta_loo, theta_loo = jk.loo_frame(endog_data, shock), jk.loo_frame(endog_data, inter_name)
+        se_beta, se_theta = jk.se(endog_data, shock), jk.se(endog_data, inter_name)
+        for r in results:
+            h = r["h"]
+            r["beta_loo"] = beta_loo[h].dropna()
+            r["theta_loo"] = theta_loo[h].dropna()
+            r["se_beta_jk"] = float(se_beta[h])
+            r["se_theta_jk"] = float(se_theta[h])
+
     return results
 
 
+def estimate_lp_interaction_windows(
+    data_set, endog_data, shock, corr_col, l_exog_data, lags_exog_data, hor,
+    mode="expanding", width=10, windows=None, entity_col="ccode",
+    time_col="year_int", corr_lag=1, cumul_mult=True, dk_bandwidth=None,
+    center_corr=True,
+):
+    """
+    Come estimate_lp_interaction ma su finestre di anni (lp_window): per ogni
+    finestra (start, end) le righe beta e theta per h, nel formato tidy di
+    run_spec_grid. Le finestre si aggiornano aggiungendo/togliendo la sezione
+    di un anno, senza ristimare da zero.
+    """
+    return lp_window_panel(
+        data_set, [endog_data], shock, l_exog_data, lags_exog_data, hor,
+        windows=windows, mode=mode, width=width, moderator=corr_col,
+        corr_lag=corr_lag, center_corr=center_corr, entity_col=entity_col,
+        time_col=time_col, cumul_mult=cumul_mult, dk_bandwidth=dk_bandwidth,
+    )
+
+
+def estimate_lp_interaction_joint(
+    data_set, endog_data, shock, corr_col, l_exog_data, lags_exog_data, hor,
+    entity_col="ccode", time_col="year_int", corr_lag=1, cumul_mult=True,
+    dk_bandwidth=None, center_corr=True, design=None,
+):
+    """
+    Stesso modello di estimate_lp_interaction, ma con beta_h e theta_h di
+    tutti gli orizzonti impilati e la loro covarianza Driscoll-Kraay
+    congiunta (lp_engine.fit_lp_joint), in una sola passata.
+
+    Ritorna un LPJointResult: Wald, sup-t e somma degli effetti su qualsiasi
+    sottoinsieme di orizzonti sono poi solo operazioni sulla matrice
+    (joint.wald / joint.sup_t / joint.sum_effect), senza altre regressioni.
+    """
+    if design is None:
+        design = PanelDesign(data_set, [endog_data, shock, corr_col] + list(l_exog_data),
+                             entity_col, time_col)
+    regressors, inter_name = interaction_regressors(
+        design, shock, corr_col, l_exog_data, lags_exog_data,
+        corr_lag=corr_lag, center_corr=center_corr,
+    )
+    return fit_lp_joint(design, [endog_data], regressors, hor,
+                        targets=[shock, inter_name], cumul_mult=cumul_mult,
+                        dk_bandwidth=dk_bandwidth)
+
+
 # ============================================================
 # FUNZIONE DI STIMA BASELINE (senza interazione, per confronto)
 # ============================================================
@@ -145,45 +168,23 @@ def estimate_lp_interaction(
 def estimate_lp_baseline(
     data_set, endog_data, shock, l_exog_data,
     lags_exog_data, hor, entity_col="ccode", time_col="year_int",
-    cumul_mult=True, dk_bandwidth=None,
+    cumul_mult=True, dk_bandwidth=None, engine="numpy", design=None,
 ):
-    df = data_set.copy()
-    df = add_panel_lags(df, entity_col, l_exog_data, lags_exog_data)
-    df = add_panel_lag1(df, entity_col, endog_data)
+    if design is None:
+        design = PanelDesign(data_set, [endog_data, shock] + list(l_exog_data),
+                             entity_col, time_col)
 
-    results = []
-
-    for h in range(0, hor + 1):
-        dff = add_panel_lead(df, entity_col, endog_data, h)
-
-        y_lead = f"LEAD{h}_{endog_data}"
-        y_lag1 = f"L1_{endog_data}"
-
-        if cumul_mult:
-            dff[f"YH_{h}"] = dff[y_lead] - dff[y_lag1]
-            y_col = f"YH_{h}"
-        else:
-            y_col = y_lead
-
-        x_cols = [shock] + [
-            f"L{L}_{c}"
-            for c in l_exog_data
-            for L in range(1, lags_exog_data + 1)
-        ]
-
-        use_cols = [entity_col, time_col, y_col] + x_cols
-        tmp = dff[use_cols].dropna().copy()
-        tmp = tmp.set_index([entity_col, time_col])
+    regressors = [(shock, design.var(shock))] + design.lagged_regressors(
+        l_exog_data, lags_exog_data
+    )
 
-        y = tmp[y_col]
-        X = tmp[x_cols]
+    fits = fit_lp_horizons(design, endog_data, regressors, hor,
+                           cumul_mult=cumul_mult, dk_bandwidth=dk_bandwidth,
+                           engine=engine)
 
-        mod = PanelOLS(y, X, entity_effects=True, time_effects=True)
-        fit_kwargs = {"cov_type": "driscoll-kraay"}
-        if dk_bandwidth is not None:
-            fit_kwargs["bandwidth"] = dk_bandwidth
-        res = mod.fit(**fit_kwargs)
+    results = []
 
+    for h, res in enumerate(fits):
         results.append({
             "h": h,
             "result": res,
@@ -202,7 +203,7 @@ def estimate_lp_baseline(
 # TEST 1: SIGNIFICATIVITA CONGIUNTA DELL'INTERAZIONE (Wald test)
 # ============================================================
 
-def test_joint_significance_interaction(results_list):
+def test_joint_significance_interaction(results_list, joint=None):
     """
     H0: theta_0 = theta_1 = ... = theta_H = 0
     (l'interazione con la qualita istituzionale e irrilevante a tutti gli orizzonti)
@@ -214,6 +215,13 @@ def test_joint_significance_interaction(results_list):
     Metodo: Statistica di Wald = theta' * Sigma^{-1} * theta ~ chi2(H+1)
     Approssimazione: usiamo i theta_h stimati indipendentemente a ogni orizzonte
     e costruiamo una matrice diagonale (LP stima equazione per equazione).
+
+    Con joint (estimate_lp_interaction_joint) Sigma e la covarianza DK
+    congiunta (H+1)x(H+1): i theta_h di orizzonti sovrapposti sono molto
+    correlati e la versione diagonale li conta come evidenza indipendente.
+    Dalla stessa matrice: sup-t (banda simultanea) e test sulla somma.
+
+    Ritorna un DiagResult "joint_wald" (tabella "theta" per h).
     """
     print("=" * 70)
     print("TEST 1: SIGNIFICATIVITA CONGIUNTA DELL'INTERAZIONE (Wald)")
@@ -247,8 +255,49 @@ def test_joint_significance_interaction(results_list):
     else:
         print("  >>> NON RIFIUTO H0: l'interazione non e congiuntamente significativa.")
 
+    theta_tbl = pd.DataFrame({
+        "h": [r["h"] for r in results_list], "theta": thetas, "se": se_thetas,
+        "t": thetas / se_thetas, "pval": [r["pval_theta"] for r in results_list],
+    })
+    out = DiagResult(
+        "joint_wald", "Significativita congiunta dell'interazione (Wald)",
+        stats={"wald_stat": wald_stat, "df": df, "pval": pval},
+        tables={"theta": theta_tbl},
+        meta={"inter": results_list[0]["inter_name"], "shock": results_list[0]["shock"]},
+    )
+
+    if joint is not None:
+        endog = joint.coef.index.get_level_values(0)[0]
+        inter = results_list[0]["inter_name"]
+        _, V = joint.select(endog, inter)
+        se = np.sqrt(np.diag(V))
+        corr = V / np.outer(se, se)
+        wald = joint.wald(endog, inter)
+        sup = joint.sup_t(endog, inter)
+        tot = joint.sum_effect(endog, inter)
+
+        print()
+        print("  Covarianza DK congiunta tra orizzonti (stima impilata):")
+        off = corr[np.triu_indices_from(corr, k=1)]
+        print(f"    correlazione theta_h / theta_s: da {off.min():.2f} a {off.max():.2f}")
+        print(f"    Wald (covarianza piena) = {wald['stat']:.3f}  (df = {wald['df']})  "
+              f"p-value = {wald['pval']:.6f}")
+        print(f"    sup-t = {sup['stat']:.3f}  p-value = {sup['pval']:.4f}  "
+              f"(valore critico 95% simultaneo = {sup['crit']:.3f})")
+        print(f"    somma theta_h = {tot['estimate']:.5f}  SE = {tot['se']:.5f}  "
+              f"p-value = {tot['pval']:.4f}")
+        out.stats.update({
+            "wald_full_stat": wald["stat"], "wald_full_df": wald["df"],
+            "wald_full_pval": wald["pval"],
+            "sup_t_stat": sup["stat"], "sup_t_pval": sup["pval"], "sup_t_crit": sup["crit"],
+            "sum_estimate": tot["estimate"], "sum_se": tot["se"], "sum_pval": tot["pval"],
+            "corr_min": float(off.min()), "corr_max": float(off.max()),
+        })
+        theta_tbl["sup_lo"], theta_tbl["sup_hi"] = sup["lo"], sup["hi"]
+        out.meta["endog"] = endog
+
     print()
-    return {"wald_stat": wald_stat, "df": df, "pval": pval}
+    return out
 
 
 # ============================================================
@@ -273,6 +322,12 @@ def test_pesaran_cd(results_list, entity_col="ccode"):
 
     Nota: usiamo correlazioni pairwise (non listwise) per non perdere
     osservazioni quando non tutti i paesi hanno gli stessi anni disponibili.
+
+    Tutte le coppie sono calcolate insieme con prodotti matriciali
+    (panel_stats.pesaran_cd); oltre al CD si riportano CDw (Juodis-Reese,
+    pesi casuali) e CD* (Pesaran-Xie, corretto per i fattori comuni).
+
+    Ritorna un DiagResult "pesaran_cd" (tabella "cd" per h).
     """
     print("=" * 70)
     print("TEST 2: PESARAN CD (Cross-Sectional Dependence)")
@@ -282,137 +337,108 @@ def test_pesaran_cd(results_list, entity_col="ccode"):
     print("H1: esiste dipendenza cross-sezionale nei residui")
     print("Se rifiutiamo H0, la scelta di Driscoll-Kraay SE e giustificata.\n")
 
+    rows = []
     for r in results_list:
         h = r["h"]
-        resids = r["resids"]
-        resid_df = resids.reset_index()
-        resid_df.columns = [entity_col, "year_int", "resid"]
-
-        # Pivot: righe = anni, colonne = paesi (NON dropna)
-        pivot = resid_df.pivot(index="year_int", columns=entity_col, values="resid")
-        countries = pivot.columns.tolist()
-        N = len(countries)
+        # matrice anni x paesi (NaN dove manca il residuo), niente dropna
+        E, _, _ = panel_matrix(r["resids"])
+        cd = pesaran_cd(E)
+        N = cd["N"]
+        rows.append({"h": h, **{k: cd[k] for k in [
+            "CD", "CD_p", "CDw", "CDw_p", "CDstar", "CDstar_p", "N", "T_min", "T_max", "pairs"]
+            if k in cd}})
 
         if N < 2:
             print(f"  h={h}: Dati insufficienti (N={N})")
             continue
-
-        # Correlazioni pairwise con formula CD esatta di Pesaran (2004)
-        cd_sum = 0.0
-        n_pairs = 0
-        min_T = np.inf
-        max_T = 0
-
-        for i in range(N):
-            for j in range(i + 1, N):
-                # Anni comuni tra paese i e j
-                mask = pivot.iloc[:, i].notna() & pivot.iloc[:, j].notna()
-                T_ij = mask.sum()
-                if T_ij < 3:
-                    continue
-                ri = pivot.iloc[:, i][mask].values
-                rj = pivot.iloc[:, j][mask].values
-                rho_ij = np.corrcoef(ri, rj)[0, 1]
-                cd_sum += np.sqrt(T_ij) * rho_ij
-                n_pairs += 1
-                min_T = min(min_T, T_ij)
-                max_T = max(max_T, T_ij)
-
-        if n_pairs == 0:
+        if cd["pairs"] == 0:
             print(f"  h={h}: Nessuna coppia con anni comuni sufficienti")
             continue
 
-        cd_stat = np.sqrt(2.0 / (N * (N - 1))) * cd_sum
-        pval = 2.0 * (1.0 - stats.norm.cdf(abs(cd_stat)))
-
+        cd_stat, pval = cd["CD"], cd["CD_p"]
         sig = "***" if pval < 0.01 else ("**" if pval < 0.05 else ("*" if pval < 0.10 else ""))
-        print(f"  h={h}: CD = {cd_stat:>8.3f}  p-value = {pval:.6f}  N={N}  T=[{int(min_T)}-{int(max_T)}]  pairs={n_pairs}  {sig}")
+        print(f"  h={h}: CD = {cd_stat:>8.3f}  p-value = {pval:.6f}  N={N}  T=[{cd['T_min']}-{cd['T_max']}]  pairs={cd['pairs']}  {sig}")
+        print(f"        CDw = {cd['CDw']:>7.3f}  p-value = {cd['CDw_p']:.6f}   "
+              f"CD* = {cd['CDstar']:>7.3f}  p-value = {cd['CDstar_p']:.6f}")
 
     print()
     print("  Se CD e significativo -> la cross-sectional dependence e presente")
     print("  -> l'uso di Driscoll-Kraay standard errors e corretto e necessario.")
     print()
 
+    tbl = pd.DataFrame(rows)
+    ok = tbl.dropna(subset=["CD_p"]) if "CD_p" in tbl else tbl.iloc[:0]
+    return DiagResult(
+        "pesaran_cd", "Pesaran CD (cross-sectional dependence dei residui)",
+        stats={"min_pval": float(ok["CD_p"].min()) if len(ok) else np.nan,
+               "reject_5pct_all": bool(len(ok) and (ok["CD_p"] < 0.05).all())},
+        tables={"cd": tbl},
+        meta={"inter": results_list[0]["inter_name"]},
+    )
+
 
 # ============================================================
 # TEST 3: STAZIONARIETA PANEL (Im-Pesaran-Shin)
 # ============================================================
 
-def test_panel_stationarity(dt, variables, entity_col="ccode"):
+def test_panel_stationarity(dt, variables, entity_col="ccode", time_col="year_int",
+                            max_lags=None, ic="bic"):
     """
-    Test IPS (Im, Pesaran & Shin, 2003) per radice unitaria panel.
+    Test IPS (Im, Pesaran & Shin, 2003) per radice unitaria panel,
+    affiancato da LLC (Levin, Lin & Chu, 2002) e CIPS (Pesaran, 2007).
 
     Perche: La validita delle LP assume che le variabili siano stazionarie
     (o che le differenze lo siano). Se le variabili hanno radice unitaria,
     le inferenze sono spurie. Il test IPS e il gold standard per panel macro.
 
-    Metodo: Media dei t-statistics degli ADF individuali per paese,
-    standardizzata con i valori tabulati IPS.
-    Qui usiamo un'approssimazione: ADF per ogni paese, poi media dei t-stat.
+    Metodo: ADF con costante per ogni paese, lag scelti per serie con
+    criterio d'informazione (ic su 0..max_lags). IPS: media dei t-ADF
+    standardizzata con i momenti E[t], Var[t] per (T_i, p_i) di ciascun
+    paese. LLC: t pooled corretto (H1 omogenea). CIPS: media delle t CADF
+    con medie cross-sezionali, robusta alla dipendenza tra paesi.
+    Tutte le regressioni girano in blocco (panel_stats.panel_unit_root).
     Sotto H0: tutte le serie hanno radice unitaria.
     Sotto H1: almeno alcune serie sono stazionarie.
+
+    Ritorna un DiagResult "unit_root" (tabella "unit_root" per variabile).
     """
     print("=" * 70)
-    print("TEST 3: STAZIONARIETA PANEL (tipo IPS)")
+    print("TEST 3: STAZIONARIETA PANEL (IPS / LLC / CIPS)")
     print("=" * 70)
     print()
     print("H0: tutte le serie hanno radice unitaria (non stazionarie)")
     print("H1: almeno alcune serie sono stazionarie")
-    print("Metodo: media dei t-ADF individuali per paese.\n")
-
-    for var in variables:
-        t_stats = []
-        countries = dt[entity_col].unique()
-
-        for c in countries:
-            series = dt.loc[dt[entity_col] == c, var].dropna().values
-            if len(series) < 5:
-                continue
-
-            # ADF(1): Delta y_t = alpha + rho * y_{t-1} + beta * Delta y_{t-1} + e
-            dy = np.diff(series)
-            y_lag = series[:-1]
-            dy_lag = np.diff(series[:-1]) if len(series) > 2 else np.array([])
-
-            if len(dy_lag) == 0:
-                continue
-
-            n = min(len(dy), len(y_lag), len(dy_lag))
-            dy = dy[1:n + 1] if n < len(dy) else dy[-n:]
-            y_lag = y_lag[1:n + 1] if n < len(y_lag) else y_lag[-n:]
-            dy_lag = dy_lag[:n]
-
-            X = np.column_stack([np.ones(n), y_lag, dy_lag])
-            try:
-                beta_hat = np.linalg.lstsq(X, dy, rcond=None)[0]
-                resid = dy - X @ beta_hat
-                sigma2 = np.sum(resid ** 2) / (n - 3)
-                var_beta = sigma2 * np.linalg.inv(X.T @ X)
-                t_stat = beta_hat[1] / np.sqrt(var_beta[1, 1])
-                t_stats.append(t_stat)
-            except np.linalg.LinAlgError:
-                continue
-
-        if len(t_stats) > 0:
-            t_bar = np.mean(t_stats)
-            # IPS critical values (approx): E[t] ~ -1.52, Var[t] ~ 0.74 for T=20
-            # Standardizziamo con valori approssimati
-            n_countries = len(t_stats)
-            # Z-stat approssimato
-            z_stat = np.sqrt(n_countries) * (t_bar - (-1.52)) / np.sqrt(0.74)
-            pval = stats.norm.cdf(z_stat)  # one-sided (left tail)
-
-            sig = "***" if pval < 0.01 else ("**" if pval < 0.05 else ("*" if pval < 0.10 else ""))
-            status = "STAZIONARIA" if pval < 0.05 else "RADICE UNITARIA"
-            print(f"  {var:<20s}  t-bar = {t_bar:>7.3f}  Z = {z_stat:>7.3f}  p = {pval:.4f}  {sig}  -> {status}")
-        else:
-            print(f"  {var:<20s}  Dati insufficienti")
+    print(f"Metodo: ADF individuali per paese, lag scelti con {ic.upper()}.\n")
+
+    tbl = panel_unit_root(dt, variables, entity_col, time_col, max_lags=max_lags, ic=ic)
+
+    for r in tbl.itertuples(index=False):
+        if r.N == 0:
+            print(f"  {r.variable:<20s}  Dati insufficienti")
+            continue
+
+        pval = r.ips_p
+        sig = "***" if pval < 0.01 else ("**" if pval < 0.05 else ("*" if pval < 0.10 else ""))
+        status = "STAZIONARIA" if pval < 0.05 else "RADICE UNITARIA"
+        print(f"  {r.variable:<20s}  t-bar = {r.ips_tbar:>7.3f}  W = {r.ips_W:>7.3f}  p = {pval:.4f}  {sig}  -> {status}")
+        print(f"  {'':<20s}  LLC t* = {r.llc_t:>7.3f} (p = {r.llc_p:.4f})   "
+              f"CIPS = {r.cips:>7.3f} (5%: {r.cips_cv5:.2f}, p = {r.cips_p:.4f})   "
+              f"lag medio = {r.lags_mean:.2f}")
 
     print()
     print("  Nota: le LP usano y_{t+h} - y_{t-1} come dipendente -> automaticamente")
     print("  in differenze, quindi anche variabili I(1) sono gestibili.")
     print("  E' comunque buona pratica verificare l'ordine di integrazione.\n")
 
+    ok = tbl[tbl["N"] > 0]
+    return DiagResult(
+        "unit_root", "Stazionarieta panel (IPS / LLC / CIPS)",
+        stats={"n_stationary_5pct": int((ok["ips_p"] < 0.05).sum()),
+               "n_variables": int(len(tbl))},
+        tables={"unit_root": tbl},
+        meta={"ic": ic, "max_lags": max_lags},
+    )
+
 
 # ============================================================
 # TEST 4: PLACEBO TEST (shock anticipato)
@@ -430,6 +456,9 @@ def test_placebo(dt, endog_data, corr_col, l_exog_data, lags_exog_data, hor,
 
     Questo e il test chiave per la validita della strategia di identificazione
     di Heimberger & Dabrowski e, per estensione, del tuo modello.
+
+    Ritorna un DiagResult "placebo" (tabella "placebo": beta, theta e
+    p-value per h).
     """
     print("=" * 70)
     print("TEST 4: PLACEBO TEST (shock futuro F_{t+1})")
@@ -439,15 +468,12 @@ def test_placebo(dt, endog_data, corr_col, l_exog_data, lags_exog_data, hor,
     print("    (beta_placebo = 0 e theta_placebo = 0)")
     print("Se NON rifiutiamo H0 -> bene, lo shock e esogeno.\n")
 
-    df = dt.copy()
-    df = df.sort_values([entity_col, time_col])
-    # Creo lo shock futuro (forecast error al tempo t+1)
-    df["forecasterror_lead1"] = df.groupby(entity_col)["forecasterror"].shift(-1)
-
+    # shock futuro (forecast error al tempo t+1) come lead del design
     results = estimate_lp_interaction(
-        df, endog_data, "forecasterror_lead1", corr_col, l_exog_data,
+        dt, endog_data, "forecasterror", corr_col, l_exog_data,
         lags_exog_data, hor, entity_col, time_col,
         corr_lag=1, cumul_mult=True, dk_bandwidth=None, center_corr=True,
+        shock_lead=1,
     )
 
     print(f"  Variabile dipendente: {endog_data}")
@@ -471,7 +497,43 @@ def test_placebo(dt, endog_data, corr_col, l_exog_data, lags_exog_data, hor,
         print("  >>> Possibile problema di anticipazione / fiscal foresight.")
     print()
 
-    return results
+    return DiagResult(
+        "placebo", "Placebo test (shock futuro F_{t+1})",
+        stats={"all_pass_10pct": all_pass},
+        tables={"placebo": _coef_table(results)},
+        meta={"endog": endog_data, "moderator": corr_col, "lags": lags_exog_data, "hor": hor},
+    )
+
+
+def _coef_table(results):
+    """
+    beta_h, theta_h con SE e p-value da una lista di estimate_lp_interaction.
+    """
+    cols = ["h", "beta", "se_beta", "pval_beta", "theta", "se_theta", "pval_theta", "nobs"]
+    return pd.DataFrame([{c: r[c] for c in cols} for r in results])
+
+
+def _grid_theta(tbl, spec):
+    """
+    Righe theta_h di una spec dalla tabella tidy di run_spec_grid.
+    """
+    th = tbl[(tbl["spec_id"] == spec.spec_id) & (tbl["term"] == "theta")]
+    return th.sort_values("h")
+
+
+def _grid_table(tbl, specs, by):
+    """
+    theta_h delle spec di una griglia con la colonna by (es. moderator).
+    """
+    out = [_grid_theta(tbl, spec).assign(**{by: getattr(spec, by)}) for spec in specs]
+    return pd.concat(out)[[by, "h", "estimate", "se", "pval", "nobs"]].reset_index(drop=True)
+
+
+def _theta_str(th):
+    return "  ".join([
+        f"h{r.h}={r.estimate:>7.4f}{'*' if r.pval < 0.10 else ' '}"
+        for r in th.itertuples()
+    ])
 
 
 # ============================================================
@@ -479,7 +541,7 @@ def test_placebo(dt, endog_data, corr_col, l_exog_data, lags_exog_data, hor,
 # ============================================================
 
 def test_alternative_wgi(dt, endog_data, l_exog_data, lags_exog_data, hor,
-                         wgi_cols=None):
+                         wgi_cols=None, n_jobs=1):
     """
     Stima il modello con diversi indicatori WGI come proxy di qualita istituzionale.
 
@@ -487,6 +549,8 @@ def test_alternative_wgi(dt, endog_data, l_exog_data, lags_exog_data, hor,
     (CC_EST vs GE_EST vs RL_EST), la conclusione e fragile. Se invece theta
     e significativo con piu indicatori, il risultato e robusto alla misurazione
     della qualita istituzionale.
+
+    Ritorna un DiagResult "alternative_wgi" (tabella "theta" per indicatore e h).
     """
     if wgi_cols is None:
         wgi_cols = ["CC_EST", "GE_EST", "RL_EST", "RQ_EST"]
@@ -498,28 +562,33 @@ def test_alternative_wgi(dt, endog_data, l_exog_data, lags_exog_data, hor,
     print("Stimo theta_h con diversi indicatori di qualita istituzionale.")
     print("Se theta e consistente tra indicatori -> risultato robusto.\n")
 
-    for col in wgi_cols:
-        results = estimate_lp_interaction(
-            dt, endog_data, "forecasterror", col, l_exog_data,
-            lags_exog_data, hor, corr_lag=1, cumul_mult=True, center_corr=True,
-        )
-
-        thetas = [r["theta"] for r in results]
-        pvals = [r["pval_theta"] for r in results]
-        sig_any = any(p < 0.10 for p in pvals)
+    # una griglia: stesso design, un moderatore per indicatore
+    specs = spec_grid(["ctrl"], [lags_exog_data], moderators=wgi_cols, hors=[hor])
+    tbl = run_spec_grid(dt, specs, [endog_data], {"ctrl": l_exog_data}, n_jobs=n_jobs)
 
-        theta_str = "  ".join([f"h{r['h']}={r['theta']:>7.4f}{'*' if r['pval_theta'] < 0.10 else ' '}" for r in results])
-        print(f"  {col:<8s}: {theta_str}  {'<- SIG' if sig_any else ''}")
+    for spec in specs:
+        th = _grid_theta(tbl, spec)
+        sig_any = bool((th["pval"] < 0.10).any())
+        print(f"  {spec.moderator:<8s}: {_theta_str(th)}  {'<- SIG' if sig_any else ''}")
 
     print()
 
+    theta = _grid_table(tbl, specs, "moderator")
+    return DiagResult(
+        "alternative_wgi", "Robustezza: indicatori WGI alternativi",
+        stats={"n_sig_10pct": int(theta.groupby("moderator")["pval"].min().lt(0.10).sum())},
+        tables={"theta": theta},
+        meta={"endog": endog_data, "lags": lags_exog_data, "hor": hor,
+              "moderators": list(wgi_cols)},
+    )
+
 
 # ============================================================
 # TEST 6: ROBUSTEZZA - QUANTILI DIVERSI
 # ============================================================
 
 def test_alternative_quantiles(dt, endog_data, corr_col, l_exog_data,
-                               lags_exog_data, hor):
+                               lags_exog_data, hor, results=None):
     """
     Valuta le IRF condizionali a diversi percentili della distribuzione
     dell'indicatore istituzionale.
@@ -527,6 +596,9 @@ def test_alternative_quantiles(dt, endog_data, corr_col, l_exog_data,
     Perche: La scelta 25/75 e arbitraria. Se i risultati cambiano drasticamente
     con 10/90 o 33/67, la conclusione non e robusta alla definizione di
     "alta" vs "bassa" qualita. Mostra che il pattern persiste.
+
+    results: stima di estimate_lp_interaction gia disponibile (opzionale).
+    Ritorna un DiagResult "quantiles" (tabelle "quantiles" e "surface").
     """
     print("=" * 70)
     print("TEST 6: ROBUSTEZZA - QUANTILI DIVERSI")
@@ -537,21 +609,22 @@ def test_alternative_quantiles(dt, endog_data, corr_col, l_exog_data,
 
     quantile_pairs = [(0.10, 0.90), (0.25, 0.75), (0.33, 0.67)]
 
-    results = estimate_lp_interaction(
-        dt, endog_data, "forecasterror", corr_col, l_exog_data,
-        lags_exog_data, hor, corr_lag=1, cumul_mult=True, center_corr=True,
-    )
+    if results is None:
+        results = estimate_lp_interaction(
+            dt, endog_data, "forecasterror", corr_col, l_exog_data,
+            lags_exog_data, hor, corr_lag=1, cumul_mult=True, center_corr=True,
+        )
 
-    # Ricostruisco le quantili manualmente
-    df_tmp = dt.copy()
-    df_tmp = df_tmp.sort_values(["ccode", "year_int"])
-    df_tmp[f"L1_{corr_col}"] = df_tmp.groupby("ccode")[corr_col].shift(1)
-    corr_mean = df_tmp[f"L1_{corr_col}"].mean(skipna=True)
-    df_tmp[f"L1_{corr_col}_c"] = df_tmp[f"L1_{corr_col}"] - corr_mean
+    # quantili del moderatore laggato e centrato, dallo stesso design
+    # usato per il regressore di interazione (come moderator_grid)
+    design = PanelDesign(dt, [corr_col])
+    corr_l = np.where(design.present, design.lag(corr_col, 1), np.nan)
+    corr_l = corr_l[np.isfinite(corr_l)]
+    corr_c = corr_l - corr_l.mean()
 
+    q_rows = []
     for q_lo, q_hi in quantile_pairs:
-        c_lo = df_tmp[f"L1_{corr_col}_c"].quantile(q_lo)
-        c_hi = df_tmp[f"L1_{corr_col}_c"].quantile(q_hi)
+        c_lo, c_hi = (float(c) for c in np.quantile(corr_c, [q_lo, q_hi]))
 
         print(f"  Quantili ({int(q_lo*100)}/{int(q_hi*100)})  ->  c_low={c_lo:.4f}  c_high={c_hi:.4f}")
 
@@ -560,17 +633,122 @@ def test_alternative_quantiles(dt, endog_data, corr_col, l_exog_data,
             theta = r["theta"]
             irf_lo = beta + theta * c_lo
             irf_hi = beta + theta * c_hi
+            q_rows.append({"q_lo": q_lo, "q_hi": q_hi, "c_lo": c_lo, "c_hi": c_hi,
+                           "h": r["h"], "irf_lo": irf_lo, "irf_hi": irf_hi,
+                           "diff": irf_hi - irf_lo})
             print(f"    h={r['h']}:  IRF(low)={irf_lo:>8.5f}   IRF(high)={irf_hi:>8.5f}   diff={irf_hi - irf_lo:>8.5f}")
         print()
 
+    # tutta la distribuzione (1-99 percentile) dalla stessa stima
+    c_grid, center = moderator_grid(dt, corr_col, corr_lag=1)
+    surf = conditional_irf_surface(results, c_grid, center=center)
+    print(f"  Superficie su {len(c_grid)} valori di {corr_col} "
+          f"({surf['level'][0]:.2f} .. {surf['level'][-1]:.2f}), banda +/- 1 SE:")
+    for i, h in enumerate(surf["h"]):
+        sig = np.r_[False, (surf["lo"][i] > 0) | (surf["hi"][i] < 0), False].astype(int)
+        starts, stops = np.flatnonzero(np.diff(sig) == 1), np.flatnonzero(np.diff(sig) == -1) - 1
+        zone = ", ".join(f"{surf['level'][a]:.2f} .. {surf['level'][b]:.2f}"
+                         for a, b in zip(starts, stops)) or "nessuno"
+        print(f"    h={h}:  IRF da {surf['irf'][i, 0]:>8.5f} a {surf['irf'][i, -1]:>8.5f}"
+              f"   banda senza lo zero per {corr_col} in {zone}")
+
     print()
 
+    n_h, n_c = surf["irf"].shape
+    surface = pd.DataFrame({
+        "h": np.repeat(surf["h"], n_c), "level": np.tile(surf["level"], n_h),
+        **{k: surf[k].ravel() for k in ["irf", "se", "lo", "hi"]},
+    })
+    return DiagResult(
+        "quantiles", "Robustezza: quantili diversi del moderatore",
+        stats={"center": center, "n_grid": len(c_grid)},
+        tables={"quantiles": pd.DataFrame(q_rows), "surface": surface},
+        meta={"endog": endog_data, "moderator": corr_col, "lags": lags_exog_data, "hor": hor},
+    )
+
+
+# ============================================================
+# SUPERFICIE IRF CONDIZIONALE (ORIZZONTE x MODERATORE)
+# ============================================================
+
+def moderator_grid(data_set, corr_col, corr_lag=1, n_grid=200, q_range=(0.01, 0.99),
+                   entity_col="ccode", time_col="year_int", center_corr=True):
+    """
+    Griglia di n_grid valori del moderatore laggato tra i quantili q_range
+    della sua distribuzione, nella stessa scala del regressore di
+    interazione (centrato sulla media se center_corr, come in
+    interaction_regressors). Ritorna (griglia, media usata per centrare).
+    """
+    design = PanelDesign(data_set, [corr_col], entity_col, time_col)
+    corr_l = np.where(design.present, design.lag(corr_col, corr_lag), np.nan)
+    corr_l = corr_l[np.isfinite(corr_l)]
+    center = float(corr_l.mean()) if center_corr else 0.0
+    lo, hi = np.quantile(corr_l - center, q_range)
+    return np.linspace(lo, hi, n_grid), center
+
+
+def conditional_irf_surface(results, c_grid, confint=1.0, center=0.0):
+    """
+    IRF condizionale beta_h + theta_h * c su tutta la griglia c, per ogni h,
+    da UNA stima di estimate_lp_interaction (nessuna ristima).
+
+    La banda usa la covarianza completa di (beta_h, theta_h):
+      Var = V_bb + 2 c V_bt + c^2 V_tt
+    Ritorna un dict con h, c, level (= c + center, scala originale del
+    moderatore) e le matrici (h x griglia) irf, se, lo, hi, pronte per
+    pcolormesh / contourf.
+    """
+    c = np.asarray(c_grid, dtype=float)
+    shock, inter = results[0]["shock"], results[0]["inter_name"]
+    b = np.array([r["beta"] for r in results])
+    t = np.array([r["theta"] for r in results])
+    V = np.array([
+        np.asarray(r["result"].cov.loc[[shock, inter], [shock, inter]], dtype=float)
+        for r in results
+    ])
+
+    irf = b[:, None] + t[:, None] * c[None, :]
+    var = V[:, 0, 0, None] + 2.0 * c[None, :] * V[:, 0, 1, None] + c[None, :]**2 * V[:, 1, 1, None]
+    se = np.sqrt(np.maximum(var, 0.0))
+    return {
+        "h": np.array([r["h"] for r in results]),
+        "c": c,
+        "level": c + center,
+        "irf": irf,
+        "se": se,
+        "lo": irf - confint * se,
+        "hi": irf + confint * se,
+    }
+
+
+def plot_irf_surface(surface, ttl="", xlab="moderatore"):
+    """
+    Mappa h x moderatore della IRF condizionale; la linea tratteggiata
+    delimita la zona in cui la banda esclude lo zero.
+    """
+    # import locale: la batteria non disegna e non paga l'import di pyplot
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    vmax = float(np.nanmax(np.abs(surface["irf"])))
+    mesh = ax.pcolormesh(surface["level"], surface["h"], surface["irf"],
+                         shading="nearest", cmap="RdBu_r", vmin=-vmax, vmax=vmax)
+    sig = (surface["lo"] > 0) | (surface["hi"] < 0)
+    if sig.any() and not sig.all():
+        ax.contour(surface["level"], surface["h"], sig.astype(float), levels=[0.5],
+                   colors="k", linestyles="--", linewidths=1)
+    fig.colorbar(mesh, ax=ax, label="IRF")
+    ax.set_title(ttl)
+    ax.set_xlabel(xlab)
+    ax.set_ylabel("h")
+    return fig
+
 
 # ============================================================
 # TEST 7: ROBUSTEZZA - DIVERSI LAG
 # ============================================================
 
-def test_lag_robustness(dt, endog_data, corr_col, l_exog_data, hor):
+def test_lag_robustness(dt, endog_data, corr_col, l_exog_data, hor, n_jobs=1):
     """
     Stima con p=1, p=2 (baseline), p=3 lag dei controlli.
 
@@ -578,29 +756,35 @@ def test_lag_robustness(dt, endog_data, corr_col, l_exog_data, hor):
     Se theta cambia segno o significativita con lag diversi, il risultato
     e sensibile a una scelta arbitraria. In ambito accademico, mostrare
     stabilita rispetto ai lag e prassi consolidata.
+
+    Ritorna un DiagResult "lag_robustness" (tabella "theta" per lags e h).
     """
     print("=" * 70)
     print("TEST 7: ROBUSTEZZA - DIVERSI LAG DEI CONTROLLI")
     print("=" * 70)
     print()
 
-    for lags in [1, 2, 3]:
-        results = estimate_lp_interaction(
-            dt, endog_data, "forecasterror", corr_col, l_exog_data,
-            lags, hor, corr_lag=1, cumul_mult=True, center_corr=True,
-        )
-        theta_str = "  ".join([f"h{r['h']}={r['theta']:>7.4f}{'*' if r['pval_theta'] < 0.10 else ' '}" for r in results])
-        print(f"  lags={lags}: {theta_str}")
+    specs = spec_grid(["ctrl"], [1, 2, 3], moderators=[corr_col], hors=[hor])
+    tbl = run_spec_grid(dt, specs, [endog_data], {"ctrl": l_exog_data}, n_jobs=n_jobs)
+
+    for spec in specs:
+        print(f"  lags={spec.lags}: {_theta_str(_grid_theta(tbl, spec))}")
 
     print()
 
+    return DiagResult(
+        "lag_robustness", "Robustezza: lag dei controlli",
+        tables={"theta": _grid_table(tbl, specs, "lags")},
+        meta={"endog": endog_data, "moderator": corr_col, "hor": hor},
+    )
+
 
 # ============================================================
 # TEST 8 & 9: ROBUSTEZZA - SOTTOCAMPIONI
 # ============================================================
 
 def test_subsample_robustness(dt, endog_data, corr_col, l_exog_data,
-                              lags_exog_data, hor):
+                              lags_exog_data, hor, n_jobs=1):
     """
     Pre-COVID (2000-2019) ed esclusione Irlanda.
 
@@ -609,6 +793,9 @@ def test_subsample_robustness(dt, endog_data, corr_col, l_exog_data,
       sono guidati solo da quegli anni, la conclusione non e generalizzabile.
     - Esclusione Irlanda: il PIL irlandese e distorto da attivita multinazionali
       (il "leprechaun economics"). E' un outlier standard nella letteratura EU.
+
+    Ritorna un DiagResult "subsamples" (tabelle "theta" per sottocampione
+    e "jackknife": SE jackknife e influenza di ogni paese per h).
     """
     print("=" * 70)
     print("TEST 8-9: ROBUSTEZZA - SOTTOCAMPIONI")
@@ -616,23 +803,95 @@ def test_subsample_robustness(dt, endog_data, corr_col, l_exog_data,
     print()
 
     subsamples = {
-        "Full sample (2000-2023)": dt,
-        "Pre-COVID (2000-2019)": dt[dt["year_int"] <= 2019].copy(),
-        "Esclusa Irlanda": dt[dt["ccode"] != "IRL"].copy(),
+        "Full sample (2000-2023)": None,
+        "Pre-COVID (2000-2019)": "year_int <= 2019",
+        "Esclusa Irlanda": "ccode != 'IRL'",
     }
 
-    for name, sub_dt in subsamples.items():
-        results = estimate_lp_interaction(
-            sub_dt, endog_data, "forecasterror", corr_col, l_exog_data,
-            lags_exog_data, hor, corr_lag=1, cumul_mult=True, center_corr=True,
-        )
+    specs = spec_grid(["ctrl"], [lags_exog_data], samples=list(subsamples),
+                      moderators=[corr_col], hors=[hor])
+    tbl = run_spec_grid(dt, specs, [endog_data], {"ctrl": l_exog_data},
+                        samples=subsamples, n_jobs=n_jobs)
+
+    for spec in specs:
+        th = _grid_theta(tbl, spec)
+        n = int(th["nobs"].iloc[0])
+        print(f"  {spec.sample:<30s} (N={n:>3d}): {_theta_str(th)}")
+
+    # jackknife leave-one-country-out: l'esclusione dell'Irlanda estesa a
+    # tutti i paesi (downdate delle equazioni normali, niente N ristime)
+    design = PanelDesign(dt, [endog_data, "forecasterror", corr_col] + list(l_exog_data))
+    jk, inter_name = jackknife_interaction(design, endog_data, "forecasterror", corr_col,
+                                           l_exog_data, lags_exog_data, hor)
+    infl = jk.influence(endog_data, inter_name)
+    se_jk = jk.se(endog_data, inter_name)
+    jk_tbl = (infl.rename_axis(index="dropped", columns="h").stack().rename("influence")
+              .reset_index())
+    jk_tbl["se_jk"] = jk_tbl["h"].map(pd.Series(np.asarray(se_jk), index=infl.columns))
+    print()
+    print("  Jackknife senza un paese alla volta (theta):")
+    for h in infl.columns:
+        col = infl[h].dropna()
+        top = col.abs().idxmax()
+        print(f"    h={h}: SE jackknife={se_jk[h]:.4f} (N paesi={len(col)}), "
+              f"paese piu influente: {top} ({col[top]:+.4f})")
+
+    print()
+
+    return DiagResult(
+        "subsamples", "Robustezza: sottocampioni e jackknife per paese",
+        tables={"theta": _grid_table(tbl, specs, "sample"), "jackknife": jk_tbl},
+        meta={"endog": endog_data, "moderator": corr_col, "lags": lags_exog_data, "hor": hor},
+    )
+
+
+# ============================================================
+# TEST 9b: STABILITA NEL TEMPO (FINESTRE CRESCENTI E MOBILI)
+# ============================================================
+
+def test_window_stability(dt, endog_data, corr_col, l_exog_data, lags_exog_data,
+                          hor, first_end=2008, width=12):
+    """
+    theta_h per anno finale del campione (finestra crescente dal 2000) e su
+    finestre mobili di width anni.
 
-        n = results[0]["nobs"]
-        theta_str = "  ".join([f"h{r['h']}={r['theta']:>7.4f}{'*' if r['pval_theta'] < 0.10 else ' '}" for r in results])
-        print(f"  {name:<30s} (N={n:>3d}): {theta_str}")
+    Perche: il taglio pre-COVID confronta solo due campioni. Seguire theta_h
+    anno per anno mostra se e dove l'interazione cambia (crisi del 2008,
+    crisi del debito sovrano 2010-2012, COVID) invece di un solo confronto.
 
+    Ritorna un DiagResult "window_stability" (tabella "theta" con
+    finestra, start, end e h).
+    """
+    print("=" * 70)
+    print("TEST 9b: STABILITA NEL TEMPO - FINESTRE DI ANNI")
+    print("=" * 70)
     print()
 
+    years = dt["year_int"]
+    tables = []
+    for mode, label, wins in [
+        ("expanding", "Finestra crescente", window_list(years, "expanding", first_end=first_end)),
+        ("rolling", f"Finestra mobile ({width} anni)", window_list(years, "rolling", width)),
+    ]:
+        tbl = estimate_lp_interaction_windows(
+            dt, endog_data, "forecasterror", corr_col, l_exog_data, lags_exog_data,
+            hor, windows=wins,
+        )
+        th = tbl[tbl["term"] == "theta"]
+        tables.append(th.drop(columns="term").assign(mode=mode))
+        print(f"  {label}:")
+        for (a, b), grp in th.groupby(["start", "end"], sort=True):
+            print(f"    {a}-{b}: {_theta_str(grp.sort_values('h'))}")
+        print()
+
+    theta = pd.concat(tables).reset_index(drop=True)
+    return DiagResult(
+        "window_stability", "Stabilita nel tempo: finestre di anni",
+        tables={"theta": theta[["mode"] + [c for c in theta.columns if c != "mode"]]},
+        meta={"endog": endog_data, "moderator": corr_col, "lags": lags_exog_data,
+              "hor": hor, "first_end": first_end, "width": width},
+    )
+
 
 # ============================================================
 # TEST 10: GRANGER NON-CAUSALITA DELLO SHOCK
@@ -647,6 +906,8 @@ def test_shock_exogeneity(dt, entity_col="ccode", time_col="year_int"):
     esogena. Se variabili come PIL o debito laggato predicono F_{i,t},
     lo shock non e esogeno e le stime sono distorte. Questo e un test
     di Granger-causalita inversa: regressiamo F su lags delle macro.
+
+    Ritorna un DiagResult "shock_exogeneity" (tabella "coef" per regressore).
     """
     print("=" * 70)
     print("TEST 10: ESOGENEITA DELLO SHOCK (Granger-tipo)")
@@ -656,25 +917,16 @@ def test_shock_exogeneity(dt, entity_col="ccode", time_col="year_int"):
     print("H0: i lag macro NON predicono il forecast error")
     print("Se H0 non rifiutata -> lo shock e plausibilmente esogeno.\n")
 
-    df = dt.copy()
     macro_vars = ["growth_RGDP", "PDEBT", "NOMLRATE", "REER"]
-    df = add_panel_lags(df, entity_col, macro_vars, 2)
-
-    x_cols = [
-        f"L{L}_{c}"
-        for c in macro_vars
-        for L in range(1, 3)
-    ]
-
-    use_cols = [entity_col, time_col, "forecasterror"] + x_cols
-    tmp = df[use_cols].dropna().copy()
-    tmp = tmp.set_index([entity_col, time_col])
-
-    y = tmp["forecasterror"]
-    X = tmp[x_cols]
+    design = PanelDesign(dt, ["forecasterror"] + macro_vars, entity_col, time_col)
+    regressors = design.lagged_regressors(macro_vars, 2)
+    x_cols = [name for name, _ in regressors]
 
-    mod = PanelOLS(y, X, entity_effects=True, time_effects=True)
-    res = mod.fit(cov_type="driscoll-kraay")
+    # two-way FE + DK sul motore interno (come PanelOLS driscoll-kraay)
+    y, X, e_idx, t_idx = design.sample(design.var("forecasterror"),
+                                        np.stack([arr for _, arr in regressors], axis=-1))
+    res = fit_twoway_dk(y, X, e_idx, t_idx, x_names=x_cols,
+                        index=design.index(e_idx, t_idx))
 
     print("  Coefficienti:")
     for var in x_cols:
@@ -700,43 +952,139 @@ def test_shock_exogeneity(dt, entity_col="ccode", time_col="year_int"):
         print("  >>> ATTENZIONE: rifiuto H0. Possibile endogeneita dello shock.")
     print()
 
+    return DiagResult(
+        "shock_exogeneity", "Esogeneita dello shock (Granger-tipo)",
+        stats={"wald_stat": wald, "df": df_test, "pval": pval_joint,
+               "r2_within": float(res.rsquared_within), "nobs": int(res.nobs)},
+        tables={"coef": pd.DataFrame({"variable": x_cols, "beta": betas, "se": ses,
+                                      "pval": [res.pvalues[v] for v in x_cols]})},
+        meta={"macro_vars": macro_vars, "lags": 2},
+    )
+
 
 # ============================================================
 # RIEPILOGO RISULTATI + R2 CONFRONTO
 # ============================================================
 
 def summary_r2_comparison(dt, endog_data, corr_col, l_exog_data,
-                          lags_exog_data, hor):
+                          lags_exog_data, hor, res_inter=None, res_base=None):
     """
     Confronta R2 within del modello baseline vs modello con interazione.
 
     Perche: Mostra quanta varianza aggiuntiva e spiegata dall'interazione.
     Se Delta-R2 e trascurabile, l'interazione non migliora il fit.
+
+    res_inter / res_base: stime gia disponibili (es. la stima principale).
+    Ritorna un DiagResult "r2_comparison" (tabella "r2" per h).
     """
     print("=" * 70)
     print("CONFRONTO R2: BASELINE vs INTERAZIONE")
     print("=" * 70)
     print()
 
-    res_base = estimate_lp_baseline(
-        dt, endog_data, "forecasterror", l_exog_data,
-        lags_exog_data, hor, cumul_mult=True,
-    )
+    if res_base is None:
+        res_base = estimate_lp_baseline(
+            dt, endog_data, "forecasterror", l_exog_data,
+            lags_exog_data, hor, cumul_mult=True,
+        )
 
-    res_inter = estimate_lp_interaction(
-        dt, endog_data, "forecasterror", corr_col, l_exog_data,
-        lags_exog_data, hor, corr_lag=1, cumul_mult=True, center_corr=True,
-    )
+    if res_inter is None:
+        res_inter = estimate_lp_interaction(
+            dt, endog_data, "forecasterror", corr_col, l_exog_data,
+            lags_exog_data, hor, corr_lag=1, cumul_mult=True, center_corr=True,
+        )
 
     print(f"  {'h':>3}  {'R2 baseline':>14}  {'R2 interaction':>16}  {'Delta R2':>10}  {'Nobs':>6}")
     print(f"  {'---':>3}  {'-' * 14:>14}  {'-' * 16:>16}  {'-' * 10:>10}  {'-' * 6:>6}")
 
+    rows = []
     for rb, ri in zip(res_base, res_inter):
         dr2 = ri["r2_within"] - rb["r2_within"]
+        rows.append({"h": rb["h"], "r2_base": rb["r2_within"], "r2_inter": ri["r2_within"],
+                     "delta_r2": dr2, "nobs": ri["nobs"]})
         print(f"  {rb['h']:>3}  {rb['r2_within']:>14.6f}  {ri['r2_within']:>16.6f}  {dr2:>10.6f}  {ri['nobs']:>6d}")
 
     print()
 
+    return DiagResult(
+        "r2_comparison", "Confronto R2: baseline vs interazione",
+        tables={"r2": pd.DataFrame(rows)},
+        meta={"endog": endog_data, "moderator": corr_col, "lags": lags_exog_data, "hor": hor},
+    )
+
+
+# ============================================================
+# BATTERIA COME DAG (task_dag)
+# ============================================================
+
+def diagnostic_battery(endog_list, corr_cols, l_exog_data, lags_exog_data, hor,
+                       stationarity_vars=None):
+    """
+    Compiti della batteria con le loro dipendenze, per ogni coppia
+    (dipendente, moderatore). Le stime condivise (modello con interazione,
+    covarianza congiunta, baseline) sono compiti a parte, calcolati una
+    volta e passati ai test che li usano; il panel e l'oggetto condiviso
+    "dt". L'output segue l'ordine della batteria seriale (test 1..10, R2).
+    """
+    ctrl, p, H = list(l_exog_data), lags_exog_data, hor
+    fits, by_test = [], {n: [] for n in ["1", "2", "3", "4", "5", "6", "7", "8", "9b", "10", "r2"]}
+
+    for endog in endog_list:
+        fits.append(Task(
+            f"baseline[{endog}]", estimate_lp_baseline,
+            kwargs=dict(endog_data=endog, shock="forecasterror", l_exog_data=ctrl,
+                        lags_exog_data=p, hor=H, cumul_mult=True),
+            deps={"data_set": "dt"}, quiet=True,
+        ))
+        by_test["5"].append(Task(
+            f"5-wgi[{endog}]", test_alternative_wgi,
+            kwargs=dict(endog_data=endog, l_exog_data=ctrl, lags_exog_data=p, hor=H),
+            deps={"dt": "dt"},
+        ))
+        for corr in corr_cols:
+            key = f"{endog}|{corr}"
+            spec = dict(endog_data=endog, corr_col=corr, l_exog_data=ctrl,
+                        lags_exog_data=p, hor=H)
+            fit_kw = dict(spec, shock="forecasterror", corr_lag=1, cumul_mult=True,
+                          center_corr=True)
+            fits += [
+                Task(f"fit[{key}]", estimate_lp_interaction, kwargs=fit_kw,
+                     deps={"data_set": "dt"}, quiet=True),
+                Task(f"joint[{key}]", estimate_lp_interaction_joint, kwargs=fit_kw,
+                     deps={"data_set": "dt"}, quiet=True),
+            ]
+            by_test["1"].append(Task(
+                f"1-wald[{key}]", test_joint_significance_interaction,
+                deps={"results_list": f"fit[{key}]", "joint": f"joint[{key}]"}))
+            by_test["2"].append(Task(
+                f"2-cd[{key}]", test_pesaran_cd, deps={"results_list": f"fit[{key}]"}))
+            by_test["4"].append(Task(
+                f"4-placebo[{key}]", test_placebo, kwargs=spec, deps={"dt": "dt"}))
+            by_test["6"].append(Task(
+                f"6-quantili[{key}]", test_alternative_quantiles, kwargs=spec,
+                deps={"dt": "dt", "results": f"fit[{key}]"}))
+            by_test["7"].append(Task(
+                f"7-lag[{key}]", test_lag_robustness,
+                kwargs=dict(endog_data=endog, corr_col=corr, l_exog_data=ctrl, hor=H),
+                deps={"dt": "dt"}))
+            by_test["8"].append(Task(
+                f"8-sottocampioni[{key}]", test_subsample_robustness, kwargs=spec,
+                deps={"dt": "dt"}))
+            by_test["9b"].append(Task(
+                f"9b-finestre[{key}]", test_window_stability, kwargs=spec,
+                deps={"dt": "dt"}))
+            by_test["r2"].append(Task(
+                f"r2[{key}]", summary_r2_comparison, kwargs=spec,
+                deps={"dt": "dt", "res_inter": f"fit[{key}]",
+                      "res_base": f"baseline[{endog}]"}))
+
+    if stationarity_vars:
+        by_test["3"].append(Task(
+            "3-stazionarieta", test_panel_stationarity,
+            kwargs={"variables": list(stationarity_vars)}, deps={"dt": "dt"}))
+    by_test["10"].append(Task("10-esogeneita", test_shock_exogeneity, deps={"dt": "dt"}))
+    return fits + [t for group in by_test.values() for t in group]
+
 
 # ============================================================
 # MAIN: ESEGUI TUTTA LA BATTERIA
@@ -744,11 +1092,13 @@ def summary_r2_comparison(dt, endog_data, corr_col, l_exog_data,
 
 if __name__ == "__main__":
 
+    # cache su disco delle stime LP: un rerun con gli stessi dati e quasi istantaneo
+    enable_cache()
+    prof = profile_from_env()
+
     # --- Caricamento dati ---
-    dt = pd.read_csv("data/data_pubinv_final_with_WGI.csv")
-    dt["year"] = dt["year_int"].astype(str).str.strip()
-    dt["year_int"] = dt["year"].astype(int)
-    dt = dt[(dt["year_int"] >= 2000) & (dt["year_int"] <= 2023)].copy()
+    # store colonnare (Parquet accanto al CSV, rigenerato se il CSV cambia)
+    dt = load_panel("data/data_pubinv_final_with_WGI.csv", years=(2000, 2023))
 
     # --- Configurazione ---
     ENDOG = "log_RGDP"
@@ -767,43 +1117,39 @@ if __name__ == "__main__":
     print("*" * 70)
     print()
 
-    # Stima principale
-    main_results = estimate_lp_interaction(
-        dt, ENDOG, "forecasterror", CORR_COL, CTRL, LAGS, HOR,
-        corr_lag=1, cumul_mult=True, center_corr=True,
-    )
-
-    # 1. Significativita congiunta
-    test_joint_significance_interaction(main_results)
-
-    # 2. Pesaran CD
-    test_pesaran_cd(main_results)
-
-    # 3. Stazionarieta
+    # Batteria come DAG: stime condivise una volta, test indipendenti in
+    # parallelo (task_dag); piu dipendenti/moderatori: allungare le liste
+    ENDOGS = [ENDOG]
+    CORR_COLS = [CORR_COL]
     stationarity_vars = ["log_RGDP", "growth_RGDP", "PDEBT", "UNRATE",
-                         "INVGDP", "forecasterror", "NOMLRATE", "REER", "GE_EST"]
-    test_panel_stationarity(dt, stationarity_vars)
-
-    # 4. Placebo
-    test_placebo(dt, ENDOG, CORR_COL, CTRL, LAGS, HOR)
-
-    # 5. Indicatori alternativi
-    test_alternative_wgi(dt, ENDOG, CTRL, LAGS, HOR)
-
-    # 6. Quantili diversi
-    test_alternative_quantiles(dt, ENDOG, CORR_COL, CTRL, LAGS, HOR)
-
-    # 7. Lag diversi
-    test_lag_robustness(dt, ENDOG, CORR_COL, CTRL, HOR)
-
-    # 8-9. Sottocampioni
-    test_subsample_robustness(dt, ENDOG, CORR_COL, CTRL, LAGS, HOR)
+                         "INVGDP", "forecasterror", "NOMLRATE", "REER"] + CORR_COLS
+    tasks = diagnostic_battery(ENDOGS, CORR_COLS, CTRL, LAGS, HOR, stationarity_vars)
+    results, timing = run_dag(tasks, shared={"dt": dt},
+                              n_jobs=int(os.environ.get("DIAG_JOBS", os.cpu_count() or 1)))
+
+    # risultati strutturati: un file per esecuzione (DIAG_OUT per il percorso)
+    out_path = write_battery(
+        results, os.environ.get("DIAG_OUT") or default_path(),
+        run_meta={"endog": ENDOGS, "moderators": CORR_COLS, "controls": CTRL,
+                  "lags": LAGS, "hor": HOR,
+                  "years": [int(dt["year_int"].min()), int(dt["year_int"].max())],
+                  "countries": int(dt["ccode"].nunique()), "nobs": int(len(dt))},
+    )
+    print(f"Risultati salvati in {out_path}")
+    print()
 
-    # 10. Esogeneita shock
-    test_shock_exogeneity(dt)
+    print("=" * 70)
+    print("  TEMPI PER COMPITO")
+    print("=" * 70)
+    print(timing_report(timing))
+    print()
 
-    # Confronto R2
-    summary_r2_comparison(dt, ENDOG, CORR_COL, CTRL, LAGS, HOR)
+    if prof is not None:
+        print("=" * 70)
+        print("  PROFILO PER FASE")
+        print("=" * 70)
+        print(report_from_env(prof))
+        print()
 
     print("=" * 70)
     print("  BATTERIA COMPLETATA")
@@ -0,0 +1,239 @@
+"""
+figures.py
+==========
+Grafici IRF / moltiplicatore senza display, in parallelo e incrementali.
+
+Ogni grafico e una FigureSpec: i dati gia calcolati (h, stima, banda) piu
+titolo, etichette e stile. Il disegno usa matplotlib.figure.Figure con il
+canvas Agg (niente pyplot, quindi nessun backend interattivo ne stato
+globale) ed e lo stesso di plot_mult / plot_cum dei notebook.
+
+Ogni file prodotto porta un hash di dati + specifica (+ versione di
+matplotlib e di questo modulo): nel PNG come campo di testo, per gli altri
+formati in un file accanto (<nome>.hash). render_figures ridisegna solo i
+grafici il cui hash e cambiato e li distribuisce su un pool di processi;
+con una sola spec cambiata si ridisegna un solo file.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import matplotlib
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+
+FIGURES_VERSION = 1
+HASH_KEY = "lp-figure-hash"
+
+# stile dei grafici in graphs/ (come plot_mult / plot_cum dei notebook)
+DEFAULT_STYLE = {
+    "figsize": (6.4, 4.8),
+    "dpi": 100,
+    "band_alpha": 0.4,
+    "linewidth": 2,
+    "marker_size": 20,
+    "zero_color": "red",
+    "grid": True,
+}
+
+
+@dataclass
+class FigureSpec:
+    """
+    Un grafico a banda: linea mid con punti, banda [lo, hi], zero
+    tratteggiato. path: percorso del file relativo alla radice di
+    render_figures (es. "BASELINE/gdp.png").
+    """
+    path: str
+    h: np.ndarray
+    mid: np.ndarray
+    lo: np.ndarray
+    hi: np.ndarray
+    ttl: str = ""
+    ylab: str = ""
+    xlab: str = "Years after the shock"
+    style: dict = field(default_factory=dict)
+
+
+def band_figure(path, h, mid, lo, hi, ttl="", ylab="", xlab="Years after the shock",
+                **style):
+    return FigureSpec(
+        path=path,
+        h=np.asarray(h, dtype=float), mid=np.asarray(mid, dtype=float),
+        lo=np.asarray(lo, dtype=float), hi=np.asarray(hi, dtype=float),
+        ttl=ttl, ylab=ylab, xlab=xlab, style=dict(style),
+    )
+
+
+# ============================================================
+# DISEGNO
+# ============================================================
+
+def _style(spec):
+    return {**DEFAULT_STYLE, **spec.style}
+
+
+def draw_band(ax, spec):
+    st = _style(spec)
+    ax.fill_between(spec.h, spec.lo, spec.hi, alpha=st["band_alpha"])
+    ax.plot(spec.h, spec.mid, linewidth=st["linewidth"])
+    ax.scatter(spec.h, spec.mid, s=st["marker_size"])
+    ax.axhline(0, linestyle="--", linewidth=1, color=st["zero_color"])
+    ax.set_title(spec.ttl)
+    ax.set_xlabel(spec.xlab)
+    ax.set_ylabel(spec.ylab)
+    if st["grid"]:
+        ax.grid(True, which="both", linestyle="-", linewidth=0.8, alpha=0.9)
+
+
+def show_figure(spec):
+    """
+    Disegno interattivo (notebook / finestra) con pyplot.
+    """
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=_style(spec)["figsize"])
+    draw_band(ax, spec)
+    plt.show()
+    return fig
+
+
+# ============================================================
+# HASH
+# ============================================================
+
+def figure_hash(spec):
+    """
+    sha256 di dati, testi e stile (non del percorso): cambia solo se cambia
+    il contenuto del grafico.
+    """
+    h = hashlib.sha256()
+    head = {
+        "version": FIGURES_VERSION,
+        "matplotlib": matplotlib.__version__,
+        "ttl": spec.ttl, "ylab": spec.ylab, "xlab": spec.xlab,
+        "style": _style(spec),
+    }
+    h.update(json.dumps(head, sort_keys=True, default=str).encode())
+    for arr in (spec.h, spec.mid, spec.lo, spec.hi):
+        a = np.ascontiguousarray(arr, dtype=np.float64)
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+
+def _sidecar(path):
+    return path + ".hash"
+
+
+def stored_hash(path):
+    """
+    Hash con cui e stato prodotto il file (None se manca o non e marcato).
+    """
+    if not os.path.exists(path):
+        return None
+    if path.lower().endswith(".png"):
+        from PIL import Image
+
+        with Image.open(path) as im:
+            return im.info.get(HASH_KEY)
+    try:
+        with open(_sidecar(path)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+# ============================================================
+# RENDER
+# ============================================================
+
+def _render(spec, full_path, digest):
+    """
+    Disegna e salva un grafico (scrittura atomica). Ritorna i secondi.
+    """
+    t0 = time.perf_counter()
+    st = _style(spec)
+    fig = Figure(figsize=st["figsize"], dpi=st["dpi"])
+    draw_band(fig.subplots(), spec)
+
+    os.makedirs(os.path.dirname(full_path) or ".", exist_ok=True)
+    root, ext = os.path.splitext(full_path)
+    tmp = root + ".tmp" + ext
+    png = ext.lower() == ".png"
+    fig.savefig(tmp, dpi=st["dpi"], bbox_inches="tight",
+                metadata={HASH_KEY: digest} if png else None)
+    os.replace(tmp, full_path)
+    if not png:
+        with open(_sidecar(full_path), "w") as f:
+            f.write(digest)
+    return time.perf_counter() - t0
+
+
+def _render_task(args):
+    return _render(*args)
+
+
+def _pool_context():
+    """
+    fork dove disponibile: il pool funziona anche da script senza guardia
+    __main__ (es. ORIGINAL_MODEL). Altrimenti None (render sequenziale).
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+def render_figures(specs, root="graphs", n_jobs=None, force=False):
+    """
+    Salva le FigureSpec sotto root, ridisegnando solo quelle il cui hash
+    differisce da quello del file esistente (force=True: tutte).
+
+    n_jobs: processi per i grafici da ridisegnare (None = tutti i core,
+    1 = sequenziale). Ritorna un DataFrame con path, hash, status
+    (rendered / unchanged) e seconds.
+    """
+    paths = [s.path for s in specs]
+    if len(set(paths)) != len(paths):
+        raise ValueError("percorsi dei grafici duplicati")
+
+    rows, todo = [], []
+    for spec in specs:
+        full = os.path.join(root, spec.path)
+        digest = figure_hash(spec)
+        stale = force or stored_hash(full) != digest
+        rows.append({"path": spec.path, "hash": digest,
+                     "status": "rendered" if stale else "unchanged", "seconds": 0.0})
+        if stale:
+            todo.append((len(rows) - 1, (spec, full, digest)))
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    ctx = _pool_context()
+    if n_jobs == 1 or len(todo) <= 1 or ctx is None:
+        secs = [_render(*args) for _, args in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(todo)), mp_context=ctx) as pool:
+            secs = list(pool.map(_render_task, [args for _, args in todo]))
+
+    for (i, _), s in zip(todo, secs):
+        rows[i]["seconds"] = s
+    return pd.DataFrame(rows)
+
+
+def render_report(tbl, wall=None):
+    """
+    Riga di riepilogo di render_figures.
+    """
+    n_new = int((tbl["status"] == "rendered").sum())
+    text = f"Grafici: {n_new} ridisegnati, {len(tbl) - n_new} invariati"
+    if wall is not None:
+        text += f" ({wall:.2f} s)"
+    return text
@@ -0,0 +1,335 @@
+"""
+lp_bench.py
+===========
+Benchmark della pipeline LP su panel sintetici (synth_panel), con curve di
+tempo e memoria al crescere di paesi (N), anni (T), orizzonti e controlli.
+
+Casi (le funzioni usate dagli script):
+  lp_lin_panel_py, mult_from_ratio    (lp_panel, per ORIGINAL_MODEL)
+  estimate_lp_interaction, test_pesaran_cd, test_panel_stationarity
+                                      (diagnostic_tests)
+
+Ogni caso ha una preparazione non cronometrata (panel, stime a monte) e
+una parte misurata: tempo minimo e mediano su piu ripetizioni, poi (se
+richiesto) una esecuzione con tracemalloc per il picco di memoria. Le
+curve variano una dimensione alla volta attorno a BASE (il panel reale).
+
+Baseline: save_baseline salva tempi e memoria (con macchina e versioni)
+in JSON, compare_baseline segnala i casi piu lenti / piu pesanti oltre
+una tolleranza. La baseline del preset quick e in benchmarks/baseline.json
+(accanto a questo file): su un'altra macchina va rigenerata prima di
+confrontare.
+
+Da riga di comando:
+  python lp_bench.py                       preset "quick", confronto con la baseline
+  LP_BENCH=full python lp_bench.py         curve fino a N=2000, T=200
+  LP_BENCH_SAVE=1 python lp_bench.py       salva la baseline
+  LP_BENCH_CASES=lp_lin_panel_py,...       solo alcuni casi
+  LP_BENCH_MEM=0                           senza misura della memoria
+  LP_BENCH_OUT=percorso.csv                salva la tabella dei risultati
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import panel_stats
+from lp_engine import get_default_cache, set_default_cache
+from lp_grid import sample_r_share
+from lp_panel import lp_lin_panel_py, mult_from_ratio
+from synth_panel import synthetic_panel
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(HERE, "benchmarks", "baseline.json")
+
+# punto centrale delle curve: dimensioni del panel reale
+BASE = {"N": 27, "T": 24, "hor": 3, "controls": 5}
+
+PRESETS = {
+    "quick": {"N": (27, 100, 300), "T": (24, 50, 100), "hor": (3, 6),
+              "controls": (2, 5, 8)},
+    "full": {"N": (27, 100, 300, 1000, 2000), "T": (24, 50, 100, 200),
+             "hor": (3, 6, 10), "controls": (2, 5, 8)},
+}
+
+# controlli in ordine di inclusione (i primi k)
+CONTROLS = ["growth_RGDP", "PDEBT", "NOMLRATE", "REER", "UNRATE", "INVGDP",
+            "OUTPUTGAP", "PRIMARYBAL"]
+STATIONARITY_VARS = ["log_RGDP", "growth_RGDP", "PDEBT", "UNRATE", "INVGDP",
+                     "forecasterror", "NOMLRATE", "REER", "GE_EST"]
+SHOCK = "forecasterror"
+MODERATOR = "GE_EST"
+LAGS = 2
+
+
+# ============================================================
+# FUNZIONI DEGLI SCRIPT
+# ============================================================
+
+def _diag():
+    """
+    diagnostic_tests importato al primo uso (all'import spegne i warning).
+    """
+    import diagnostic_tests
+
+    return diagnostic_tests
+
+
+# ============================================================
+# CASI: preparazione -> funzione misurata
+# ============================================================
+
+def _case_lp_lin(data, hor, ctrl):
+    return lambda: lp_lin_panel_py(data, "log_RGDP", SHOCK, ctrl, LAGS, hor)
+
+
+def _case_interaction(data, hor, ctrl):
+    est = _diag().estimate_lp_interaction
+    return lambda: est(data, "log_RGDP", SHOCK, MODERATOR, ctrl, LAGS, hor)
+
+
+def _case_mult(data, hor, ctrl):
+    gdp = lp_lin_panel_py(data, "log_RGDP", SHOCK, ctrl, LAGS, hor, jackknife=True)
+    ratio = lp_lin_panel_py(data, "PUBINVRATIO", SHOCK, ctrl, LAGS, hor, jackknife=True)
+    r_share = sample_r_share(data)
+    return lambda: mult_from_ratio(gdp, ratio, r_share)
+
+
+def _case_cd(data, hor, ctrl):
+    diag = _diag()
+    res = diag.estimate_lp_interaction(data, "log_RGDP", SHOCK, MODERATOR, ctrl, LAGS, hor)
+    return lambda: diag.test_pesaran_cd(res)
+
+
+def _case_stationarity(data, hor, ctrl):
+    diag = _diag()
+
+    def run():
+        # a freddo, come in uno script: compresa la simulazione della
+        # distribuzione CIPS (in cache per processo)
+        panel_stats._CIPS_NULL.clear()
+        return diag.test_panel_stationarity(data, STATIONARITY_VARS)
+    return run
+
+
+CASES = {
+    "lp_lin_panel_py": _case_lp_lin,
+    "estimate_lp_interaction": _case_interaction,
+    "mult_from_ratio": _case_mult,
+    "test_pesaran_cd": _case_cd,
+    "test_panel_stationarity": _case_stationarity,
+}
+
+
+# ============================================================
+# MISURA
+# ============================================================
+
+def measure(fn, repeats=3, memory=True, budget=2.0):
+    """
+    Tempo minimo e mediano di fn() (output soppresso) e picco di memoria.
+    Le ripetizioni si fermano oltre budget secondi complessivi.
+    """
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for _ in range(max(int(repeats), 1)):
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+            if sum(times) > budget:
+                break
+        peak = np.nan
+        if memory:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn()
+            peak = (tracemalloc.get_traced_memory()[1] - base) / 2**20
+            if started:
+                tracemalloc.stop()
+    return {"seconds": min(times), "median_s": float(np.median(times)),
+            "repeats": len(times), "peak_mb": peak}
+
+
+def bench_points(preset="quick"):
+    """
+    Punti delle curve: una dimensione alla volta attorno a BASE.
+    """
+    grid = PRESETS[preset] if isinstance(preset, str) else preset
+    points = {}
+    for curve, values in grid.items():
+        for v in values:
+            p = {**BASE, curve: int(v)}
+            key = (p["N"], p["T"], p["hor"], p["controls"])
+            if key in points:
+                # il punto centrale compare in piu curve: una sola misura
+                points[key]["curve"] += "," + curve
+            else:
+                points[key] = {**p, "curve": curve}
+    return list(points.values())
+
+
+def run_benchmarks(preset="quick", cases=None, repeats=3, memory=True, seed=0,
+                   missing=0.02, cd=0.5, echo=True):
+    """
+    Esegue i casi su tutti i punti del preset. Panel sintetici con seed
+    fisso (uno per (N, T), riusato tra i casi). La cache delle stime e
+    spenta durante le misure.
+
+    Ritorna un DataFrame con case, curve, N, T, hor, controls, nobs,
+    seconds (minimo), median_s, repeats, peak_mb.
+    """
+    cases = list(CASES) if cases is None else list(cases)
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        raise ValueError(f"casi sconosciuti: {unknown} (disponibili: {list(CASES)})")
+
+    old_cache = get_default_cache()
+    set_default_cache(None)
+    panels, rows = {}, []
+    try:
+        for p in bench_points(preset):
+            key = (p["N"], p["T"])
+            if key not in panels:
+                panels.clear()
+                panels[key] = synthetic_panel(p["N"], p["T"], missing=missing, cd=cd,
+                                              seed=seed)
+            data = panels[key]
+            ctrl = CONTROLS[:p["controls"]]
+            for case in cases:
+                with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    fn = CASES[case](data, p["hor"], ctrl)
+                m = measure(fn, repeats=repeats, memory=memory)
+                rows.append({"case": case, **p, "nobs": len(data), **m})
+                if echo:
+                    print(f"  {case:<24s} N={p['N']:<5d} T={p['T']:<4d} H={p['hor']:<3d} "
+                          f"k={p['controls']:<2d} {m['seconds'] * 1000:>10.1f} ms  "
+                          f"{m['peak_mb']:>8.1f} MB", flush=True)
+    finally:
+        set_default_cache(old_cache)
+    return pd.DataFrame(rows)
+
+
+# ============================================================
+# BASELINE
+# ============================================================
+
+KEY = ["case", "N", "T", "hor", "controls"]
+
+
+def machine_info():
+    import scipy
+
+    return {
+        "python": platform.python_version(), "numpy": np.__version__,
+        "pandas": pd.__version__, "scipy": scipy.__version__,
+        "platform": platform.platform(), "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def save_baseline(tbl, path=BASELINE_PATH):
+    """
+    Salva la tabella di run_benchmarks come baseline (JSON).
+    """
+    doc = {"written": time.strftime("%Y-%m-%dT%H:%M:%S"), "machine": machine_info(),
+           "results": json.loads(tbl.to_json(orient="records"))}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=1)
+    os.replace(tmp, path)
+    return path
+
+
+def load_baseline(path=BASELINE_PATH):
+    """
+    (DataFrame dei risultati, info macchina) di una baseline.
+    """
+    with open(path, encoding="utf-8") as f:
+        doc = json.load(f)
+    return pd.DataFrame(doc["results"]), doc.get("machine", {})
+
+
+def compare_baseline(tbl, base, tol=1.5, min_seconds=0.01, mem_tol=1.3, min_mb=1.0):
+    """
+    Confronto con la baseline sui punti comuni: ratio = nuovo / baseline
+    per tempo e memoria. regression=True se il tempo supera tol volte la
+    baseline (e di almeno min_seconds) o la memoria mem_tol volte (e di
+    almeno min_mb).
+    """
+    cols = KEY + ["seconds", "peak_mb"]
+    out = tbl[cols].merge(base[cols], on=KEY, suffixes=("", "_base"))
+    out["ratio"] = out["seconds"] / out["seconds_base"]
+    out["mem_ratio"] = out["peak_mb"] / out["peak_mb_base"]
+    slow = (out["ratio"] > tol) & (out["seconds"] - out["seconds_base"] > min_seconds)
+    heavy = (out["mem_ratio"] > mem_tol) & (out["peak_mb"] - out["peak_mb_base"] > min_mb)
+    out["regression"] = slow | heavy
+    return out
+
+
+def scaling_table(tbl):
+    """
+    Curve in forma larga: secondi per caso (colonne) lungo ciascuna
+    dimensione (righe curve, valore).
+    """
+    rows = []
+    for r in tbl.itertuples(index=False):
+        for curve in r.curve.split(","):
+            rows.append({"curve": curve, "value": getattr(r, curve), "case": r.case,
+                         "seconds": r.seconds})
+    return (pd.DataFrame(rows)
+            .pivot_table(index=["curve", "value"], columns="case", values="seconds")
+            .sort_index())
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+if __name__ == "__main__":
+    preset = os.environ.get("LP_BENCH", "quick")
+    cases = os.environ.get("LP_BENCH_CASES")
+    cases = cases.split(",") if cases else None
+    memory = os.environ.get("LP_BENCH_MEM", "1") != "0"
+    path = os.environ.get("LP_BENCH_BASELINE", BASELINE_PATH)
+
+    print(f"Benchmark LP: preset {preset}, base {BASE}")
+    tbl = run_benchmarks(preset, cases, memory=memory)
+    print()
+    print(scaling_table(tbl).to_string(float_format=lambda v: f"{v:.4f}"))
+    print()
+
+    out = os.environ.get("LP_BENCH_OUT")
+    if out:
+        tbl.to_csv(out, index=False)
+        print(f"Risultati salvati in {out}")
+
+    if os.environ.get("LP_BENCH_SAVE") == "1":
+        print(f"Baseline salvata in {save_baseline(tbl, path)}")
+    elif os.path.exists(path):
+        base, machine = load_baseline(path)
+        cmp = compare_baseline(tbl, base)
+        if machine and machine != machine_info():
+            print("Nota: baseline registrata su un'altra macchina / altre versioni")
+        bad = cmp[cmp["regression"]]
+        print(f"Confronto con {path}: {len(cmp)} punti, {len(bad)} regressioni")
+        if len(bad):
+            print(bad.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+            sys.exit(1)
+    else:
+        print(f"Nessuna baseline in {path} (LP_BENCH_SAVE=1 per crearla)")
@@ -0,0 +1,320 @@
+"""
+lp_bootstrap.py
+===============
+Bootstrap per le Local Projections panel (IRF, interazione, moltiplicatori).
+
+Due schemi, entrambi con la stessa estrazione per tutte le equazioni e tutti
+gli orizzonti (cosi le IRF cumulate e il moltiplicatore GDP/ratio restano
+coerenti draw per draw):
+
+  - "block": block bootstrap cross-sezionale per anno. Si estraggono blocchi
+    di anni consecutivi (moving blocks) e per ogni anno estratto entrano
+    TUTTI i paesi: si preserva la dipendenza cross-sezionale (shock comuni)
+    e, dentro il blocco, quella seriale. Ogni replica ristima il modello.
+  - "wild": wild cluster bootstrap (cluster = anno di default, o paese).
+    Con X fissa il coefficiente bootstrap e b + A (e * w), A = (X'X)^{-1}X',
+    quindi intere batch di repliche sono un solo prodotto di matrici.
+
+Le repliche sono divise in batch con seed deterministico (SeedSequence.spawn):
+il risultato non dipende dal numero di worker. Le batch girano su un
+ProcessPoolExecutor.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from lp_engine import (
+    PanelDesign, interaction_regressors, lp_dependent, lp_regressors,
+    twoway_ols,
+)
+from lp_profile import profiled
+
+
+# ============================================================
+# PREPARAZIONE DELLE EQUAZIONI
+# ============================================================
+
+def _prepare_equations(design, endog_list, regressors, hor, targets, cumul_mult=True):
+    """
+    Campione, stima puntuale e oggetti riusabili per ogni (endog, h).
+    """
+    x_cols = [name for name, _ in regressors]
+    t_pos = [x_cols.index(t) for t in targets]
+    X_cube = np.stack([arr for _, arr in regressors], axis=-1)
+    n_grid = design.shape[1]
+
+    eqs, keys = [], []
+    for endog in endog_list:
+        for h in range(0, hor + 1):
+            y_h = lp_dependent(design, endog, h, cumul_mult)
+            y, X, e_idx, t_idx = design.sample(y_h, X_cube)
+            ols = twoway_ols(y[:, None], X, e_idx, t_idx)
+
+            eqs.append({
+                "y": y, "X": X, "e_idx": e_idx, "t_idx": t_idx,
+                "b": ols["B"][t_pos, 0],
+                "fitted": y - ols["E"][:, 0],
+                # per il wild: A = [(X'X)^{-1} X']_target e residui
+                "A": ols["xpx_inv"][t_pos] @ ols["xd"].T,
+                "eps": ols["E"][:, 0],
+                # righe per anno della griglia (per il block bootstrap)
+                "rows_by_year": [np.flatnonzero(t_idx == t) for t in range(n_grid)],
+            })
+            keys.extend((endog, h, name) for name in targets)
+
+    index = pd.MultiIndex.from_tuples(keys, names=["endog", "h", "regressor"])
+    return eqs, t_pos, index
+
+
+# ============================================================
+# WORKER
+# ============================================================
+
+_STATE = {}
+
+
+def _init_worker(state):
+    _STATE.clear()
+    _STATE.update(state)
+
+
+def _wild_weights(rng, size, kind):
+    """
+    Pesi wild generati a batch: Rademacher (+-1) o Webb (6 punti).
+    """
+    if kind == "rademacher":
+        return rng.choice(np.array([-1.0, 1.0]), size=size)
+    if kind == "webb":
+        vals = np.sqrt(np.array([0.5, 1.0, 1.5]))
+        return rng.choice(np.concatenate([-vals, vals]), size=size)
+    raise ValueError(f"pesi wild sconosciuti: {kind!r} (rademacher, webb)")
+
+
+def _block_years(rng, n_grid, block_length):
+    """
+    Sequenza di anni (indici griglia) da moving blocks di lunghezza block_length.
+    """
+    n_blocks = int(np.ceil(n_grid / block_length))
+    starts = rng.integers(0, n_grid - block_length + 1, size=n_blocks)
+    seq = (starts[:, None] + np.arange(block_length)[None, :]).ravel()
+    return seq[:n_grid]
+
+
+def _run_batch(args):
+    """
+    Una batch di repliche -> array (n_rep x n_coef).
+    """
+    seed, n_rep = args
+    rng = np.random.default_rng(seed)
+    eqs, t_pos = _STATE["eqs"], _STATE["t_pos"]
+    method = _STATE["method"]
+
+    if method == "wild":
+        cluster = _STATE["cluster"]
+        n_clusters = _STATE["n_clusters"]
+        W = _wild_weights(rng, (n_clusters, n_rep), _STATE["weights"])
+        out = []
+        for eq in eqs:
+            c_idx = eq["t_idx"] if cluster == "time" else eq["e_idx"]
+            draws = eq["b"][:, None] + eq["A"] @ (eq["eps"][:, None] * W[c_idx])
+            out.append(draws)
+        return np.vstack(out).T
+
+    # block bootstrap per anno: stessi anni estratti per tutte le equazioni
+    n_grid, block_length = _STATE["n_grid"], _STATE["block_length"]
+    out = np.empty((n_rep, len(eqs) * len(t_pos)))
+    for r in range(n_rep):
+        seq = _block_years(rng, n_grid, block_length)
+        col = 0
+        for eq in eqs:
+            parts = [eq["rows_by_year"][t] for t in seq]
+            rows = np.concatenate(parts)
+            # anni ripetuti = periodi distinti (effetto temporale proprio)
+            new_t = np.repeat(np.arange(len(seq)), [len(p) for p in parts])
+            try:
+                ols = twoway_ols(eq["y"][rows, None], eq["X"][rows],
+                                 eq["e_idx"][rows], new_t)
+                out[r, col:col + len(t_pos)] = ols["B"][t_pos, 0]
+            except np.linalg.LinAlgError:
+                out[r, col:col + len(t_pos)] = np.nan
+            col += len(t_pos)
+    return out
+
+
+# ============================================================
+# API
+# ============================================================
+
+@dataclass
+class BootstrapResult:
+    """
+    Stime puntuali e draw bootstrap per (endog, h, regressore).
+    """
+    point: pd.Series
+    draws: pd.DataFrame
+    method: str
+    n_boot: int
+    seed: int
+
+
+@profiled()
+def bootstrap_lp(design, endog_list, regressors, hor, targets=None, method="block",
+                 n_boot=10000, block_length=3, weights="rademacher", cluster="time",
+                 cumul_mult=True, seed=12345, n_jobs=None, batch_size=250):
+    """
+    Bootstrap congiunto (tutte le equazioni e gli orizzonti) dei coefficienti
+    in targets (default: il primo regressore, lo shock).
+
+    method: "block" (block bootstrap per anno) o "wild" (wild cluster,
+    cluster="time" o "entity", weights="rademacher" o "webb").
+    n_jobs: processi del pool (None = tutti i core, 1 = nessun pool).
+    """
+    if method not in ("block", "wild"):
+        raise ValueError(f"metodo sconosciuto: {method!r} (block, wild)")
+    if cluster not in ("time", "entity"):
+        raise ValueError(f"cluster sconosciuto: {cluster!r} (time, entity)")
+    x_cols = [name for name, _ in regressors]
+    if targets is None:
+        targets = [x_cols[0]]
+    endog_list = list(dict.fromkeys(endog_list))
+
+    eqs, t_pos, index = _prepare_equations(design, endog_list, regressors, hor,
+                                           targets, cumul_mult)
+    point = pd.Series(np.concatenate([eq["b"] for eq in eqs]), index=index, name="coef")
+
+    state = {
+        "eqs": eqs, "t_pos": t_pos, "method": method,
+        "n_grid": design.shape[1], "block_length": int(block_length),
+        "weights": weights, "cluster": cluster,
+        "n_clusters": design.shape[1] if cluster == "time" else design.shape[0],
+    }
+
+    # batch con seed deterministici, indipendenti dal numero di worker
+    sizes = [batch_size] * (n_boot // batch_size)
+    if n_boot % batch_size:
+        sizes.append(n_boot % batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = list(zip(seeds, sizes))
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs == 1 or len(tasks) == 1:
+        _init_worker(state)
+        chunks = [_run_batch(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(state,)) as pool:
+            chunks = list(pool.map(_run_batch, tasks))
+
+    draws = pd.DataFrame(np.vstack(chunks), columns=index)
+    return BootstrapResult(point=point, draws=draws, method=method,
+                           n_boot=n_boot, seed=seed)
+
+
+def _select(boot, endog, target=None):
+    idx = boot.point.index
+    if target is None:
+        target = idx.get_level_values(2)[0]
+    sel = (idx.get_level_values(0) == endog) & (idx.get_level_values(2) == target)
+    return boot.point.to_numpy()[sel], boot.draws.to_numpy()[:, sel]
+
+
+def _pct(draws, level):
+    a = (1.0 - level) / 2.0
+    return np.nanquantile(draws, a, axis=0), np.nanquantile(draws, 1.0 - a, axis=0)
+
+
+def bootstrap_irf_bands(boot, endog, target=None, level=0.68, scale=1.0,
+                        cumulative=False):
+    """
+    Bande percentili (livello level, 0.68 ~ +/-1 SE) per l'IRF di un
+    regressore, per orizzonte o cumulata.
+    Formato compatibile con lp_lin_panel_py / cum_irf.
+    """
+    b, D = _select(boot, endog, target)
+    if cumulative:
+        b, D = np.cumsum(b), np.cumsum(D, axis=1)
+    lo, hi = _pct(D * scale, level)
+    if cumulative:
+        return pd.DataFrame({"h": np.arange(len(b)), "cum": b * scale, "lo": lo, "hi": hi})
+    return {"irf_panel_mean": b * scale, "irf_panel_low": lo, "irf_panel_up": hi}
+
+
+def bootstrap_mult(boot, r_share, gdp="log_RGDP", ratio="PUBINVRATIO", level=0.68,
+                   target=None):
+    """
+    Moltiplicatore cumulato come mult_from_ratio, con bande percentili
+    calcolate draw per draw invece del delta method.
+    """
+    bx, Dx = _select(boot, gdp, target)
+    br, Dr = _select(boot, ratio, target)
+
+    def mult(x, r):
+        X = 100.0 * np.cumsum(x, axis=-1)
+        R = np.cumsum(r, axis=-1)
+        return X / np.maximum(R + r_share * X, 1e-12)
+
+    point = mult(bx, br)
+    lo, hi = _pct(mult(Dx, Dr), level)
+    return pd.DataFrame({
+        "h": np.arange(len(bx)),
+        "multiplier": point,
+        "lo_pct": lo,
+        "hi_pct": hi,
+    })
+
+
+# ============================================================
+# WRAPPER SULLE FUNZIONI DEL REPO
+# ============================================================
+
+def bootstrap_lp_lin_panel(data_set, endog_data, shock, l_exog_data, lags_exog_data,
+                           hor, entity_col="ccode", time_col="year_int",
+                           cumul_mult=True, level=0.68, **boot_kwargs):
+    """
+    Bande bootstrap per lp_lin_panel_py (stesso dict in uscita).
+    """
+    design = PanelDesign(data_set, [endog_data, shock] + list(l_exog_data),
+                         entity_col, time_col)
+    regressors = lp_regressors(design, shock, l_exog_data, lags_exog_data)
+    boot = bootstrap_lp(design, [endog_data], regressors, hor, targets=[shock],
+                        cumul_mult=cumul_mult, **boot_kwargs)
+    return bootstrap_irf_bands(boot, endog_data, level=level)
+
+
+def bootstrap_lp_interaction(data_set, endog_data, shock, corr_col, l_exog_data,
+                             lags_exog_data, hor, entity_col="ccode",
+                             time_col="year_int", corr_lag=1, cumul_mult=True,
+                             center_corr=True, **boot_kwargs):
+    """
+    Bootstrap congiunto di beta_h e theta_h di estimate_lp_interaction.
+    """
+    design = PanelDesign(data_set, [endog_data, shock, corr_col] + list(l_exog_data),
+                         entity_col, time_col)
+    regressors, inter_name = interaction_regressors(
+        design, shock, corr_col, l_exog_data, lags_exog_data,
+        corr_lag=corr_lag, center_corr=center_corr,
+    )
+    return bootstrap_lp(design, [endog_data], regressors, hor,
+                        targets=[shock, inter_name], cumul_mult=cumul_mult,
+                        **boot_kwargs)
+
+
+def bootstrap_mult_from_ratio(data_set, shock, l_exog_data, lags_exog_data, hor,
+                              r_share, gdp="log_RGDP", ratio="PUBINVRATIO",
+                              entity_col="ccode", time_col="year_int",
+                              level=0.68, **boot_kwargs):
+    """
+    Tabella del moltiplicatore (mult_from_ratio) con bande percentili da un
+    bootstrap congiunto delle equazioni GDP e ratio.
+    """
+    design = PanelDesign(data_set, [gdp, ratio, shock] + list(l_exog_data),
+                         entity_col, time_col)
+    regressors = lp_regressors(design, shock, l_exog_data, lags_exog_data)
+    boot = bootstrap_lp(design, [gdp, ratio], regressors, hor, targets=[shock],
+                        **boot_kwargs)
+    return bootstrap_mult(boot, r_share, gdp, ratio, level=level)
@@ -0,0 +1,348 @@
+"""
+lp_cache.py
+===========
+Cache persistente su disco per le stime LP, indirizzata per contenuto.
+
+La chiave e un hash (blake2b) dei dati effettivamente usati dalla stima
+(serie della dipendente, maschera del panel, etichette paese/anno, array dei
+regressori) piu la specifica (nomi dei regressori, orizzonte, cumul_mult,
+bandwidth DK). Filtri di campione, controlli e lag entrano quindi nella
+chiave attraverso i dati stessi: lo stesso campione costruito da notebook o
+script diversi riusa la stessa voce.
+
+Ogni voce e un file .npz (senza pickle). Le stime per orizzonte
+(fit_lp_horizons, fit_lp_horizons_multi) salvano coefficienti, SE, t,
+p-value, covarianza, residui e indice (paese, anno) per ogni orizzonte. Gli
+altri risultati salvano i propri array (get_arrays / put_arrays), con una
+chiave in un namespace proprio (NAMESPACES, versione per namespace):
+  - joint: fit_lp_joint (coefficienti e covarianza DK congiunta);
+  - window: lp_window.window_fits (stime per finestra);
+  - jackknife: lp_jackknife.jackknife_lp (stime senza ciascun paese);
+  - cips_null: panel_stats.cips_null (distribuzione simulata della CIPS).
+La dimensione totale e limitata: oltre max_bytes si eliminano le voci usate
+meno di recente (LRU sulla mtime, aggiornata a ogni lettura).
+
+Uso:
+    from lp_cache import enable_cache
+    enable_cache()            # .lp_cache/ o $LP_CACHE_DIR, 512 MB
+"""
+
+import hashlib
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from lp_engine import LPFitResult, lp_dependent, set_default_cache
+
+
+CACHE_VERSION = 1
+
+# namespace delle voci in array e loro versione: si incrementa quando cambia
+# il formato o il calcolo del risultato, senza invalidare gli altri
+NAMESPACES = {
+    "joint": 1,
+    "window": 1,
+    "jackknife": 1,
+    "cips_null": 1,
+}
+
+
+# ============================================================
+# CHIAVI
+# ============================================================
+
+def _label_array(values):
+    """
+    Etichette (paese, nomi) in un array salvabile senza pickle: array object
+    con valori numerici tornano al loro dtype, gli altri diventano stringhe.
+    """
+    arr = np.asarray(values)
+    if arr.dtype == object:
+        arr = np.asarray(pd.Index(arr).infer_objects())
+        if arr.dtype == object:
+            arr = arr.astype(str)
+    return arr
+
+
+def _update(hsh, arr):
+    arr = np.ascontiguousarray(arr)
+    hsh.update(str(arr.dtype).encode())
+    hsh.update(str(arr.shape).encode())
+    hsh.update(arr.tobytes())
+
+
+def lp_fit_key(design, endog_data, regressors, hor, cumul_mult=True,
+               dk_bandwidth=None):
+    """
+    Chiave della stima fit_lp_horizons(design, endog_data, regressors, hor).
+
+    Si hashano la dipendente a tutti gli orizzonti (lead compresi), la
+    maschera del panel e gli array dei regressori: due design diversi che
+    producono gli stessi dati danno la stessa chiave.
+    """
+    hsh = hashlib.blake2b(digest_size=20)
+    hsh.update(repr((CACHE_VERSION, "lp", endog_data, int(hor), bool(cumul_mult),
+                     dk_bandwidth, [name for name, _ in regressors])).encode())
+    _update(hsh, _label_array(design.entity_labels))
+    _update(hsh, design.time_labels)
+    _update(hsh, design.present)
+    for h in range(0, hor + 1):
+        _update(hsh, lp_dependent(design, endog_data, h, cumul_mult))
+    for _, arr in regressors:
+        _update(hsh, arr)
+    return hsh.hexdigest()
+
+
+def array_key(namespace, spec, arrays=()):
+    """
+    Chiave di un risultato in array: namespace (con la sua versione),
+    specifica (repr) e array di input. Il namespace fa da prefisso del nome
+    del file.
+    """
+    hsh = hashlib.blake2b(digest_size=20)
+    hsh.update(repr((CACHE_VERSION, namespace, NAMESPACES[namespace], spec)).encode())
+    for arr in arrays:
+        _update(hsh, arr)
+    return f"{namespace}-{hsh.hexdigest()}"
+
+
+def lp_data_key(namespace, design, endog_list, regressors, hor, cumul_mult=True, spec=()):
+    """
+    Chiave di una stima su un PanelDesign con piu dipendenti: come
+    lp_fit_key (dipendenti a tutti gli orizzonti, maschera, etichette,
+    regressori) piu la specifica propria della stima (spec).
+    """
+    arrays = [_label_array(design.entity_labels), design.time_labels, design.present]
+    arrays += [lp_dependent(design, endog, h, cumul_mult)
+               for endog in endog_list for h in range(0, hor + 1)]
+    arrays += [arr for _, arr in regressors]
+    return array_key(namespace, (list(endog_list), int(hor), bool(cumul_mult),
+                                 [name for name, _ in regressors], spec), arrays)
+
+
+# ============================================================
+# SERIALIZZAZIONE
+# ============================================================
+
+def _pack_fits(fits):
+    """
+    Lista di LPFitResult -> pochi array piatti per np.savez.
+
+    Tutti gli orizzonti hanno gli stessi regressori (k): coefficienti, SE,
+    t, p-value, covarianza e R2 within stanno in una matrice (H, 4k + k^2 + 1);
+    residui e codici (paese, anno) sono concatenati, con nobs come offset.
+    """
+    names = list(fits[0].params.index)
+    floats = np.stack([
+        np.concatenate([
+            res.params.to_numpy(), res.std_errors.to_numpy(), res.tstats.to_numpy(),
+            res.pvalues.to_numpy(), res.cov.to_numpy().ravel(), [res.rsquared_within],
+        ])
+        for res in fits
+    ])
+    ints = np.array([[res.nobs, res.df_resid, res.entity_count, res.time_count]
+                     for res in fits], dtype=np.int64)
+    out = {
+        "names": np.asarray(names, dtype=str),
+        "floats": floats,
+        "ints": ints,
+        "resids": np.concatenate([res.resids.to_numpy() for res in fits]),
+    }
+
+    idx = [res.resids.index for res in fits]
+    if all(isinstance(ix, pd.MultiIndex) for ix in idx):
+        e_codes, e_levels = pd.factorize(
+            np.concatenate([ix.get_level_values(0).to_numpy() for ix in idx]), sort=True)
+        t_codes, t_levels = pd.factorize(
+            np.concatenate([ix.get_level_values(1).to_numpy() for ix in idx]), sort=True)
+        out["idx_names"] = np.asarray(idx[0].names, dtype=str)
+        out["idx_levels_e"] = _label_array(e_levels)
+        out["idx_levels_t"] = np.asarray(t_levels)
+        out["idx_codes"] = np.stack([e_codes, t_codes]).astype(np.int32)
+    return out
+
+
+def _unpack_fits(z):
+    names = list(z["names"])
+    k = len(names)
+    floats, ints, resids = z["floats"], z["ints"], z["resids"]
+    has_index = "idx_names" in z
+    if has_index:
+        idx_names = list(z["idx_names"])
+        levels_e = z["idx_levels_e"]
+        if levels_e.dtype.kind == "U":
+            levels_e = levels_e.astype(object)
+        levels = [levels_e, z["idx_levels_t"]]
+        codes = z["idx_codes"]
+
+    fits, start = [], 0
+    for row, (nobs, df_resid, n_entity, n_time) in zip(floats, ints):
+        stop = start + int(nobs)
+        index = None
+        if has_index:
+            index = pd.MultiIndex(levels=levels, codes=codes[:, start:stop],
+                                  names=idx_names, verify_integrity=False)
+        fits.append(LPFitResult(
+            params=pd.Series(row[:k], index=names, name="parameter"),
+            std_errors=pd.Series(row[k:2 * k], index=names, name="std_error"),
+            tstats=pd.Series(row[2 * k:3 * k], index=names, name="tstat"),
+            pvalues=pd.Series(row[3 * k:4 * k], index=names, name="pvalue"),
+            cov=pd.DataFrame(row[4 * k:4 * k + k * k].reshape(k, k),
+                             index=names, columns=names),
+            resids=pd.Series(resids[start:stop], index=index, name="residual"),
+            nobs=int(nobs),
+            df_resid=int(df_resid),
+            rsquared_within=float(row[-1]),
+            entity_count=int(n_entity),
+            time_count=int(n_time),
+        ))
+        start = stop
+    return fits
+
+
+# ============================================================
+# CACHE
+# ============================================================
+
+class LPCache:
+    """
+    Cache LRU su disco: una voce .npz per chiave, dimensione totale <= max_bytes.
+
+    Scritture atomiche (file temporaneo + os.replace), quindi piu processi
+    (es. i worker di lp_grid) possono condividere la stessa directory.
+    """
+
+    def __init__(self, root=".lp_cache", max_bytes=512 * 2**20):
+        self.root = os.path.abspath(root)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def __getstate__(self):
+        # ai worker passa solo la configurazione, non i contatori
+        return {"root": self.root, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state["root"], state["max_bytes"])
+
+    def _path(self, key):
+        return os.path.join(self.root, key + ".npz")
+
+    def key(self, design, endog_data, regressors, hor, cumul_mult=True,
+            dk_bandwidth=None):
+        return lp_fit_key(design, endog_data, regressors, hor, cumul_mult, dk_bandwidth)
+
+    def data_key(self, namespace, design, endog_list, regressors, hor, cumul_mult=True,
+                 spec=()):
+        return lp_data_key(namespace, design, endog_list, regressors, hor, cumul_mult, spec)
+
+    def array_key(self, namespace, spec, arrays=()):
+        return array_key(namespace, spec, arrays)
+
+    def _load(self, key, unpack):
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                out = unpack(z)
+            os.utime(path)   # LRU: voce appena usata
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # voce mancante, troncata o corrotta: si ristima e si riscrive
+            self.misses += 1
+            return None
+        self.hits += 1
+        return out
+
+    def _store(self, key, arrays):
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.root)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._evict()
+
+    def get(self, key):
+        """
+        Lista di LPFitResult o None se la voce non c'e (o e illeggibile).
+        """
+        return self._load(key, _unpack_fits)
+
+    def put(self, key, fits):
+        self._store(key, _pack_fits(fits))
+
+    def get_arrays(self, key):
+        """
+        Dict {nome: array} di una voce in array, None se manca.
+        """
+        return self._load(key, lambda z: {name: z[name] for name in z.files})
+
+    def put_arrays(self, key, arrays):
+        """
+        Salva {nome: array}; array object (etichette) come in _label_array,
+        perche le voci si leggono senza pickle.
+        """
+        self._store(key, {name: _label_array(arr) for name, arr in arrays.items()})
+
+    def _entries(self):
+        out = []
+        with os.scandir(self.root) as it:
+            for e in it:
+                if e.name.endswith(".npz"):
+                    st = e.stat()
+                    out.append((st.st_mtime, st.st_size, e.path))
+        return out
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def enable_cache(root=None, max_mb=None):
+    """
+    Attiva la cache di default per le stime LP (fit_lp_horizons,
+    fit_lp_horizons_multi, fit_lp_joint, window_fits, jackknife_lp) e per
+    cips_null.
+
+    root: directory (default $LP_CACHE_DIR o .lp_cache); max_mb: limite in MB
+    (default $LP_CACHE_MAX_MB o 512). Con LP_CACHE=0 la cache resta spenta.
+    Ritorna la LPCache attiva (o None).
+    """
+    if os.environ.get("LP_CACHE", "1") == "0":
+        set_default_cache(None)
+        return None
+    if root is None:
+        root = os.environ.get("LP_CACHE_DIR", ".lp_cache")
+    if max_mb is None:
+        max_mb = float(os.environ.get("LP_CACHE_MAX_MB", 512))
+    cache = LPCache(root, max_bytes=max_mb * 2**20)
+    set_default_cache(cache)
+    return cache
+
+
+def disable_cache():
+    set_default_cache(None)
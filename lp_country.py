@@ -0,0 +1,328 @@
+"""
+lp_country.py
+=============
+LP con coefficienti eterogenei: una LP per paese, poi stimatori mean-group
+e pooled pesato per la precisione, per qualsiasi raggruppamento di paesi.
+
+Per il paese i e l'orizzonte h:
+
+    y_{i,t+h} - y_{i,t-1} = a_i + b_ih s_it + G_ih X_{i,t-k}
+                            + c_ih ybar_{t,h} + d_ih sbar_t + e
+
+Gli effetti anno del panel two-way non sono stimabili paese per paese:
+al loro posto le medie cross-sezionali (stile CCE, Pesaran 2006) della
+dipendente e dello shock (csa=True). SE di b_ih: Driscoll-Kraay con un
+solo paese, cioe Newey-West (Bartlett, bandwidth di default sugli anni del
+paese, correzione n/(n - k)).
+
+Tutti i sistemi (equazione x orizzonte x paese) hanno la stessa dimensione:
+si impilano su una griglia densa (righe fuori campione a zero) e si
+risolvono con una sola solve batch, senza pool di processi. I paesi con
+gradi di liberta <= 0 o X'X singolare restano NaN.
+
+Dalla tabella per paese (CountryLPResult) i gruppi si ricostruiscono
+senza ristimare:
+  - mean-group: media semplice delle b_ih, SE = sd / sqrt(N) (Pesaran-Smith);
+  - pooled: media pesata con 1/SE^2, SE = (sum 1/SE^2)^{-1/2};
+  - moltiplicatore per paese e per gruppo con la formula di
+    mult_from_ratio (SE cumulati, senza covarianze), NaN dove il
+    denominatore R + r X e negativo o quasi nullo (MIN_DENOM).
+Con pochi anni per paese conviene ridurre i lag dei controlli.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from lp_engine import PanelDesign, dk_default_bandwidth, lp_dependent, lp_regressors
+from lp_profile import profiled, stage
+
+
+# ============================================================
+# STIMA PER PAESE (SOLVE BATCH)
+# ============================================================
+
+def _cross_mean(a, present):
+    """
+    Media cross-sezionale per anno sui paesi presenti (T,), NaN se nessuno.
+    """
+    v = np.where(present & np.isfinite(a), a, np.nan)
+    cnt = np.isfinite(v).sum(axis=0)
+    tot = np.nansum(v, axis=0)
+    return np.divide(tot, cnt, out=np.full(tot.shape, np.nan), where=cnt > 0)
+
+
+def _newey_west_var(psi, n, bandwidth=None):
+    """
+    Varianza Newey-West di sum_t psi_t per serie (S, N, T) sulla griglia
+    anni (zeri fuori campione); bandwidth di default per serie sugli n anni.
+    """
+    if bandwidth is None:
+        bw = np.vectorize(dk_default_bandwidth, otypes=[float])(n)
+    else:
+        bw = np.full(n.shape, float(bandwidth))
+    n_lags = np.minimum(np.floor(bw), np.maximum(n - 1, 0))
+    out = (psi**2).sum(axis=-1)
+    for j in range(1, int(n_lags.max(initial=0)) + 1):
+        w = np.where(j <= n_lags, 1.0 - j / (bw + 1.0), 0.0)
+        out += 2.0 * w * (psi[..., j:] * psi[..., :-j]).sum(axis=-1)
+    return out
+
+
+@profiled()
+def fit_lp_countries(design, endog_list, regressors, hor, cumul_mult=True, csa=True,
+                     dk_bandwidth=None):
+    """
+    LP per paese per tutte le equazioni e h = 0..hor, coefficiente dello
+    shock (primo regressore). Tabella tidy: entity, endog, h, term
+    ("beta"), estimate, se, nobs, df_resid.
+    """
+    endog_list = list(dict.fromkeys(endog_list))
+    N, T = design.shape
+    X_cube = np.stack([arr for _, arr in regressors], axis=-1)
+    x_ok = design.present & np.isfinite(X_cube).all(axis=-1)
+    s_bar = _cross_mean(regressors[0][1], design.present)
+
+    keys, Zs, Ys, masks = [], [], [], []
+    with stage("regressors"):
+        for endog in endog_list:
+            for h in range(hor + 1):
+                y = np.where(design.present, lp_dependent(design, endog, h, cumul_mult), np.nan)
+                cols = [np.ones((N, T, 1)), X_cube]
+                if csa:
+                    common = np.column_stack([_cross_mean(y, design.present), s_bar])
+                    cols.append(np.broadcast_to(common, (N, T, 2)))
+                Z = np.concatenate(cols, axis=-1)
+                mask = x_ok & np.isfinite(y) & np.isfinite(Z).all(axis=-1)
+                keys.append((endog, h))
+                Zs.append(np.where(mask[..., None], Z, 0.0))
+                Ys.append(np.where(mask, y, 0.0))
+                masks.append(mask)
+    Z, Y, M = np.stack(Zs), np.stack(Ys), np.stack(masks)      # (S, N, T, m) ...
+    m = Z.shape[-1]
+
+    # una sola solve per tutti i sistemi (equazione, h, paese)
+    with stage("solve", rows=Z.shape[0] * N, cols=m):
+        XtX = np.einsum("sntk,sntl->snkl", Z, Z)
+        Xty = np.einsum("sntk,snt->snk", Z, Y)
+        n = M.sum(axis=-1)
+        ok = (n > m) & (np.linalg.matrix_rank(XtX, hermitian=True) == m)
+        inv = np.full(XtX.shape, np.nan)
+        inv[ok] = np.linalg.inv(XtX[ok])
+        b = np.einsum("snkl,snl->snk", inv, Xty)
+
+    # SE Newey-West dello shock (colonna 1 dopo la costante)
+    with stage("cov"):
+        E = np.where(M, Y - np.einsum("sntk,snk->snt", Z, np.nan_to_num(b)), 0.0)
+        psi = np.einsum("sntk,snk->snt", Z, np.nan_to_num(inv[..., 1, :])) * E
+        scale = np.divide(n, n - m, out=np.full(n.shape, np.nan), where=ok)
+        se = np.sqrt(scale * _newey_west_var(psi, n, dk_bandwidth))
+
+    rows = []
+    for s, (endog, h) in enumerate(keys):
+        for i in range(N):
+            rows.append({
+                "entity": design.entity_labels[i], "endog": endog, "h": h,
+                "term": "beta",
+                "estimate": b[s, i, 1] if ok[s, i] else np.nan,
+                "se": se[s, i] if ok[s, i] else np.nan,
+                "nobs": int(n[s, i]),
+                "df_resid": int(n[s, i] - m) if ok[s, i] else np.nan,
+            })
+    return pd.DataFrame(rows)
+
+
+# ============================================================
+# MOLTIPLICATORE E AGGREGAZIONE
+# ============================================================
+
+# denominatore minimo (R + r X, punti del rapporto) del moltiplicatore per
+# paese: sotto la soglia X / D esplode e il moltiplicatore resta NaN
+MIN_DENOM = 1e-2
+
+
+def _mult_delta(b_gdp, se_gdp, b_ratio, se_ratio, r_share, min_denom=MIN_DENOM):
+    """
+    Formula di mult_from_ratio su array (..., H+1): X = 100 cumsum(b_gdp),
+    R = cumsum(b_ratio), SE cumulati sommando gli SE (come cum_irf).
+    Invece della soglia 1e-12 di mult_from_ratio, NaN dove D <= min_denom
+    (con le stime per paese D e spesso negativo o quasi nullo).
+    Ritorna (M, se_M, D).
+    """
+    X = 100.0 * np.cumsum(b_gdp, axis=-1)
+    R = np.cumsum(b_ratio, axis=-1)
+    se_X = 100.0 * np.cumsum(se_gdp, axis=-1)
+    se_R = np.cumsum(se_ratio, axis=-1)
+    D = R + np.asarray(r_share)[..., None] * X
+    Dok = np.where(D > min_denom, D, np.nan)
+    se_M = np.sqrt((R / Dok**2) ** 2 * se_X**2 + (X / Dok**2) ** 2 * se_R**2)
+    return X / Dok, se_M, D
+
+
+def mean_group(est, se=None):
+    """
+    Media semplice per colonna (paese x h) e SE sd / sqrt(N) sui paesi
+    stimati. Ritorna (coef, se, n_paesi).
+    """
+    est = np.asarray(est, dtype=float)
+    ok = np.isfinite(est)
+    n = ok.sum(axis=0)
+    mu = np.nansum(est, axis=0) / np.maximum(n, 1)
+    dev = np.where(ok, est - mu, 0.0)
+    sd = np.sqrt((dev**2).sum(axis=0) / np.maximum(n - 1, 1))
+    return np.where(n > 0, mu, np.nan), np.where(n > 1, sd / np.sqrt(n), np.nan), n
+
+
+def pooled_precision(est, se):
+    """
+    Media pesata con 1/SE^2 per colonna (paese x h). Ritorna (coef, se,
+    n_paesi).
+    """
+    est, se = np.asarray(est, dtype=float), np.asarray(se, dtype=float)
+    ok = np.isfinite(est) & np.isfinite(se) & (se > 0)
+    w = np.where(ok, 1.0 / np.where(ok, se, 1.0) ** 2, 0.0)
+    W = w.sum(axis=0)
+    mu = np.divide((w * np.where(ok, est, 0.0)).sum(axis=0), W,
+                   out=np.full(W.shape, np.nan), where=W > 0)
+    return mu, np.divide(1.0, np.sqrt(W), out=np.full(W.shape, np.nan), where=W > 0), ok.sum(axis=0)
+
+
+ESTIMATORS = {"mg": mean_group, "pooled": pooled_precision}
+
+
+@dataclass
+class CountryLPResult:
+    """
+    Stime per paese (table: entity, endog, h, term, estimate, se, nobs,
+    df_resid), quota media del rapporto per paese (r_share) e nomi dei
+    paesi (names: entity -> nome, per i gruppi definiti con i nomi).
+    """
+    table: pd.DataFrame
+    r_share: pd.Series
+    names: pd.Series
+    gdp: str = "log_RGDP"
+    ratio: str = "PUBINVRATIO"
+
+    def entities(self, group=None):
+        """
+        Codici dei paesi di un gruppo (codici o nomi; None = tutti).
+        """
+        codes = self.r_share.index
+        if group is None:
+            return list(codes)
+        by_name = {str(v): k for k, v in self.names.items()}
+        out = [g if g in codes else by_name.get(str(g)) for g in group]
+        missing = [g for g, c in zip(group, out) if c is None]
+        if missing:
+            raise KeyError(f"paesi non presenti nelle stime: {missing}")
+        return out
+
+    def coef(self, endog, group=None, value="estimate"):
+        """
+        Matrice paese x h di estimate (o se) per una equazione.
+        """
+        t = self.table[(self.table["endog"] == endog) & (self.table["term"] == "beta")]
+        return t.pivot(index="entity", columns="h", values=value).reindex(self.entities(group))
+
+    def irf(self, endog, group=None, estimator="mg", confint=1.0):
+        """
+        IRF del gruppo (mean-group o pooled) nel formato di lp_lin_panel_py:
+        va direttamente in cum_irf e mult_from_ratio.
+        """
+        mu, se, _ = ESTIMATORS[estimator](self.coef(endog, group).to_numpy(),
+                                          self.coef(endog, group, "se").to_numpy())
+        return {
+            "irf_panel_mean": mu,
+            "irf_panel_low": mu - confint * se,
+            "irf_panel_up": mu + confint * se,
+        }
+
+    def multipliers(self, group=None, min_denom=MIN_DENOM):
+        """
+        Moltiplicatore cumulato per paese (h, multiplier, lo_1se, hi_1se
+        come mult_from_ratio) con la quota media del paese; den = R + r X,
+        moltiplicatore NaN dove den <= min_denom.
+        """
+        ents = self.entities(group)
+        M, se, D = _mult_delta(self.coef(self.gdp, ents).to_numpy(),
+                               self.coef(self.gdp, ents, "se").to_numpy(),
+                               self.coef(self.ratio, ents).to_numpy(),
+                               self.coef(self.ratio, ents, "se").to_numpy(),
+                               self.r_share.reindex(ents).to_numpy(), min_denom)
+        H1 = M.shape[1]
+        return pd.DataFrame({
+            "entity": np.repeat(ents, H1), "h": np.tile(np.arange(H1), len(ents)),
+            "multiplier": M.ravel(), "lo_1se": (M - se).ravel(), "hi_1se": (M + se).ravel(),
+            "den": D.ravel(),
+        })
+
+    def group_table(self, groups, estimators=("mg", "pooled"), min_denom=MIN_DENOM):
+        """
+        Tabella tidy per gruppo: group, estimator, endog, h, term (beta /
+        multiplier), estimate, se, n_countries (paesi con stima). groups:
+        {nome: lista di paesi (codici o nomi) o None = tutti}. Il
+        moltiplicatore del gruppo usa le IRF aggregate e la media delle
+        quote dei paesi (NaN se R + r X <= min_denom).
+        """
+        rows = []
+        endogs = list(dict.fromkeys(self.table["endog"]))
+        for gname, members in groups.items():
+            ents = self.entities(members)
+            for est in estimators:
+                agg = {}
+                for endog in endogs:
+                    mu, se, n = ESTIMATORS[est](self.coef(endog, ents).to_numpy(),
+                                                self.coef(endog, ents, "se").to_numpy())
+                    agg[endog] = (mu, se, n)
+                    rows += [{"group": gname, "estimator": est, "endog": endog, "h": h,
+                              "term": "beta", "estimate": mu[h], "se": se[h],
+                              "n_countries": int(n[h])} for h in range(len(mu))]
+                if self.gdp in agg and self.ratio in agg:
+                    r = float(np.nanmean(self.r_share.reindex(ents)))
+                    (mu_x, se_x, n_x), (mu_r, se_r, n_r) = agg[self.gdp], agg[self.ratio]
+                    M, se, _ = _mult_delta(mu_x, se_x, mu_r, se_r, r, min_denom)
+                    n = np.minimum(n_x, n_r)
+                    rows += [{"group": gname, "estimator": est, "endog": self.gdp, "h": h,
+                              "term": "multiplier", "estimate": M[h], "se": se[h],
+                              "n_countries": int(n[h])} for h in range(len(M))]
+        return pd.DataFrame(rows)
+
+
+def country_r_share(data_set, ratio="PUBINVRATIO", entity_col="ccode"):
+    """
+    Quota media del rapporto per paese (stessa regola di sample_r_share:
+    /100 se la media e > 1).
+    """
+    r = pd.to_numeric(data_set[ratio], errors="coerce").groupby(
+        data_set[entity_col].to_numpy()).mean()
+    return r.where(~(np.isfinite(r) & (r > 1)), r / 100.0)
+
+
+@profiled()
+def lp_country_panel(data_set, endog_list, shock, l_exog_data, lags_exog_data, hor,
+                     entity_col="ccode", time_col="year_int", name_col="Country",
+                     cumul_mult=True, csa=True, dk_bandwidth=None, gdp="log_RGDP",
+                     ratio="PUBINVRATIO", design=None):
+    """
+    LP per paese con i regressori di lp_lin_panel_py (shock + lags dei
+    controlli, costante e medie cross-sezionali al posto degli effetti).
+    Ritorna CountryLPResult (r_share per paese da ratio, se nel data_set).
+    """
+    if design is None:
+        design = PanelDesign(data_set, list(endog_list) + [shock] + list(l_exog_data),
+                             entity_col, time_col)
+    regressors = lp_regressors(design, shock, l_exog_data, lags_exog_data)
+    table = fit_lp_countries(design, endog_list, regressors, hor, cumul_mult=cumul_mult,
+                             csa=csa, dk_bandwidth=dk_bandwidth)
+
+    codes = pd.Index(design.entity_labels)
+    if ratio in data_set:
+        r_share = country_r_share(data_set, ratio, entity_col).reindex(codes)
+    else:
+        r_share = pd.Series(np.nan, index=codes)
+    if name_col in data_set:
+        names = data_set.groupby(entity_col)[name_col].first().reindex(codes)
+    else:
+        names = pd.Series(codes, index=codes)
+    return CountryLPResult(table=table, r_share=r_share, names=names, gdp=gdp, ratio=ratio)
@@ -0,0 +1,1114 @@
+"""
+lp_engine.py
+============
+Motore NumPy per le Local Projections panel con effetti fissi two-way ed
+errori standard Driscoll-Kraay.
+
+Sostituisce la coppia PanelOLS(...).fit(cov_type="driscoll-kraay") usata a
+ogni orizzonte in ORIGINAL_MODEL.py e diagnostic_tests.py: la trasformazione
+within (paese + anno) e la covarianza DK sono calcolate direttamente su array,
+senza ricostruire ogni volta MultiIndex e PanelData.
+
+Le formule replicano PanelOLS.fit con i suoi default (Bartlett, bandwidth
+floor(4 * (T/100)^(2/9)), debiased=True: correzione per effetti fissi e
+regressori, p-value da t(df_resid)), quindi i risultati coincidono.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from lp_profile import note, profiled, stage, tags
+
+
+# ============================================================
+# TRASFORMAZIONE WITHIN TWO-WAY
+# ============================================================
+
+def _group_sum(idx, values, n_groups):
+    """
+    Somma per gruppo delle colonne di values (n x k) -> (n_groups x k).
+    """
+    out = np.empty((n_groups, values.shape[1]))
+    for j in range(values.shape[1]):
+        out[:, j] = np.bincount(idx, weights=values[:, j], minlength=n_groups)
+    return out
+
+
+def twoway_demean(values, entity_idx, time_idx, n_entity=None, n_time=None):
+    """
+    Trasformazione within esatta per effetti paese + anno (anche panel sbilanciati).
+
+    Prima si toglie la media per paese, poi (Frisch-Waugh) si proietta fuori
+    la matrice dei dummy temporali gia demeanati per paese. Il sistema per gli
+    effetti temporali e solo T x T:
+      (D'M_e D) g = D'M_e v,   D'M_e D = diag(n_t) - C' diag(1/n_i) C
+    dove C e la matrice di incidenza paese x anno.
+    """
+    values = np.asarray(values, dtype=float)
+    squeeze = values.ndim == 1
+    if squeeze:
+        values = values[:, None]
+
+    if n_entity is None:
+        n_entity = int(entity_idx.max()) + 1
+    if n_time is None:
+        n_time = int(time_idx.max()) + 1
+
+    cnt_i = np.bincount(entity_idx, minlength=n_entity).astype(float)
+    cnt_t = np.bincount(time_idx, minlength=n_time).astype(float)
+    inv_i = np.divide(1.0, cnt_i, out=np.zeros_like(cnt_i), where=cnt_i > 0)
+
+    # demean per paese
+    r = values - (_group_sum(entity_idx, values, n_entity) * inv_i[:, None])[entity_idx]
+
+    # effetti temporali sul residuo
+    C = np.zeros((n_entity, n_time))
+    C[entity_idx, time_idx] = 1.0
+    A = np.diag(cnt_t) - C.T @ (C * inv_i[:, None])
+    b = _group_sum(time_idx, r, n_time)
+    g = np.linalg.lstsq(A, b, rcond=None)[0]
+
+    g_bar_i = (C @ g) * inv_i[:, None]
+    out = r - (g[time_idx] - g_bar_i[entity_idx])
+
+    return out[:, 0] if squeeze else out
+
+
+def entity_demean(values, entity_idx, n_entity=None):
+    """
+    Demean per paese (serve per l'R2 within come in PanelOLS).
+    """
+    values = np.asarray(values, dtype=float)
+    squeeze = values.ndim == 1
+    if squeeze:
+        values = values[:, None]
+    if n_entity is None:
+        n_entity = int(entity_idx.max()) + 1
+    cnt_i = np.bincount(entity_idx, minlength=n_entity).astype(float)
+    inv_i = np.divide(1.0, cnt_i, out=np.zeros_like(cnt_i), where=cnt_i > 0)
+    out = values - (_group_sum(entity_idx, values, n_entity) * inv_i[:, None])[entity_idx]
+    return out[:, 0] if squeeze else out
+
+
+# ============================================================
+# COVARIANZA DRISCOLL-KRAAY
+# ============================================================
+
+def dk_default_bandwidth(n_periods):
+    """
+    Bandwidth di default di linearmodels per il kernel di Bartlett.
+    """
+    return float(np.floor(4 * (n_periods / 100) ** (2 / 9)))
+
+
+def bartlett_weights(bandwidth, n_periods):
+    """
+    Pesi di Bartlett w_j = 1 - j/(bw+1), j = 0..bw (troncati a T-1).
+    """
+    n_lags = int(min(np.floor(bandwidth), n_periods - 1))
+    j = np.arange(n_lags + 1)
+    return 1.0 - j / (bandwidth + 1.0)
+
+
+def dk_meat(scores_t, bandwidth=None):
+    """
+    Parte centrale ("meat") della DK: somma kernel delle autocovarianze dei
+    momenti aggregati per anno. scores_t: (T x k), righe ordinate per anno.
+    """
+    n_periods = scores_t.shape[0]
+    bw = dk_default_bandwidth(n_periods) if bandwidth is None else bandwidth
+    w = bartlett_weights(bw, n_periods)
+
+    S = scores_t.T @ scores_t
+    for j in range(1, len(w)):
+        op = scores_t[j:].T @ scores_t[:-j]
+        S += w[j] * (op + op.T)
+    return S
+
+
+def time_scores(xd, eps, time_idx, n_time=None):
+    """
+    xi_t = sum_i x_it * e_it, solo per gli anni presenti nel campione.
+    """
+    if n_time is None:
+        n_time = int(time_idx.max()) + 1
+    xi = _group_sum(time_idx, xd * eps[:, None], n_time)
+    present = np.bincount(time_idx, minlength=n_time) > 0
+    return xi[present]
+
+
+def driscoll_kraay_cov(xd, eps, time_idx, extra_df=0, bandwidth=None, xpx_inv=None):
+    """
+    Covarianza DK come in linearmodels:
+      V = n/(n - extra_df) * (X'X)^{-1} S (X'X)^{-1}
+    (con debiased=True extra_df include anche il numero di regressori).
+    """
+    n = xd.shape[0]
+    if xpx_inv is None:
+        xpx_inv = np.linalg.inv(xd.T @ xd)
+    S = dk_meat(time_scores(xd, eps, time_idx), bandwidth)
+    scale = n / (n - extra_df)
+    out = scale * (xpx_inv @ S @ xpx_inv)
+    return (out + out.T) / 2
+
+
+# ============================================================
+# STIMA TWO-WAY FE + DK
+# ============================================================
+
+@dataclass
+class LPFitResult:
+    """
+    Risultato di una regressione two-way FE con SE Driscoll-Kraay.
+
+    Espone gli stessi attributi di PanelOLSResults usati nel repo
+    (params, std_errors, pvalues, resids, nobs, rsquared_within, cov).
+    """
+    params: pd.Series
+    std_errors: pd.Series
+    tstats: pd.Series
+    pvalues: pd.Series
+    cov: pd.DataFrame
+    resids: pd.Series
+    nobs: int
+    df_resid: int
+    rsquared_within: float
+    entity_count: int
+    time_count: int
+
+
+def factorize_panel(entity, time):
+    """
+    Codici interi 0..N-1 (paese) e 0..T-1 (anno) piu le etichette ordinate.
+    """
+    e_codes, e_labels = pd.factorize(np.asarray(entity), sort=True)
+    t_codes, t_labels = pd.factorize(np.asarray(time), sort=True)
+    return e_codes, t_codes, e_labels, t_labels
+
+
+def twoway_ols(Y, X, entity_idx, time_idx, debiased=True):
+    """
+    Nucleo comune delle stime two-way FE: demean, fattorizzazione di X'X
+    (Cholesky, una volta per tutte le colonne di Y), coefficienti e residui.
+
+    Ritorna un dict con xd, Yd, xpx_inv, B (k x m), E (n x m), codici
+    ricodificati e gradi di liberta (df_resid, cov_df come PanelOLS).
+    """
+    Y = np.asarray(Y, dtype=float)
+    X = np.asarray(X, dtype=float)
+    m, k = Y.shape[1], X.shape[1]
+
+    # ricodifica sugli effetti effettivamente presenti nel campione
+    entity_idx = pd.factorize(entity_idx, sort=True)[0]
+    time_idx = pd.factorize(time_idx, sort=True)[0]
+    n_entity = int(entity_idx.max()) + 1
+    n_time = int(time_idx.max()) + 1
+    n = Y.shape[0]
+
+    with stage("demean", rows=n, cols=m + k):
+        Z = twoway_demean(np.column_stack([Y, X]), entity_idx, time_idx, n_entity, n_time)
+    Yd, xd = Z[:, :m], Z[:, m:]
+
+    # una sola fattorizzazione di X'X per tutte le equazioni
+    with stage("solve", rows=n, cols=k):
+        chol = np.linalg.cholesky(xd.T @ xd)
+        chol_inv = np.linalg.inv(chol)
+        xpx_inv = chol_inv.T @ chol_inv
+        B = xpx_inv @ (xd.T @ Yd)
+        E = Yd - xd @ B
+
+    # gradi di liberta assorbiti dagli effetti: N + T - 1 (come PanelOLS)
+    extra_df = n_entity + n_time - 1
+    df_resid = n - k - extra_df
+    cov_df = extra_df + k if debiased else extra_df
+
+    return {
+        "xd": xd, "Yd": Yd, "xpx_inv": xpx_inv, "B": B, "E": E,
+        "entity_idx": entity_idx, "time_idx": time_idx,
+        "n_entity": n_entity, "n_time": n_time, "nobs": n,
+        "df_resid": df_resid, "cov_df": cov_df,
+    }
+
+
+def fit_twoway_dk(y, X, entity_idx, time_idx, x_names=None, bandwidth=None,
+                  index=None, debiased=True):
+    """
+    Stima y = a_i + g_t + X b + e (senza costante) con SE Driscoll-Kraay.
+
+    y, X: array gia senza NA; entity_idx, time_idx: codici interi.
+    index: MultiIndex (paese, anno) per i residui (opzionale).
+    """
+    y = np.asarray(y, dtype=float)
+    return fit_twoway_dk_multi(
+        y[:, None], X, entity_idx, time_idx, x_names=x_names,
+        bandwidth=bandwidth, index=index, debiased=debiased,
+    )[0]
+
+
+def fit_twoway_dk_multi(Y, X, entity_idx, time_idx, x_names=None, bandwidth=None,
+                        index=None, debiased=True):
+    """
+    Come fit_twoway_dk ma per piu dipendenti (colonne di Y, n x m) sullo
+    stesso campione: X viene demeanata e fattorizzata (Cholesky) una volta
+    sola e tutte le equazioni si risolvono come un unico sistema multi-RHS.
+    Ritorna una lista di LPFitResult, una per colonna di Y.
+    """
+    X = np.asarray(X, dtype=float)
+    if X.ndim == 1:
+        X = X[:, None]
+    if x_names is None:
+        x_names = [f"x{j}" for j in range(X.shape[1])]
+    Y = np.asarray(Y, dtype=float)
+    m, k = Y.shape[1], X.shape[1]
+
+    ols = twoway_ols(Y, X, entity_idx, time_idx, debiased)
+    entity_idx, time_idx = ols["entity_idx"], ols["time_idx"]
+    n_entity, n_time, n = ols["n_entity"], ols["n_time"], ols["nobs"]
+    xd, xpx_inv, B, E = ols["xd"], ols["xpx_inv"], ols["B"], ols["E"]
+    df_resid, cov_df = ols["df_resid"], ols["cov_df"]
+
+    # R2 within come in PanelOLS: solo demean per paese
+    with stage("r2_within", rows=n, cols=m + k):
+        W = entity_demean(np.column_stack([Y, X]), entity_idx, n_entity)
+        wY, wx = W[:, :m], W[:, m:]
+        wE = wY - wx @ B
+
+    out = []
+    for j in range(m):
+        b, eps = B[:, j], E[:, j]
+        with stage("cov", rows=n, cols=k):
+            cov = driscoll_kraay_cov(xd, eps, time_idx, cov_df, bandwidth, xpx_inv)
+        se = np.sqrt(np.diag(cov))
+        t = b / se
+        if debiased:
+            pv = 2 * (1 - stats.t.cdf(np.abs(t), df_resid))
+        else:
+            pv = 2 * (1 - stats.norm.cdf(np.abs(t)))
+
+        tss = float(wY[:, j] @ wY[:, j])
+        r2w = 1.0 - float(wE[:, j] @ wE[:, j]) / tss if tss > 0.0 else 0.0
+
+        with stage("results"):
+            out.append(LPFitResult(
+                params=pd.Series(b, index=x_names, name="parameter"),
+                std_errors=pd.Series(se, index=x_names, name="std_error"),
+                tstats=pd.Series(t, index=x_names, name="tstat"),
+                pvalues=pd.Series(pv, index=x_names, name="pvalue"),
+                cov=pd.DataFrame(cov, index=x_names, columns=x_names),
+                resids=pd.Series(eps, index=index, name="residual"),
+                nobs=n,
+                df_resid=df_resid,
+                rsquared_within=r2w,
+                entity_count=n_entity,
+                time_count=n_time,
+            ))
+
+    return out
+
+
+def fit_frame_twoway_dk(tmp, y_col, x_cols, entity_col="ccode",
+                        time_col="year_int", bandwidth=None):
+    """
+    Come fit_twoway_dk ma da un DataFrame gia ripulito dai NA
+    (colonne entity_col, time_col, y_col, x_cols).
+    """
+    e_codes, t_codes, _, _ = factorize_panel(tmp[entity_col], tmp[time_col])
+    index = pd.MultiIndex.from_arrays(
+        [tmp[entity_col].to_numpy(), tmp[time_col].to_numpy()],
+        names=[entity_col, time_col],
+    )
+    return fit_twoway_dk(
+        tmp[y_col].to_numpy(dtype=float),
+        tmp[x_cols].to_numpy(dtype=float),
+        e_codes, t_codes, x_names=list(x_cols),
+        bandwidth=bandwidth, index=index,
+    )
+
+
+def check_against_panelols(res, tmp, y_col, x_cols, entity_col="ccode",
+                           time_col="year_int", bandwidth=None, rtol=1e-6):
+    """
+    Modalita di verifica: ristima con PanelOLS e confronta coefficienti,
+    SE Driscoll-Kraay, nobs e R2 within. Solleva AssertionError se diversi.
+    """
+    from linearmodels.panel import PanelOLS
+
+    panel = tmp.set_index([entity_col, time_col])
+    mod = PanelOLS(panel[y_col], panel[x_cols], entity_effects=True, time_effects=True)
+    fit_kwargs = {"cov_type": "driscoll-kraay"}
+    if bandwidth is not None:
+        fit_kwargs["bandwidth"] = bandwidth
+    ref = mod.fit(**fit_kwargs)
+
+    np.testing.assert_allclose(res.params.to_numpy(), ref.params[x_cols].to_numpy(),
+                               rtol=rtol, atol=1e-10, err_msg="params")
+    np.testing.assert_allclose(res.std_errors.to_numpy(), ref.std_errors[x_cols].to_numpy(),
+                               rtol=rtol, atol=1e-10, err_msg="std_errors DK")
+    np.testing.assert_allclose(res.pvalues.to_numpy(), ref.pvalues[x_cols].to_numpy(),
+                               rtol=rtol, atol=1e-10, err_msg="pvalues")
+    np.testing.assert_allclose(res.rsquared_within, ref.rsquared_within,
+                               rtol=rtol, atol=1e-10, err_msg="rsquared_within")
+    assert res.nobs == ref.nobs, f"nobs: {res.nobs} != {ref.nobs}"
+    return ref
+
+
+def fit_lp_horizon(tmp, y_col, x_cols, entity_col="ccode", time_col="year_int",
+                   dk_bandwidth=None, engine="numpy"):
+    """
+    Stima di un singolo orizzonte LP.
+
+    engine:
+      - "numpy"    : motore interno (default, veloce)
+      - "panelols" : linearmodels.PanelOLS come nel codice originale
+      - "check"    : motore interno + verifica contro PanelOLS
+    """
+    if engine == "panelols":
+        from linearmodels.panel import PanelOLS
+
+        with stage("set_index", rows=len(tmp), cols=len(x_cols) + 1):
+            panel = tmp.set_index([entity_col, time_col])
+        with stage("panelols_init"):
+            mod = PanelOLS(panel[y_col], panel[x_cols], entity_effects=True, time_effects=True)
+        fit_kwargs = {"cov_type": "driscoll-kraay"}
+        if dk_bandwidth is not None:
+            fit_kwargs["bandwidth"] = dk_bandwidth
+        with stage("panelols_fit"):
+            return mod.fit(**fit_kwargs)
+
+    if engine not in ("numpy", "check"):
+        raise ValueError(f"engine sconosciuto: {engine!r} (numpy, panelols, check)")
+
+    res = fit_frame_twoway_dk(tmp, y_col, x_cols, entity_col, time_col, dk_bandwidth)
+    if engine == "check":
+        check_against_panelols(res, tmp, y_col, x_cols, entity_col, time_col, dk_bandwidth)
+    return res
+
+
+# ============================================================
+# DESIGN PANEL DENSO (paese x anno x variabile)
+# ============================================================
+
+class PanelDesign:
+    """
+    Panel ordinato UNA volta e salvato come array denso (N, T, V).
+
+    Lag e lead sono viste sull'asse temporale (O(1), nessuna copia), quindi
+    il loop sugli orizzonti non copia piu il DataFrame: per H orizzonti e K
+    controlli laggati memoria e tempo crescono come O(N*T*K).
+
+    L'asse temporale e quello degli anni osservati nel dataset (es. il 2007
+    manca per tutti i paesi): come groupby(...).shift del codice originale,
+    il lag del 2008 e il 2006. Coincide con l'originale finche i buchi sono
+    comuni a tutti i paesi.
+    """
+
+    @profiled("design")
+    def __init__(self, data, variables=None, entity_col="ccode",
+                 time_col="year_int", pad=8):
+        if variables is None:
+            variables = [
+                c for c in data.columns
+                if c not in (entity_col, time_col) and pd.api.types.is_numeric_dtype(data[c])
+            ]
+        variables = list(dict.fromkeys(variables))
+        note(rows=len(data), cols=len(variables))
+
+        e_codes, e_labels = pd.factorize(data[entity_col].to_numpy(), sort=True)
+        t_codes, time_labels = pd.factorize(data[time_col].to_numpy().astype(int), sort=True)
+
+        N, T, V = len(e_labels), len(time_labels), len(variables)
+        cube = np.full((N, T + 2 * pad, V), np.nan)
+        cube[e_codes, t_codes + pad, :] = data[variables].to_numpy(dtype=float)
+
+        present = np.zeros((N, T), dtype=bool)
+        present[e_codes, t_codes] = True
+
+        self.entity_col = entity_col
+        self.time_col = time_col
+        self.entity_labels = np.asarray(e_labels)
+        self.time_labels = np.asarray(time_labels)
+        self.variables = variables
+        self.present = present
+        self.pad = pad
+        self._cube = cube
+        self._pos = {v: j for j, v in enumerate(variables)}
+
+    @property
+    def shape(self):
+        return self.present.shape
+
+    def _shifted(self, name, k):
+        """
+        Valori di name al tempo t + k (k < 0: lag, k > 0: lead).
+        """
+        if name not in self._pos:
+            raise KeyError(f"variabile {name!r} non presente nel design")
+        j = self._pos[name]
+        T = self.present.shape[1]
+        if abs(k) <= self.pad:
+            start = self.pad + k
+            return self._cube[:, start:start + T, j]
+
+        # oltre il padding: copia (caso raro, es. lag molto lunghi)
+        base = self._cube[:, self.pad:self.pad + T, j]
+        out = np.full_like(base, np.nan)
+        if k > 0:
+            out[:, :T - k] = base[:, k:]
+        else:
+            out[:, -k:] = base[:, :T + k]
+        return out
+
+    def var(self, name):
+        return self._shifted(name, 0)
+
+    def lag(self, name, L):
+        return self._shifted(name, -L)
+
+    def lead(self, name, h):
+        return self._shifted(name, h)
+
+    def lagged_regressors(self, cols, max_lag):
+        """
+        Lista (nome, vista N x T) per L1..Lp di ciascun controllo,
+        nello stesso ordine delle colonne L{L}_{c} del codice originale.
+        """
+        with stage("lags", cols=len(cols) * max_lag):
+            return [
+                (f"L{L}_{c}", self.lag(c, L))
+                for c in cols
+                for L in range(1, max_lag + 1)
+            ]
+
+    def sample(self, y, X):
+        """
+        Righe (paese, anno) presenti con y e tutti i regressori non-NA.
+
+        y: (N, T); X: (N, T, K). Ritorna y, X appiattiti e codici paese/anno
+        in ordine (paese, anno) come il DataFrame ordinato originale.
+        """
+        mask = self.present & np.isfinite(y) & np.isfinite(X).all(axis=-1)
+        e_idx, t_idx = np.nonzero(mask)
+        return y[mask], X[mask], e_idx, t_idx
+
+    def index(self, e_idx, t_idx):
+        return pd.MultiIndex.from_arrays(
+            [self.entity_labels[e_idx], self.time_labels[t_idx]],
+            names=[self.entity_col, self.time_col],
+        )
+
+    def frame(self, y_col, y, x_cols, X, e_idx, t_idx):
+        """
+        DataFrame (entity, time, y, X) per i percorsi PanelOLS / check.
+        """
+        tmp = pd.DataFrame(X, columns=x_cols)
+        tmp.insert(0, y_col, y)
+        tmp.insert(0, self.time_col, self.time_labels[t_idx])
+        tmp.insert(0, self.entity_col, self.entity_labels[e_idx])
+        return tmp
+
+
+def lp_dependent(design, endog_data, h, cumul_mult=True):
+    """
+    y_{t+h} - y_{t-1} (cumul_mult=True, come lpirfs) oppure y_{t+h}.
+    """
+    if cumul_mult:
+        return design.lead(endog_data, h) - design.lag(endog_data, 1)
+    return design.lead(endog_data, h)
+
+
+# cache delle stime (lp_cache.LPCache): None = nessuna cache
+_DEFAULT_CACHE = None
+
+
+def set_default_cache(cache):
+    global _DEFAULT_CACHE
+    _DEFAULT_CACHE = cache
+
+
+def get_default_cache():
+    return _DEFAULT_CACHE
+
+
+@profiled()
+def fit_lp_horizons(design, endog_data, regressors, hor, cumul_mult=True,
+                    dk_bandwidth=None, engine="numpy", cache=None):
+    """
+    Stima LP per h = 0..hor su un PanelDesign.
+
+    regressors: lista (nome, array N x T). La matrice dei regressori e
+    costruita una sola volta; a ogni orizzonte cambia solo la dipendente.
+    Ritorna la lista dei risultati (LPFitResult o PanelOLSResults).
+    cache: LPCache (default: quella attivata con lp_cache.enable_cache);
+    usata solo con engine="numpy".
+    """
+    if cache is None:
+        cache = _DEFAULT_CACHE
+    key = None
+    if cache is not None and engine == "numpy":
+        with stage("cache_get"):
+            key = cache.key(design, endog_data, regressors, hor, cumul_mult, dk_bandwidth)
+            hit = cache.get(key)
+        if hit is not None:
+            return hit
+
+    x_cols = [name for name, _ in regressors]
+    with stage("regressors", cols=len(x_cols)):
+        X_cube = np.stack([arr for _, arr in regressors], axis=-1)
+
+    fits = []
+    for h in range(0, hor + 1):
+        with tags(h=h, endog=endog_data):
+            with stage("lead"):
+                y_h = lp_dependent(design, endog_data, h, cumul_mult)
+            with stage("sample", cols=len(x_cols)):
+                y, X, e_idx, t_idx = design.sample(y_h, X_cube)
+                note(rows=len(y))
+            y_col = f"YH_{h}" if cumul_mult else f"LEAD{h}_{endog_data}"
+
+            with stage("fit", rows=len(y), cols=len(x_cols)):
+                if engine == "numpy":
+                    res = fit_twoway_dk(y, X, e_idx, t_idx, x_names=x_cols,
+                                        bandwidth=dk_bandwidth,
+                                        index=design.index(e_idx, t_idx))
+                else:
+                    tmp = design.frame(y_col, y, x_cols, X, e_idx, t_idx)
+                    res = fit_lp_horizon(tmp, y_col, x_cols, design.entity_col,
+                                         design.time_col, dk_bandwidth=dk_bandwidth,
+                                         engine=engine)
+            fits.append(res)
+
+    if key is not None:
+        with stage("cache_put"):
+            cache.put(key, fits)
+    return fits
+
+
+@profiled()
+def fit_lp_horizons_multi(design, endog_list, regressors, hor, cumul_mult=True,
+                          dk_bandwidth=None, engine="numpy", cache=None):
+    """
+    Come fit_lp_horizons ma per piu variabili dipendenti con gli stessi
+    regressori.
+
+    A ogni orizzonte le dipendenti vengono raggruppate per maschera di
+    campione (righe con y non-NA): ogni gruppo condivide X demeanata e la sua
+    fattorizzazione, e si risolve come un unico problema multi-RHS. Se i
+    campioni differiscono tra outcome si ottengono piu gruppi, senza errori.
+    Ritorna un dict {endog: lista dei risultati per h}.
+
+    cache: come in fit_lp_horizons, con una voce per dipendente (le stesse
+    chiavi di fit_lp_horizons); si stimano solo le dipendenti mancanti.
+    """
+    endog_list = list(dict.fromkeys(endog_list))
+    if cache is None:
+        cache = _DEFAULT_CACHE
+    cached, keys = {}, {}
+    if cache is not None and engine == "numpy":
+        with stage("cache_get"):
+            for endog in endog_list:
+                keys[endog] = cache.key(design, endog, regressors, hor, cumul_mult,
+                                        dk_bandwidth)
+                hit = cache.get(keys[endog])
+                if hit is not None:
+                    cached[endog] = hit
+        if len(cached) == len(endog_list):
+            return cached
+    todo = [endog for endog in endog_list if endog not in cached]
+
+    x_cols = [name for name, _ in regressors]
+    with stage("regressors", cols=len(x_cols)):
+        X_cube = np.stack([arr for _, arr in regressors], axis=-1)
+        x_ok = design.present & np.isfinite(X_cube).all(axis=-1)
+
+    fits = {endog: [] for endog in todo}
+    for h in range(0, hor + 1):
+        with tags(h=h), stage("lead", cols=len(todo)):
+            Y_cube = np.stack(
+                [lp_dependent(design, endog, h, cumul_mult) for endog in todo], axis=-1
+            )
+            masks = x_ok[..., None] & np.isfinite(Y_cube)
+
+        groups = {}
+        for j in range(len(todo)):
+            groups.setdefault(masks[..., j].tobytes(), []).append(j)
+
+        for cols in groups.values():
+            with tags(h=h, endog=",".join(todo[j] for j in cols)):
+                with stage("sample", cols=len(x_cols) + len(cols)):
+                    mask = masks[..., cols[0]]
+                    e_idx, t_idx = np.nonzero(mask)
+                    X = X_cube[mask]
+                    Y = Y_cube[mask][:, cols]
+                    note(rows=len(e_idx))
+
+                with stage("fit", rows=len(e_idx), cols=len(x_cols)):
+                    if engine == "numpy":
+                        res = fit_twoway_dk_multi(Y, X, e_idx, t_idx, x_names=x_cols,
+                                                  bandwidth=dk_bandwidth,
+                                                  index=design.index(e_idx, t_idx))
+                    else:
+                        res = []
+                        for jj, j in enumerate(cols):
+                            y_col = f"YH_{h}" if cumul_mult else f"LEAD{h}_{todo[j]}"
+                            tmp = design.frame(y_col, Y[:, jj], x_cols, X, e_idx, t_idx)
+                            res.append(fit_lp_horizon(tmp, y_col, x_cols,
+                                                      design.entity_col, design.time_col,
+                                                      dk_bandwidth=dk_bandwidth,
+                                                      engine=engine))
+
+            for j, r in zip(cols, res):
+                fits[todo[j]].append(r)
+
+    if keys:
+        with stage("cache_put"):
+            for endog in todo:
+                cache.put(keys[endog], fits[endog])
+    fits.update(cached)
+    return {endog: fits[endog] for endog in endog_list}
+
+
+def lp_regressors(design, shock, l_exog_data, lags_exog_data):
+    """
+    Regressori LP standard: shock contemporaneo + lags 1..p dei controlli.
+    """
+    return [(shock, design.var(shock))] + design.lagged_regressors(
+        l_exog_data, lags_exog_data
+    )
+
+
+def interaction_regressors(design, shock, corr_col, l_exog_data, lags_exog_data,
+                           corr_lag=1, center_corr=True, shock_lead=0):
+    """
+    Regressori del modello con interazione (diagnostic_tests):
+      shock, shock x Corr_{t-corr_lag} (centrata), lags 1..p dei controlli.
+    shock_lead > 0 usa lo shock al tempo t + shock_lead (placebo), con nome
+    {shock}_lead{k}. Ritorna (regressors, inter_name).
+    """
+    # corruzione laggata (solo sulle righe presenti, come groupby.shift)
+    corr_l = np.where(design.present, design.lag(corr_col, corr_lag), np.nan)
+    if center_corr:
+        corr_l = corr_l - np.nanmean(corr_l)
+
+    shock_x = design.lead(shock, shock_lead)
+    if shock_lead:
+        shock = f"{shock}_lead{shock_lead}"
+    inter_name = f"{shock}_x_{corr_col}_L{corr_lag}"
+    regressors = [
+        (shock, shock_x),
+        (inter_name, shock_x * corr_l),
+    ] + design.lagged_regressors(l_exog_data, lags_exog_data)
+    return regressors, inter_name
+
+
+# ============================================================
+# COVARIANZA DK CONGIUNTA TRA ORIZZONTI ED EQUAZIONI
+# ============================================================
+
+@dataclass
+class LPJointResult:
+    """
+    Coefficienti di interesse impilati per (endog, h, regressore) e la loro
+    covarianza Driscoll-Kraay congiunta tra orizzonti ed equazioni.
+    """
+    coef: pd.Series
+    cov: pd.DataFrame
+    nobs: pd.Series
+    bandwidth: float
+
+    def block(self, endog, target=None):
+        """
+        Coefficienti (H+1) e covarianza (H+1 x H+1) di un regressore per
+        una equazione. target di default: il primo regressore (lo shock).
+        """
+        if target is None:
+            target = self.coef.index.get_level_values(2)[0]
+        sel = (self.coef.index.get_level_values(0) == endog) & (
+            self.coef.index.get_level_values(2) == target
+        )
+        return self.coef.to_numpy()[sel], self.cov.to_numpy()[np.ix_(sel, sel)]
+
+    def cross(self, endog_a, endog_b, target=None):
+        """
+        Blocco di covarianza tra le IRF di due equazioni (H+1 x H+1).
+        """
+        if target is None:
+            target = self.coef.index.get_level_values(2)[0]
+        lvl0 = self.coef.index.get_level_values(0)
+        lvl2 = self.coef.index.get_level_values(2)
+        sa = (lvl0 == endog_a) & (lvl2 == target)
+        sb = (lvl0 == endog_b) & (lvl2 == target)
+        return self.cov.to_numpy()[np.ix_(sa, sb)]
+
+    def select(self, endog, target=None, horizons=None):
+        """
+        Come block ma solo per gli orizzonti in horizons (None = tutti):
+        i test su sottoinsiemi sono selezioni sulla covarianza gia stimata.
+        """
+        b, V = self.block(endog, target)
+        if horizons is None:
+            return b, V
+        lvl0 = self.coef.index.get_level_values(0)
+        hs = np.unique(self.coef.index.get_level_values(1)[lvl0 == endog])
+        pos = [int(np.flatnonzero(hs == h)[0]) for h in horizons]
+        return b[pos], V[np.ix_(pos, pos)]
+
+    def wald(self, endog, target=None, horizons=None, R=None, q=None):
+        b, V = self.select(endog, target, horizons)
+        return wald_test(b, V, R, q)
+
+    def sup_t(self, endog, target=None, horizons=None, alpha=0.05, **kw):
+        b, V = self.select(endog, target, horizons)
+        return sup_t_test(b, V, alpha, **kw)
+
+    def sum_effect(self, endog, target=None, horizons=None, weights=None):
+        b, V = self.select(endog, target, horizons)
+        return sum_test(b, V, weights)
+
+
+@profiled()
+def fit_lp_joint(design, endog_list, regressors, hor, targets=None,
+                 cumul_mult=True, dk_bandwidth=None, debiased=True, common_sample=False,
+                 cache=None):
+    """
+    Stima LP per tutte le equazioni (endog_list) e tutti gli orizzonti e
+    calcola in un solo passaggio la covarianza DK congiunta dei coefficienti
+    in targets (default: il primo regressore, lo shock).
+
+    Per ogni equazione e l'influenza sul coefficiente e
+      psi_{e,t} = [(X_e'X_e)^{-1} sum_i x_{e,it} eps_{e,it}]_target
+    allineata sulla griglia anni del design; la covarianza congiunta e la
+    somma kernel (Bartlett) delle autocovarianze di psi_t. I blocchi
+    diagonali coincidono con la DK per orizzonte (stessa bandwidth e
+    correzione n/(n-df) applicata come sqrt(s_e * s_f) fuori diagonale).
+
+    Se dk_bandwidth e None si usa la bandwidth di default calcolata sul
+    numero massimo di anni tra le equazioni (in genere h=0).
+    common_sample=True: a ogni orizzonte tutte le equazioni sulle righe in
+    cui tutte le dipendenti sono osservate (un solo sistema multi-RHS).
+    cache: come in fit_lp_horizons (namespace "joint").
+    """
+    endog_list = list(dict.fromkeys(endog_list))
+    x_cols = [name for name, _ in regressors]
+    if targets is None:
+        targets = [x_cols[0]]
+    t_pos = [x_cols.index(t) for t in targets]
+
+    if cache is None:
+        cache = _DEFAULT_CACHE
+    key = None
+    if cache is not None:
+        with stage("cache_get"):
+            key = cache.data_key("joint", design, endog_list, regressors, hor, cumul_mult,
+                                 spec=(list(targets), dk_bandwidth, bool(debiased),
+                                       bool(common_sample)))
+            hit = cache.get_arrays(key)
+        if hit is not None:
+            return _joint_from_arrays(hit)
+
+    X_cube = np.stack([arr for _, arr in regressors], axis=-1)
+    x_ok = design.present & np.isfinite(X_cube).all(axis=-1)
+    n_grid = design.shape[1]
+
+    keys, coefs, psi_cols, scales, periods = [], [], [], [], []
+    nobs = {}
+
+    for h in range(0, hor + 1):
+        Y_cube = np.stack(
+            [lp_dependent(design, endog, h, cumul_mult) for endog in endog_list], axis=-1
+        )
+        masks = x_ok[..., None] & np.isfinite(Y_cube)
+        if common_sample:
+            masks = masks & masks.all(axis=-1, keepdims=True)
+
+        groups = {}
+        for j in range(len(endog_list)):
+            groups.setdefault(masks[..., j].tobytes(), []).append(j)
+
+        for cols in groups.values():
+            mask = masks[..., cols[0]]
+            e_idx, t_idx = np.nonzero(mask)
+            with tags(h=h):
+                ols = twoway_ols(Y_cube[mask][:, cols], X_cube[mask], e_idx, t_idx,
+                                 debiased)
+            xd, A = ols["xd"], ols["xpx_inv"][t_pos]
+            scale = ols["nobs"] / (ols["nobs"] - ols["cov_df"])
+            periods.append(ols["n_time"])
+
+            for jj, j in enumerate(cols):
+                eps = ols["E"][:, jj]
+                # momenti per anno sulla griglia completa del design
+                xi = _group_sum(t_idx, xd * eps[:, None], n_grid)
+                psi = xi @ A.T
+                for q, name in enumerate(targets):
+                    keys.append((endog_list[j], h, name))
+                    coefs.append(ols["B"][t_pos[q], jj])
+                    psi_cols.append(psi[:, q])
+                    scales.append(scale)
+                nobs[(endog_list[j], h)] = ols["nobs"]
+
+    # ordine (endog, h, target)
+    order = sorted(range(len(keys)), key=lambda i: (endog_list.index(keys[i][0]),
+                                                    keys[i][1], targets.index(keys[i][2])))
+    keys = [keys[i] for i in order]
+    Psi = np.column_stack([psi_cols[i] for i in order])
+    root_s = np.sqrt(np.array([scales[i] for i in order]))
+
+    bw = dk_default_bandwidth(max(periods)) if dk_bandwidth is None else dk_bandwidth
+    with stage("joint_cov", rows=Psi.shape[0], cols=Psi.shape[1]):
+        V = dk_meat(Psi, bw) * np.outer(root_s, root_s)
+    V = (V + V.T) / 2
+
+    index = pd.MultiIndex.from_tuples(keys, names=["endog", "h", "regressor"])
+    res = LPJointResult(
+        coef=pd.Series(np.array([coefs[i] for i in order]), index=index, name="coef"),
+        cov=pd.DataFrame(V, index=index, columns=index),
+        nobs=pd.Series(nobs, name="nobs").sort_index(),
+        bandwidth=bw,
+    )
+    if key is not None:
+        with stage("cache_put"):
+            cache.put_arrays(key, _joint_to_arrays(res))
+    return res
+
+
+def _joint_to_arrays(res):
+    idx, nidx = res.coef.index, res.nobs.index
+    return {
+        "endog": idx.get_level_values(0), "h": idx.get_level_values(1),
+        "regressor": idx.get_level_values(2),
+        "coef": res.coef.to_numpy(), "cov": res.cov.to_numpy(),
+        "nobs_endog": nidx.get_level_values(0),
+        "nobs_h": nidx.get_level_values(1), "nobs": res.nobs.to_numpy(),
+        "bandwidth": res.bandwidth,
+    }
+
+
+def _joint_from_arrays(z):
+    index = pd.MultiIndex.from_arrays(
+        [z["endog"].astype(object), z["h"], z["regressor"].astype(object)],
+        names=["endog", "h", "regressor"],
+    )
+    nidx = pd.MultiIndex.from_arrays([z["nobs_endog"].astype(object), z["nobs_h"]])
+    return LPJointResult(
+        coef=pd.Series(z["coef"], index=index, name="coef"),
+        cov=pd.DataFrame(z["cov"], index=index, columns=index),
+        nobs=pd.Series(z["nobs"], index=nidx, name="nobs"),
+        bandwidth=float(z["bandwidth"]),
+    )
+
+
+def lp_joint_panel(data_set, endog_list, shock, l_exog_data, lags_exog_data, hor,
+                   entity_col="ccode", time_col="year_int", cumul_mult=True,
+                   dk_bandwidth=None, design=None, common_sample=False):
+    """
+    fit_lp_joint con i regressori standard di lp_lin_panel_py.
+    """
+    if design is None:
+        design = PanelDesign(data_set, list(endog_list) + [shock] + list(l_exog_data),
+                             entity_col, time_col)
+    regressors = lp_regressors(design, shock, l_exog_data, lags_exog_data)
+    return fit_lp_joint(design, endog_list, regressors, hor, targets=[shock],
+                        cumul_mult=cumul_mult, dk_bandwidth=dk_bandwidth,
+                        common_sample=common_sample)
+
+
+# bande dei cumulati: "joint" dalla covarianza congiunta, "ratio" come
+# cum_irf / mult_from_ratio (SE sommati tra orizzonti, senza covarianze).
+# Nel Monte Carlo calibrato (lp_montecarlo, 500 repliche) le bande "joint"
+# del PIL cumulato a h=3 coprono 0.87 al 95% nominale contro 0.91 di
+# "ratio" (moltiplicatore 0.88 contro 0.93): gli script usano "ratio".
+BANDS = ("joint", "ratio")
+
+
+def _check_bands(bands):
+    if bands not in BANDS:
+        raise ValueError(f"bande sconosciute: {bands!r} (joint, ratio)")
+
+
+def _cum_var(C, V, bands):
+    """
+    Varianze dei cumulati C b: diag(C V C') o (C sqrt(diag V))^2.
+    """
+    if bands == "ratio":
+        return (C @ np.sqrt(np.diag(V)))**2
+    return np.einsum("ij,jk,ik->i", C, V, C)
+
+
+def cum_irf_joint(joint, endog, scale=1.0, confint=1.0, target=None, bands="joint"):
+    """
+    IRF cumulata con bande +/- confint*SE dalla covarianza congiunta:
+    Var(sum_{s<=h} b_s) = C V C' (C triangolare inferiore di uni),
+    invece di sommare le bande dei singoli orizzonti come cum_irf
+    (bands="ratio" le somma, come cum_irf). Stesso formato di cum_irf
+    (h, cum, lo, hi).
+    """
+    _check_bands(bands)
+    b, V = joint.block(endog, target)
+    C = np.tril(np.ones((len(b), len(b))))
+    cum = (C @ b) * scale
+    se = np.sqrt(_cum_var(C, V, bands)) * abs(scale)
+    return pd.DataFrame({
+        "h": np.arange(len(b)),
+        "cum": cum,
+        "lo": cum - confint * se,
+        "hi": cum + confint * se,
+    })
+
+
+def mult_delta_joint(bx, br, Vxx, Vrr, Vxr, r_share, bands="joint"):
+    """
+    Moltiplicatore cumulato M_h = X_h / (R_h + r * X_h) e SE delta method
+    per tutti gli orizzonti, da IRF e blocchi di covarianza congiunta
+    (X = 100 * PIL cumulato, R = rapporto cumulato, Cov(X_h, R_h) incluso).
+    bands="ratio": SE come mult_from_ratio (bande sommate tra orizzonti,
+    Cov(X_h, R_h) = 0).
+
+    r_share scalare o array (...): M e se hanno forma r_share.shape + (H+1,),
+    quindi molte quote (specificazioni, paesi esclusi, ...) in una chiamata.
+    """
+    _check_bands(bands)
+    C = np.tril(np.ones((len(bx), len(bx))))
+    X = 100.0 * (C @ bx)
+    R = C @ br
+    var_X = 1e4 * _cum_var(C, Vxx, bands)
+    var_R = _cum_var(C, Vrr, bands)
+    if bands == "ratio":
+        cov_XR = np.zeros_like(X)
+    else:
+        cov_XR = 100.0 * np.einsum("ij,jk,ik->i", C, Vxr, C)
+
+    r = np.asarray(r_share, dtype=float)[..., None]
+    Dsafe = np.maximum(R + r * X, 1e-12)
+    mult = X / Dsafe
+    dMdX = R / (Dsafe**2)
+    dMdR = -X / (Dsafe**2)
+    se_M = np.sqrt(np.maximum(
+        dMdX**2 * var_X + dMdR**2 * var_R + 2 * dMdX * dMdR * cov_XR, 0.0
+    ))
+    return mult, se_M
+
+
+def mult_from_joint(joint, r_share, gdp="log_RGDP", ratio="PUBINVRATIO",
+                    confint=1.0, target=None, bands="joint"):
+    """
+    Moltiplicatore cumulato M_h = X_h / (R_h + r * X_h) (come mult_from_ratio,
+    X = 100 * PIL cumulato, R = rapporto cumulato) con delta method sulla
+    covarianza congiunta: include Cov(X_h, R_h) tra le due equazioni
+    (bands="ratio": bande di mult_from_ratio). Stesso formato di
+    mult_from_ratio (h, multiplier, lo_1se, hi_1se).
+    """
+    bx, Vxx = joint.block(gdp, target)
+    br, Vrr = joint.block(ratio, target)
+    Vxr = joint.cross(gdp, ratio, target)
+    mult, se_M = mult_delta_joint(bx, br, Vxx, Vrr, Vxr, r_share, bands)
+
+    return pd.DataFrame({
+        "h": np.arange(len(bx)),
+        "multiplier": mult,
+        "lo_1se": mult - confint * se_M,
+        "hi_1se": mult + confint * se_M,
+    })
+
+
+@profiled()
+def mult_system_panel(data_set, shock, l_exog_data, lags_exog_data, hor, r_share,
+                      gdp="log_RGDP", ratio="PUBINVRATIO", entity_col="ccode",
+                      time_col="year_int", cumul_mult=True, dk_bandwidth=None,
+                      confint=1.0, common_sample=True, design=None, bands="joint"):
+    """
+    Stimatore dedicato del moltiplicatore: log_RGDP e PUBINVRATIO stimati
+    insieme (sistema multi-RHS sul campione comune a ogni orizzonte),
+    covarianza DK congiunta e moltiplicatore per tutti gli orizzonti in
+    forma vettoriale, senza merge delle IRF ne SE ricavati dalle bande.
+    bands="ratio": SE con la semantica di mult_from_ratio (vedi BANDS).
+
+    r_share scalare: tabella come mult_from_ratio (h, multiplier, se,
+    lo_1se, hi_1se). Array o Serie (una quota per specificazione): stesse
+    colonne piu spec (indice della Serie o posizione) e r_share, una riga
+    per (spec, h).
+    """
+    joint = lp_joint_panel(data_set, [gdp, ratio], shock, l_exog_data, lags_exog_data,
+                           hor, entity_col, time_col, cumul_mult, dk_bandwidth, design,
+                           common_sample=common_sample)
+    bx, Vxx = joint.block(gdp)
+    br, Vrr = joint.block(ratio)
+    mult, se_M = mult_delta_joint(bx, br, Vxx, Vrr, joint.cross(gdp, ratio), r_share,
+                                  bands)
+
+    H1 = len(bx)
+    out = pd.DataFrame({
+        "h": np.tile(np.arange(H1), mult.size // H1),
+        "multiplier": mult.ravel(),
+        "se": se_M.ravel(),
+        "lo_1se": (mult - confint * se_M).ravel(),
+        "hi_1se": (mult + confint * se_M).ravel(),
+    })
+    if np.ndim(r_share) == 0:
+        return out
+    r = np.asarray(r_share, dtype=float).ravel()
+    keys = r_share.index if isinstance(r_share, pd.Series) else np.arange(len(r))
+    out.insert(0, "r_share", np.repeat(r, H1))
+    out.insert(0, "spec", np.repeat(np.asarray(keys), H1))
+    return out
+
+
+# ============================================================
+# TEST CONGIUNTI TRA ORIZZONTI
+# ============================================================
+
+def wald_test(b, V, R=None, q=None):
+    """
+    Wald per H0: R b = q (default R = I, q = 0) con la covarianza completa V:
+      W = (Rb - q)' (R V R')^{-1} (Rb - q) ~ chi2(rank R).
+    """
+    b = np.asarray(b, dtype=float)
+    R = np.eye(len(b)) if R is None else np.atleast_2d(np.asarray(R, dtype=float))
+    q = np.zeros(R.shape[0]) if q is None else np.asarray(q, dtype=float)
+    d = R @ b - q
+    RVR = R @ np.asarray(V, dtype=float) @ R.T
+    stat = float(d @ np.linalg.pinv(RVR, hermitian=True) @ d)
+    df = int(np.linalg.matrix_rank(RVR))
+    return {"stat": stat, "df": df, "pval": float(stats.chi2.sf(stat, df))}
+
+
+def sup_t_test(b, V, alpha=0.05, n_sim=100_000, seed=12345):
+    """
+    Test sup-t: max_h |b_h / se_h| contro la distribuzione del massimo di
+    |N(0, Corr(V))| (simulata, seed fisso). Il valore critico crit da anche
+    la banda simultanea b +/- crit * se (livello 1 - alpha su tutti gli h).
+    """
+    b = np.asarray(b, dtype=float)
+    V = np.asarray(V, dtype=float)
+    se = np.sqrt(np.diag(V))
+    corr = V / np.outer(se, se)
+    w, U = np.linalg.eigh((corr + corr.T) / 2)
+    root = U * np.sqrt(np.maximum(w, 0.0))
+    rng = np.random.default_rng(seed)
+    draws = np.abs(rng.standard_normal((n_sim, len(b))) @ root.T).max(axis=1)
+
+    stat = float(np.max(np.abs(b / se)))
+    crit = float(np.quantile(draws, 1 - alpha))
+    return {
+        "stat": stat,
+        "pval": float(np.mean(draws >= stat)),
+        "crit": crit,
+        "lo": b - crit * se,
+        "hi": b + crit * se,
+    }
+
+
+def sum_test(b, V, weights=None):
+    """
+    Effetto cumulato w'b (default w = 1: somma degli orizzonti) con
+    SE sqrt(w'Vw) e p-value normale per H0: w'b = 0.
+    """
+    b = np.asarray(b, dtype=float)
+    w = np.ones(len(b)) if weights is None else np.asarray(weights, dtype=float)
+    est = float(w @ b)
+    se = float(np.sqrt(w @ np.asarray(V, dtype=float) @ w))
+    z = est / se
+    return {"estimate": est, "se": se, "z": z, "pval": float(2 * stats.norm.sf(abs(z)))}
+
@@ -0,0 +1,272 @@
+"""
+lp_grid.py
+==========
+Griglia dichiarativa di specificazioni LP (controlli x lag x campione x
+moderatore x orizzonte) eseguita in parallelo.
+
+Le sotto-stime comuni vengono condivise:
+  - un solo PanelDesign per campione (filtro);
+  - una sola stima per (campione, controlli, lag, moderatore): tutte le
+    variabili dipendenti entrano come sistema multi-RHS e gli orizzonti
+    piu corti riusano la stima fino all'orizzonte massimo richiesto.
+
+Le stime uniche rimaste vanno su un ProcessPoolExecutor e il risultato e
+una sola tabella tidy (una riga per spec x endog x h x termine).
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from lp_engine import (
+    BANDS, PanelDesign, fit_lp_horizons_multi, fit_lp_joint, get_default_cache,
+    interaction_regressors, lp_regressors, mult_delta_joint,
+)
+from lp_profile import merge_records, profile_config, profiled, tags, worker_profiling
+
+
+# ============================================================
+# SPECIFICAZIONI
+# ============================================================
+
+@dataclass(frozen=True)
+class LPSpec:
+    """
+    Una specificazione LP. controls e il nome del set di controlli
+    (chiave del dict passato a run_spec_grid), sample il nome del filtro.
+    """
+    controls: str
+    lags: int
+    sample: str = "full"
+    moderator: str | None = None
+    hor: int = 3
+    name: str | None = None
+
+    @property
+    def spec_id(self):
+        if self.name is not None:
+            return self.name
+        mod = self.moderator or "-"
+        return f"{self.controls}|p{self.lags}|{self.sample}|{mod}|H{self.hor}"
+
+    @property
+    def fit_key(self):
+        return (self.sample, self.controls, self.lags, self.moderator)
+
+
+def spec_grid(controls, lags, samples=("full",), moderators=(None,), hors=(3,)):
+    """
+    Prodotto cartesiano controlli x lag x campione x moderatore x orizzonte.
+    controls e samples sono nomi (chiavi dei dict di run_spec_grid).
+    """
+    return [
+        LPSpec(c, int(p), s, m, int(H))
+        for c, p, s, m, H in product(controls, lags, samples, moderators, hors)
+    ]
+
+
+def _apply_sample(data_set, flt):
+    """
+    Filtro campione: None (tutto), stringa per DataFrame.query o callable.
+    """
+    if flt is None:
+        return data_set
+    if isinstance(flt, str):
+        return data_set.query(flt)
+    return data_set[flt(data_set)]
+
+
+def sample_r_share(data_set, ratio="PUBINVRATIO"):
+    """
+    Quota media dell'investimento pubblico (come rbar negli script).
+    """
+    r = np.nanmean(data_set[ratio].to_numpy(dtype=float))
+    if np.isfinite(r) and r > 1:
+        r = r / 100.0
+    return r
+
+
+# ============================================================
+# WORKER
+# ============================================================
+
+_DESIGNS = {}
+
+
+def _init_worker(designs):
+    _DESIGNS.clear()
+    _DESIGNS.update(designs)
+
+
+def _fit_task(task):
+    """
+    Una stima unica -> (chiave, righe tidy senza colonne della spec, record
+    del profiler del worker).
+    """
+    *args, prof_cfg = task
+    sample, controls, lags, moderator = args[0]
+    with worker_profiling(prof_cfg) as prof, \
+            tags(spec=f"{sample}|{controls}|p{lags}|{moderator or '-'}"):
+        key, rows = _fit_rows(*args)
+    return key, rows, [] if prof is None else prof.records
+
+
+def _fit_rows(key, ctrl_cols, endog_list, hor, shock, dk_bandwidth, mult, cache):
+    sample, _, lags, moderator = key
+    design = _DESIGNS[sample]
+
+    if moderator is None:
+        regressors = lp_regressors(design, shock, ctrl_cols, lags)
+        terms = {"beta": shock}
+    else:
+        regressors, inter_name = interaction_regressors(
+            design, shock, moderator, ctrl_cols, lags
+        )
+        terms = {"beta": shock, "theta": inter_name}
+
+    fits = fit_lp_horizons_multi(design, endog_list, regressors, hor,
+                                 dk_bandwidth=dk_bandwidth, cache=cache)
+    rows = []
+    for endog, res_list in fits.items():
+        for h, res in enumerate(res_list):
+            for term, col in terms.items():
+                rows.append({
+                    "endog": endog, "h": h, "term": term,
+                    "estimate": float(res.params[col]),
+                    "se": float(res.std_errors[col]),
+                    "pval": float(res.pvalues[col]),
+                    "nobs": int(res.nobs),
+                })
+
+    if mult is not None and moderator is None:
+        gdp, ratio, r_share, bands = mult
+        if bands == "ratio":
+            # come mult_from_ratio sulle stime per orizzonte gia fatte
+            if gdp not in fits or ratio not in fits:
+                fits.update(fit_lp_horizons_multi(design, [gdp, ratio], regressors, hor,
+                                                  dk_bandwidth=dk_bandwidth, cache=cache))
+            (bx, Vxx), (br, Vrr) = [
+                (np.array([r.params[shock] for r in fits[e]]),
+                 np.diag([r.std_errors[shock]**2 for r in fits[e]]))
+                for e in (gdp, ratio)
+            ]
+            cross = np.zeros_like(Vxx)
+            nobs = [int(r.nobs) for r in fits[gdp]]
+        else:
+            # covarianza congiunta GDP/ratio (orizzonti ed equazioni)
+            joint = fit_lp_joint(design, [gdp, ratio], regressors, hor, targets=[shock],
+                                 dk_bandwidth=dk_bandwidth, cache=cache)
+            (bx, Vxx), (br, Vrr) = joint.block(gdp), joint.block(ratio)
+            cross = joint.cross(gdp, ratio)
+            nobs = [int(joint.nobs[(gdp, h)]) for h in range(hor + 1)]
+        mult_h, se_h = mult_delta_joint(bx, br, Vxx, Vrr, cross, r_share, bands)
+        for h in range(hor + 1):
+            rows.append({
+                "endog": gdp, "h": h, "term": "multiplier",
+                "estimate": float(mult_h[h]),
+                "se": float(se_h[h]),
+                "pval": np.nan,
+                "nobs": nobs[h],
+            })
+    return key, rows
+
+
+# ============================================================
+# API
+# ============================================================
+
+@profiled()
+def run_spec_grid(data_set, specs, endog_list, controls, samples=None,
+                  shock="forecasterror", entity_col="ccode", time_col="year_int",
+                  dk_bandwidth=None, multiplier=None, bands="ratio", n_jobs=None,
+                  cache=None):
+    """
+    Esegue tutte le specs e ritorna una tabella tidy con colonne
+      spec_id, controls, lags, sample, moderator, hor,
+      endog, h, term (beta / theta / multiplier), estimate, se, pval, nobs.
+
+    controls: dict {nome: lista colonne}; samples: dict {nome: filtro}
+    (None, stringa query o callable; "full" = tutto il campione).
+    multiplier: None oppure (gdp, ratio) per aggiungere il moltiplicatore
+    cumulato (solo spec senza moderatore), con r_share del campione.
+    bands: SE del moltiplicatore, "ratio" (default, come mult_from_ratio
+    sulle stime per orizzonte, nessuna stima in piu) o "joint" (covarianza
+    DK congiunta GDP/ratio, bande piu strette: vedi lp_engine.BANDS).
+    n_jobs: processi (None = tutti i core, 1 = sequenziale).
+    cache: LPCache (default: quella attiva nel processo principale, passata
+    anche ai worker).
+    """
+    if bands not in BANDS:
+        raise ValueError(f"bande sconosciute: {bands!r} (joint, ratio)")
+    samples = dict(samples or {})
+    samples.setdefault("full", None)
+    endog_list = list(dict.fromkeys(endog_list))
+
+    # un design per campione, con tutte le variabili necessarie
+    needed = set(endog_list) | {shock} | set(multiplier or ())
+    for spec in specs:
+        needed |= set(controls[spec.controls])
+        if spec.moderator is not None:
+            needed.add(spec.moderator)
+    designs, r_shares = {}, {}
+    for name in {spec.sample for spec in specs}:
+        sub = _apply_sample(data_set, samples[name])
+        designs[name] = PanelDesign(sub, sorted(needed), entity_col, time_col)
+        if multiplier is not None:
+            r_shares[name] = sample_r_share(sub, multiplier[1])
+
+    # stime uniche: orizzonte massimo per chiave
+    max_hor = {}
+    for spec in specs:
+        max_hor[spec.fit_key] = max(max_hor.get(spec.fit_key, 0), spec.hor)
+    if cache is None:
+        cache = get_default_cache()
+    tasks = [
+        (key, list(controls[key[1]]), endog_list, H, shock, dk_bandwidth,
+         None if multiplier is None else (*multiplier, r_shares[key[0]], bands),
+         cache, profile_config())
+        for key, H in max_hor.items()
+    ]
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs == 1 or len(tasks) == 1:
+        _init_worker(designs)
+        outs = [_fit_task(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(designs,)) as pool:
+            outs = list(pool.map(_fit_task, tasks))
+    done = {}
+    for key, rows, records in outs:
+        done[key] = rows
+        merge_records(records)
+
+    # ogni spec prende le righe della sua stima fino al suo orizzonte
+    out = []
+    for spec in specs:
+        for row in done[spec.fit_key]:
+            if row["h"] <= spec.hor:
+                out.append({
+                    "spec_id": spec.spec_id, "controls": spec.controls,
+                    "lags": spec.lags, "sample": spec.sample,
+                    "moderator": spec.moderator, "hor": spec.hor, **row,
+                })
+    return pd.DataFrame(out)
+
+
+def grid_mult_table(tbl, spec_id):
+    """
+    Tabella del moltiplicatore di una spec nel formato di mult_from_ratio.
+    """
+    m = tbl[(tbl["spec_id"] == spec_id) & (tbl["term"] == "multiplier")].sort_values("h")
+    return pd.DataFrame({
+        "h": m["h"].to_numpy(),
+        "multiplier": m["estimate"].to_numpy(),
+        "lo_1se": (m["estimate"] - m["se"]).to_numpy(),
+        "hi_1se": (m["estimate"] + m["se"]).to_numpy(),
+    })
@@ -0,0 +1,295 @@
+"""
+lp_groups.py
+============
+LP panel completamente interagite con un'assegnazione a gruppi, stimate
+una volta per orizzonte invece che separatamente su ogni sottocampione.
+
+    y_{i,t+h} - y_{i,t-1} = a_i + g_t + sum_g 1{G_it = g} (b_gh s_it + G_gh X_{i,t-k}
+                            + c_g) + e
+
+Effetti paese e anno sono condivisi tra i gruppi; shock e controlli sono
+interagiti con i dummy di gruppo (interact_controls=True: modello
+completamente interagito, le b_gh differiscono da quelle delle stime
+separate per sottocampione solo perche gli effetti anno sono comuni e
+stimati su tutti i paesi). I dummy di gruppo c_g entrano
+solo se l'assegnazione varia nel tempo (es. terzili WGI laggati): con
+gruppi fissi per paese sono assorbiti dagli effetti paese.
+
+La stima e fit_lp_joint sui regressori interagiti, quindi la covarianza DK
+e congiunta tra gruppi, orizzonti ed equazioni: differenze tra gruppi,
+test di uguaglianza (Wald) e moltiplicatori per gruppo (mult_from_joint)
+senza ristimare. Qualsiasi numero di gruppi.
+
+Assegnazioni:
+  - gruppi fissi: {etichetta: [paesi]} (codici o nomi), gli altri paesi
+    nel gruppo rest (None = esclusi);
+  - variabili nel tempo: colonna del panel (valori = etichette) oppure
+    quantili di una colonna laggata (quantile_groups), o array (N, T).
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from lp_engine import PanelDesign, fit_lp_joint, lp_regressors, mult_from_joint, wald_test
+from lp_profile import profiled
+
+
+# ============================================================
+# ASSEGNAZIONE AI GRUPPI
+# ============================================================
+
+def quantile_labels(n_groups):
+    if n_groups == 2:
+        return ["low", "high"]
+    if n_groups == 3:
+        return ["low", "mid", "high"]
+    return [f"q{j + 1}" for j in range(n_groups)]
+
+
+def quantile_groups(design, col, n_groups=3, lag=1, labels=None):
+    """
+    Gruppi per quantili (sul campione) di col laggata di lag anni, come il
+    moderatore di interaction_regressors: array (N, T) di etichette, None
+    dove col manca.
+    """
+    labels = quantile_labels(n_groups) if labels is None else list(labels)
+    x = np.where(design.present, design.lag(col, lag), np.nan)
+    edges = np.nanquantile(x, np.linspace(0, 1, n_groups + 1)[1:-1])
+    pos = np.searchsorted(edges, x, side="right")
+    out = np.empty(x.shape, dtype=object)
+    ok = np.isfinite(x)
+    out[ok] = np.asarray(labels, dtype=object)[pos[ok]]
+    return out
+
+
+def static_groups(design, members, names=None, rest="other"):
+    """
+    {etichetta: [paesi]} -> array (N, T) di etichette. names: Serie codice
+    -> nome per i gruppi definiti con i nomi; rest: etichetta dei paesi non
+    elencati (None = esclusi).
+    """
+    codes = list(design.entity_labels)
+    by_name = {} if names is None else {str(v): k for k, v in names.items()}
+    lab = np.full(len(codes), rest, dtype=object)
+    for label, countries in members.items():
+        for c in countries:
+            code = c if c in codes else by_name.get(str(c))
+            if code is None:
+                raise KeyError(f"paese non presente nel panel: {c!r}")
+            lab[codes.index(code)] = label
+    return np.repeat(lab[:, None], design.shape[1], axis=1)
+
+
+def group_codes(assignment, labels=None):
+    """
+    Array (N, T) di etichette -> codici interi (-1 = non assegnato) ed
+    etichette in ordine (default: ordine di comparsa, crescente se
+    numeriche). Il primo gruppo e la base delle differenze.
+    """
+    a = np.asarray(assignment, dtype=object)
+    ok = np.array([v is not None and not (isinstance(v, float) and np.isnan(v))
+                   for v in a.ravel()]).reshape(a.shape)
+    if labels is None:
+        labels = list(pd.unique(a[ok]))
+        if all(isinstance(v, (int, float, np.number)) for v in labels):
+            labels = sorted(labels)
+    pos = {v: j for j, v in enumerate(labels)}
+    codes = np.full(a.shape, -1, dtype=int)
+    codes[ok] = [pos.get(v, -1) for v in a[ok]]
+    return codes, list(labels)
+
+
+def group_regressors(regressors, codes, labels, interact_controls=True):
+    """
+    Regressori interagiti con i dummy di gruppo (nome@gruppo) piu i dummy
+    di gruppo se l'assegnazione varia nel tempo per almeno un paese. Righe
+    non assegnate a NaN (escluse dal campione).
+    """
+    assigned = codes >= 0
+    time_varying = any(len(np.unique(row[ok])) > 1 for row, ok in zip(codes, assigned))
+    dummies = [np.where(assigned, (codes == g).astype(float), np.nan)
+               for g in range(len(labels))]
+    shock_name, shock = regressors[0]
+    out = [(f"{shock_name}@{lab}", shock * d) for lab, d in zip(labels, dummies)]
+    for name, arr in regressors[1:]:
+        if interact_controls:
+            out += [(f"{name}@{lab}", arr * d) for lab, d in zip(labels, dummies)]
+        else:
+            out.append((name, np.where(assigned, arr, np.nan)))
+    if time_varying:
+        out += [(f"group@{lab}", d) for lab, d in zip(labels[1:], dummies[1:])]
+    return out
+
+
+# ============================================================
+# STIMA
+# ============================================================
+
+@dataclass
+class LPGroupResult:
+    """
+    Stima congiunta per gruppi: joint (LPJointResult con target
+    shock@gruppo), etichette dei gruppi, righe per gruppo nel campione
+    (h = 0, prima equazione) e nome dello shock.
+    """
+    joint: object
+    groups: list
+    nobs: pd.Series
+    shock: str
+
+    def target(self, group):
+        if group not in self.groups:
+            raise KeyError(f"gruppo sconosciuto: {group!r} ({self.groups})")
+        return f"{self.shock}@{group}"
+
+    def _sel(self, endog, group):
+        idx = self.joint.coef.index
+        return (idx.get_level_values(0) == endog) & (
+            idx.get_level_values(2) == self.target(group))
+
+    def block(self, endog, group):
+        return self.joint.block(endog, self.target(group))
+
+    def irf(self, endog, group, confint=1.0):
+        """
+        IRF del gruppo nel formato di lp_lin_panel_py (per cum_irf /
+        mult_from_ratio).
+        """
+        b, V = self.block(endog, group)
+        se = np.sqrt(np.maximum(np.diag(V), 0.0))
+        return {
+            "irf_panel_mean": b,
+            "irf_panel_low": b - confint * se,
+            "irf_panel_up": b + confint * se,
+        }
+
+    def diff(self, endog, group, base):
+        """
+        b_group - b_base per h e la sua covarianza (include la covarianza
+        tra i gruppi dovuta agli effetti e ai momenti per anno comuni).
+        """
+        sa, sb = self._sel(endog, group), self._sel(endog, base)
+        V = self.joint.cov.to_numpy()
+        b = self.joint.coef.to_numpy()
+        d = b[sa] - b[sb]
+        Vd = (V[np.ix_(sa, sa)] + V[np.ix_(sb, sb)]
+              - V[np.ix_(sa, sb)] - V[np.ix_(sb, sa)])
+        return d, Vd
+
+    def diff_irf(self, endog, group, base, confint=1.0):
+        d, Vd = self.diff(endog, group, base)
+        se = np.sqrt(np.maximum(np.diag(Vd), 0.0))
+        return {
+            "irf_panel_mean": d,
+            "irf_panel_low": d - confint * se,
+            "irf_panel_up": d + confint * se,
+        }
+
+    def test_equal(self, endog, horizons=None):
+        """
+        Wald per H0: IRF uguali in tutti i gruppi (agli orizzonti in
+        horizons, None = tutti), con la covarianza congiunta.
+        """
+        blocks = [np.flatnonzero(self._sel(endog, g)) for g in self.groups]
+        hs = np.arange(len(blocks[0])) if horizons is None else np.asarray(horizons)
+        pos = np.concatenate([blk[hs] for blk in blocks])
+        b = self.joint.coef.to_numpy()[pos]
+        V = self.joint.cov.to_numpy()[np.ix_(pos, pos)]
+        k, G = len(hs), len(self.groups)
+        R = np.zeros(((G - 1) * k, G * k))
+        for g in range(1, G):
+            R[(g - 1) * k:g * k, g * k:(g + 1) * k] = np.eye(k)
+            R[(g - 1) * k:g * k, :k] = -np.eye(k)
+        return wald_test(b, V, R)
+
+    def multiplier(self, group, r_share, gdp="log_RGDP", ratio="PUBINVRATIO",
+                   confint=1.0):
+        """
+        Moltiplicatore del gruppo con la covarianza congiunta (mult_from_joint).
+        """
+        return mult_from_joint(self.joint, r_share, gdp, ratio, confint,
+                               target=self.target(group))
+
+    def table(self, base=None):
+        """
+        Tabella tidy: endog, h, group, term (beta / diff rispetto a base,
+        default il primo gruppo), estimate, se.
+        """
+        base = self.groups[0] if base is None else base
+        rows = []
+        for endog in dict.fromkeys(self.joint.coef.index.get_level_values(0)):
+            for g in self.groups:
+                b, V = self.block(endog, g)
+                terms = [("beta", b, V)]
+                if g != base:
+                    terms.append((f"diff_{base}", *self.diff(endog, g, base)))
+                for term, est, cov in terms:
+                    se = np.sqrt(np.maximum(np.diag(cov), 0.0))
+                    rows += [{"endog": endog, "h": h, "group": g, "term": term,
+                              "estimate": est[h], "se": se[h]} for h in range(len(est))]
+        return pd.DataFrame(rows)
+
+
+@profiled()
+def fit_lp_groups(design, endog_list, regressors, hor, assignment, labels=None,
+                  interact_controls=True, cumul_mult=True, dk_bandwidth=None):
+    """
+    LP completamente interagite per gruppi: un solo fit per orizzonte (per
+    tutte le equazioni) con effetti fissi condivisi. assignment: array
+    (N, T) di etichette (static_groups, quantile_groups o una colonna).
+    """
+    codes, labels = group_codes(assignment, labels)
+    if len(labels) < 2:
+        raise ValueError(f"servono almeno due gruppi: {labels}")
+    g_regs = group_regressors(regressors, codes, labels, interact_controls)
+    shock = regressors[0][0]
+    joint = fit_lp_joint(design, endog_list, g_regs, hor,
+                         targets=[f"{shock}@{lab}" for lab in labels],
+                         cumul_mult=cumul_mult, dk_bandwidth=dk_bandwidth)
+    x_ok = np.isfinite(np.stack([a for _, a in g_regs], axis=-1)).all(axis=-1)
+    counts = pd.Series(
+        [int((design.present & x_ok & (codes == g)).sum()) for g in range(len(labels))],
+        index=labels, name="rows")
+    return LPGroupResult(joint=joint, groups=labels, nobs=counts, shock=shock)
+
+
+@profiled()
+def lp_group_panel(data_set, endog_list, shock, l_exog_data, lags_exog_data, hor, groups,
+                   entity_col="ccode", time_col="year_int", name_col="Country",
+                   rest="other", n_quantiles=None, group_lag=1, interact_controls=True,
+                   cumul_mult=True, dk_bandwidth=None, design=None):
+    """
+    LP per gruppi con i regressori di lp_lin_panel_py.
+
+    groups: {etichetta: [paesi]} (gruppi fissi, codici o nomi in name_col;
+    gli altri paesi in rest), nome di una colonna laggata di group_lag anni
+    (valori = gruppi; con n_quantiles i suoi quantili, es. terzili WGI)
+    oppure array (N, T) di etichette sulla griglia del design.
+    Ritorna LPGroupResult.
+    """
+    variables = list(endog_list) + [shock] + list(l_exog_data)
+    if isinstance(groups, str):
+        variables.append(groups)
+    if design is None:
+        design = PanelDesign(data_set, variables, entity_col, time_col)
+    regressors = lp_regressors(design, shock, l_exog_data, lags_exog_data)
+
+    labels = None
+    if isinstance(groups, dict):
+        names = (data_set.groupby(entity_col)[name_col].first()
+                 if name_col in data_set else None)
+        assignment = static_groups(design, groups, names, rest)
+        labels = list(groups) + ([rest] if rest is not None and (assignment == rest).any() else [])
+    elif isinstance(groups, str) and n_quantiles:
+        assignment = quantile_groups(design, groups, n_quantiles, group_lag)
+        labels = quantile_labels(n_quantiles)
+    elif isinstance(groups, str):
+        vals = np.where(design.present, design.lag(groups, group_lag), np.nan)
+        assignment = np.where(np.isfinite(vals), vals, None)
+    else:
+        assignment = groups
+    return fit_lp_groups(design, endog_list, regressors, hor, assignment, labels,
+                         interact_controls=interact_controls, cumul_mult=cumul_mult,
+                         dk_bandwidth=dk_bandwidth)
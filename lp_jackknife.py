@@ -0,0 +1,273 @@
+"""
+lp_jackknife.py
+===============
+Jackknife leave-one-country-out per le Local Projections panel (IRF,
+interazione, moltiplicatori) senza ristimare N volte.
+
+Con effetti paese + anno la trasformazione within per paese di un paese j
+usa solo le righe di j: togliendo il paese i le righe demeanate degli altri
+paesi non cambiano. Gli effetti anno si tengono come dummy esplicite
+(demeanate per paese), quindi le equazioni normali del modello two-way sono
+una somma di blocchi per paese:
+
+    G = sum_i Z_i'Z_i,   g = sum_i Z_i'y_i,   Z = [X~, D~]
+
+e la stima senza il paese i e (G - G_i)^{-1} (g - g_i): un downdate di
+rango pari alle righe del paese, risolto per tutti i paesi con una sola
+solve batch (N sistemi (K + T - 1)). Il risultato coincide con la stima
+two-way ristimata sul panel senza il paese i (stesso asse anni: se un anno
+e osservato solo per i, la sua dummy resta nulla e non conta).
+
+Dai coefficienti LOO:
+  - SE jackknife: sqrt((n-1)/n * sum_i (b_(i) - b_(.))^2)
+  - influenza del paese i: (n-1) * (b_(.) - b_(i))
+con n = paesi presenti nel campione a quell'orizzonte.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from lp_engine import entity_demean, get_default_cache, interaction_regressors, lp_dependent
+from lp_profile import profiled
+
+
+# ============================================================
+# DOWNDATE PER PAESE
+# ============================================================
+
+def _loo_solve(Zc, Yc):
+    """
+    Zc: (N, T, P), Yc: (N, T, m) con righe nulle fuori campione.
+    Ritorna (soluzione sul campione intero (P, m), soluzioni LOO (N, P, m)).
+    """
+    ZT = np.swapaxes(Zc, 1, 2)
+    G = ZT @ Zc
+    g = ZT @ Yc
+    G_all, g_all = G.sum(axis=0), g.sum(axis=0)
+    full = np.linalg.lstsq(G_all, g_all, rcond=None)[0]
+    A, b = G_all[None] - G, g_all[None] - g
+    try:
+        loo = np.linalg.solve(A, b)
+    except np.linalg.LinAlgError:
+        # un anno osservato solo da un paese: dummy nulla senza quel paese
+        loo = np.linalg.pinv(A, hermitian=True) @ b
+    return full, loo
+
+
+def loo_twoway(Y, X, e_idx, t_idx, n_entity, n_time):
+    """
+    Coefficienti two-way FE (X: n x k, Y: n x m) sul campione intero e
+    senza ciascun paese. Ritorna (full (k, m), loo (n_entity, k, m)); i
+    paesi senza righe nel campione hanno loo = NaN.
+    """
+    Y = np.asarray(Y, dtype=float)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    k = X.shape[1]
+
+    years = np.unique(t_idx)
+    D = (t_idx[:, None] == years[None, 1:]).astype(float)
+    Z = entity_demean(np.column_stack([X, D]), e_idx, n_entity)
+    Yd = entity_demean(Y, e_idx, n_entity)
+
+    Zc = np.zeros((n_entity, n_time, Z.shape[1]))
+    Yc = np.zeros((n_entity, n_time, Y.shape[1]))
+    Zc[e_idx, t_idx] = Z
+    Yc[e_idx, t_idx] = Yd
+
+    full, loo = _loo_solve(Zc, Yc)
+    full, loo = full[:k], loo[:, :k]
+    absent = np.bincount(e_idx, minlength=n_entity) == 0
+    loo[absent] = np.nan
+    return full, loo
+
+
+# ============================================================
+# JACKKNIFE LP
+# ============================================================
+
+@dataclass
+class LPJackknifeResult:
+    """
+    Coefficienti di interesse sul campione intero (coef[endog]: H+1 x q) e
+    senza ciascun paese (loo[endog]: N x H+1 x q, NaN se il paese non e nel
+    campione a quell'orizzonte).
+    """
+    entities: np.ndarray
+    targets: list
+    coef: dict
+    loo: dict
+
+    def _pos(self, target):
+        return 0 if target is None else self.targets.index(target)
+
+    def loo_frame(self, endog, target=None):
+        """
+        DataFrame paese x h delle stime senza il paese.
+        """
+        arr = self.loo[endog][:, :, self._pos(target)]
+        return pd.DataFrame(arr, index=pd.Index(self.entities, name="dropped"),
+                            columns=pd.RangeIndex(arr.shape[1], name="h"))
+
+    def se(self, endog, target=None):
+        return jackknife_se(self.loo[endog][:, :, self._pos(target)])
+
+    def influence(self, endog, target=None):
+        return jackknife_influence(self.loo_frame(endog, target))
+
+
+def jackknife_se(loo):
+    """
+    SE jackknife lungo l'asse 0 (paesi), ignorando i NaN.
+    """
+    loo = np.asarray(loo, dtype=float)
+    n = np.isfinite(loo).sum(axis=0)
+    dev = loo - np.nanmean(loo, axis=0)
+    ss = np.nansum(dev**2, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 1, np.sqrt((n - 1) / n * ss), np.nan)
+
+
+def jackknife_influence(loo_frame):
+    """
+    Influenza (n-1) * (media LOO - stima senza il paese) per paese e h:
+    valori positivi = il paese spinge la stima verso l'alto.
+    """
+    n = loo_frame.notna().sum(axis=0)
+    return (loo_frame.mean(axis=0) - loo_frame) * (n - 1)
+
+
+@profiled()
+def jackknife_lp(design, endog_list, regressors, hor, targets=None, cumul_mult=True,
+                 cache=None):
+    """
+    Jackknife leave-one-country-out delle LP per h=0..hor.
+
+    Stessi campioni di fit_lp_horizons_multi (raggruppamento per maschera,
+    multi-RHS dentro il gruppo). targets: regressori di cui tenere le stime
+    (default: il primo, lo shock). cache: come in fit_lp_horizons
+    (namespace "jackknife").
+    """
+    endog_list = list(dict.fromkeys(endog_list))
+    x_cols = [name for name, _ in regressors]
+    if targets is None:
+        targets = [x_cols[0]]
+    t_pos = [x_cols.index(t) for t in targets]
+
+    if cache is None:
+        cache = get_default_cache()
+    key = None
+    if cache is not None:
+        key = cache.data_key("jackknife", design, endog_list, regressors, hor, cumul_mult,
+                             spec=list(targets))
+        hit = cache.get_arrays(key)
+        if hit is not None:
+            return LPJackknifeResult(
+                entities=design.entity_labels, targets=list(targets),
+                coef=dict(zip(endog_list, hit["coef"])), loo=dict(zip(endog_list, hit["loo"])),
+            )
+
+    X_cube = np.stack([arr for _, arr in regressors], axis=-1)
+    x_ok = design.present & np.isfinite(X_cube).all(axis=-1)
+    N, T = design.shape
+
+    coef = {e: np.full((hor + 1, len(targets)), np.nan) for e in endog_list}
+    loo = {e: np.full((N, hor + 1, len(targets)), np.nan) for e in endog_list}
+    for h in range(0, hor + 1):
+        Y_cube = np.stack(
+            [lp_dependent(design, endog, h, cumul_mult) for endog in endog_list], axis=-1
+        )
+        masks = x_ok[..., None] & np.isfinite(Y_cube)
+
+        groups = {}
+        for j in range(len(endog_list)):
+            groups.setdefault(masks[..., j].tobytes(), []).append(j)
+
+        for cols in groups.values():
+            mask = masks[..., cols[0]]
+            e_idx, t_idx = np.nonzero(mask)
+            full, b_loo = loo_twoway(Y_cube[mask][:, cols], X_cube[mask],
+                                     e_idx, t_idx, N, T)
+            for jj, j in enumerate(cols):
+                coef[endog_list[j]][h] = full[t_pos, jj]
+                loo[endog_list[j]][:, h] = b_loo[:, t_pos, jj]
+
+    if key is not None:
+        cache.put_arrays(key, {"coef": np.stack([coef[e] for e in endog_list]),
+                               "loo": np.stack([loo[e] for e in endog_list])})
+    return LPJackknifeResult(entities=design.entity_labels, targets=list(targets),
+                             coef=coef, loo=loo)
+
+
+def jackknife_interaction(design, endog_data, shock, corr_col, l_exog_data,
+                          lags_exog_data, hor, corr_lag=1, center_corr=True,
+                          cumul_mult=True):
+    """
+    Jackknife del modello con interazione (shock, shock x Corr centrata).
+
+    Senza il paese i anche la media usata per centrare Corr cambia (c -> c_i):
+    il termine di interazione resta lo stesso e lo shock si corregge con
+    b_(i) = b'_(i) + theta_(i) * (c_i - c).
+    Ritorna (LPJackknifeResult con targets [shock, inter_name], inter_name).
+    """
+    regressors, inter_name = interaction_regressors(
+        design, shock, corr_col, l_exog_data, lags_exog_data,
+        corr_lag=corr_lag, center_corr=center_corr,
+    )
+    jk = jackknife_lp(design, [endog_data], regressors, hor,
+                      targets=[shock, inter_name], cumul_mult=cumul_mult)
+
+    if center_corr:
+        corr_l = np.where(design.present, design.lag(corr_col, corr_lag), np.nan)
+        ok = np.isfinite(corr_l)
+        tot, cnt = corr_l[ok].sum(), ok.sum()
+        tot_i = np.where(ok, corr_l, 0.0).sum(axis=1)
+        cnt_i = ok.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            shift = (tot - tot_i) / (cnt - cnt_i) - tot / cnt
+        b = jk.loo[endog_data]
+        b[:, :, 0] += b[:, :, 1] * shift[:, None]
+    return jk, inter_name
+
+
+# ============================================================
+# MOLTIPLICATORI
+# ============================================================
+
+def loo_r_share(data, ratio_col="PUBINVRATIO", entity_col="ccode", entities=None):
+    """
+    Quota media del rapporto senza ciascun paese (stessa regola dello
+    script: /100 se la media e > 1). Serie indicizzata per paese escluso.
+    """
+    s = pd.to_numeric(data[ratio_col], errors="coerce")
+    keys = data[entity_col].astype(str).to_numpy()
+    ok = s.notna().to_numpy()
+    vals = s.to_numpy(dtype=float)
+    tot_i = pd.Series(np.where(ok, vals, 0.0)).groupby(keys).sum()
+    cnt_i = pd.Series(ok.astype(float)).groupby(keys).sum()
+    r = (vals[ok].sum() - tot_i) / (ok.sum() - cnt_i)
+    r = r.where(~(np.isfinite(r) & (r > 1)), r / 100.0)
+    if entities is not None:
+        r = r.reindex(np.asarray(entities).astype(str))
+    r.index.name = "dropped"
+    return r
+
+
+def loo_multipliers(gdp_loo, ratio_loo, r_share_loo):
+    """
+    Moltiplicatori cumulati senza ciascun paese.
+
+    gdp_loo, ratio_loo: DataFrame paese x h delle IRF LOO (come loo_frame);
+    r_share_loo: scalare o Serie per paese. Stessa formula di
+    mult_from_ratio: X = cumsum(100 b_gdp), R = cumsum(b_ratio),
+    M = X / max(R + r X, 1e-12).
+    """
+    X = gdp_loo.cumsum(axis=1) * 100.0
+    R = ratio_loo.reindex(X.index).cumsum(axis=1)
+    r = r_share_loo
+    if isinstance(r, pd.Series):
+        r = r.reindex(X.index.astype(str)).to_numpy()[:, None]
+    D = np.maximum((R + r * X).to_numpy(), 1e-12)
+    return pd.DataFrame(X.to_numpy() / D, index=X.index, columns=X.columns)
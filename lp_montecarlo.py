@@ -0,0 +1,465 @@
+"""
+lp_montecarlo.py
+================
+Simulazioni Monte Carlo per la copertura delle bande Driscoll-Kraay delle
+LP panel e degli intervalli del moltiplicatore, su panel con IRF vera nota.
+
+Il processo generatore (synth_panel.simulate_panels) e calibrato sul panel
+reale (calibrate): stessa griglia paesi x anni e stesse celle mancanti
+(quindi lo stesso campione di stima in ogni replica), IRF vere pari alle
+stime di base di log_RGDP e PUBINVRATIO, SD dello shock, persistenza e
+varianza della crescita e quota comune (dipendenza cross-sezionale) dai
+dati.
+
+Con il campione fisso la trasformazione within two-way e lo stesso
+operatore lineare in tutte le repliche: per ogni (equazione, h) si calcola
+una volta (twoway_demean applicata all'identita) e una batch di repliche
+si demeana con un solo prodotto matriciale. OLS, varianze DK per tutte le
+bandwidth della griglia (dalle stesse autocovarianze) e moltiplicatori
+sono operazioni vettoriali sulle repliche. Le batch (seed da
+SeedSequence.spawn: il risultato non dipende dal numero di worker) girano
+su un ProcessPoolExecutor, come in lp_bootstrap.
+
+coverage_table riporta per h e bandwidth: distorsione, SD delle stime, SE
+medio, copertura delle bande +/- c*SE (c = 1 come negli script, 1.645,
+1.96) e size del t-test al 5%. Oltre alle IRF per orizzonte: IRF cumulata
+del PIL e moltiplicatore, con le bande degli script (cum_irf /
+mult_from_ratio: SE sommati tra orizzonti, senza covarianze) e con la
+covarianza DK congiunta (cum_irf_joint / mult_from_joint).
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from lp_engine import (
+    PanelDesign, bartlett_weights, dk_default_bandwidth, fit_lp_horizons_multi,
+    lp_regressors, twoway_demean,
+)
+from lp_grid import sample_r_share
+from lp_profile import profiled
+from synth_panel import simulate_panels, true_irf
+
+
+GDP = "log_RGDP"
+RATIO = "PUBINVRATIO"
+SHOCK = "forecasterror"
+CTRL_BASE = ["growth_RGDP", "PDEBT", "forecasterror", "NOMLRATE", "REER"]
+
+# griglia di bandwidth DK (None = default di linearmodels sul campione)
+DEFAULT_BANDWIDTHS = (None, 0, 1, 2, 3, 4)
+
+# bande +/- c * SE: c = 1 (confint degli script), 90% e 95% normali
+CONFINTS = {"1se": 1.0, "90": stats.norm.ppf(0.95), "95": stats.norm.ppf(0.975)}
+
+
+# ============================================================
+# CALIBRAZIONE
+# ============================================================
+
+@dataclass
+class MCSetup:
+    """
+    Processo generatore calibrato e struttura del panel reale.
+
+    present: (N, T) celle (paese, anno) presenti; holes: {variabile: (N, T)}
+    celle presenti ma con la variabile mancante; dgp: argomenti di
+    simulate_panels; truth: IRF vere per h (log_RGDP, PUBINVRATIO, cumulata
+    del PIL x 100 e moltiplicatore con r_share).
+    """
+    present: np.ndarray
+    holes: dict
+    dgp: dict
+    controls: list
+    lags: int
+    hor: int
+    r_share: float
+    truth: pd.DataFrame
+
+
+def true_multiplier(beta_gdp, beta_ratio, r_share):
+    """
+    X / (R + r X) con X = 100 * PIL cumulato e R = rapporto cumulato (come
+    mult_from_ratio).
+    """
+    X = 100.0 * np.cumsum(beta_gdp)
+    R = np.cumsum(beta_ratio)
+    return X / np.maximum(R + r_share * X, 1e-12)
+
+
+def calibrate(data, controls=CTRL_BASE, lags=2, hor=3, entity_col="ccode",
+              time_col="year_int"):
+    """
+    MCSetup dal panel reale: IRF vere = stime LP di base (shock + lag dei
+    controlli), risposta della crescita = differenze della IRF cumulata di
+    log_RGDP; quota comune cd dalla varianza delle medie per anno della
+    crescita (demeanata per paese, corretta per il rumore 1/N).
+    """
+    variables = list(dict.fromkeys([GDP, RATIO, SHOCK, "growth_RGDP"] + list(controls)))
+    design = PanelDesign(data, variables, entity_col, time_col)
+    regressors = lp_regressors(design, SHOCK, controls, lags)
+    fits = fit_lp_horizons_multi(design, [GDP, RATIO], regressors, hor)
+    beta_gdp = np.array([float(r.params[SHOCK]) for r in fits[GDP]])
+    beta_ratio = np.array([float(r.params[SHOCK]) for r in fits[RATIO]])
+
+    g = design.var("growth_RGDP")
+    g_w = g - np.nanmean(g, axis=1, keepdims=True)
+    N = design.shape[0]
+    share = np.nanvar(np.nanmean(g_w, axis=0)) / np.nanvar(g_w)
+    cd = float(np.clip((share - 1.0 / N) / (1.0 - 1.0 / N), 0.0, 0.95))
+    ok = np.isfinite(g_w[:, 1:]) & np.isfinite(g_w[:, :-1])
+    rho = float(np.clip(np.corrcoef(g_w[:, 1:][ok], g_w[:, :-1][ok])[0, 1], 0.0, 0.95))
+
+    dgp = {
+        "cd": cd,
+        "irf": tuple(np.diff(beta_gdp, prepend=0.0)),
+        "ratio_irf": tuple(beta_ratio),
+        "shock_sd": float(np.nanstd(design.var(SHOCK))),
+        "growth_sd": float(np.nanstd(g_w) * np.sqrt(1.0 - rho**2)),
+        "growth_rho": rho,
+    }
+    r_share = float(sample_r_share(data, RATIO))
+
+    truth = true_irf(hor, dgp["irf"], dgp["ratio_irf"])[["h", GDP, RATIO]]
+    truth["cum"] = 100.0 * np.cumsum(truth[GDP])
+    truth["multiplier"] = true_multiplier(truth[GDP], truth[RATIO], r_share)
+
+    holes = {v: design.present & ~np.isfinite(design.var(v)) for v in variables}
+    return MCSetup(present=design.present.copy(), holes=holes, dgp=dgp,
+                   controls=list(controls), lags=int(lags), hor=int(hor),
+                   r_share=r_share, truth=truth)
+
+
+# ============================================================
+# OPERATORI FISSI PER (EQUAZIONE, h)
+# ============================================================
+
+def _shift(a, k, fill=np.nan):
+    """
+    Valori al tempo t + k lungo l'ultimo asse (come PanelDesign._shifted).
+    """
+    out = np.full_like(a, fill)
+    T = a.shape[-1]
+    if k >= 0:
+        out[..., :T - k] = a[..., k:]
+    else:
+        out[..., -k:] = a[..., :T + k]
+    return out
+
+
+def _regressor_names(setup):
+    return [(SHOCK, 0)] + [(c, L) for c in setup.controls
+                           for L in range(1, setup.lags + 1)]
+
+
+def _prepare(setup):
+    """
+    Per ogni (equazione, h): campione, operatore within M (n x n), matrice
+    anno x riga per i momenti DK e gradi di liberta come twoway_ols.
+    """
+    ok = {v: setup.present & ~setup.holes[v] for v in setup.holes}
+    x_ok = np.ones_like(setup.present)
+    for name, L in _regressor_names(setup):
+        x_ok &= _shift(ok[name], -L, fill=False)
+    k = len(_regressor_names(setup))
+
+    eqs = []
+    for endog in (GDP, RATIO):
+        for h in range(setup.hor + 1):
+            mask = (setup.present & x_ok & _shift(ok[endog], h, fill=False)
+                    & _shift(ok[endog], -1, fill=False))
+            e_idx, t_idx = np.nonzero(mask)
+            e_c = pd.factorize(e_idx, sort=True)[0]
+            t_c, t_years = pd.factorize(t_idx, sort=True)
+            n, n_e, n_t = len(e_idx), int(e_c.max()) + 1, int(t_c.max()) + 1
+            G = np.zeros((n_t, n))
+            G[t_c, np.arange(n)] = 1.0
+            extra_df = n_e + n_t - 1
+            eqs.append({
+                "endog": endog, "h": h, "mask": mask,
+                "M": twoway_demean(np.eye(n), e_c, t_c, n_e, n_t),
+                "G": G, "t_grid": np.asarray(t_years), "n_time": n_t,
+                "df_resid": n - k - extra_df,
+                "scale": n / (n - extra_df - k),
+            })
+    return eqs
+
+
+# ============================================================
+# WORKER
+# ============================================================
+
+_STATE = {}
+
+
+def _init_worker(state):
+    _STATE.clear()
+    _STATE.update(state)
+
+
+def _bw_value(bw, n_time):
+    return dk_default_bandwidth(n_time) if bw is None else bw
+
+
+def _autocov(P, bandwidths, n_time):
+    """
+    Gamma_j = sum_t P_t P_{t-j}' per j = 0..(lag massimo delle bandwidth);
+    P: (R, T, m).
+    """
+    max_lag = int(min(max(np.floor(bw) for bw in bandwidths), n_time - 1))
+    return [np.einsum("rta,rtb->rab", P[:, j:], P[:, :P.shape[1] - j])
+            for j in range(max_lag + 1)]
+
+
+def _kernel_sum(gammas, bw, n_time):
+    """
+    Somma di Bartlett delle autocovarianze (come dk_meat), per replica.
+    """
+    w = bartlett_weights(bw, n_time)
+    S = gammas[0].copy()
+    for j in range(1, len(w)):
+        S += w[j] * (gammas[j] + np.swapaxes(gammas[j], 1, 2))
+    return S
+
+
+def _delta_mult(X, R, var_X, var_R, cov_XR):
+    D = np.maximum(R + _STATE["r_share"] * X, 1e-12)
+    dMdX = R / D**2
+    dMdR = -X / D**2
+    se = np.sqrt(np.maximum(dMdX**2 * var_X + dMdR**2 * var_R
+                            + 2 * dMdX * dMdR * cov_XR, 0.0))
+    return X / D, se
+
+
+def _run_batch(args):
+    """
+    Una batch di repliche -> dict di array (replica come primo asse).
+    """
+    seed, n_rep = args
+    rng = np.random.default_rng(seed)
+    eqs, bws = _STATE["eqs"], _STATE["bandwidths"]
+    names, present = _STATE["regressors"], _STATE["present"]
+    N, T = present.shape
+    H1 = _STATE["hor"] + 1
+
+    sim = simulate_panels(rng, n_rep, N, T, wgi=False, **_STATE["dgp"])
+    cube = {v: np.where(present & ~_STATE["holes"][v], sim[v], np.nan)
+            for v in _STATE["holes"]}
+    X_cube = np.stack([_shift(cube[c], -L) for c, L in names], axis=-1)
+
+    b = np.empty((n_rep, 2, H1))
+    var = np.empty((n_rep, 2, H1, len(bws)))
+    psi_grid = np.zeros((n_rep, T, 2 * H1))
+    for q, eq in enumerate(eqs):
+        e, h = int(eq["endog"] == RATIO), eq["h"]
+        y = (_shift(cube[eq["endog"]], h) - _shift(cube[eq["endog"]], -1))[:, eq["mask"]]
+        Z = np.concatenate([y[..., None], X_cube[:, eq["mask"], :]], axis=-1)
+        if not np.isfinite(Z).all():
+            raise ValueError(f"valori mancanti fuori dal campione fisso ({eq['endog']}, h={h})")
+
+        # demean di tutte le repliche con lo stesso operatore
+        R, n, m = Z.shape
+        Zd = (eq["M"] @ Z.transpose(1, 0, 2).reshape(n, R * m)).reshape(n, R, m)
+        Zd = Zd.transpose(1, 0, 2)
+        yd, xd = Zd[..., 0], Zd[..., 1:]
+
+        xpx_inv = np.linalg.inv(np.einsum("rnk,rnl->rkl", xd, xd))
+        coef = np.einsum("rkl,rl->rk", xpx_inv, np.einsum("rnk,rn->rk", xd, yd))
+        eps = yd - np.einsum("rnk,rk->rn", xd, coef)
+
+        # influenza sul coefficiente dello shock, per anno del campione
+        xi = np.einsum("tn,rnk->rtk", eq["G"], xd * eps[..., None])
+        psi = np.einsum("rtk,rk->rt", xi, xpx_inv[:, 0, :])
+        n_t = eq["n_time"]
+        bw_h = [_bw_value(bw, n_t) for bw in bws]
+        gam = _autocov(psi[..., None], bw_h, n_t)
+        for j, bw in enumerate(bw_h):
+            var[:, e, h, j] = eq["scale"] * _kernel_sum(gam, bw, n_t)[:, 0, 0]
+        b[:, e, h] = coef[:, 0]
+        psi_grid[:, eq["t_grid"], q] = psi * np.sqrt(eq["scale"])
+
+    # cumulata del PIL e moltiplicatore: bande degli script e congiunte
+    C = np.tril(np.ones((H1, H1)))
+    X = 100.0 * np.cumsum(b[:, 0], axis=1)
+    Rc = np.cumsum(b[:, 1], axis=1)
+    n_max = max(eq["n_time"] for eq in eqs)
+    bw_joint = [_bw_value(bw, n_max) for bw in bws]
+    gam = _autocov(psi_grid, bw_joint, T)
+    se_cum = np.empty((n_rep, H1, len(bws), 2))
+    se_mult = np.empty((n_rep, H1, len(bws), 2))
+    mult = X / np.maximum(Rc + _STATE["r_share"] * X, 1e-12)
+    for j in range(len(bws)):
+        se = np.sqrt(var[..., j])
+        se_X = 100.0 * np.cumsum(se[:, 0], axis=1)
+        se_R = np.cumsum(se[:, 1], axis=1)
+        se_cum[:, :, j, 0] = se_X
+        _, se_mult[:, :, j, 0] = _delta_mult(X, Rc, se_X**2, se_R**2, 0.0)
+
+        V = _kernel_sum(gam, bw_joint[j], T)
+        Vxx, Vrr, Vxr = V[:, :H1, :H1], V[:, H1:, H1:], V[:, :H1, H1:]
+        var_X = 1e4 * np.einsum("ij,rjk,ik->ri", C, Vxx, C)
+        var_R = np.einsum("ij,rjk,ik->ri", C, Vrr, C)
+        cov_XR = 100.0 * np.einsum("ij,rjk,ik->ri", C, Vxr, C)
+        se_cum[:, :, j, 1] = np.sqrt(var_X)
+        _, se_mult[:, :, j, 1] = _delta_mult(X, Rc, var_X, var_R, cov_XR)
+
+    return {"b": b, "var": var, "cum": X, "se_cum": se_cum,
+            "mult": mult, "se_mult": se_mult}
+
+
+# ============================================================
+# SIMULAZIONE
+# ============================================================
+
+@dataclass
+class MCResult:
+    """
+    Stime per replica: b (R, 2, H+1) coefficienti dello shock per
+    (log_RGDP, PUBINVRATIO) e h, var (R, 2, H+1, B) varianze DK per
+    bandwidth; cum e mult (R, H+1) con se_cum e se_mult (R, H+1, B, 2),
+    ultimo asse = (bande degli script, covarianza congiunta).
+    """
+    setup: MCSetup
+    bandwidths: tuple
+    df_resid: np.ndarray
+    draws: dict
+    n_rep: int
+    seed: int
+
+
+@profiled()
+def run_montecarlo(setup, n_rep=2000, bandwidths=DEFAULT_BANDWIDTHS, seed=2024,
+                   n_jobs=None, batch_size=250):
+    """
+    n_rep panel simulati da setup, stimati in batch da batch_size repliche.
+    n_jobs: processi del pool (None = tutti i core, 1 = nessun pool).
+    """
+    bandwidths = tuple(bandwidths)
+    eqs = _prepare(setup)
+    state = {
+        "eqs": eqs, "bandwidths": bandwidths, "regressors": _regressor_names(setup),
+        "present": setup.present, "holes": setup.holes, "dgp": setup.dgp,
+        "hor": setup.hor, "r_share": setup.r_share,
+    }
+
+    # batch con seed deterministici, indipendenti dal numero di worker
+    sizes = [batch_size] * (n_rep // batch_size)
+    if n_rep % batch_size:
+        sizes.append(n_rep % batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = list(zip(seeds, sizes))
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs == 1 or len(tasks) == 1:
+        _init_worker(state)
+        chunks = [_run_batch(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(state,)) as pool:
+            chunks = list(pool.map(_run_batch, tasks))
+
+    draws = {k: np.concatenate([c[k] for c in chunks]) for k in chunks[0]}
+    df_resid = np.array([eq["df_resid"] for eq in eqs]).reshape(2, setup.hor + 1)
+    return MCResult(setup=setup, bandwidths=bandwidths, df_resid=df_resid,
+                    draws=draws, n_rep=n_rep, seed=seed)
+
+
+# ============================================================
+# COPERTURA E SIZE
+# ============================================================
+
+def _bw_label(bw):
+    return "auto" if bw is None else f"{bw:g}"
+
+
+def _coverage_rows(est, se, true, crit, confints):
+    """
+    Statistiche di copertura per una colonna di stime (R,) con SE (R,).
+    """
+    ok = np.isfinite(est) & np.isfinite(se)
+    est, se = est[ok], se[ok]
+    err = est - true
+    sd = est.std(ddof=1)
+    row = {
+        "n_rep": int(ok.sum()), "true": true, "mean": est.mean(), "bias": err.mean(),
+        "sd": sd, "mean_se": se.mean(),
+        "se_ratio": np.sqrt(np.mean(se**2)) / sd if sd > 0 else np.nan,
+    }
+    for name, c in confints.items():
+        row[f"cov_{name}"] = np.mean(np.abs(err) <= c * se)
+    row["size_5"] = np.mean(np.abs(err) > crit * se)
+    return row
+
+
+def coverage_table(res, confints=CONFINTS):
+    """
+    Una riga per (target, series, method, h, bandwidth):
+      target "irf": coefficienti dello shock per log_RGDP e PUBINVRATIO
+      (method "dk"), size con t(df_resid) come PanelOLS;
+      target "cum": 100 * PIL cumulato, method "sum" (cum_irf) o "joint"
+      (cum_irf_joint); target "multiplier": method "ratio" (mult_from_ratio)
+      o "joint" (mult_from_joint); size con la normale.
+    cov_*: quota di repliche con il valore vero nella banda +/- c*SE.
+    """
+    d, truth = res.draws, res.setup.truth
+    z = stats.norm.ppf(0.975)
+    rows = []
+
+    def add(target, series, method, h, bw, est, se, true, crit):
+        rows.append({"target": target, "series": series, "method": method, "h": h,
+                     "bandwidth": _bw_label(bw),
+                     **_coverage_rows(est, se, true, crit, confints)})
+
+    for j, bw in enumerate(res.bandwidths):
+        for e, series in enumerate((GDP, RATIO)):
+            for h in truth["h"]:
+                crit = stats.t.ppf(0.975, res.df_resid[e, h])
+                add("irf", series, "dk", h, bw, d["b"][:, e, h],
+                    np.sqrt(d["var"][:, e, h, j]), truth[series].iloc[h], crit)
+        for m, method in enumerate(("sum", "joint")):
+            for h in truth["h"]:
+                add("cum", GDP, method, h, bw, d["cum"][:, h],
+                    d["se_cum"][:, h, j, m], truth["cum"].iloc[h], z)
+        for m, method in enumerate(("ratio", "joint")):
+            for h in truth["h"]:
+                add("multiplier", "multiplier", method, h, bw, d["mult"][:, h],
+                    d["se_mult"][:, h, j, m], truth["multiplier"].iloc[h], z)
+    return pd.DataFrame(rows)
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+if __name__ == "__main__":
+    from panel_store import load_panel
+
+    n_rep = int(os.environ.get("LP_MC_REPS", "2000"))
+    n_jobs = os.environ.get("LP_MC_JOBS")
+    out = os.environ.get("LP_MC_OUT")
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    dt = load_panel(os.path.join(here, "data", "data_pubinv_final.csv"), years=(2000, 2023))
+    setup = calibrate(dt)
+    print("DGP calibrato:", {k: np.round(v, 4) for k, v in setup.dgp.items()})
+    print(f"r_share = {setup.r_share:.4f}")
+    print(setup.truth.round(4).to_string(index=False))
+
+    res = run_montecarlo(setup, n_rep=n_rep, n_jobs=int(n_jobs) if n_jobs else None)
+    tbl = coverage_table(res)
+
+    for (target, series, method), g in tbl.groupby(["target", "series", "method"], sort=False):
+        print(f"\n=== {target} / {series} / {method} ({res.n_rep} repliche) ===")
+        print(g.pivot(index="h", columns="bandwidth",
+                      values=["cov_1se", "cov_95", "size_5"]).round(3).to_string())
+        base = g[g["bandwidth"] == "auto"].set_index("h")
+        print(base[["true", "bias", "sd", "mean_se", "se_ratio"]].round(4).to_string())
+
+    if out:
+        tbl.to_csv(out, index=False)
+        print(f"\nTabella salvata in {out}")
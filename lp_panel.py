@@ -0,0 +1,327 @@
+"""
+lp_panel.py
+===========
+Funzioni LP usate da ORIGINAL_MODEL e dai notebook, importabili senza
+eseguire lo script:
+  - lp_lin_panel_py, lp_lin_panel_multi: LP panel come lpirfs (dict
+    irf_panel_mean / low / up), su lp_engine;
+  - lp_interaction_low_high: IRF condizionali ai quantili del moderatore;
+  - cum_irf, mult_from_ratio, mult_from_ratio_windows: IRF cumulate e
+    moltiplicatore delta-method X / (R + r X).
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from lp_engine import PanelDesign, fit_lp_horizons, fit_lp_horizons_multi, interaction_regressors
+from lp_jackknife import jackknife_lp, jackknife_se, loo_multipliers
+from lp_profile import profiled
+
+
+# ============================================================
+# LP PANEL
+# ============================================================
+
+@profiled()
+def lp_lin_panel_py(
+    data_set: pd.DataFrame,
+    endog_data: str,
+    shock: str,
+    l_exog_data: list[str],
+    lags_exog_data: int,
+    hor: int,
+    entity_col: str = "ccode",
+    time_col: str = "year_int",
+    confint: float = 1.0,
+    cumul_mult: bool = True,          # <-- replica default lpirfs
+    dk_bandwidth: int | None = None,  # <-- per provare a matchare vcovSCC
+    engine: str = "numpy",            # "numpy" | "panelols" | "check"
+    design: PanelDesign | None = None,  # riuso del design tra piu stime
+    jackknife: bool = False,          # leave-one-country-out (lp_jackknife)
+):
+    """
+    Local Projections panel per h=0..hor.
+
+    Replica lpirfs (default cumul_mult=TRUE):
+      y_{t+h} - y_{t-1} = a_i + g_t + b_h * shock_t + sum_{k=1..p} Gamma_{h,k} * X_{t-k} + e
+
+    Ritorna un dict con:
+      - irf_panel_mean: array dei b_h
+      - irf_panel_low / up: bande +/- confint*SE
+
+    engine="numpy" usa il motore interno (lp_engine), "panelols" il PanelOLS
+    originale, "check" il motore interno verificato contro PanelOLS.
+    design: PanelDesign gia costruito sullo stesso data_set (opzionale).
+    jackknife=True aggiunge irf_loo (paese escluso x h) e irf_jk_se.
+    """
+    # design denso ordinato una volta: lag/lead sono viste, niente copie per h
+    if design is None:
+        design = PanelDesign(data_set, [endog_data, shock] + list(l_exog_data),
+                             entity_col, time_col)
+
+    # regressori: shock contemporaneo + lags 1..p dei controlli (come lpirfs)
+    regressors = [(shock, design.var(shock))] + design.lagged_regressors(
+        l_exog_data, lags_exog_data
+    )
+
+    # two-way FE: entity_effects + time_effects, NO costante
+    # endog: y_{t+h} - y_{t-1} (lpirfs cumul_mult=TRUE)
+    fits = fit_lp_horizons(design, endog_data, regressors, hor,
+                           cumul_mult=cumul_mult, dk_bandwidth=dk_bandwidth,
+                           engine=engine)
+
+    out = irf_from_fits(fits, shock, confint)
+    if jackknife:
+        jk = jackknife_lp(design, [endog_data], regressors, hor, cumul_mult=cumul_mult)
+        out.update(jackknife_irf(jk, endog_data))
+    return out
+
+
+def jackknife_irf(jk, endog):
+    """
+    Voci irf_loo / irf_jk_se del dict IRF da un LPJackknifeResult.
+    """
+    return {
+        "irf_loo": jk.loo_frame(endog),
+        "irf_jk_se": jk.se(endog),
+    }
+
+
+def irf_from_fits(fits, shock, confint=1.0):
+    """
+    Dict irf_panel_mean / low / up dai risultati per orizzonte.
+    """
+    means, lows, ups = [], [], []
+
+    for res in fits:
+        b = res.params[shock]
+        se = res.std_errors[shock]
+
+        means.append(b)
+        lows.append(b - confint * se)
+        ups.append(b + confint * se)
+
+    return {
+        "irf_panel_mean": np.array(means),
+        "irf_panel_low":  np.array(lows),
+        "irf_panel_up":   np.array(ups),
+    }
+
+
+@profiled()
+def lp_lin_panel_multi(
+    data_set: pd.DataFrame,
+    endog_list: list[str],
+    shock: str,
+    l_exog_data: list[str],
+    lags_exog_data: int,
+    hor: int,
+    entity_col: str = "ccode",
+    time_col: str = "year_int",
+    confint: float = 1.0,
+    cumul_mult: bool = True,
+    dk_bandwidth: int | None = None,
+    engine: str = "numpy",
+    design: PanelDesign | None = None,
+    jackknife: bool = False,
+):
+    """
+    Come lp_lin_panel_py ma per piu variabili dipendenti con gli stessi
+    controlli (es. log_RGDP, PUBINVRATIO, PDEBT con ctrl_base).
+
+    A ogni orizzonte X demeanata e la sua fattorizzazione sono condivise tra
+    gli outcome (sistema multi-RHS); outcome con campioni diversi vengono
+    separati tramite maschere.
+
+    Ritorna {endog: dict come lp_lin_panel_py}.
+    """
+    if design is None:
+        design = PanelDesign(data_set, list(endog_list) + [shock] + list(l_exog_data),
+                             entity_col, time_col)
+
+    regressors = [(shock, design.var(shock))] + design.lagged_regressors(
+        l_exog_data, lags_exog_data
+    )
+
+    fits = fit_lp_horizons_multi(design, endog_list, regressors, hor,
+                                 cumul_mult=cumul_mult, dk_bandwidth=dk_bandwidth,
+                                 engine=engine)
+
+    out = {endog: irf_from_fits(f, shock, confint) for endog, f in fits.items()}
+    if jackknife:
+        jk = jackknife_lp(design, endog_list, regressors, hor, cumul_mult=cumul_mult)
+        for endog in out:
+            out[endog].update(jackknife_irf(jk, endog))
+    return out
+
+
+@profiled()
+def lp_interaction_low_high(
+    data_set: pd.DataFrame,
+    endog_list: list[str],
+    shock: str,
+    corr_col: str,
+    l_exog_data: list[str],
+    lags_exog_data: int,
+    hor: int,
+    entity_col: str = "ccode",
+    time_col: str = "year_int",
+    corr_lag: int = 1,
+    confint: float = 1.0,
+    cumul_mult: bool = True,
+    dk_bandwidth: int | None = None,
+    q_low: float = 0.25,
+    q_high: float = 0.75,
+    center_corr: bool = True,
+):
+    """
+    LP con interazione shock x Corr_{t-corr_lag} (analysis_Corruption) per
+    piu dipendenti con gli stessi controlli.
+
+    IRF condizionali beta_h + theta_h * c ai quantili q_low / q_high del
+    moderatore (centrato), bande +/- confint*SE dalla covarianza di
+    (beta_h, theta_h). Ritorna {endog: {"low": dict IRF, "high": dict IRF}}
+    (dict come lp_lin_panel_py) e (corr_low, corr_high).
+    """
+    design = PanelDesign(data_set, list(endog_list) + [shock, corr_col] + list(l_exog_data),
+                         entity_col, time_col)
+    regressors, inter_name = interaction_regressors(
+        design, shock, corr_col, l_exog_data, lags_exog_data,
+        corr_lag=corr_lag, center_corr=center_corr,
+    )
+    # quantili sulla stessa scala del regressore di interazione
+    corr_l = np.where(design.present, design.lag(corr_col, corr_lag), np.nan)
+    if center_corr:
+        corr_l = corr_l - np.nanmean(corr_l)
+    c_low, c_high = np.nanquantile(corr_l, [q_low, q_high])
+
+    fits = fit_lp_horizons_multi(design, endog_list, regressors, hor,
+                                 cumul_mult=cumul_mult, dk_bandwidth=dk_bandwidth)
+    out = {}
+    for endog, f in fits.items():
+        b = np.array([res.params[shock] for res in f])
+        t = np.array([res.params[inter_name] for res in f])
+        V = np.array([np.asarray(res.cov.loc[[shock, inter_name], [shock, inter_name]],
+                                 dtype=float) for res in f])
+        out[endog] = {}
+        for name, c in [("low", c_low), ("high", c_high)]:
+            mu = b + t * c
+            se = np.sqrt(np.maximum(V[:, 0, 0] + c**2 * V[:, 1, 1] + 2.0 * c * V[:, 0, 1], 0.0))
+            out[endog][name] = {
+                "irf_panel_mean": mu,
+                "irf_panel_low": mu - confint * se,
+                "irf_panel_up": mu + confint * se,
+            }
+    return out, (float(c_low), float(c_high))
+
+
+# ============================================================
+# IRF CUMULATE E MOLTIPLICATORI
+# ============================================================
+
+def cum_irf(obj, scale=1.0):
+    mu = np.asarray(obj["irf_panel_mean"], dtype=float) * scale
+    lo = np.asarray(obj["irf_panel_low"], dtype=float)  * scale
+    hi = np.asarray(obj["irf_panel_up"], dtype=float)   * scale
+
+    h = np.arange(len(mu))
+    return pd.DataFrame({
+        "h": h,
+        "cum": np.cumsum(mu),
+        "lo":  np.cumsum(lo),
+        "hi":  np.cumsum(hi),
+    })
+
+
+def se_from_bands(mid, lo, hi):
+    mid = np.asarray(mid)
+    lo  = np.asarray(lo)
+    hi  = np.asarray(hi)
+    return 0.5 * ((hi - mid) + (mid - lo))
+
+
+def mult_from_ratio(gdp_lp, ratio_lp, r_share, r_share_loo=None):
+    """
+    Moltiplicatore cumulato X / (R + r X) con bande delta-method (+/- 1 SE).
+
+    Se gdp_lp e ratio_lp hanno irf_loo (jackknife=True) si aggiungono
+    jk_se, jk_lo_1se, jk_hi_1se dai moltiplicatori senza ciascun paese;
+    r_share_loo (Serie per paese, es. loo_r_share) ricalcola anche la
+    quota media senza il paese (default: r_share fisso).
+    """
+    gdp_c = cum_irf(gdp_lp, scale=100.0).rename(columns={"cum": "X", "lo": "X_lo", "hi": "X_hi"})
+    ratio_c = cum_irf(ratio_lp, scale=1.0).rename(columns={"cum": "R", "lo": "R_lo", "hi": "R_hi"})
+
+    out = gdp_c.merge(ratio_c, on="h", how="left")
+
+    se_X = se_from_bands(out["X"], out["X_lo"], out["X_hi"])
+    se_R = se_from_bands(out["R"], out["R_lo"], out["R_hi"])
+
+    se_X = np.asarray(se_X, dtype=float)
+    se_R = np.asarray(se_R, dtype=float)
+
+    den_pp = out["R"] + r_share * out["X"]
+    Dsafe = np.maximum(np.asarray(den_pp, dtype=float), 1e-12)
+
+    X = np.asarray(out["X"], dtype=float)
+    R = np.asarray(out["R"], dtype=float)
+
+    mult = X / Dsafe
+    dMdX = R / (Dsafe**2)
+    dMdR = -X / (Dsafe**2)
+
+    se_M = np.sqrt((dMdX**2) * (se_X**2) + (dMdR**2) * (se_R**2))
+
+    tbl = pd.DataFrame({
+        "h": out["h"].to_numpy(),
+        "multiplier": mult,
+        "lo_1se": mult - se_M,
+        "hi_1se": mult + se_M
+    })
+
+    if "irf_loo" in gdp_lp and "irf_loo" in ratio_lp:
+        loo = loo_multipliers(gdp_lp["irf_loo"], ratio_lp["irf_loo"],
+                              r_share if r_share_loo is None else r_share_loo)
+        se_jk = jackknife_se(loo.to_numpy())
+        tbl["jk_se"] = se_jk
+        tbl["jk_lo_1se"] = mult - se_jk
+        tbl["jk_hi_1se"] = mult + se_jk
+    return tbl
+
+
+def mult_from_ratio_windows(win_tbl, r_shares, gdp="log_RGDP", ratio="PUBINVRATIO"):
+    """
+    mult_from_ratio per ogni finestra di lp_window_panel (bande +/- 1 SE,
+    come mult_from_ratio).
+
+    win_tbl: tabella tidy delle finestre (term "beta"); r_shares: Serie per
+    (start, end), es. window_r_share. Ritorna le tabelle di mult_from_ratio
+    impilate con le colonne start, end. Le finestre in cui GDP e ratio non
+    hanno gli stessi orizzonti stimati sono escluse con un warning.
+    """
+    beta = win_tbl[win_tbl["term"] == "beta"]
+    out = []
+    for (a, b), grp in beta.groupby(["start", "end"], sort=True):
+        lp, hs = {}, {}
+        for endog in (gdp, ratio):
+            g = grp[grp["endog"] == endog].sort_values("h")
+            est, se = g["estimate"].to_numpy(), g["se"].to_numpy()
+            hs[endog] = g["h"].tolist()
+            lp[endog] = {
+                "irf_panel_mean": est,
+                "irf_panel_low": est - se,
+                "irf_panel_up": est + se,
+            }
+        if hs[gdp] != hs[ratio]:
+            warnings.warn(
+                f"finestra {a}-{b} esclusa: orizzonti stimati diversi "
+                f"({gdp}: {hs[gdp]}, {ratio}: {hs[ratio]})", stacklevel=2,
+            )
+            continue
+        tbl = mult_from_ratio(lp[gdp], lp[ratio], r_shares[(a, b)])
+        tbl.insert(0, "end", b)
+        tbl.insert(0, "start", a)
+        out.append(tbl)
+    return pd.concat(out, ignore_index=True)
@@ -0,0 +1,322 @@
+"""
+lp_profile.py
+=============
+Strumentazione per fasi della pipeline LP: tempo (wall-clock), righe e
+colonne, picco di memoria per fase, orizzonte e specificazione.
+
+Spenta di default: stage() e tags() ritornano un context manager vuoto
+condiviso e note() esce subito, quindi il costo e un controllo su una
+variabile globale per fase. Accesa (enable_profiling / profiling), ogni fase
+produce un record con
+
+  stage  : percorso della fase (es. "fit_lp_horizons/sample")
+  seconds: tempo totale della fase, self_s: al netto delle sotto-fasi
+  rows, cols: dimensioni dei dati della fase (se note)
+  peak_mb: picco di memoria allocata durante la fase (memory=True,
+           tracemalloc: rallenta, solo per diagnosi)
+  + i tag attivi (h, endog, spec, task, ...).
+
+Le fasi nei worker (lp_grid, task_dag) vengono raccolte nel worker e
+rimandate al processo principale. report() aggrega i record per fase ed
+export() li salva (CSV / Parquet) per confrontare esecuzioni.
+
+Uso:
+    from lp_profile import profiling
+    with profiling() as prof:
+        run_spec_grid(...)
+    print(prof.report())
+
+oppure dagli script LP_PROFILE=1 (LP_PROFILE=mem anche con la memoria;
+LP_PROFILE_OUT=percorso.csv|.parquet per salvare i record).
+"""
+
+import contextlib
+import functools
+import os
+import time
+import tracemalloc
+
+import pandas as pd
+
+
+_ACTIVE = None
+_NULL = contextlib.nullcontext()
+
+
+class Profiler:
+    """
+    Raccoglie i record delle fasi. memory=True misura anche il picco di
+    memoria (tracemalloc).
+    """
+
+    def __init__(self, memory=False, tags=None):
+        self.memory = memory
+        self.records = []
+        self._tags = dict(tags or {})
+        self._open = []
+
+    # --------------------------------------------------------
+    # fasi e tag
+    # --------------------------------------------------------
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None, cols=None):
+        parent = self._open[-1] if self._open else None
+        rec = {
+            "stage": name if parent is None else f"{parent['stage']}/{name}",
+            "seconds": 0.0, "self_s": 0.0,
+            "rows": None if rows is None else int(rows),
+            "cols": None if cols is None else int(cols),
+            "peak_mb": None, **self._tags, "_child": 0.0,
+        }
+        if self.memory:
+            cur, peak = tracemalloc.get_traced_memory()
+            for r in self._open:
+                r["_peak"] = max(r["_peak"], peak)
+            tracemalloc.reset_peak()
+            rec["_base"], rec["_peak"] = cur, cur
+        self._open.append(rec)
+        t0 = time.perf_counter()
+        try:
+            yield rec
+        finally:
+            secs = time.perf_counter() - t0
+            self._open.pop()
+            rec["seconds"] = secs
+            # sotto-fasi in parallelo (worker) possono superare il wall-clock
+            rec["self_s"] = max(secs - rec.pop("_child"), 0.0)
+            if parent is not None:
+                parent["_child"] += secs
+            if self.memory:
+                _, peak = tracemalloc.get_traced_memory()
+                peak = max(rec.pop("_peak"), peak)
+                rec["peak_mb"] = (peak - rec.pop("_base")) / 2**20
+                if parent is not None:
+                    parent["_peak"] = max(parent["_peak"], peak)
+            self.records.append(rec)
+
+    @contextlib.contextmanager
+    def tags(self, **kw):
+        old = self._tags
+        self._tags = {**old, **kw}
+        try:
+            yield
+        finally:
+            self._tags = old
+
+    def note(self, rows=None, cols=None):
+        """
+        Dimensioni della fase aperta piu interna.
+        """
+        if not self._open:
+            return
+        rec = self._open[-1]
+        if rows is not None:
+            rec["rows"] = int(rows)
+        if cols is not None:
+            rec["cols"] = int(cols)
+
+    def extend(self, records):
+        """
+        Aggiunge record di un altro Profiler (es. di un worker), con i tag
+        attivi qui e le fasi sotto quella aperta.
+        """
+        parent = self._open[-1] if self._open else None
+        for rec in records:
+            rec = {**self._tags, **rec}
+            if parent is not None:
+                if "/" not in rec["stage"]:
+                    parent["_child"] += rec["seconds"]
+                rec["stage"] = f"{parent['stage']}/{rec['stage']}"
+            self.records.append(rec)
+
+    # --------------------------------------------------------
+    # output
+    # --------------------------------------------------------
+
+    def frame(self):
+        return pd.DataFrame(self.records)
+
+    def report(self, by=("stage",)):
+        """
+        Aggregato per fase (o per le colonne in by, es. ("stage", "h")):
+        chiamate, tempo totale e proprio, media e massimo in ms, quota del
+        tempo totale, righe medie, colonne e picco di memoria massimi.
+        """
+        df = self.frame()
+        if df.empty:
+            return df
+        by = [c for c in by if c in df.columns]
+        total = df.loc[~df["stage"].str.contains("/"), "seconds"].sum()
+        agg = df.groupby(by, sort=False, dropna=False).agg(
+            calls=("seconds", "size"),
+            total_s=("seconds", "sum"),
+            self_s=("self_s", "sum"),
+            mean_ms=("seconds", "mean"),
+            max_ms=("seconds", "max"),
+            rows=("rows", "mean"),
+            cols=("cols", "max"),
+            peak_mb=("peak_mb", "max"),
+        )
+        agg[["mean_ms", "max_ms"]] *= 1000.0
+        agg["share"] = agg["self_s"] / total if total > 0 else float("nan")
+        return agg.sort_values("self_s", ascending=False)
+
+    def export(self, path):
+        """
+        Salva i record (.parquet o .csv) e ritorna il percorso.
+        """
+        df = self.frame()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if path.endswith(".parquet"):
+            df.to_parquet(path, index=False)
+        else:
+            df.to_csv(path, index=False)
+        return path
+
+
+# ============================================================
+# API DI MODULO (no-op se spenta)
+# ============================================================
+
+def stage(name, rows=None, cols=None):
+    prof = _ACTIVE
+    if prof is None:
+        return _NULL
+    return prof.stage(name, rows, cols)
+
+
+def tags(**kw):
+    prof = _ACTIVE
+    if prof is None:
+        return _NULL
+    return prof.tags(**kw)
+
+
+def note(rows=None, cols=None):
+    prof = _ACTIVE
+    if prof is not None:
+        prof.note(rows, cols)
+
+
+def profiled(name=None):
+    """
+    Decoratore: tutta la funzione come una fase (nome di default: quello
+    della funzione).
+    """
+    def deco(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            prof = _ACTIVE
+            if prof is None:
+                return fn(*args, **kwargs)
+            with prof.stage(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def get_profiler():
+    return _ACTIVE
+
+
+def enable_profiling(memory=False):
+    """
+    Attiva un nuovo Profiler e lo ritorna.
+    """
+    global _ACTIVE
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _ACTIVE = Profiler(memory=memory)
+    return _ACTIVE
+
+
+def disable_profiling():
+    """
+    Spegne la strumentazione e ritorna il Profiler che era attivo.
+    """
+    global _ACTIVE
+    prof, _ACTIVE = _ACTIVE, None
+    if prof is not None and prof.memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return prof
+
+
+@contextlib.contextmanager
+def profiling(memory=False):
+    global _ACTIVE
+    old = _ACTIVE
+    prof = enable_profiling(memory)
+    try:
+        yield prof
+    finally:
+        _ACTIVE = old
+        if memory and old is None and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def profile_from_env():
+    """
+    LP_PROFILE=1: tempi; LP_PROFILE=mem: tempi e memoria. Altrimenti None.
+    """
+    mode = os.environ.get("LP_PROFILE", "0")
+    if mode in ("", "0"):
+        return None
+    return enable_profiling(memory=(mode == "mem"))
+
+
+def report_from_env(prof, by=("stage",)):
+    """
+    Fine script: testo del report e, se LP_PROFILE_OUT e impostata,
+    export dei record in quel file. Stringa vuota se prof e None.
+    """
+    if prof is None:
+        return ""
+    out = os.environ.get("LP_PROFILE_OUT")
+    text = prof.report(by).to_string(float_format=lambda v: f"{v:.4g}")
+    if out:
+        text += f"\nProfilo salvato in {prof.export(out)}"
+    return text
+
+
+# ============================================================
+# WORKER (lp_grid, task_dag)
+# ============================================================
+
+def profile_config():
+    """
+    Configurazione da passare ai worker (None se spenta).
+    """
+    prof = _ACTIVE
+    if prof is None:
+        return None
+    return {"memory": prof.memory}
+
+
+@contextlib.contextmanager
+def worker_profiling(config):
+    """
+    Nel worker: Profiler locale per la durata di un compito. Restituisce il
+    Profiler (None se config e None); i suoi records vanno rimandati al
+    processo principale e aggiunti con merge_records.
+    """
+    global _ACTIVE
+    if config is None:
+        yield None
+        return
+    old = _ACTIVE
+    if config["memory"] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _ACTIVE = Profiler(memory=config["memory"])
+    try:
+        yield _ACTIVE
+    finally:
+        _ACTIVE = old
+
+
+def merge_records(records):
+    prof = _ACTIVE
+    if prof is not None and records:
+        prof.extend(records)
@@ -0,0 +1,292 @@
+"""
+lp_smooth.py
+============
+Smooth Local Projections (Barnichon-Brownlees) per il panel two-way:
+tutti gli orizzonti stimati insieme, con la IRF beta(h) rappresentata su
+una base B-spline e una penalita ridge sulle differenze dei coefficienti.
+
+Modello impilato per h = 0..H (effetti paese/anno e controlli propri di
+ciascun orizzonte, come nelle LP per orizzonte):
+
+    y_{i,t+h} - y_{i,t-1} = a_{i,h} + g_{t,h} + beta(h) s_{it} + G_h X_{it} + e
+    beta(h) = B(h)' theta,   min  SSR + lam * theta' P theta
+
+con P = D_r'D_r (differenze di ordine r dei coefficienti, P-spline):
+lam -> inf porta beta(h) verso un polinomio di grado r - 1 in h. Gli
+effetti fissi e i controlli non sono penalizzati, quindi per Frisch-Waugh
+si tolgono orizzonte per orizzonte (twoway_ols) e il problema impilato si
+riduce a K coefficienti: servono solo le somme per (h, anno) di s~^2,
+s~ y~ e y~^2 (s~, y~: shock e dipendente al netto di effetti e controlli).
+
+La base ha K = H + 1 funzioni (B-spline cubiche clampate, grado ridotto se
+H < 3), quindi con lam = 0 le stime coincidono con fit_lp_horizons e la
+covarianza con il blocco di fit_lp_joint.
+
+lam si sceglie per cross-validation a blocchi di anni contigui: per ogni
+fold si fattorizza una volta (autovalori generalizzati di (A_-g, P)) e la
+soluzione per tutta la griglia e una riscalatura diagonale. I residui
+parziali sono calcolati una volta sul campione intero. Se il minimo cade
+al bordo della griglia (cv_edge) si emette un warning: al bordo alto
+beta(h) e di fatto un polinomio di grado r - 1 imposto dalla penalita.
+cv_spread misura quanto la CV discrimina tra i valori della griglia.
+
+Covarianza DK del vettore beta come in fit_lp_joint (momenti per anno della
+griglia, sommati sugli orizzonti, correzione n/(n - df) per orizzonte).
+Le bande ignorano la distorsione da smoothing (come nel lavoro originale).
+"""
+
+import warnings
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy.interpolate import BSpline
+from scipy.linalg import eigh
+
+from lp_engine import (
+    PanelDesign, dk_default_bandwidth, dk_meat, lp_dependent,
+    lp_regressors, twoway_ols,
+)
+from lp_profile import profiled, stage, tags
+
+
+# griglia di penalita relativa: lam = rel * tr(A) / tr(P)
+DEFAULT_LAMBDAS = np.concatenate([[0.0], np.logspace(-4, 3, 36)])
+
+
+# ============================================================
+# BASE E PENALITA
+# ============================================================
+
+def bspline_basis(hor, degree=3):
+    """
+    Matrice (H+1) x (H+1) delle B-spline clampate valutate in h = 0..H,
+    nodi interni equispaziati; grado min(degree, H).
+    """
+    H = int(hor)
+    if H == 0:
+        return np.ones((1, 1))
+    k = min(int(degree), H)
+    inner = np.linspace(0.0, H, H - k + 2)[1:-1]
+    knots = np.concatenate([np.zeros(k + 1), inner, np.full(k + 1, float(H))])
+    return BSpline.design_matrix(np.arange(H + 1, dtype=float), knots, k).toarray()
+
+
+def diff_penalty(n_coef, order=2):
+    """
+    P = D'D con D differenze di ordine order (P-spline di Eilers-Marx).
+    """
+    order = min(int(order), n_coef - 1)
+    D = np.diff(np.eye(n_coef), n=order, axis=0)
+    return D.T @ D
+
+
+# ============================================================
+# STIMA
+# ============================================================
+
+@dataclass
+class LPSmoothResult:
+    """
+    IRF smooth di una equazione: coef (H+1), cov (H+1 x H+1) DK, lam
+    scelta (assoluta e relativa), tabella di cross-validation (lam_rel,
+    lam, cv_mse) e coefficienti theta sulla base. cv_edge: "low" / "high"
+    se la lam scelta e al bordo della griglia ("" altrimenti o con lam
+    fissa); cv_spread: (max - min) / min del MSE di cross-validation.
+    """
+    endog: str
+    coef: np.ndarray
+    cov: np.ndarray
+    lam: float
+    lam_rel: float
+    cv: pd.DataFrame
+    theta: np.ndarray
+    basis: np.ndarray
+    nobs: np.ndarray
+    bandwidth: float
+    cv_edge: str = ""
+    cv_spread: float = np.nan
+
+    @property
+    def se(self):
+        return np.sqrt(np.maximum(np.diag(self.cov), 0.0))
+
+    def irf(self, confint=1.0):
+        """
+        Dict come lp_lin_panel_py (irf_panel_mean / low / up): va
+        direttamente in cum_irf e mult_from_ratio.
+        """
+        return {
+            "irf_panel_mean": self.coef.copy(),
+            "irf_panel_low": self.coef - confint * self.se,
+            "irf_panel_up": self.coef + confint * self.se,
+        }
+
+
+def _partial_horizons(design, endog, regressors, hor, cumul_mult=True):
+    """
+    Per h = 0..H: anno (sulla griglia) di ogni riga, shock e dipendente al
+    netto di effetti two-way e controlli, correzione DK n/(n - df) e anni.
+    """
+    X_cube = np.stack([arr for _, arr in regressors], axis=-1)
+    x_ok = design.present & np.isfinite(X_cube).all(axis=-1)
+    out = []
+    for h in range(hor + 1):
+        y = lp_dependent(design, endog, h, cumul_mult)
+        mask = x_ok & np.isfinite(y)
+        e_idx, t_idx = np.nonzero(mask)
+        with tags(h=h):
+            ols = twoway_ols(y[mask][:, None], X_cube[mask], e_idx, t_idx)
+        # Frisch-Waugh: riga dello shock di (X'X)^{-1} X' = s~' / s~'s~
+        a = ols["xpx_inv"][0]
+        s = ols["xd"] @ a / a[0]
+        b = ols["B"][0, 0]
+        out.append({
+            "t": t_idx, "s": s, "y": ols["E"][:, 0] + s * b,
+            "scale": ols["nobs"] / (ols["nobs"] - ols["cov_df"]),
+            "n_time": ols["n_time"], "nobs": ols["nobs"],
+        })
+    return out
+
+
+def _year_moments(parts, n_grid):
+    """
+    Somme per (h, anno della griglia) di s~^2, s~ y~, y~^2: (H+1, T) ciascuna.
+    """
+    S = np.array([np.bincount(p["t"], p["s"] ** 2, n_grid) for p in parts])
+    C = np.array([np.bincount(p["t"], p["s"] * p["y"], n_grid) for p in parts])
+    Q = np.array([np.bincount(p["t"], p["y"] ** 2, n_grid) for p in parts])
+    return S, C, Q
+
+
+def _ridge_path(A, r, P, lams):
+    """
+    theta(lam) = (A + lam P)^{-1} r per tutta la griglia con una sola
+    fattorizzazione: P v = d A v, V'AV = I => (A + lam P)^{-1} =
+    V diag(1 / (1 + lam d)) V'. Ritorna (len(lams), K).
+    """
+    d, V = eigh(P, A)
+    d = np.maximum(d, 0.0)
+    return (V.T @ r)[None, :] / (1.0 + np.outer(lams, d)) @ V.T
+
+
+def _cv_path(S, C, Q, B, P, lams, n_folds):
+    """
+    MSE di cross-validation per ogni lam: fold = blocchi di anni contigui
+    (tra quelli osservati), stima sugli altri anni, errore sul blocco.
+    """
+    years = np.flatnonzero(S.sum(axis=0) > 0)
+    folds = np.array_split(years, min(int(n_folds), len(years)))
+    sse = np.zeros(len(lams))
+    for fold in folds:
+        Sg, Cg, Qg = S[:, fold].sum(axis=1), C[:, fold].sum(axis=1), Q[:, fold].sum(axis=1)
+        A = B.T @ ((S.sum(axis=1) - Sg)[:, None] * B)
+        r = B.T @ (C.sum(axis=1) - Cg)
+        beta = _ridge_path(A, r, P, lams) @ B.T             # (L, H+1)
+        sse += (Qg - 2.0 * beta * Cg + beta**2 * Sg).sum(axis=1)
+    return sse / S.sum()
+
+
+def _cv_edge(rel, mse):
+    """
+    "low" / "high" se il minimo del MSE e al primo / ultimo valore della
+    griglia ("" altrimenti). lam = 0 non e un bordo: e la LP per orizzonte.
+    """
+    pos = int(np.argmin(mse))
+    if pos == len(rel) - 1 and len(rel) > 1:
+        return "high"
+    if pos == 0 and rel[0] > 0:
+        return "low"
+    return ""
+
+
+@profiled()
+def fit_lp_smooth(design, endog, regressors, hor, cumul_mult=True, lambdas=None,
+                  lam=None, n_folds=5, degree=3, order=2, dk_bandwidth=None):
+    """
+    Smooth LP di endog sullo shock (primo regressore) per h = 0..hor.
+
+    lambdas: griglia relativa (lam / (tr(A) / tr(P))) per la
+    cross-validation, default DEFAULT_LAMBDAS; lam: valore relativo fisso
+    (salta la cross-validation, 0 = LP per orizzonte). n_folds: blocchi di
+    anni della cross-validation. degree, order: grado delle B-spline e
+    ordine delle differenze penalizzate.
+    """
+    n_grid = design.shape[1]
+    with stage("partial"):
+        parts = _partial_horizons(design, endog, regressors, hor, cumul_mult)
+    S, C, Q = _year_moments(parts, n_grid)
+
+    B = bspline_basis(hor, degree)
+    P = diff_penalty(B.shape[1], order)
+    A = B.T @ (S.sum(axis=1)[:, None] * B)
+    unit = np.trace(A) / max(np.trace(P), 1e-300)
+
+    rel = np.asarray(DEFAULT_LAMBDAS if lambdas is None else lambdas, dtype=float)
+    edge, spread = "", np.nan
+    if lam is None:
+        with stage("cv", cols=len(rel)):
+            mse = _cv_path(S, C, Q, B, P, rel * unit, n_folds)
+        lam_rel = float(rel[np.argmin(mse)])
+        edge = _cv_edge(rel, mse)
+        spread = float((mse.max() - mse.min()) / mse.min())
+        if edge:
+            warnings.warn(
+                f"fit_lp_smooth({endog}, hor={hor}): lam scelta al bordo {edge} della "
+                f"griglia (lam_rel={lam_rel:g}, variazione del MSE di CV {spread:.2%})",
+                stacklevel=3,
+            )
+    else:
+        mse = np.full(len(rel), np.nan)
+        lam_rel = float(lam)
+    cv = pd.DataFrame({"lam_rel": rel, "lam": rel * unit, "cv_mse": mse})
+
+    theta = _ridge_path(A, B.T @ C.sum(axis=1), P, np.array([lam_rel * unit]))[0]
+    coef = B @ theta
+
+    # DK: influenza su theta dei momenti per anno, sommati sugli orizzonti
+    with stage("cov"):
+        G = np.linalg.inv(A + lam_rel * unit * P)
+        xi = np.zeros((n_grid, B.shape[1]))
+        for h, p in enumerate(parts):
+            u = p["s"] * (p["y"] - p["s"] * coef[h]) * np.sqrt(p["scale"])
+            xi += np.outer(np.bincount(p["t"], u, n_grid), B[h])
+        bw = (dk_default_bandwidth(max(p["n_time"] for p in parts))
+              if dk_bandwidth is None else dk_bandwidth)
+        V = B @ G @ dk_meat(xi, bw) @ G @ B.T
+    return LPSmoothResult(
+        endog=endog, coef=coef, cov=(V + V.T) / 2, lam=lam_rel * unit, lam_rel=lam_rel,
+        cv=cv, theta=theta, basis=B, nobs=np.array([p["nobs"] for p in parts]),
+        bandwidth=bw, cv_edge=edge, cv_spread=spread,
+    )
+
+
+@profiled()
+def lp_smooth_panel(data_set, endog_list, shock, l_exog_data, lags_exog_data, hor,
+                    entity_col="ccode", time_col="year_int", confint=1.0,
+                    cumul_mult=True, dk_bandwidth=None, lambdas=None, lam=None,
+                    n_folds=5, degree=3, order=2, design=None):
+    """
+    Smooth LP con i regressori di lp_lin_panel_py (shock + lags dei
+    controlli) per ogni variabile in endog_list; lam scelta per equazione.
+
+    Ritorna {endog: dict come lp_lin_panel_py} con in piu lam, lam_rel,
+    cv (tabella della cross-validation), cv_edge e cv_spread: cum_irf e
+    mult_from_ratio li usano come le LP per orizzonte.
+    """
+    if isinstance(endog_list, str):
+        endog_list = [endog_list]
+    if design is None:
+        design = PanelDesign(data_set, list(endog_list) + [shock] + list(l_exog_data),
+                             entity_col, time_col)
+    regressors = lp_regressors(design, shock, l_exog_data, lags_exog_data)
+
+    out = {}
+    for endog in dict.fromkeys(endog_list):
+        with tags(endog=endog):
+            res = fit_lp_smooth(design, endog, regressors, hor, cumul_mult=cumul_mult,
+                                lambdas=lambdas, lam=lam, n_folds=n_folds, degree=degree,
+                                order=order, dk_bandwidth=dk_bandwidth)
+        out[endog] = {**res.irf(confint), "lam": res.lam, "lam_rel": res.lam_rel,
+                      "cv": res.cv, "cv_edge": res.cv_edge, "cv_spread": res.cv_spread}
+    return out
@@ -0,0 +1,301 @@
+"""
+lp_window.py
+============
+Local Projections su finestre di anni mobili (rolling) o crescenti
+(expanding) senza ristimare da zero a ogni finestra.
+
+Con effetti paese + anno l'effetto di un anno tocca solo le righe di
+quell'anno: togliendo la media per anno (dummy anno) e tenendo i paesi come
+dummy esplicite, le equazioni normali sono una somma di blocchi annuali
+
+    S_t = Z_t' M_t Z_t,   g_t = Z_t' M_t Y_t,   Z_t = [X_t, E_t]
+
+(M_t: demean sulla sezione dell'anno t). Con le somme cumulate dei blocchi
+una finestra costa una differenza C_b - C_a e una solve (K + N), e spostare
+la finestra aggiunge o toglie la sezione di un anno. Anche i momenti per
+anno della DK vengono dai blocchi: xi_t = g_t - S_t b (righe dei
+regressori, moltiplicate per l'inversa), quindi SE Driscoll-Kraay e gradi
+di liberta coincidono con fit_lp_horizons sul panel tagliato alla finestra.
+
+La finestra e sugli anni dei DATI, come un filtro year_int del campione:
+con dati [a, b] la riga dell'anno t entra se t - back >= a (lag dei
+controlli e y_{t-1}) e t + h <= b (lead), sull'asse degli anni osservati.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from lp_engine import (
+    PanelDesign, dk_default_bandwidth, dk_meat, get_default_cache,
+    interaction_regressors, lp_dependent, lp_regressors,
+)
+from lp_grid import sample_r_share
+from lp_profile import profiled
+
+
+# ============================================================
+# FINESTRE
+# ============================================================
+
+def window_list(years, mode="expanding", width=10, start=None, first_end=None):
+    """
+    Lista di finestre (anno iniziale, anno finale) sugli anni osservati.
+
+    mode="expanding": inizio fisso (start, default il primo anno) e fine
+    crescente da first_end (default inizio + width - 1);
+    mode="rolling": width anni osservati consecutivi per finestra.
+    """
+    years = np.sort(np.unique(np.asarray(years, dtype=int)))
+    if mode == "rolling":
+        return [(int(years[i]), int(years[i + width - 1]))
+                for i in range(len(years) - width + 1)]
+    if mode != "expanding":
+        raise ValueError(f"mode {mode!r} non valido (expanding | rolling)")
+    a = int(years[0]) if start is None else int(start)
+    inside = years[years >= a]
+    if first_end is None:
+        first_end = inside[min(width, len(inside)) - 1]
+    return [(a, int(b)) for b in inside if b >= first_end]
+
+
+def _positions(time_labels, windows):
+    """
+    (inizio, fine) in anni -> posizioni sull'asse del design (inclusive).
+    """
+    pa = np.searchsorted(time_labels, [a for a, _ in windows], side="left")
+    pb = np.searchsorted(time_labels, [b for _, b in windows], side="right") - 1
+    return pa, pb
+
+
+# ============================================================
+# BLOCCHI ANNUALI
+# ============================================================
+
+def year_blocks(Y, X, e_idx, t_idx, n_entity, n_time):
+    """
+    Blocchi annuali demeanati per anno: S (T, P, P), g (T, P, m), conteggi
+    per anno e paese cnt (T, N), con P = K + N (regressori + dummy paese).
+    """
+    k, m = X.shape[1], Y.shape[1]
+    P = k + n_entity
+    Zc = np.zeros((n_time, n_entity, P))
+    Yc = np.zeros((n_time, n_entity, m))
+    Zc[t_idx, e_idx, :k] = X
+    Zc[t_idx, e_idx, k + e_idx] = 1.0
+    Yc[t_idx, e_idx] = Y
+
+    cnt = np.zeros((n_time, n_entity))
+    cnt[t_idx, e_idx] = 1.0
+    n_t = cnt.sum(axis=1)
+    inv = np.divide(1.0, n_t, out=np.zeros_like(n_t), where=n_t > 0)
+
+    ZT = np.swapaxes(Zc, 1, 2)
+    zs, ys = Zc.sum(axis=1), Yc.sum(axis=1)
+    S = ZT @ Zc - inv[:, None, None] * zs[:, :, None] * zs[:, None, :]
+    g = ZT @ Yc - inv[:, None, None] * zs[:, :, None] * ys[:, None, :]
+    return S, g, cnt
+
+
+def _prefix(a):
+    """
+    Somme cumulate con uno zero davanti: sum(a[lo:hi+1]) = C[hi+1] - C[lo].
+    """
+    return np.concatenate([np.zeros((1,) + a.shape[1:]), np.cumsum(a, axis=0)])
+
+
+@profiled()
+def window_fits(design, endog_list, regressors, hor, windows, back=1,
+                cumul_mult=True, dk_bandwidth=None, debiased=True, cache=None):
+    """
+    Stime two-way FE + DK per ogni finestra, orizzonte e dipendente.
+
+    back: anni di lag richiesti dai regressori e dalla dipendente (es.
+    max(lags, 1) con cumul_mult). Ritorna un dict
+    {(finestra, endog, h): dict(coef, cov, nobs, df_resid)} con coef (K,)
+    e cov (K, K); finestre senza abbastanza osservazioni sono omesse.
+    cache: come in fit_lp_horizons (namespace "window").
+    """
+    endog_list = list(dict.fromkeys(endog_list))
+    if cache is None:
+        cache = get_default_cache()
+    key = None
+    if cache is not None:
+        key = cache.data_key("window", design, endog_list, regressors, hor, cumul_mult,
+                             spec=([tuple(map(int, w)) for w in windows], int(back),
+                                   dk_bandwidth, bool(debiased)))
+        hit = cache.get_arrays(key)
+        if hit is not None:
+            return _windows_from_arrays(hit, endog_list)
+
+    X_cube = np.stack([arr for _, arr in regressors], axis=-1)
+    x_ok = design.present & np.isfinite(X_cube).all(axis=-1)
+    N, T = design.shape
+    k = X_cube.shape[-1]
+    pa, pb = _positions(design.time_labels, windows)
+
+    out = {}
+    for h in range(0, hor + 1):
+        Y_cube = np.stack(
+            [lp_dependent(design, endog, h, cumul_mult) for endog in endog_list], axis=-1
+        )
+        masks = x_ok[..., None] & np.isfinite(Y_cube)
+
+        groups = {}
+        for j in range(len(endog_list)):
+            groups.setdefault(masks[..., j].tobytes(), []).append(j)
+
+        for cols in groups.values():
+            mask = masks[..., cols[0]]
+            e_idx, t_idx = np.nonzero(mask)
+            S, g, cnt = year_blocks(Y_cube[mask][:, cols], X_cube[mask], e_idx, t_idx, N, T)
+            CS, Cg, Cc = _prefix(S), _prefix(g), _prefix(cnt)
+
+            for w, win in enumerate(windows):
+                lo, hi = pa[w] + back, pb[w] - h
+                if hi < lo:
+                    continue
+                c_e = Cc[hi + 1] - Cc[lo]
+                ent = np.flatnonzero(c_e > 0)
+                yrs = lo + np.flatnonzero(cnt[lo:hi + 1].sum(axis=1) > 0)
+                n = int(c_e.sum())
+                extra_df = len(ent) + len(yrs) - 1
+                if len(ent) < 2 or n - k - extra_df <= 0:
+                    continue
+
+                # dummy paese attive, meno una (collineare con le dummy anno)
+                sel = np.concatenate([np.arange(k), k + ent[1:]])
+                G = (CS[hi + 1] - CS[lo])[np.ix_(sel, sel)]
+                try:
+                    G_inv = np.linalg.inv(G)
+                except np.linalg.LinAlgError:
+                    continue
+                B = G_inv @ (Cg[hi + 1] - Cg[lo])[sel]
+
+                # momenti per anno gia moltiplicati per (X~'X~)^{-1}
+                r = g[yrs][:, sel] - S[yrs][:, sel][:, :, sel] @ B
+                Psi = np.einsum("ap,tpm->tma", G_inv[:k], r)
+
+                bw = dk_default_bandwidth(len(yrs)) if dk_bandwidth is None else dk_bandwidth
+                scale = n / (n - (extra_df + k if debiased else extra_df))
+                for jj, j in enumerate(cols):
+                    V = scale * dk_meat(Psi[:, jj], bw)
+                    out[(win, endog_list[j], h)] = {
+                        "coef": B[:k, jj], "cov": (V + V.T) / 2,
+                        "nobs": n, "df_resid": n - k - extra_df,
+                    }
+    if key is not None:
+        cache.put_arrays(key, _windows_to_arrays(out, endog_list, k))
+    return out
+
+
+def _windows_to_arrays(fits, endog_list, k):
+    keys = list(fits)
+    return {
+        "win": np.array([w for w, _, _ in keys], dtype=np.int64).reshape(-1, 2),
+        "endog": np.array([endog_list.index(e) for _, e, _ in keys], dtype=np.int64),
+        "h": np.array([h for _, _, h in keys], dtype=np.int64),
+        "coef": np.array([f["coef"] for f in fits.values()]).reshape(-1, k),
+        "cov": np.array([f["cov"] for f in fits.values()]).reshape(-1, k, k),
+        "nobs": np.array([f["nobs"] for f in fits.values()], dtype=np.int64),
+        "df_resid": np.array([f["df_resid"] for f in fits.values()], dtype=np.int64),
+    }
+
+
+def _windows_from_arrays(z, endog_list):
+    return {
+        ((int(w[0]), int(w[1])), endog_list[int(e)], int(h)): {
+            "coef": b, "cov": V, "nobs": int(n), "df_resid": int(df),
+        }
+        for w, e, h, b, V, n, df in zip(z["win"], z["endog"], z["h"], z["coef"],
+                                        z["cov"], z["nobs"], z["df_resid"])
+    }
+
+
+# ============================================================
+# API
+# ============================================================
+
+def lp_window_panel(data_set, endog_list, shock, l_exog_data, lags_exog_data, hor,
+                    windows=None, mode="expanding", width=10, moderator=None,
+                    corr_lag=1, center_corr=True, entity_col="ccode",
+                    time_col="year_int", cumul_mult=True, dk_bandwidth=None,
+                    design=None):
+    """
+    LP (o LP con interazione se moderator non e None) su ogni finestra.
+
+    windows: lista (inizio, fine) in anni; None = window_list(mode, width)
+    sugli anni del panel. Tabella tidy con colonne
+      start, end, endog, h, term (beta / theta), estimate, se, pval, nobs
+    come run_spec_grid. Ogni finestra coincide con la stima sul panel
+    filtrato a start <= year_int <= end (anche la centratura del
+    moderatore, ricalcolata sulla finestra).
+    """
+    endog_list = list(dict.fromkeys(endog_list))
+    if design is None:
+        variables = endog_list + [shock] + list(l_exog_data)
+        if moderator is not None:
+            variables.append(moderator)
+        design = PanelDesign(data_set, variables, entity_col, time_col)
+    if windows is None:
+        windows = window_list(design.time_labels, mode, width)
+    windows = list(dict.fromkeys((int(a), int(b)) for a, b in windows))
+
+    back = max(lags_exog_data, 1 if cumul_mult else 0)
+    if moderator is None:
+        regressors = lp_regressors(design, shock, l_exog_data, lags_exog_data)
+        terms = {"beta": 0}
+    else:
+        regressors, _ = interaction_regressors(
+            design, shock, moderator, l_exog_data, lags_exog_data,
+            corr_lag=corr_lag, center_corr=center_corr,
+        )
+        terms = {"beta": 0, "theta": 1}
+        back = max(back, corr_lag)
+
+    fits = window_fits(design, endog_list, regressors, hor, windows, back=back,
+                       cumul_mult=cumul_mult, dk_bandwidth=dk_bandwidth)
+
+    # centratura del moderatore sulla finestra: b = b' + theta * (c_w - c)
+    shift = np.zeros(len(windows))
+    if moderator is not None and center_corr:
+        corr_l = np.where(design.present, design.lag(moderator, corr_lag), np.nan)
+        c_all = np.nanmean(corr_l)
+        pa, pb = _positions(design.time_labels, windows)
+        for w in range(len(windows)):
+            with np.errstate(invalid="ignore"):
+                shift[w] = np.nanmean(corr_l[:, pa[w] + corr_lag:pb[w] + 1]) - c_all
+
+    rows = []
+    for w, win in enumerate(windows):
+        for endog in endog_list:
+            for h in range(0, hor + 1):
+                fit = fits.get((win, endog, h))
+                if fit is None:
+                    continue
+                coef, cov = fit["coef"].copy(), fit["cov"]
+                if shift[w] != 0.0:
+                    L = np.eye(len(coef))
+                    L[0, 1] = shift[w]
+                    coef, cov = L @ coef, L @ cov @ L.T
+                for term, q in terms.items():
+                    se = float(np.sqrt(cov[q, q]))
+                    rows.append({
+                        "start": win[0], "end": win[1], "endog": endog, "h": h,
+                        "term": term, "estimate": float(coef[q]), "se": se,
+                        "pval": float(2 * stats.t.sf(abs(coef[q] / se), fit["df_resid"])),
+                        "nobs": fit["nobs"],
+                    })
+    return pd.DataFrame(rows)
+
+
+def window_r_share(data_set, windows, ratio="PUBINVRATIO", time_col="year_int"):
+    """
+    Quota media (sample_r_share) sugli anni di ogni finestra, indicizzata
+    per (start, end).
+    """
+    years = data_set[time_col].to_numpy()
+    return pd.Series({
+        (a, b): sample_r_share(data_set[(years >= a) & (years <= b)], ratio)
+        for a, b in windows
+    })
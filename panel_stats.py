@@ -0,0 +1,609 @@
+"""
+panel_stats.py
+==============
+Statistiche diagnostiche per panel calcolate su matrici (anni x paesi),
+senza loop Python sulle coppie di paesi.
+
+I dati mancanti sono gestiti con una maschera: tutte le somme pairwise
+(anni comuni T_ij, medie, varianze e covarianze sugli anni comuni) sono
+prodotti matriciali maschera' x dati, quindi poche chiamate BLAS per blocco
+di paesi. La memoria cresce come O(blocco * N), non O(N^2).
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from lp_engine import get_default_cache
+
+
+# ============================================================
+# MATRICE DEI RESIDUI
+# ============================================================
+
+def panel_matrix(series):
+    """
+    Serie con MultiIndex (paese, anno) -> (matrice T x N con NaN, anni, paesi).
+
+    Equivale a un pivot anni x paesi ma senza passare da DataFrame.pivot.
+    """
+    idx = series.index
+    e_codes, e_labels = pd.factorize(idx.get_level_values(0), sort=True)
+    t_codes, t_labels = pd.factorize(idx.get_level_values(1), sort=True)
+    out = np.full((len(t_labels), len(e_labels)), np.nan)
+    out[t_codes, e_codes] = series.to_numpy(dtype=float)
+    return out, np.asarray(t_labels), np.asarray(e_labels)
+
+
+# ============================================================
+# CORRELAZIONI PAIRWISE
+# ============================================================
+
+def _pairwise_blocks(E, block=1024):
+    """
+    Genera (i0, T_ij, rho_ij) per blocchi di righe i0..i0+b della matrice
+    N x N, con correlazioni calcolate solo sugli anni comuni a i e j
+    (come np.corrcoef sulle righe non-NA della coppia).
+    """
+    M = np.isfinite(E)
+    # centrare per colonna riduce la cancellazione nelle formule a una passata
+    # (la correlazione sugli anni comuni non cambia)
+    mu = np.nanmean(np.where(M, E, np.nan), axis=0)
+    R = np.where(M, E - mu, 0.0)
+    Mf = M.astype(float)
+    R2 = R * R
+    N = E.shape[1]
+
+    for i0 in range(0, N, block):
+        sl = slice(i0, min(i0 + block, N))
+        T_ij = Mf[:, sl].T @ Mf                 # anni comuni
+        S_i = R[:, sl].T @ Mf                   # somma di r_i sugli anni comuni a j
+        S_j = Mf[:, sl].T @ R                   # somma di r_j sugli anni comuni a i
+        Q_i = R2[:, sl].T @ Mf
+        Q_j = Mf[:, sl].T @ R2
+        P = R[:, sl].T @ R
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = P - S_i * S_j / T_ij
+            var_i = Q_i - S_i * S_i / T_ij
+            var_j = Q_j - S_j * S_j / T_ij
+            rho = cov / np.sqrt(var_i * var_j)
+        yield i0, T_ij, rho
+
+
+def pairwise_corr(E, min_T=3, block=1024):
+    """
+    Correlazioni pairwise (N x N) e anni comuni T_ij; NaN dove T_ij < min_T.
+    """
+    N = E.shape[1]
+    rho_all = np.full((N, N), np.nan)
+    T_all = np.zeros((N, N))
+    for i0, T_ij, rho in _pairwise_blocks(E, block):
+        b = T_ij.shape[0]
+        rho_all[i0:i0 + b] = np.where(T_ij >= min_T, rho, np.nan)
+        T_all[i0:i0 + b] = T_ij
+    return rho_all, T_all
+
+
+# ============================================================
+# PESARAN CD
+# ============================================================
+
+def _cd_pvalue(cd):
+    return 2.0 * (1.0 - stats.norm.cdf(abs(cd)))
+
+
+def _pca_loadings(E, n_factors):
+    """
+    Fattori principali dei residui standardizzati (NaN -> 0), normalizzati
+    con f'f / T = I. Ritorna loadings (N x p) e SD idiosincratiche (N).
+    """
+    M = np.isfinite(E)
+    Z = np.where(M, E, np.nan)
+    Z = (Z - np.nanmean(Z, axis=0)) / np.nanstd(Z, axis=0)
+    Z = np.where(M, Z, 0.0)
+    T = Z.shape[0]
+
+    U, s, _ = np.linalg.svd(Z, full_matrices=False)
+    p = min(n_factors, len(s))
+    F = U[:, :p] * np.sqrt(T)
+    G = Z.T @ F / T
+    resid = np.where(M, Z - F @ G.T, np.nan)
+    sigma = np.sqrt(np.nanmean(resid ** 2, axis=0))
+    return G, sigma
+
+
+def pesaran_cd(E, min_T=3, n_factors=4, seed=12345, block=1024):
+    """
+    Test di dipendenza cross-sezionale su una matrice T x N (NaN = mancante).
+
+      CD  (Pesaran 2004/2015): sqrt(2 / (N(N-1))) * sum_{i<j} sqrt(T_ij) rho_ij
+      CDw (Juodis-Reese 2022): come CD con rho_ij * w_i * w_j, w_i Rademacher
+          (seed fisso): robusto quando la CD debole e dovuta ai fattori;
+      CD* (Pesaran-Xie 2021):  (CD + sqrt(T/2) theta) / (1 - theta),
+          theta = sum_k (N^-1 sum_i g_ik / s_i)^2 con g loadings dei primi
+          n_factors fattori principali e s_i SD idiosincratica: corregge la
+          distorsione del CD su residui da modelli con fattori / effetti anno.
+
+    Come nel codice originale contano solo le coppie con T_ij >= min_T, ma
+    la normalizzazione usa N(N-1) su tutti i paesi.
+    Ritorna un dict con N, pairs, T_min, T_max e statistiche/p-value.
+    """
+    E = np.asarray(E, dtype=float)
+    keep = np.isfinite(E).sum(axis=0) > 0
+    E = E[:, keep]
+    T, N = E.shape
+    out = {"N": N, "pairs": 0, "T_min": np.nan, "T_max": np.nan,
+           "CD": np.nan, "CD_p": np.nan, "CDw": np.nan, "CDw_p": np.nan,
+           "CDstar": np.nan, "CDstar_p": np.nan}
+    if N < 2:
+        return out
+
+    w = np.random.default_rng(seed).choice([-1.0, 1.0], size=N)
+    cd_sum = cdw_sum = 0.0
+    pairs, t_min, t_max = 0, np.inf, 0.0
+    for i0, T_ij, rho in _pairwise_blocks(E, block):
+        b = T_ij.shape[0]
+        upper = np.arange(N)[None, :] > np.arange(i0, i0 + b)[:, None]
+        ok = upper & (T_ij >= min_T) & np.isfinite(rho)
+        if not ok.any():
+            continue
+        term = np.where(ok, np.sqrt(T_ij) * rho, 0.0)
+        cd_sum += term.sum()
+        cdw_sum += w[i0:i0 + b] @ term @ w
+        pairs += int(ok.sum())
+        t_min = min(t_min, T_ij[ok].min())
+        t_max = max(t_max, T_ij[ok].max())
+
+    if pairs == 0:
+        return out
+
+    scale = np.sqrt(2.0 / (N * (N - 1)))
+    cd = scale * cd_sum
+    cdw = scale * cdw_sum
+    out.update(pairs=pairs, T_min=int(t_min), T_max=int(t_max),
+               CD=cd, CD_p=_cd_pvalue(cd), CDw=cdw, CDw_p=_cd_pvalue(cdw))
+
+    if n_factors > 0 and T > n_factors:
+        G, sigma = _pca_loadings(E, n_factors)
+        theta = float(np.sum((np.mean(G / sigma[:, None], axis=0)) ** 2))
+        if theta < 1.0:
+            cds = (cd + np.sqrt(T / 2.0) * theta) / (1.0 - theta)
+            out.update(CDstar=cds, CDstar_p=_cd_pvalue(cds))
+    return out
+
+
+# ============================================================
+# RADICI UNITARIE: ADF IN BLOCCO
+# ============================================================
+
+def panel_cube(data, variables, entity_col="ccode", time_col="year_int"):
+    """
+    DataFrame -> array (V, N, T) sugli anni osservati, NaN dove manca il dato.
+
+    Come in PanelDesign l'asse temporale e quello degli anni presenti nel
+    dataset (il 2007 mancante per tutti non interrompe le serie).
+    """
+    e_codes, e_labels = pd.factorize(data[entity_col].to_numpy(), sort=True)
+    t_codes, t_labels = pd.factorize(data[time_col].to_numpy(), sort=True)
+    cube = np.full((len(variables), len(e_labels), len(t_labels)), np.nan)
+    cube[:, e_codes, t_codes] = data[list(variables)].to_numpy(dtype=float).T
+    return cube, np.asarray(e_labels), np.asarray(t_labels)
+
+
+def _shift(A, k):
+    """
+    A[..., t - k] lungo l'ultimo asse (k > 0: lag), NaN fuori campione.
+    """
+    out = np.full_like(A, np.nan)
+    if k == 0:
+        out[...] = A
+    else:
+        out[..., k:] = A[..., :-k]
+    return out
+
+
+def _diff(A):
+    out = np.full_like(A, np.nan)
+    out[..., 1:] = A[..., 1:] - A[..., :-1]
+    return out
+
+
+def batched_ols(y, X, valid):
+    """
+    S regressioni OLS indipendenti in un colpo solo.
+
+    y: (S, T); X: (S, T, K); valid: (S, T) righe usate da ciascuna serie.
+    Ritorna beta (S, K), (X'X)^-1 (S, K, K), SSR (S), nobs (S) e residui
+    (S, T, 0 fuori campione). Serie con nobs <= K restano NaN.
+    """
+    K = X.shape[-1]
+    Xv = np.where(valid[..., None], X, 0.0)
+    yv = np.where(valid, y, 0.0)
+    n = valid.sum(axis=1)
+
+    # matmul su copie contigue: molto piu veloce di einsum per K piccolo
+    XvT = np.ascontiguousarray(np.swapaxes(Xv, 1, 2))
+    XtX = XvT @ Xv
+    Xty = (XvT @ yv[..., None])[..., 0]
+    ok = n > K
+    XtX[~ok] = np.eye(K)
+    try:
+        inv = np.linalg.inv(XtX)
+    except np.linalg.LinAlgError:
+        inv = np.linalg.pinv(XtX)
+    beta = (inv @ Xty[..., None])[..., 0]
+    resid = np.where(valid, yv - (Xv @ beta[..., None])[..., 0], 0.0)
+    ssr = (resid * resid).sum(axis=1)
+
+    beta[~ok] = np.nan
+    inv[~ok] = np.nan
+    ssr = np.where(ok, ssr, np.nan)
+    return beta, inv, ssr, n, resid
+
+
+def _adf_design(Y, p, cross=None):
+    """
+    Regressione ADF(p) con costante: Delta y_t su (1, y_{t-1}, Delta y_{t-1..t-p}).
+
+    cross: None oppure (ybar (S, T)) per la CADF di Pesaran, che aggiunge
+    ybar_{t-1}, Delta ybar_t e Delta ybar_{t-1..t-p}.
+    """
+    dY = _diff(Y)
+    cols = [np.ones_like(Y), _shift(Y, 1)]
+    if cross is not None:
+        dbar = _diff(cross)
+        cols += [_shift(cross, 1), dbar] + [_shift(dbar, j) for j in range(1, p + 1)]
+    cols += [_shift(dY, j) for j in range(1, p + 1)]
+    X = np.stack(cols, axis=-1)
+    valid = np.isfinite(dY) & np.isfinite(X).all(axis=-1)
+    return dY, X, valid
+
+
+def adf_batch(Y, lags, t0=None, cross=None):
+    """
+    ADF(lags) con costante per tutte le righe di Y (S, T) insieme.
+
+    lags: intero comune oppure array (S,) di lag per serie (si stima per
+    gruppi di serie con lo stesso lag: il loop e sui lag, non sulle serie).
+    t0: primo periodo usabile (campione comune per la selezione dei lag).
+    Ritorna un dict con tau (t di y_{t-1}), rho, ssr, nobs, k, resid.
+    """
+    Y = np.asarray(Y, dtype=float)
+    S, T = Y.shape
+    lags = np.broadcast_to(np.asarray(lags, dtype=int), (S,))
+    out = {"tau": np.full(S, np.nan), "rho": np.full(S, np.nan),
+           "ssr": np.full(S, np.nan), "nobs": np.zeros(S, dtype=int),
+           "k": np.zeros(S, dtype=int), "resid": np.zeros((S, T))}
+
+    for p in np.unique(lags):
+        rows = np.flatnonzero(lags == p)
+        dY, X, valid = _adf_design(Y[rows], int(p),
+                                   None if cross is None else cross[rows])
+        if t0 is not None:
+            valid[:, :t0] = False
+        beta, inv, ssr, n, resid = batched_ols(dY, X, valid)
+        K = X.shape[-1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            se = np.sqrt(ssr / (n - K) * inv[:, 1, 1])
+        out["tau"][rows] = beta[:, 1] / se
+        out["rho"][rows] = beta[:, 1]
+        out["ssr"][rows] = ssr
+        out["nobs"][rows] = n
+        out["k"][rows] = K
+        out["resid"][rows] = resid
+    return out
+
+
+def default_max_lags(T):
+    """
+    Regola di Schwert corta: floor(4 * (T/100)^(1/4)), almeno 1.
+    """
+    return max(1, int(4 * (T / 100.0) ** 0.25))
+
+
+def select_lags(Y, max_lags, ic="bic"):
+    """
+    Lag ADF per serie con criterio d'informazione (aic / bic), tutti i
+    lag 0..max_lags confrontati sullo stesso campione (t >= max_lags + 2).
+    """
+    S = Y.shape[0]
+    best = np.zeros(S, dtype=int)
+    best_ic = np.full(S, np.inf)
+    for p in range(0, max_lags + 1):
+        r = adf_batch(Y, p, t0=max_lags + 1)
+        n, ssr, K = r["nobs"], r["ssr"], r["k"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pen = 2.0 * K if ic == "aic" else K * np.log(n)
+            val = n * np.log(ssr / n) + pen
+        val = np.where(np.isfinite(val), val, np.inf)
+        better = val < best_ic
+        best[better] = p
+        best_ic[better] = val[better]
+    return best
+
+
+# ============================================================
+# IPS
+# ============================================================
+
+# Momenti di t_ADF(p) con costante sotto H0 per T osservazioni, come la
+# Tavola 3 di Im-Pesaran-Shin (2003): colonne T, poi (E[t], Var[t]) per
+# p = 0..4. Generata con simulate_ips_moments (100000 random walk per cella);
+# NaN dove T < 2p + 6 (meno di 3 gradi di liberta nell'ADF).
+_IPS_TABLE = np.array([
+    [  6, -1.555,  2.639, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan],
+    [  7, -1.523,  1.715, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan],
+    [  8, -1.517,  1.419, -1.545,  3.011, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan],
+    [  9, -1.507,  1.249, -1.514,  1.991, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan],
+    [ 10, -1.506,  1.141, -1.501,  1.549, -1.314,  3.354, np.nan, np.nan, np.nan, np.nan],
+    [ 12, -1.508,  1.023, -1.491,  1.246, -1.309,  1.587, -1.343,  3.490, np.nan, np.nan],
+    [ 14, -1.512,  0.958, -1.496,  1.125, -1.338,  1.304, -1.302,  1.708, -1.184,  2.998],
+    [ 16, -1.514,  0.925, -1.500,  1.026, -1.367,  1.166, -1.330,  1.390, -1.182,  1.729],
+    [ 18, -1.515,  0.888, -1.501,  0.978, -1.389,  1.087, -1.358,  1.244, -1.223,  1.430],
+    [ 20, -1.516,  0.863, -1.506,  0.939, -1.398,  1.018, -1.376,  1.140, -1.261,  1.276],
+    [ 22, -1.519,  0.836, -1.511,  0.913, -1.413,  0.990, -1.391,  1.080, -1.287,  1.199],
+    [ 25, -1.522,  0.824, -1.517,  0.880, -1.435,  0.948, -1.414,  1.019, -1.321,  1.094],
+    [ 30, -1.522,  0.804, -1.516,  0.844, -1.448,  0.887, -1.438,  0.952, -1.360,  1.013],
+    [ 35, -1.526,  0.790, -1.515,  0.825, -1.464,  0.863, -1.456,  0.903, -1.393,  0.942],
+    [ 40, -1.526,  0.774, -1.518,  0.808, -1.472,  0.844, -1.464,  0.862, -1.417,  0.908],
+    [ 50, -1.525,  0.750, -1.524,  0.784, -1.487,  0.806, -1.482,  0.823, -1.437,  0.854],
+    [ 60, -1.526,  0.749, -1.525,  0.766, -1.498,  0.786, -1.488,  0.811, -1.458,  0.831],
+    [ 70, -1.530,  0.746, -1.526,  0.761, -1.505,  0.783, -1.497,  0.787, -1.469,  0.803],
+    [100, -1.533,  0.734, -1.524,  0.744, -1.510,  0.757, -1.506,  0.762, -1.491,  0.779],
+])
+
+
+def simulate_ips_moments(T, p, reps=100000, seed=2003, chunk=20000):
+    """
+    E[t] e Var[t] dell'ADF(p) con costante su T osservazioni sotto H0
+    (random walk gaussiano), stimati in blocco. Serve a rigenerare
+    _IPS_TABLE o a coprire (T, p) fuori tavola.
+    """
+    taus = []
+    for c in range(0, reps, chunk):
+        rng = np.random.default_rng([seed, T, p, c // chunk])
+        Y = np.cumsum(rng.standard_normal((min(chunk, reps - c), T)), axis=1)
+        tau = adf_batch(Y, p)["tau"]
+        taus.append(tau[np.isfinite(tau)])
+    tau = np.concatenate(taus)
+    return float(tau.mean()), float(tau.var(ddof=1))
+
+
+def ips_moments(T, p):
+    """
+    (E[t], Var[t]) per T osservazioni e p lag: interpolazione lineare in T
+    sulla tavola (oltre T=100 si usa l'ultima riga). NaN se fuori tavola.
+    """
+    if p < 0 or p > 4 or T < 2 * p + 6:
+        return np.nan, np.nan
+    T_tab = _IPS_TABLE[:, 0]
+    col = 1 + 2 * p
+    ok = np.isfinite(_IPS_TABLE[:, col])
+    T = min(float(T), T_tab[-1])
+    return (float(np.interp(T, T_tab[ok], _IPS_TABLE[ok, col])),
+            float(np.interp(T, T_tab[ok], _IPS_TABLE[ok, col + 1])))
+
+
+def ips_test(tau, n_levels, lags):
+    """
+    W_tbar di Im-Pesaran-Shin: sqrt(N) (tbar - mean E[t_i]) / sqrt(mean Var[t_i])
+    con momenti per (T_i, p_i) di ciascuna serie. p-value a sinistra.
+    """
+    mom = np.array([ips_moments(T, p) for T, p in zip(n_levels, lags)]).reshape(-1, 2)
+    # serie senza t o con (T_i, p_i) fuori tavola restano fuori dalla media
+    ok = np.isfinite(tau) & np.isfinite(mom).all(axis=1)
+    tau, mom = tau[ok], mom[ok]
+    N = len(tau)
+    if N == 0:
+        return {"N": 0, "tbar": np.nan, "W": np.nan, "p": np.nan}
+    tbar = tau.mean()
+    W = np.sqrt(N) * (tbar - mom[:, 0].mean()) / np.sqrt(mom[:, 1].mean())
+    return {"N": N, "tbar": float(tbar), "W": float(W), "p": float(stats.norm.cdf(W))}
+
+
+# ============================================================
+# LLC
+# ============================================================
+
+# Levin-Lin-Chu (2002), Tavola 2, modello con costante: T_tilde, mu*, sigma*
+_LLC_ADJ = np.array([
+    [25, -0.554, 0.919], [30, -0.546, 0.889], [35, -0.541, 0.867],
+    [40, -0.537, 0.850], [45, -0.533, 0.837], [50, -0.531, 0.826],
+    [60, -0.527, 0.810], [70, -0.524, 0.798], [80, -0.522, 0.789],
+    [90, -0.520, 0.782], [100, -0.518, 0.776], [250, -0.509, 0.742],
+    [500, -0.504, 0.727], [np.inf, -0.500, 0.707],
+])
+
+
+def _llc_adjustment(T_tilde):
+    # sotto T=25 si usa la prima riga (come plm / Stata)
+    T_tab = np.where(np.isinf(_LLC_ADJ[:, 0]), 1e6, _LLC_ADJ[:, 0])
+    mu = np.interp(T_tilde, T_tab, _LLC_ADJ[:, 1])
+    sd = np.interp(T_tilde, T_tab, _LLC_ADJ[:, 2])
+    return mu, sd
+
+
+def llc_test(Y, lags):
+    """
+    Levin-Lin-Chu con costante sulle serie di Y (N, T) e lag per serie.
+
+    Residui ortogonalizzati e_it (di Delta y) e v_it-1 (di y_t-1) rispetto a
+    costante e Delta y laggati, normalizzati con la SD dell'ADF; t pooled
+    corretto con il rapporto medio di varianza lungo/breve periodo S_N e
+    con mu*, sigma* della Tavola 2 di LLC.
+    """
+    N, T = Y.shape
+    lags = np.broadcast_to(np.asarray(lags, dtype=int), (N,))
+    dY = _diff(Y)
+    e = np.zeros((N, T))
+    v = np.zeros((N, T))
+    used = np.zeros((N, T), dtype=bool)
+    sig_e = np.full(N, np.nan)
+
+    for p in np.unique(lags):
+        rows = np.flatnonzero(lags == p)
+        dYp, X, valid = _adf_design(Y[rows], int(p))
+        Z = np.delete(X, 1, axis=-1)            # costante + Delta y laggati
+        ylag = X[..., 1]
+        _, _, _, _, re = batched_ols(dYp, Z, valid)
+        _, _, _, _, rv = batched_ols(ylag, Z, valid)
+        _, _, ssr, n, _ = batched_ols(dYp, X, valid)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sig_e[rows] = np.sqrt(ssr / n)
+        e[rows], v[rows], used[rows] = re, rv, valid
+
+    # varianza di lungo periodo di Delta y (Bartlett, K = 3.21 T^(1/3));
+    # nel modello con costante H0 e un random walk senza drift: Delta y non
+    # si demeana (LLC lo fanno solo nel modello con trend)
+    okd = np.isfinite(dY)
+    nd = okd.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dm = np.where(okd, dY, 0.0)
+        lr = (dm * dm).sum(axis=1) / nd
+        Kbar = int(3.21 * T ** (1.0 / 3.0))
+        for L in range(1, Kbar + 1):
+            w = 1.0 - L / (Kbar + 1.0)
+            lr += 2.0 * w * (dm[:, L:] * dm[:, :-L]).sum(axis=1) / nd
+        s_i = np.sqrt(lr) / sig_e
+
+    good = np.isfinite(sig_e) & (sig_e > 0) & np.isfinite(s_i)
+    if good.sum() < 2:
+        return {"N": int(good.sum()), "t_delta": np.nan, "t_star": np.nan, "p": np.nan}
+    et = e[good] / sig_e[good, None]
+    vt = v[good] / sig_e[good, None]
+    m = used[good]
+    n_tot = m.sum()
+    Ng = int(good.sum())
+    T_tilde = n_tot / Ng
+
+    svv = (vt[m] ** 2).sum()
+    delta = (vt[m] * et[m]).sum() / svv
+    sig2 = ((et[m] - delta * vt[m]) ** 2).sum() / n_tot
+    std_delta = np.sqrt(sig2 / svv)
+    t_delta = delta / std_delta
+
+    mu, sd = _llc_adjustment(T_tilde)
+    S_N = s_i[good].mean()
+    t_star = (t_delta - Ng * T_tilde * S_N / sig2 * std_delta * mu) / sd
+    return {"N": Ng, "t_delta": float(t_delta), "t_star": float(t_star),
+            "p": float(stats.norm.cdf(t_star))}
+
+
+# ============================================================
+# CIPS
+# ============================================================
+
+# distribuzioni di CIPS sotto H0 per (N, T, p)
+_CIPS_NULL = {}
+# valori (replica x paese x anno) simulati per blocco in cips_null
+CIPS_BLOCK = 1_000_000
+
+
+def _cips_stat(Y3, p):
+    """
+    CIPS per ogni pannello di Y3 (R, N, T): media delle t CADF(p) di Pesaran
+    (2007), con le medie cross-sezionali calcolate sui paesi presenti a t.
+    """
+    R, N, T = Y3.shape
+    ybar = np.nanmean(Y3, axis=1, keepdims=True)
+    ybar = np.broadcast_to(ybar, Y3.shape).reshape(R * N, T)
+    tau = adf_batch(Y3.reshape(R * N, T), p, cross=ybar)["tau"].reshape(R, N)
+    # troncamento CIPS* (costante): K1 = -6.19, K2 = 2.61
+    tau = np.clip(tau, -6.19, 2.61)
+    return np.nanmean(tau, axis=1)
+
+
+def cips_null(N, T, p, reps=1000, seed=2007):
+    """
+    Distribuzione simulata di CIPS sotto H0 (random walk indipendenti),
+    al posto delle tavole di Pesaran (2007) per ogni (N, T, p). In cache.
+
+    Le repliche sono simulate a blocchi di circa CIPS_BLOCK valori: la
+    memoria resta limitata anche con N, T grandi e, poiche i blocchi
+    consumano lo stesso flusso casuale, il risultato non cambia. Con la
+    cache LP attiva (lp_cache.enable_cache) la distribuzione e salvata
+    anche su disco.
+    """
+    key = (int(N), int(T), int(p))
+    if key not in _CIPS_NULL:
+        cache = get_default_cache()
+        disk_key = None
+        if cache is not None:
+            disk_key = cache.array_key("cips_null", (*key, int(reps), int(seed)))
+            hit = cache.get_arrays(disk_key)
+            if hit is not None:
+                _CIPS_NULL[key] = hit["stat"]
+                return _CIPS_NULL[key]
+        rng = np.random.default_rng([seed, *key])
+        block = max(1, CIPS_BLOCK // (key[0] * key[1]))
+        stat = []
+        for start in range(0, reps, block):
+            n = min(block, reps - start)
+            Y3 = np.cumsum(rng.standard_normal((n, key[0], key[1])), axis=2)
+            stat.append(_cips_stat(Y3, key[2]))
+        _CIPS_NULL[key] = np.sort(np.concatenate(stat))
+        if disk_key is not None:
+            cache.put_arrays(disk_key, {"stat": _CIPS_NULL[key]})
+    return _CIPS_NULL[key]
+
+
+def cips_test(Y, p):
+    """
+    CIPS di Pesaran (2007) su Y (N, T) con lag comune p.
+    p-value dalla distribuzione simulata per (N, T, p), a sinistra.
+    """
+    keep = np.isfinite(Y).sum(axis=1) > 0
+    Y = Y[keep]
+    N, T = Y.shape
+    if N < 2:
+        return {"N": N, "cips": np.nan, "p": np.nan, "cv5": np.nan}
+    cips = float(_cips_stat(Y[None], p)[0])
+    null = cips_null(N, T, p)
+    pval = float(np.searchsorted(null, cips, side="right") / len(null))
+    return {"N": N, "cips": cips, "p": pval, "cv5": float(np.quantile(null, 0.05))}
+
+
+# ============================================================
+# BATTERIA
+# ============================================================
+
+def panel_unit_root(data, variables, entity_col="ccode", time_col="year_int",
+                    max_lags=None, ic="bic", min_obs=5):
+    """
+    IPS, LLC e CIPS (con costante) per ciascuna variabile.
+
+    Tutte le regressioni ADF paese x variabile (selezione lag compresa)
+    girano come un'unica stima in blocco sulle serie (V*N, T). Lag per
+    serie scelti con ic su 0..max_lags (default regola di Schwert su T; con
+    T ~ 20 BIC distorce meno la size di AIC); la CIPS usa il lag mediano
+    selezionato per la variabile.
+    Ritorna un DataFrame con una riga per variabile.
+    """
+    cube, _, _ = panel_cube(data, variables, entity_col, time_col)
+    V, N, T = cube.shape
+    Y = cube.reshape(V * N, T)
+    n_levels = np.isfinite(Y).sum(axis=1)
+    Y = np.where((n_levels >= min_obs)[:, None], Y, np.nan)
+
+    if max_lags is None:
+        max_lags = default_max_lags(T)
+    lags = select_lags(Y, max_lags, ic)
+    adf = adf_batch(Y, lags)
+
+    rows = []
+    for v, var in enumerate(variables):
+        sl = slice(v * N, (v + 1) * N)
+        ok = np.isfinite(adf["tau"][sl])
+        ips = ips_test(adf["tau"][sl], n_levels[sl], lags[sl])
+        llc = llc_test(Y[sl][ok], lags[sl][ok])
+        p_c = int(np.median(lags[sl][ok])) if ok.any() else 0
+        cips = cips_test(Y[sl], p_c)
+        rows.append({
+            "variable": var, "N": ips["N"],
+            "lags_mean": float(lags[sl][ok].mean()) if ok.any() else np.nan,
+            "ips_tbar": ips["tbar"], "ips_W": ips["W"], "ips_p": ips["p"],
+            "llc_t": llc["t_star"], "llc_p": llc["p"],
+            "cips": cips["cips"], "cips_cv5": cips["cv5"], "cips_p": cips["p"],
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,210 @@
+"""
+panel_store.py
+==============
+Store colonnare del panel: il CSV viene letto, pulito e validato una volta
+sola e salvato accanto al file originale come Parquet (default) o Feather.
+
+  - anno sempre intero in "year_int" (niente piu astype(str).str.strip());
+  - righe ordinate per (ccode, year_int), chiave senza duplicati;
+  - codici paese e nomi come dizionario (categorical), valori float64;
+  - nei metadati la firma del CSV (dimensione, mtime, sha256): se il CSV
+    cambia lo store viene rigenerato al primo caricamento.
+
+load_panel legge solo le colonne richieste e filtra gli anni sul file
+(predicate pushdown / memory map), quindi costi di avvio e memoria
+crescono con le colonne usate, non con la dimensione del panel.
+Senza pyarrow si ripiega sulla lettura del CSV con la stessa pulizia.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - dipende dall'ambiente
+    pa = None
+
+from lp_profile import profiled
+
+
+STORE_VERSION = 1
+ENTITY_COL = "ccode"
+TIME_COL = "year_int"
+# colonne testuali ammesse oltre alla chiave (salvate come dizionario)
+TEXT_COLS = ("Country", "Country Name")
+
+
+# ============================================================
+# PULIZIA E VALIDAZIONE
+# ============================================================
+
+def clean_panel(raw, required=None):
+    """
+    DataFrame grezzo dal CSV -> panel tipizzato, ordinato e validato.
+
+    Accetta l'anno come "year" o "year_int" (anche stringa con spazi).
+    Solleva ValueError se mancano colonne richieste, se la chiave
+    (ccode, year_int) ha valori mancanti o duplicati, o se una colonna
+    numerica contiene testo non convertibile.
+    """
+    df = raw.copy()
+    year_col = TIME_COL if TIME_COL in df.columns else "year"
+    missing = [c for c in [ENTITY_COL, year_col] + list(required or []) if c not in df.columns]
+    if missing:
+        raise ValueError(f"colonne mancanti nel panel: {missing}")
+
+    years = pd.to_numeric(df[year_col].astype(str).str.strip(), errors="coerce")
+    if years.isna().any() or (years % 1 != 0).any():
+        bad = df.loc[years.isna() | (years % 1 != 0), year_col].unique()[:5]
+        raise ValueError(f"anni non interi nel panel: {list(bad)}")
+    df = df.drop(columns=[year_col])
+    df[TIME_COL] = years.astype(np.int64)
+
+    if df[ENTITY_COL].isna().any():
+        raise ValueError("codici paese mancanti nel panel")
+    df[ENTITY_COL] = df[ENTITY_COL].astype(str).str.strip()
+
+    dup = df.duplicated([ENTITY_COL, TIME_COL])
+    if dup.any():
+        raise ValueError(
+            f"chiave (ccode, year_int) duplicata: "
+            f"{df.loc[dup, [ENTITY_COL, TIME_COL]].head().values.tolist()}"
+        )
+
+    bad_cols = []
+    for c in df.columns:
+        if c in (ENTITY_COL, TIME_COL):
+            continue
+        if c in TEXT_COLS:
+            df[c] = df[c].astype("category")
+            continue
+        num = pd.to_numeric(df[c], errors="coerce")
+        if (num.isna() & df[c].notna()).any():
+            bad_cols.append(c)
+        df[c] = num.astype(np.float64)
+    if bad_cols:
+        raise ValueError(f"valori non numerici nelle colonne: {bad_cols}")
+
+    df[ENTITY_COL] = df[ENTITY_COL].astype("category")
+    first = [ENTITY_COL, TIME_COL]
+    df = df[first + [c for c in df.columns if c not in first]]
+    return df.sort_values(first).reset_index(drop=True)
+
+
+# ============================================================
+# STORE
+# ============================================================
+
+def store_path(csv_path, fmt="parquet"):
+    root, _ = os.path.splitext(csv_path)
+    return root + (".parquet" if fmt == "parquet" else ".feather")
+
+
+def _csv_signature(csv_path, with_hash=True):
+    st = os.stat(csv_path)
+    sig = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if with_hash:
+        h = hashlib.sha256()
+        with open(csv_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        sig["sha256"] = h.hexdigest()
+    return sig
+
+
+def _read_meta(path, fmt):
+    if fmt == "parquet":
+        schema = pq.read_schema(path)
+    else:
+        with pa.memory_map(path) as src:
+            schema = pa.ipc.open_file(src).schema
+    raw = (schema.metadata or {}).get(b"panel_store")
+    return json.loads(raw) if raw else None
+
+
+def ingest_panel(csv_path, fmt="parquet", required=None):
+    """
+    CSV -> store colonnare accanto al CSV. Ritorna il percorso dello store.
+    """
+    if pa is None:
+        raise ImportError("pyarrow necessario per lo store colonnare")
+    df = clean_panel(pd.read_csv(csv_path), required)
+    meta = {"version": STORE_VERSION, "source": os.path.basename(csv_path),
+            **_csv_signature(csv_path)}
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"panel_store": json.dumps(meta).encode(),
+    })
+    out = store_path(csv_path, fmt)
+    tmp = out + ".tmp"
+    if fmt == "parquet":
+        pq.write_table(table, tmp)
+    else:
+        # Feather non compresso: leggibile in memory map senza copie
+        feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, out)
+    return out
+
+
+def _store_is_fresh(csv_path, path, fmt):
+    if not os.path.exists(path):
+        return False
+    if not os.path.exists(csv_path):
+        return True     # solo lo store: lo si usa cosi com'e
+    meta = _read_meta(path, fmt)
+    if meta is None or meta.get("version") != STORE_VERSION:
+        return False
+    sig = _csv_signature(csv_path, with_hash=False)
+    if sig["size"] == meta["size"] and sig["mtime_ns"] == meta["mtime_ns"]:
+        return True
+    # mtime cambiata (es. checkout): decide il contenuto
+    return _csv_signature(csv_path)["sha256"] == meta["sha256"]
+
+
+@profiled()
+def load_panel(csv_path, columns=None, years=(2000, 2023), fmt="parquet"):
+    """
+    Panel pulito da csv_path, passando dallo store colonnare.
+
+    columns: colonne da leggere (ccode e year_int sono sempre incluse);
+    None = tutte. years: (min, max) inclusivi o None per tutti gli anni.
+    Lo store viene creato o rigenerato se manca o se il CSV e cambiato.
+    """
+    if columns is not None:
+        columns = [ENTITY_COL, TIME_COL] + [
+            c for c in dict.fromkeys(columns) if c not in (ENTITY_COL, TIME_COL)
+        ]
+
+    if pa is None:
+        df = clean_panel(pd.read_csv(csv_path))
+        if columns is not None:
+            df = df[columns]
+        if years is not None:
+            df = df[(df[TIME_COL] >= years[0]) & (df[TIME_COL] <= years[1])]
+        return df.reset_index(drop=True)
+
+    path = store_path(csv_path, fmt)
+    if not _store_is_fresh(csv_path, path, fmt):
+        ingest_panel(csv_path, fmt)
+
+    if fmt == "parquet":
+        filters = None
+        if years is not None:
+            filters = [(TIME_COL, ">=", years[0]), (TIME_COL, "<=", years[1])]
+        table = pq.read_table(path, columns=columns, filters=filters, memory_map=True)
+    else:
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        if years is not None:
+            t = table[TIME_COL]
+            table = table.filter(pc.and_(pc.greater_equal(t, years[0]),
+                                         pc.less_equal(t, years[1])))
+    return table.to_pandas()
@@ -0,0 +1,220 @@
+"""
+synth_panel.py
+==============
+Panel sintetici con le stesse colonne di data_pubinv_final_with_WGI.csv
+(forecasterror, log_RGDP, PUBINVRATIO, controlli, indicatori WGI), per
+benchmark su dimensioni molto maggiori del panel reale (27 paesi x 24
+anni) e per simulazioni con IRF vera nota.
+
+Processo generatore (tutto con seed):
+  - fattori comuni AR(1): la quota cd della varianza di ogni serie e
+    comune ai paesi (carichi per paese), quindi cd regola la dipendenza
+    cross-sezionale (cd=0: paesi indipendenti);
+  - forecasterror: shock esogeno (parte idiosincratica iid + comune);
+  - growth_RGDP: risposta allo shock con profilo irf (per anno dopo lo
+    shock), moltiplicata per (1 + theta * moderatore centrato laggato),
+    piu ciclo AR(1); log_RGDP = livello + somma cumulata della crescita.
+    Con cumul_mult=True la IRF vera di log_RGDP e cumsum(irf) (true_irf);
+  - PUBINVRATIO: livello per paese + AR(1) + risposta ratio_irf allo shock;
+  - WGI: qualita istituzionale persistente per paese (comune ai sei
+    indicatori) con piccole deviazioni AR(1), medie e SD come nel panel;
+  - missing: quota di celle mancanti (MCAR) per colonna numerica;
+    unbalanced: quota di righe (paese, anno) eliminate.
+
+Il risultato passa da panel_store.clean_panel: stessi tipi e ordinamento
+di load_panel. simulate_panels genera invece direttamente molti panel
+come array (repliche x paesi x anni), per le simulazioni (lp_montecarlo).
+"""
+
+import numpy as np
+import pandas as pd
+
+from panel_store import clean_panel
+
+
+# risposta di growth_RGDP e di PUBINVRATIO allo shock (h = 0, 1, 2, ...)
+DEFAULT_IRF = (0.006, 0.004, 0.002, 0.001)
+DEFAULT_RATIO_IRF = (1.0, 0.6, 0.36, 0.2)
+
+# (media, SD) degli indicatori WGI nel panel reale
+WGI_MOMENTS = {
+    "CC_EST": (0.97, 0.78), "GE_EST": (1.07, 0.60), "PV_EST": (0.76, 0.39),
+    "RL_EST": (1.07, 0.61), "RQ_EST": (1.15, 0.45), "VA_EST": (1.10, 0.35),
+}
+
+
+def _ar1(rng, rho, sd, common, load, cd, shape):
+    """
+    AR(1) per paese (R x N x T) con innovazioni sd * (sqrt(cd) load_i f_t +
+    sqrt(1 - cd) e_it), f fattore comune standardizzato (R x T).
+    """
+    u = sd * (np.sqrt(cd) * load[..., None] * common[:, None, :]
+              + np.sqrt(1.0 - cd) * rng.standard_normal(shape))
+    x = np.empty(shape)
+    x[..., 0] = u[..., 0] / np.sqrt(1.0 - rho**2)
+    for t in range(1, shape[-1]):
+        x[..., t] = rho * x[..., t - 1] + u[..., t]
+    return x
+
+
+def _common(rng, R, n, rho=0.5):
+    f = np.empty((R, n))
+    e = rng.standard_normal((R, n)) * np.sqrt(1.0 - rho**2)
+    f[:, 0] = rng.standard_normal(R)
+    for t in range(1, n):
+        f[:, t] = rho * f[:, t - 1] + e[:, t]
+    return f
+
+
+def _distributed(shock, weights, scale=None):
+    """
+    sum_k weights[k] * shock_{t-k} (* scale_{t-k}) lungo l'asse del tempo.
+    """
+    s = shock if scale is None else shock * scale
+    out = np.zeros_like(s)
+    T = s.shape[-1]
+    for k, w in enumerate(weights[:T]):
+        out[..., k:] += w * s[..., :T - k]
+    return out
+
+
+def simulate_panels(rng, n_panels, n_countries, n_years, cd=0.5, irf=DEFAULT_IRF,
+                    ratio_irf=DEFAULT_RATIO_IRF, theta=0.0, moderator="GE_EST",
+                    wgi=True, shock_sd=0.5, growth_sd=0.02, growth_rho=0.4, burn=20):
+    """
+    n_panels panel indipendenti in un colpo: {colonna: array (R, N, T)}
+    (dopo il burn-in), tutti i paesi presenti e senza valori mancanti
+    (tranne il primo anno di INVGDP_diff). Fattori comuni, carichi ed
+    effetti paese sono propri di ciascun panel.
+
+    shock_sd: SD dello shock; growth_sd, growth_rho: innovazione e
+    persistenza della componente ciclica della crescita. Gli altri
+    argomenti come in synthetic_panel.
+    """
+    if not 0.0 <= cd <= 1.0:
+        raise ValueError(f"cd deve stare in [0, 1]: {cd}")
+    R, N = int(n_panels), int(n_countries)
+    T = int(n_years) + int(burn)
+    shape = (R, N, T)
+
+    def load():
+        return rng.normal(1.0, 0.5, (R, N))
+
+    def fixed(sd):
+        return rng.normal(0.0, sd, (R, N))[..., None]
+
+    def ar(rho, sd, f=None):
+        return _ar1(rng, rho, sd, _common(rng, R, T) if f is None else f, load(), cd, shape)
+
+    # --- istituzioni (WGI): livello persistente per paese + deviazioni ---
+    quality = rng.standard_normal((R, N))
+    wgi_cols = {}
+    if wgi or theta:
+        for name, (mu, sd) in WGI_MOMENTS.items():
+            own = rng.standard_normal((R, N))
+            level = mu + sd * (0.9 * quality + np.sqrt(1 - 0.81) * own)
+            wgi_cols[name] = level[..., None] + ar(0.9, 0.05 * sd)
+
+    # --- shock: errore di previsione dell'investimento pubblico ---
+    shock = shock_sd * (np.sqrt(cd) * load()[..., None]
+                        * rng.standard_normal((R, T))[:, None, :]
+                        + np.sqrt(1.0 - cd) * rng.standard_normal(shape))
+
+    # moltiplicatore dell'effetto: 1 + theta * (moderatore_{t-1} - media del panel)
+    scale = None
+    if theta:
+        m = wgi_cols[moderator]
+        m_l = np.concatenate([m[..., :1], m[..., :-1]], axis=-1)
+        scale = 1.0 + theta * (m_l - m_l[..., burn:].mean(axis=(1, 2), keepdims=True))
+
+    # --- attivita reale ---
+    f_cycle = _common(rng, R, T)
+    growth = (0.02 + fixed(0.008)
+              + ar(growth_rho, growth_sd, f_cycle)
+              + _distributed(shock, irf, scale))
+    log_rgdp = 5.0 + fixed(1.5) + np.cumsum(growth, axis=-1)
+
+    ratio = np.clip(3.8 + fixed(0.8) + ar(0.8, 0.3)
+                    + _distributed(shock, ratio_irf), 0.5, None)
+    invgdp = 18.0 + fixed(3.0) + ar(0.7, 1.5, f_cycle)
+
+    cols = {
+        "REER": 100.0 + ar(0.8, 4.0),
+        "NOMLRATE": 3.6 + ar(0.9, 0.8),
+        "log_RPUBINV": np.log(ratio / 100.0) + log_rgdp,
+        "log_RGDP": log_rgdp,
+        "growth_RGDP": growth,
+        "UNRATE": np.clip(8.6 + fixed(3.5) + ar(0.8, 1.0, f_cycle)
+                          - 30.0 * _distributed(shock, irf), 2.0, None),
+        "PDEBT": np.clip(60.0 + fixed(30.0) + ar(0.95, 3.0), 5.0, None),
+        "INVGDP": invgdp,
+        "OUTPUTGAP": ar(0.6, 2.5, f_cycle),
+        "PRIMARYBAL": -0.6 + ar(0.7, 2.5),
+        "PUBINVRATIO": ratio,
+        "forecasterror": shock,
+        "INVGDP_diff": np.concatenate([np.full((R, N, 1), np.nan),
+                                       np.diff(invgdp, axis=-1)], axis=-1),
+    }
+    if wgi:
+        cols.update(wgi_cols)
+    return {name: arr[..., burn:] for name, arr in cols.items()}
+
+
+def synthetic_panel(n_countries=27, n_years=24, start_year=2000, missing=0.0,
+                    unbalanced=0.0, cd=0.5, irf=DEFAULT_IRF, ratio_irf=DEFAULT_RATIO_IRF,
+                    theta=0.0, moderator="GE_EST", wgi=True, seed=0, burn=20, **dgp):
+    """
+    Panel sintetico n_countries x n_years (anni da start_year).
+
+    cd: quota comune della varianza (0..1); missing / unbalanced: quota di
+    celle / righe mancanti; irf, ratio_irf: risposte di growth_RGDP e
+    PUBINVRATIO allo shock; theta: interazione con il moderatore (centrato
+    sulla media del campione, laggato di un anno come in
+    interaction_regressors). burn: anni iniziali scartati. dgp: altri
+    parametri di simulate_panels (shock_sd, growth_sd, growth_rho).
+    """
+    rng = np.random.default_rng(seed)
+    N = int(n_countries)
+    cols = simulate_panels(rng, 1, N, n_years, cd=cd, irf=irf, ratio_irf=ratio_irf,
+                           theta=theta, moderator=moderator, wgi=wgi, burn=burn, **dgp)
+
+    # --- panel lungo ---
+    width = len(str(N))
+    codes = np.array([f"C{i:0{width}d}" for i in range(N)])
+    years = np.arange(start_year, start_year + n_years)
+    df = pd.DataFrame({
+        "Country": np.repeat(np.char.add("Country ", codes), n_years),
+        "year_int": np.tile(years, N),
+        "ccode": np.repeat(codes, n_years),
+    })
+    for name, arr in cols.items():
+        df[name] = arr[0].ravel()
+    if wgi:
+        df.insert(df.columns.get_loc("CC_EST"), "Country Name", df["Country"])
+
+    num = list(cols)
+    if missing > 0:
+        holes = rng.random((len(df), len(num))) < missing
+        df[num] = df[num].mask(holes)
+    if unbalanced > 0:
+        df = df[rng.random(len(df)) >= unbalanced]
+    return clean_panel(df)
+
+
+def true_irf(hor, irf=DEFAULT_IRF, ratio_irf=DEFAULT_RATIO_IRF, theta=0.0):
+    """
+    IRF vere per h = 0..hor con cumul_mult=True (y_{t+h} - y_{t-1}):
+    beta di log_RGDP = cumsum(irf), theta = theta * beta (coefficiente
+    dell'interazione), beta di PUBINVRATIO = ratio_irf (livello).
+    """
+    g = np.zeros(hor + 1)
+    g[:min(len(irf), hor + 1)] = irf[:hor + 1]
+    r = np.zeros(hor + 1)
+    r[:min(len(ratio_irf), hor + 1)] = ratio_irf[:hor + 1]
+    beta = np.cumsum(g)
+    return pd.DataFrame({
+        "h": np.arange(hor + 1),
+        "log_RGDP": beta,
+        "theta": theta * beta,
+        "PUBINVRATIO": r,
+    })
@@ -0,0 +1,200 @@
+"""
+task_dag.py
+===========
+Esecuzione di una batteria di compiti con dipendenze dichiarate (DAG) su un
+pool di processi.
+
+Ogni Task dichiara da quali altri compiti dipende (deps: argomento ->
+nome del compito o di un oggetto condiviso). I compiti pronti partono
+appena le dipendenze sono finite, quindi stime condivise (es. la stima
+principale usata da piu test) si calcolano una volta sola e i test
+indipendenti girano in parallelo.
+
+Gli oggetti condivisi (es. il panel) vanno ai worker una volta sola
+tramite l'initializer del pool, come in lp_grid. L'output di ogni compito
+(print) viene catturato nel worker e stampato nell'ordine di dichiarazione,
+quindi il log e identico a quello dell'esecuzione seriale; per ogni
+compito si misura il tempo (wall-clock) di esecuzione. Con lp_profile
+attivo anche le fasi dentro i compiti (con tag task) tornano al processo
+principale.
+"""
+
+import contextlib
+import io
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from lp_engine import get_default_cache, set_default_cache
+from lp_profile import merge_records, profile_config, profiled, tags, worker_profiling
+
+
+@dataclass
+class Task:
+    """
+    Un compito: fn(*args, **kwargs, **{arg: risultato di deps[arg]}).
+    quiet=True: il suo output non viene stampato (es. stime condivise).
+    """
+    name: str
+    fn: object
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+    deps: dict = field(default_factory=dict)
+    quiet: bool = False
+
+
+# ============================================================
+# WORKER
+# ============================================================
+
+_SHARED = {}
+
+
+def _init_worker(shared, cache):
+    _SHARED.clear()
+    _SHARED.update(shared)
+    set_default_cache(cache)
+
+
+def _run_task(name, fn, args, kwargs, shared_deps, prof_cfg=None):
+    """
+    Esegue un compito catturandone l'output. Ritorna (risultato, testo,
+    secondi, record del profiler).
+    """
+    kwargs = dict(kwargs)
+    for arg, key in shared_deps.items():
+        kwargs[arg] = _SHARED[key]
+    buf = io.StringIO()
+    t0 = time.perf_counter()
+    with worker_profiling(prof_cfg) as prof, tags(task=name), \
+            contextlib.redirect_stdout(buf):
+        out = fn(*args, **kwargs)
+    records = [] if prof is None else prof.records
+    return out, buf.getvalue(), time.perf_counter() - t0, records
+
+
+# ============================================================
+# SCHEDULER
+# ============================================================
+
+def _check(tasks, shared):
+    names = [t.name for t in tasks]
+    if len(set(names)) != len(names):
+        raise ValueError("nomi dei compiti duplicati")
+    known = set(names) | set(shared)
+    for t in tasks:
+        missing = [d for d in t.deps.values() if d not in known]
+        if missing:
+            raise ValueError(f"{t.name}: dipendenze sconosciute {missing}")
+
+    # ciclo: ordinamento topologico (Kahn)
+    task_deps = {t.name: {d for d in t.deps.values() if d not in shared} for t in tasks}
+    done, left = set(), dict(task_deps)
+    while left:
+        ready = [n for n, d in left.items() if d <= done]
+        if not ready:
+            raise ValueError(f"dipendenze cicliche tra {sorted(left)}")
+        for n in ready:
+            done.add(n)
+            del left[n]
+
+
+@profiled()
+def run_dag(tasks, shared=None, n_jobs=None, echo=True):
+    """
+    Esegue i compiti rispettando le dipendenze.
+
+    shared: dict {nome: oggetto} disponibile come dipendenza a tutti i
+    compiti (inviato una volta per worker). n_jobs: processi (None = tutti i
+    core, 1 = sequenziale nel processo corrente). echo: stampa l'output dei
+    compiti nell'ordine di dichiarazione man mano che diventa disponibile.
+
+    Ritorna (dict {nome: risultato}, DataFrame dei tempi con colonne
+    task, seconds, start, end).
+    """
+    shared = dict(shared or {})
+    _check(tasks, shared)
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    cache = get_default_cache()
+    prof_cfg = profile_config()
+
+    results, texts, timing = {}, {}, []
+    order = [t.name for t in tasks]
+    printed = 0
+    t_start = time.perf_counter()
+
+    def flush():
+        nonlocal printed
+        while printed < len(order) and order[printed] in texts:
+            if echo:
+                print(texts[order[printed]], end="")
+            printed += 1
+
+    def split(t):
+        task_deps = {a: d for a, d in t.deps.items() if d not in shared}
+        shared_deps = {a: d for a, d in t.deps.items() if d in shared}
+        kwargs = {**t.kwargs, **{a: results[d] for a, d in task_deps.items()}}
+        return kwargs, shared_deps
+
+    def finish(t, out, text, secs, records, t0):
+        merge_records(records)
+        results[t.name] = out
+        texts[t.name] = "" if t.quiet else text
+        timing.append({"task": t.name, "seconds": secs,
+                       "start": t0 - t_start, "end": time.perf_counter() - t_start})
+        flush()
+
+    pending = list(tasks)
+
+    def ready():
+        out = [t for t in pending
+               if all(d in shared or d in results for d in t.deps.values())]
+        for t in out:
+            pending.remove(t)
+        return out
+
+    if n_jobs == 1:
+        _init_worker(shared, cache)
+        while pending:
+            for t in ready():
+                kwargs, shared_deps = split(t)
+                t0 = time.perf_counter()
+                out, text, secs, records = _run_task(t.name, t.fn, t.args, kwargs,
+                                                     shared_deps, prof_cfg)
+                finish(t, out, text, secs, records, t0)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(shared, cache)) as pool:
+            running = {}
+            while pending or running:
+                for t in ready():
+                    kwargs, shared_deps = split(t)
+                    fut = pool.submit(_run_task, t.name, t.fn, t.args, kwargs,
+                                      shared_deps, prof_cfg)
+                    running[fut] = (t, time.perf_counter())
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    t, t0 = running.pop(fut)
+                    out, text, secs, records = fut.result()
+                    finish(t, out, text, secs, records, t0)
+
+    timing = pd.DataFrame(timing).set_index("task").loc[order].reset_index()
+    return results, timing
+
+
+def timing_report(timing, wall=None):
+    """
+    Testo con il tempo di ogni compito, la somma (tempo seriale) e il tempo
+    totale effettivo.
+    """
+    if wall is None:
+        wall = float(timing["end"].max())
+    width = max(len(str(n)) for n in timing["task"])
+    lines = [f"  {r.task:<{width}s}  {r.seconds:>8.2f} s" for r in timing.itertuples()]
+    lines.append(f"  {'somma dei compiti':<{width}s}  {timing['seconds'].sum():>8.2f} s")
+    lines.append(f"  {'tempo totale':<{width}s}  {wall:>8.2f} s")
+    return "\n".join(lines)
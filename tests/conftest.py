@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# i moduli del repo sono al livello superiore (niente pacchetto)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lp_engine import set_default_cache  # noqa: E402
+from synth_panel import synthetic_panel  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def no_cache():
+    # le stime devono essere ricalcolate, non lette dalla cache su disco
+    set_default_cache(None)
+
+
+@pytest.fixture(scope="session")
+def panel():
+    return synthetic_panel(27, 24, missing=0.02, seed=1)
@@ -0,0 +1,65 @@
+"""
+Bootstrap wild e block (lp_bootstrap): stima puntuale, replica wild come
+ristima su outcome perturbato, seed indipendenti dal numero di worker.
+"""
+
+import numpy as np
+import pytest
+
+import lp_bootstrap
+from lp_bootstrap import _prepare_equations, bootstrap_lp
+from lp_engine import PanelDesign, fit_lp_horizons_multi, lp_regressors, twoway_ols
+
+
+CTRL = ["growth_RGDP", "PDEBT", "NOMLRATE", "REER"]
+ENDOG = ["log_RGDP", "PUBINVRATIO"]
+SHOCK = "forecasterror"
+HOR = 2
+
+
+@pytest.fixture(scope="module")
+def setup(panel):
+    design = PanelDesign(panel, ENDOG + [SHOCK] + CTRL)
+    return design, lp_regressors(design, SHOCK, CTRL, 2)
+
+
+def test_point_matches_engine(setup):
+    design, regressors = setup
+    boot = bootstrap_lp(design, ENDOG, regressors, HOR, method="wild", n_boot=10, n_jobs=1)
+    fits = fit_lp_horizons_multi(design, ENDOG, regressors, HOR)
+    for endog in ENDOG:
+        np.testing.assert_allclose(boot.point.loc[endog].to_numpy(),
+                                   [r.params[SHOCK] for r in fits[endog]], rtol=1e-10)
+
+
+@pytest.mark.parametrize("cluster", ["time", "entity"])
+def test_wild_draw_is_refit_on_perturbed_outcome(setup, monkeypatch, cluster):
+    design, regressors = setup
+    n_clusters = design.shape[1] if cluster == "time" else design.shape[0]
+    w = np.where(np.arange(n_clusters) % 3 == 0, -1.0, 1.0)
+    monkeypatch.setattr(lp_bootstrap, "_wild_weights",
+                        lambda rng, size, kind: np.repeat(w[:, None], size[1], axis=1))
+    boot = bootstrap_lp(design, ["log_RGDP"], regressors, HOR, method="wild", n_boot=1,
+                        cluster=cluster, n_jobs=1)
+
+    eqs, t_pos, _ = _prepare_equations(design, ["log_RGDP"], regressors, HOR, [SHOCK])
+    for h, eq in enumerate(eqs):
+        c_idx = eq["t_idx"] if cluster == "time" else eq["e_idx"]
+        y_star = eq["fitted"] + eq["eps"] * w[c_idx]
+        ols = twoway_ols(y_star[:, None], eq["X"], eq["e_idx"], eq["t_idx"])
+        assert boot.draws.iloc[0, h] == pytest.approx(ols["B"][t_pos[0], 0], rel=1e-8)
+
+
+@pytest.mark.parametrize("method", ["wild", "block"])
+def test_draws_do_not_depend_on_workers(setup, method):
+    design, regressors = setup
+    kw = dict(method=method, n_boot=30, batch_size=10, seed=3)
+    one = bootstrap_lp(design, ENDOG, regressors, HOR, n_jobs=1, **kw)
+    two = bootstrap_lp(design, ENDOG, regressors, HOR, n_jobs=2, **kw)
+    np.testing.assert_array_equal(one.draws.to_numpy(), two.draws.to_numpy())
+
+
+def test_unknown_cluster_raises(setup):
+    design, regressors = setup
+    with pytest.raises(ValueError, match="cluster"):
+        bootstrap_lp(design, ENDOG, regressors, HOR, method="wild", cluster="year")
@@ -0,0 +1,100 @@
+"""
+Cache su disco (lp_cache): una voce letta deve essere identica alla stima
+ricalcolata, indice dei residui compreso; voci illeggibili sono miss.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lp_cache import LPCache
+from lp_engine import PanelDesign, fit_lp_horizons, fit_lp_joint, lp_regressors
+
+
+CTRL = ["growth_RGDP", "PDEBT", "NOMLRATE", "REER"]
+ENDOG = ["log_RGDP", "PUBINVRATIO"]
+SHOCK = "forecasterror"
+
+
+def _setup(data):
+    design = PanelDesign(data, ENDOG + [SHOCK] + CTRL)
+    return design, lp_regressors(design, SHOCK, CTRL, 2)
+
+
+def _assert_fits_equal(a, b):
+    for ra, rb in zip(a, b, strict=True):
+        for attr in ("params", "std_errors", "tstats", "pvalues", "resids"):
+            pd.testing.assert_series_equal(getattr(ra, attr), getattr(rb, attr))
+        pd.testing.assert_frame_equal(ra.cov, rb.cov)
+        for lev_a, lev_b in zip(ra.resids.index.levels, rb.resids.index.levels):
+            assert lev_a.dtype == lev_b.dtype
+        assert (ra.nobs, ra.df_resid, ra.entity_count, ra.time_count) == \
+            (rb.nobs, rb.df_resid, rb.entity_count, rb.time_count)
+        assert ra.rsquared_within == rb.rsquared_within
+
+
+@pytest.mark.parametrize("codes", ["str", "int"])
+def test_hit_equals_fresh_fit(panel, tmp_path, codes):
+    data = panel.copy()
+    if codes == "int":
+        data["ccode"] = data["ccode"].cat.codes.astype(int)
+    design, regressors = _setup(data)
+    cache = LPCache(tmp_path)
+    fresh = fit_lp_horizons(design, "log_RGDP", regressors, 3, cache=cache)
+    hit = fit_lp_horizons(design, "log_RGDP", regressors, 3, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+    _assert_fits_equal(fresh, hit)
+    _assert_fits_equal(fresh, fit_lp_horizons(design, "log_RGDP", regressors, 3))
+
+
+def test_int_and_str_labels_use_different_keys(panel, tmp_path):
+    as_str = panel.assign(ccode=panel["ccode"].cat.codes.astype(str))
+    as_int = panel.assign(ccode=panel["ccode"].cat.codes.astype(int))
+    cache = LPCache(tmp_path)
+    design, regressors = _setup(as_str)
+    fit_lp_horizons(design, "log_RGDP", regressors, 1, cache=cache)
+    design, regressors = _setup(as_int)
+    res = fit_lp_horizons(design, "log_RGDP", regressors, 1, cache=cache)
+    assert cache.hits == 0
+    assert res[0].resids.index.levels[0].dtype == np.int64
+
+
+def test_joint_hit_equals_fresh_fit(panel, tmp_path):
+    design, regressors = _setup(panel)
+    cache = LPCache(tmp_path)
+    fresh = fit_lp_joint(design, ENDOG, regressors, 3, cache=cache)
+    hit = fit_lp_joint(design, ENDOG, regressors, 3, cache=cache)
+    assert cache.hits == 1
+    pd.testing.assert_series_equal(fresh.coef, hit.coef)
+    pd.testing.assert_frame_equal(fresh.cov, hit.cov)
+    pd.testing.assert_series_equal(fresh.nobs, hit.nobs, check_index_type=False)
+
+
+@pytest.mark.parametrize("size", [0, 100, -1])
+def test_corrupt_entry_is_a_miss(panel, tmp_path, size):
+    design, regressors = _setup(panel)
+    cache = LPCache(tmp_path)
+    fresh = fit_lp_horizons(design, "log_RGDP", regressors, 2, cache=cache)
+    path = cache._path(cache.key(design, "log_RGDP", regressors, 2))
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:size if size >= 0 else len(data) // 2])
+
+    again = fit_lp_horizons(design, "log_RGDP", regressors, 2, cache=cache)
+    assert cache.misses == 2
+    _assert_fits_equal(fresh, again)
+    # la voce e stata riscritta
+    fit_lp_horizons(design, "log_RGDP", regressors, 2, cache=cache)
+    assert cache.hits == 1
+
+
+def test_lru_eviction_keeps_size_bound(panel, tmp_path):
+    design, regressors = _setup(panel)
+    cache = LPCache(tmp_path)
+    fit_lp_horizons(design, "log_RGDP", regressors, 1, cache=cache)
+    one = cache.size()
+    cache.max_bytes = int(1.5 * one)
+    fit_lp_horizons(design, "PUBINVRATIO", regressors, 1, cache=cache)
+    assert cache.size() <= cache.max_bytes
+    assert len(list(tmp_path.glob("*.npz"))) == 1
@@ -0,0 +1,100 @@
+"""
+LP per paese (lp_country): la solve batch deve coincidere con una OLS
+paese per paese con SE Newey-West, e i gruppi con mean-group / pooled.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lp_country import lp_country_panel, mean_group, pooled_precision
+from lp_engine import dk_default_bandwidth
+
+
+CTRL = ["growth_RGDP", "PDEBT"]
+SHOCK = "forecasterror"
+LAGS = 1
+HOR = 2
+TOL = {"rtol": 1e-8, "atol": 1e-12}
+
+
+def _frame(panel, endog, h):
+    """
+    Dipendente, shock e lag dei controlli con groupby.shift (panel ordinato)
+    e medie cross-sezionali per anno di dipendente e shock.
+    """
+    df = panel.sort_values(["ccode", "year_int"]).reset_index(drop=True)
+    g = df.groupby("ccode", observed=True)
+    out = pd.DataFrame({"ccode": df["ccode"].astype(str), "year_int": df["year_int"]})
+    out["y"] = g[endog].shift(-h) - g[endog].shift(1)
+    out[SHOCK] = df[SHOCK]
+    for c in CTRL:
+        for L in range(1, LAGS + 1):
+            out[f"L{L}_{c}"] = g[c].shift(L)
+    out["ybar"] = out.groupby("year_int")["y"].transform("mean")
+    out["sbar"] = out.groupby("year_int")[SHOCK].transform("mean")
+    return out
+
+
+def _ols_nw(sub, years):
+    """
+    OLS con costante e SE Newey-West dello shock sulla griglia anni
+    (anni mancanti come contributi nulli), correzione n / (n - k).
+    """
+    x_cols = [SHOCK] + [c for c in sub.columns if c.startswith("L")] + ["ybar", "sbar"]
+    sub = sub.dropna(subset=["y"] + x_cols)
+    Z = np.column_stack([np.ones(len(sub)), sub[x_cols].to_numpy(float)])
+    n, k = Z.shape
+    inv = np.linalg.inv(Z.T @ Z)
+    b = inv @ Z.T @ sub["y"].to_numpy()
+    e = sub["y"].to_numpy() - Z @ b
+    psi = np.zeros(len(years))
+    psi[np.searchsorted(years, sub["year_int"])] = (Z @ inv[1]) * e
+    bw = dk_default_bandwidth(n)
+    var = psi @ psi
+    for j in range(1, int(min(bw, n - 1)) + 1):
+        var += 2 * (1 - j / (bw + 1)) * psi[j:] @ psi[:-j]
+    return b[1], np.sqrt(n / (n - k) * var), n
+
+
+@pytest.fixture(scope="module")
+def country_panel(panel):
+    # un paese con pochi anni: gradi di liberta insufficienti -> NaN
+    short = panel["ccode"].astype(str) == str(panel["ccode"].iloc[-1])
+    return panel[~short | (panel["year_int"] >= panel["year_int"].max() - 3)]
+
+
+def test_batch_solve_matches_country_ols(country_panel):
+    res = lp_country_panel(country_panel, ["log_RGDP", "PUBINVRATIO"], SHOCK, CTRL, LAGS, HOR)
+    years = np.sort(country_panel["year_int"].unique())
+    tbl = res.table.assign(entity=res.table["entity"].astype(str))
+    codes = sorted(tbl["entity"].unique())
+    for endog in ("log_RGDP", "PUBINVRATIO"):
+        for h in range(HOR + 1):
+            frame = _frame(country_panel, endog, h)
+            got = tbl[(tbl["endog"] == endog) & (tbl["h"] == h)].set_index("entity")
+            for code in codes[:3] + codes[-1:]:
+                sub = frame[frame["ccode"] == code]
+                row = got.loc[code]
+                if code == codes[-1]:
+                    assert np.isnan(row["estimate"]) and np.isnan(row["se"])
+                    continue
+                b, se, n = _ols_nw(sub, years)
+                assert row["nobs"] == n
+                np.testing.assert_allclose([row["estimate"], row["se"]], [b, se], **TOL)
+
+
+def test_group_estimators():
+    est = np.array([[0.1, 0.2], [0.3, np.nan], [0.5, 0.6]])
+    se = np.array([[0.1, 0.2], [0.2, 0.1], [0.4, 0.3]])
+    mu, s, n = mean_group(est)
+    np.testing.assert_allclose(mu, [0.3, 0.4], **TOL)
+    np.testing.assert_allclose(s, [np.std([0.1, 0.3, 0.5], ddof=1) / np.sqrt(3),
+                                   np.std([0.2, 0.6], ddof=1) / np.sqrt(2)], **TOL)
+    assert list(n) == [3, 2]
+
+    mu, s, n = pooled_precision(est, se)
+    w = 1 / se[:, 0] ** 2
+    np.testing.assert_allclose(mu[0], (w * est[:, 0]).sum() / w.sum(), **TOL)
+    np.testing.assert_allclose(s[0], 1 / np.sqrt(w.sum()), **TOL)
+    assert list(n) == [3, 2]
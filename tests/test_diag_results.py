@@ -0,0 +1,64 @@
+"""
+Salvataggio dei risultati diagnostici (diag_results): read_battery deve
+ricostruire i DiagResult scritti da write_battery, in JSON e in Parquet.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from diag_results import DiagResult, collect_results, read_battery, write_battery
+
+
+def _results():
+    coef = pd.DataFrame({
+        "h": np.arange(4),
+        "beta": [0.1, -0.2, np.nan, 0.4],
+        "sig": [True, False, False, True],
+        "label": ["a", "b", "c", "d"],
+    })
+    by_var = pd.DataFrame({"stat": [1.5, 2.5], "pval": [0.2, 0.01]},
+                          index=pd.Index(["log_RGDP", "PDEBT"], name="variable"))
+    return {
+        "placebo": DiagResult(
+            "placebo", "Placebo test",
+            stats={"stat": np.float64(3.25), "df": np.int64(4), "reject": True,
+                   "decision": "non rifiuto", "pval": np.nan},
+            tables={"coef": coef, "by_var": by_var},
+            meta={"endog": "log_RGDP", "lags": 2, "controls": ["PDEBT", "REER"]},
+        ),
+        "cd": DiagResult("pesaran_cd", "Pesaran CD", stats={"cd": -0.75}),
+        "shared_fit": [1, 2, 3],  # non e un DiagResult: escluso
+    }
+
+
+def _expected_table(df):
+    return df.reset_index() if not isinstance(df.index, pd.RangeIndex) else df
+
+
+@pytest.mark.parametrize("ext", ["json", "parquet"])
+def test_read_battery_round_trip(tmp_path, ext):
+    if ext == "parquet":
+        pytest.importorskip("pyarrow")
+    results = _results()
+    path = write_battery(results, str(tmp_path / f"battery.{ext}"), run_meta={"n": 27})
+    back, run = read_battery(path)
+
+    assert run == {"n": 27}
+    expected = collect_results(results)
+    assert list(back) == list(expected)
+    for key, res in expected.items():
+        got = back[key]
+        assert (got.test, got.title) == (res.test, res.title)
+        assert got.meta == {k: list(v) if isinstance(v, (list, tuple)) else v
+                            for k, v in res.meta.items()}
+        assert set(got.stats) == set(res.stats)
+        for k, v in res.stats.items():
+            if isinstance(v, float) and np.isnan(v):
+                assert got[k] is None
+            else:
+                assert got[k] == v and type(got[k]) is type(np.asarray(v).item())
+        assert list(got.tables) == list(res.tables)
+        for name, df in res.tables.items():
+            pd.testing.assert_frame_equal(got.tables[name], _expected_table(df),
+                                          check_dtype=(ext == "parquet"))
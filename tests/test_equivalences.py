@@ -0,0 +1,116 @@
+"""
+Equivalenze numeriche su cui poggiano i moduli costruiti su lp_engine:
+ciascun percorso veloce deve coincidere con la stima diretta.
+
+    python -m pytest -q tests
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from diagnostic_tests import estimate_lp_interaction
+from lp_engine import (
+    PanelDesign, fit_lp_horizons, fit_lp_horizons_multi, fit_lp_joint, lp_regressors,
+)
+from lp_jackknife import jackknife_lp
+from lp_montecarlo import (
+    GDP, RATIO, SHOCK, _init_worker, _prepare, _regressor_names, _run_batch, calibrate,
+)
+from lp_panel import lp_lin_panel_py
+from lp_smooth import fit_lp_smooth
+from lp_window import lp_window_panel
+from synth_panel import simulate_panels
+
+
+CTRL = ["growth_RGDP", "PDEBT", "NOMLRATE", "REER"]
+LAGS = 2
+HOR = 3
+ENDOG = "log_RGDP"
+TOL = {"rtol": 1e-8, "atol": 1e-12}
+
+
+def _design(data):
+    return PanelDesign(data, [ENDOG, "PUBINVRATIO", SHOCK] + CTRL)
+
+
+def _fits(data, endog=ENDOG):
+    design = _design(data)
+    regressors = lp_regressors(design, SHOCK, CTRL, LAGS)
+    return fit_lp_horizons(design, endog, regressors, HOR)
+
+
+def test_engine_matches_panelols(panel):
+    pytest.importorskip("linearmodels")
+    # engine="check" ristima con PanelOLS e solleva AssertionError se diverso
+    lp_lin_panel_py(panel, ENDOG, SHOCK, CTRL, LAGS, HOR, engine="check")
+
+
+def test_jackknife_downdates_match_refits(panel):
+    design = _design(panel)
+    regressors = lp_regressors(design, SHOCK, CTRL, LAGS)
+    jk = jackknife_lp(design, [ENDOG], regressors, HOR)
+    for i in (0, 13, 26):
+        code = design.entity_labels[i]
+        refit = _fits(panel[panel["ccode"] != code])
+        np.testing.assert_allclose(jk.loo[ENDOG][i, :, 0],
+                                   [r.params[SHOCK] for r in refit], **TOL)
+
+
+def test_window_prefix_sums_match_refits(panel):
+    windows = [(2000, 2011), (2005, 2023)]
+    tbl = lp_window_panel(panel, [ENDOG], SHOCK, CTRL, LAGS, HOR, windows=windows)
+    for a, b in windows:
+        refit = _fits(panel[panel["year_int"].between(a, b)])
+        win = tbl[(tbl["start"] == a) & (tbl["term"] == "beta")].sort_values("h")
+        np.testing.assert_allclose(win["estimate"], [r.params[SHOCK] for r in refit], **TOL)
+        np.testing.assert_allclose(win["se"], [r.std_errors[SHOCK] for r in refit], **TOL)
+
+
+def test_smooth_lp_at_zero_penalty_matches_horizons(panel):
+    design = _design(panel)
+    regressors = lp_regressors(design, SHOCK, CTRL, LAGS)
+    sm = fit_lp_smooth(design, ENDOG, regressors, HOR, lam=0.0)
+    fits = fit_lp_horizons(design, ENDOG, regressors, HOR)
+    np.testing.assert_allclose(sm.coef, [r.params[SHOCK] for r in fits], **TOL)
+    _, V = fit_lp_joint(design, [ENDOG], regressors, HOR).block(ENDOG)
+    np.testing.assert_allclose(sm.cov, V, **TOL)
+
+
+def test_montecarlo_batch_matches_engine(panel):
+    setup = calibrate(panel, controls=CTRL, lags=LAGS, hor=HOR)
+    _init_worker({
+        "eqs": _prepare(setup), "bandwidths": (None,), "regressors": _regressor_names(setup),
+        "present": setup.present, "holes": setup.holes, "dgp": setup.dgp,
+        "hor": setup.hor, "r_share": setup.r_share,
+    })
+    seed = np.random.SeedSequence(7)
+    draws = _run_batch((seed, 1))
+
+    # stesso panel simulato, stimato con il motore
+    N, T = setup.present.shape
+    sim = simulate_panels(np.random.default_rng(seed), 1, N, T, wgi=False, **setup.dgp)
+    e_idx, t_idx = np.nonzero(setup.present)
+    data = pd.DataFrame({"ccode": e_idx, "year_int": t_idx})
+    for v in setup.holes:
+        data[v] = np.where(setup.holes[v], np.nan, sim[v][0])[e_idx, t_idx]
+    design = PanelDesign(data, list(setup.holes))
+    regressors = lp_regressors(design, SHOCK, setup.controls, setup.lags)
+    fits = fit_lp_horizons_multi(design, [GDP, RATIO], regressors, setup.hor)
+    for e, endog in enumerate((GDP, RATIO)):
+        np.testing.assert_allclose(draws["b"][0, e], [r.params[SHOCK] for r in fits[endog]],
+                                   **TOL)
+        np.testing.assert_allclose(np.sqrt(draws["var"][0, e, :, 0]),
+                                   [r.std_errors[SHOCK] for r in fits[endog]], **TOL)
+
+
+def test_placebo_lead_matches_shifted_shock(panel):
+    # panel bilanciato: il lead del design coincide con groupby.shift(-1)
+    df = panel.sort_values(["ccode", "year_int"]).copy()
+    df["forecasterror_lead1"] = df.groupby("ccode", observed=True)[SHOCK].shift(-1)
+    ref = estimate_lp_interaction(df, ENDOG, "forecasterror_lead1", "GE_EST", CTRL, LAGS, HOR)
+    got = estimate_lp_interaction(panel, ENDOG, SHOCK, "GE_EST", CTRL, LAGS, HOR, shock_lead=1)
+    for r, g in zip(ref, got):
+        assert g["shock"] == "forecasterror_lead1" and g["inter_name"] == r["inter_name"]
+        np.testing.assert_allclose([g["beta"], g["theta"], g["se_beta"], g["se_theta"]],
+                                   [r["beta"], r["theta"], r["se_beta"], r["se_theta"]], **TOL)
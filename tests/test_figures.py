@@ -0,0 +1,50 @@
+"""
+Grafici incrementali (figures): render_figures ridisegna solo le spec il
+cui hash di dati + specifica e cambiato.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from figures import band_figure, figure_hash, render_figures, stored_hash
+
+pytest.importorskip("PIL")
+
+
+def _specs(shift=0.0):
+    h = np.arange(4)
+    mid = np.array([0.5, 1.0, 1.2, 1.1])
+    return [
+        band_figure("BASELINE/mult.png", h, mid, mid - 0.3, mid + 0.3, ttl="mult"),
+        band_figure("BASELINE/cum.png", h, mid + shift, mid - 0.2, mid + 0.2, ttl="cum"),
+        band_figure("BASELINE/cum.svg", h, mid, mid - 0.2, mid + 0.2, ttl="svg"),
+    ]
+
+
+def test_only_changed_figures_are_redrawn(tmp_path):
+    root = str(tmp_path)
+    first = render_figures(_specs(), root=root, n_jobs=1)
+    assert list(first["status"]) == ["rendered"] * 3
+    for spec in _specs():
+        assert stored_hash(os.path.join(root, spec.path)) == figure_hash(spec)
+    mtimes = {p: os.path.getmtime(os.path.join(root, p)) for p in first["path"]}
+
+    again = render_figures(_specs(), root=root, n_jobs=1)
+    assert list(again["status"]) == ["unchanged"] * 3
+    assert list(again["hash"]) == list(first["hash"])
+    assert all(os.path.getmtime(os.path.join(root, p)) == t for p, t in mtimes.items())
+
+    changed = render_figures(_specs(shift=0.1), root=root, n_jobs=1)
+    assert list(changed["status"]) == ["unchanged", "rendered", "unchanged"]
+    assert render_figures(_specs(), root=root, n_jobs=1, force=True)["status"].eq("rendered").all()
+
+
+def test_hash_ignores_path_and_duplicates_raise(tmp_path):
+    a, b = _specs()[1], _specs()[1]
+    b.path = "OTHER/cum.png"
+    assert figure_hash(a) == figure_hash(b)
+    assert figure_hash(a) != figure_hash(_specs(shift=1e-12)[1])
+    with pytest.raises(ValueError):
+        render_figures([a, a], root=str(tmp_path))
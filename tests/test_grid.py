@@ -0,0 +1,96 @@
+"""
+Griglia di specificazioni (lp_grid): ogni riga deve coincidere con la
+stima diretta della sua spec, moltiplicatore compreso.
+"""
+
+import numpy as np
+import pytest
+
+from lp_engine import (
+    PanelDesign, fit_lp_horizons, interaction_regressors, lp_joint_panel, mult_from_joint,
+)
+from lp_grid import LPSpec, grid_mult_table, run_spec_grid, sample_r_share
+from lp_panel import lp_lin_panel_multi, mult_from_ratio
+
+
+CONTROLS = {
+    "base": ["growth_RGDP", "PDEBT", "NOMLRATE", "REER"],
+    "gap": ["OUTPUTGAP", "PDEBT", "NOMLRATE", "REER"],
+}
+SAMPLES = {"early": "year_int <= 2017"}
+ENDOG = ["log_RGDP", "PUBINVRATIO"]
+SHOCK = "forecasterror"
+SPECS = [
+    LPSpec("base", 2, name="base"),
+    LPSpec("base", 2, hor=1, name="short"),
+    LPSpec("gap", 3, "early", name="gap_early"),
+    LPSpec("base", 2, moderator="GE_EST", name="inter"),
+]
+TOL = {"rtol": 1e-8, "atol": 1e-12}
+
+
+def _grid(panel, **kw):
+    return run_spec_grid(panel, SPECS, ENDOG, CONTROLS, SAMPLES, shock=SHOCK,
+                         multiplier=tuple(ENDOG), n_jobs=1, **kw)
+
+
+@pytest.fixture(scope="module")
+def grid(panel):
+    return _grid(panel)
+
+
+def _rows(tbl, spec_id, endog, term):
+    sel = (tbl["spec_id"] == spec_id) & (tbl["endog"] == endog) & (tbl["term"] == term)
+    return tbl[sel].sort_values("h")
+
+
+def test_rows_match_direct_fits(panel, grid):
+    sub = panel.query(SAMPLES["early"])
+    design = PanelDesign(sub, ENDOG + [SHOCK] + CONTROLS["gap"])
+    regressors = [(SHOCK, design.var(SHOCK))] + design.lagged_regressors(CONTROLS["gap"], 3)
+    for endog in ENDOG:
+        fits = fit_lp_horizons(design, endog, regressors, 3)
+        rows = _rows(grid, "gap_early", endog, "beta")
+        np.testing.assert_allclose(rows["estimate"], [r.params[SHOCK] for r in fits], **TOL)
+        np.testing.assert_allclose(rows["se"], [r.std_errors[SHOCK] for r in fits], **TOL)
+
+
+def test_moderator_theta_matches_direct_fit(panel, grid):
+    ctrl = CONTROLS["base"]
+    design = PanelDesign(panel, ["log_RGDP", SHOCK, "GE_EST"] + ctrl)
+    regressors, inter = interaction_regressors(design, SHOCK, "GE_EST", ctrl, 2)
+    fits = fit_lp_horizons(design, "log_RGDP", regressors, 3)
+    rows = _rows(grid, "inter", "log_RGDP", "theta")
+    np.testing.assert_allclose(rows["estimate"], [r.params[inter] for r in fits], **TOL)
+    assert not (grid["spec_id"].eq("inter") & grid["term"].eq("multiplier")).any()
+
+
+def test_shorter_horizon_reuses_longest_fit(grid):
+    short = _rows(grid, "short", "log_RGDP", "beta")
+    base = _rows(grid, "base", "log_RGDP", "beta")
+    assert short["h"].tolist() == [0, 1]
+    np.testing.assert_array_equal(short["estimate"], base["estimate"].iloc[:2])
+
+
+def test_multiplier_has_mult_from_ratio_bands(panel, grid):
+    sub = panel.query(SAMPLES["early"])
+    lp = lp_lin_panel_multi(sub, ENDOG, SHOCK, CONTROLS["gap"], 3, 3)
+    ref = mult_from_ratio(lp["log_RGDP"], lp["PUBINVRATIO"], sample_r_share(sub))
+    np.testing.assert_allclose(grid_mult_table(grid, "gap_early").to_numpy(), ref.to_numpy(),
+                               **TOL)
+
+
+def test_joint_bands_on_request(panel):
+    tbl = _grid(panel, bands="joint")
+    joint = lp_joint_panel(panel, ENDOG, SHOCK, CONTROLS["base"], 2, 3)
+    ref = mult_from_joint(joint, sample_r_share(panel))
+    np.testing.assert_allclose(grid_mult_table(tbl, "base").to_numpy(), ref.to_numpy(), **TOL)
+    with pytest.raises(ValueError):
+        _grid(panel, bands="sum")
+
+
+def test_pool_matches_sequential(panel, grid):
+    pooled = run_spec_grid(panel, SPECS, ENDOG, CONTROLS, SAMPLES, shock=SHOCK,
+                           multiplier=tuple(ENDOG), n_jobs=2)
+    np.testing.assert_array_equal(pooled["estimate"], grid["estimate"])
+    np.testing.assert_array_equal(pooled["se"], grid["se"])
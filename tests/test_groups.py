@@ -0,0 +1,114 @@
+"""
+LP per gruppi (lp_groups): il fit interagito deve coincidere con la stima
+diretta sui regressori moltiplicati per i dummy di gruppo, e test_equal con
+il Wald sulle differenze tra gruppi.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lp_engine import PanelDesign, fit_lp_horizons, lp_regressors, wald_test
+from lp_groups import (
+    group_codes, group_regressors, lp_group_panel, quantile_groups, quantile_labels,
+    static_groups,
+)
+
+
+CTRL = ["growth_RGDP", "PDEBT"]
+SHOCK = "forecasterror"
+ENDOG = ["log_RGDP", "PUBINVRATIO"]
+LAGS = 2
+HOR = 3
+TOL = {"rtol": 1e-8, "atol": 1e-12}
+
+
+@pytest.fixture(scope="module")
+def members(panel):
+    codes = sorted(panel["ccode"].astype(str).unique())
+    return {"south": codes[:8], "east": codes[8:15]}
+
+
+def _interacted(panel, members):
+    """
+    Colonne shock@g e L{k}_c@g costruite a mano (groupby.shift per i lag),
+    gruppo "other" per i paesi non elencati.
+    """
+    df = panel.sort_values(["ccode", "year_int"]).reset_index(drop=True)
+    g = df.groupby("ccode", observed=True)
+    code = df["ccode"].astype(str)
+    label = pd.Series("other", index=df.index)
+    for lab, codes in members.items():
+        label[code.isin(codes)] = lab
+    out = df[["ccode", "year_int"] + ENDOG].copy()
+    names = []
+    for lab in list(members) + ["other"]:
+        d = (label == lab).astype(float)
+        out[f"{SHOCK}@{lab}"] = df[SHOCK] * d
+        names.append(f"{SHOCK}@{lab}")
+    for c in CTRL:
+        for L in range(1, LAGS + 1):
+            for lab in list(members) + ["other"]:
+                out[f"L{L}_{c}@{lab}"] = g[c].shift(L) * (label == lab).astype(float)
+                names.append(f"L{L}_{c}@{lab}")
+    return out, names
+
+
+def test_group_fit_matches_interacted_regression(panel, members):
+    res = lp_group_panel(panel, ENDOG, SHOCK, CTRL, LAGS, HOR, members)
+    assert res.groups == ["south", "east", "other"]
+
+    df, names = _interacted(panel, members)
+    design = PanelDesign(df, ENDOG + names)
+    regressors = [(n, design.var(n)) for n in names]
+    for endog in ENDOG:
+        fits = fit_lp_horizons(design, endog, regressors, HOR)
+        for lab in res.groups:
+            b, V = res.block(endog, lab)
+            col = f"{SHOCK}@{lab}"
+            np.testing.assert_allclose(b, [r.params[col] for r in fits], **TOL)
+            np.testing.assert_allclose(np.sqrt(np.diag(V)), [r.std_errors[col] for r in fits],
+                                       **TOL)
+    assert res.nobs.sum() == np.isfinite(df[names].to_numpy()).all(axis=1).sum()
+
+
+def test_test_equal_is_wald_on_group_differences(panel, members):
+    two = lp_group_panel(panel, ENDOG, SHOCK, CTRL, LAGS, HOR, {"south": members["south"]})
+    d, Vd = two.diff("log_RGDP", "other", "south")
+    ref = wald_test(d, Vd)
+    got = two.test_equal("log_RGDP")
+    assert got["df"] == ref["df"] == HOR + 1
+    np.testing.assert_allclose(got["stat"], ref["stat"], **TOL)
+
+    sub = two.test_equal("log_RGDP", horizons=[1, 3])
+    ref = wald_test(d[[1, 3]], Vd[np.ix_([1, 3], [1, 3])])
+    np.testing.assert_allclose(sub["stat"], ref["stat"], **TOL)
+
+    # con tre gruppi il test non dipende dal gruppo di base
+    three = lp_group_panel(panel, ENDOG, SHOCK, CTRL, LAGS, HOR, members)
+    stat = three.test_equal("log_RGDP")
+    assert stat["df"] == 2 * (HOR + 1)
+    d1, _ = three.diff("log_RGDP", "east", "south")
+    d2, _ = three.diff("log_RGDP", "other", "south")
+    d3, _ = three.diff("log_RGDP", "other", "east")
+    np.testing.assert_allclose(d2 - d1, d3, **TOL)
+    groups = three.groups
+    three.groups = groups[::-1]
+    np.testing.assert_allclose(three.test_equal("log_RGDP")["stat"], stat["stat"], rtol=1e-8)
+    three.groups = groups
+
+
+def test_quantile_groups_add_group_dummies(panel, members):
+    design = PanelDesign(panel, ENDOG + [SHOCK, "GE_EST"] + CTRL)
+    regressors = lp_regressors(design, SHOCK, CTRL, LAGS)
+    codes, labels = group_codes(quantile_groups(design, "GE_EST", 3), quantile_labels(3))
+    names = [n for n, _ in group_regressors(regressors, codes, labels)]
+    # assegnazione variabile nel tempo: dummy per i gruppi oltre la base
+    assert names[-2:] == ["group@mid", "group@high"]
+    codes, labels = group_codes(static_groups(design, members))
+    assert not any(n.startswith("group@") for n, _ in group_regressors(regressors, codes, labels))
+
+    res = lp_group_panel(panel, ["log_RGDP"], SHOCK, CTRL, LAGS, 1, "GE_EST", n_quantiles=3)
+    assert res.groups == ["low", "mid", "high"] and res.nobs.min() > 0
+    with pytest.raises(KeyError):
+        res.target("top")
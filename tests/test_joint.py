@@ -0,0 +1,56 @@
+"""
+Covarianza DK congiunta (lp_engine.fit_lp_joint) e bande dei cumulati:
+bands="ratio" deve riprodurre cum_irf / mult_from_ratio.
+"""
+
+import numpy as np
+import pytest
+
+from lp_engine import cum_irf_joint, lp_joint_panel, mult_from_joint
+from lp_panel import cum_irf, lp_lin_panel_multi, mult_from_ratio
+
+
+CTRL = ["growth_RGDP", "PDEBT", "NOMLRATE", "REER"]
+ENDOG = ["log_RGDP", "PUBINVRATIO"]
+R_SHARE = 0.035
+TOL = {"rtol": 1e-8, "atol": 1e-10}
+
+
+@pytest.fixture(scope="module")
+def fits(panel):
+    joint = lp_joint_panel(panel, ENDOG, "forecasterror", CTRL, 2, 3)
+    lp = lp_lin_panel_multi(panel, ENDOG, "forecasterror", CTRL, 2, 3)
+    return joint, lp
+
+
+def test_joint_diagonal_matches_horizon_se(fits):
+    joint, lp = fits
+    for endog in ENDOG:
+        b, V = joint.block(endog)
+        se = 0.5 * (lp[endog]["irf_panel_up"] - lp[endog]["irf_panel_low"])
+        np.testing.assert_allclose(b, lp[endog]["irf_panel_mean"], **TOL)
+        np.testing.assert_allclose(np.sqrt(np.diag(V)), se, **TOL)
+
+
+def test_ratio_bands_match_script_bands(fits):
+    joint, lp = fits
+    cum = cum_irf(lp["log_RGDP"], scale=100.0)
+    cum_j = cum_irf_joint(joint, "log_RGDP", scale=100.0, bands="ratio")
+    np.testing.assert_allclose(cum_j.to_numpy(), cum.to_numpy(), **TOL)
+
+    mult = mult_from_ratio(lp["log_RGDP"], lp["PUBINVRATIO"], R_SHARE)
+    mult_j = mult_from_joint(joint, R_SHARE, bands="ratio")
+    np.testing.assert_allclose(mult_j.to_numpy(), mult.to_numpy(), **TOL)
+
+
+def test_joint_bands_use_cross_horizon_covariance(fits):
+    joint, _ = fits
+    b, V = joint.block("log_RGDP")
+    C = np.tril(np.ones((len(b), len(b))))
+    cum = cum_irf_joint(joint, "log_RGDP")
+    np.testing.assert_allclose(cum["hi"] - cum["cum"], np.sqrt(np.diag(C @ V @ C.T)), **TOL)
+
+
+def test_unknown_bands_raise(fits):
+    with pytest.raises(ValueError):
+        mult_from_joint(fits[0], R_SHARE, bands="sum")
@@ -0,0 +1,85 @@
+"""
+Test congiunti tra orizzonti (wald_test, sup_t_test, sum_test) e i metodi
+di LPJointResult che li applicano alla covarianza gia stimata.
+"""
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from lp_engine import lp_joint_panel, sum_test, sup_t_test, wald_test
+
+
+CTRL = ["growth_RGDP", "PDEBT", "NOMLRATE", "REER"]
+TOL = {"rtol": 1e-10, "atol": 1e-12}
+
+
+def _cov(k, seed=0):
+    A = np.random.default_rng(seed).standard_normal((k, k))
+    return A @ A.T + k * np.eye(k)
+
+
+def test_wald_matches_quadratic_form():
+    b = np.array([0.3, -0.1, 0.5, 0.2])
+    V = _cov(4)
+    out = wald_test(b, V)
+    stat = b @ np.linalg.solve(V, b)
+    assert out["df"] == 4
+    np.testing.assert_allclose(out["stat"], stat, **TOL)
+    np.testing.assert_allclose(out["pval"], stats.chi2.sf(stat, 4), **TOL)
+
+    # H0: b_0 = b_1 e b_3 = 0.2 come restrizione lineare
+    R = np.array([[1.0, -1.0, 0.0, 0.0], [0.0, 0.0, 0.0, 1.0]])
+    q = np.array([0.0, 0.2])
+    d = R @ b - q
+    out = wald_test(b, V, R, q)
+    assert out["df"] == 2
+    np.testing.assert_allclose(out["stat"], d @ np.linalg.solve(R @ V @ R.T, d), **TOL)
+
+
+def test_sup_t_critical_values():
+    # orizzonti indipendenti: crit = quantile di Sidak del massimo di k |N(0,1)|
+    k = 4
+    out = sup_t_test(np.zeros(k), np.eye(k), alpha=0.05, n_sim=200_000)
+    sidak = stats.norm.ppf(1 - (1 - 0.95 ** (1 / k)) / 2)
+    assert abs(out["crit"] - sidak) < 0.02
+    # orizzonti perfettamente correlati: crit = quantile normale a due code
+    out = sup_t_test(np.zeros(k), np.ones((k, k)) + 1e-12 * np.eye(k), n_sim=200_000)
+    assert abs(out["crit"] - stats.norm.ppf(0.975)) < 0.02
+
+    b = np.array([0.1, 0.4, -0.2])
+    V = _cov(3)
+    out = sup_t_test(b, V)
+    se = np.sqrt(np.diag(V))
+    np.testing.assert_allclose(out["stat"], np.max(np.abs(b / se)), **TOL)
+    np.testing.assert_allclose(out["hi"] - out["lo"], 2 * out["crit"] * se, **TOL)
+    # seed fisso: stesso valore critico a ogni chiamata
+    assert sup_t_test(b, V)["crit"] == out["crit"]
+
+
+def test_sum_matches_weighted_sum():
+    b = np.array([0.3, -0.1, 0.5])
+    V = _cov(3, seed=1)
+    out = sum_test(b, V)
+    np.testing.assert_allclose(out["estimate"], b.sum(), **TOL)
+    np.testing.assert_allclose(out["se"], np.sqrt(V.sum()), **TOL)
+    w = np.array([1.0, 0.0, 2.0])
+    out = sum_test(b, V, w)
+    np.testing.assert_allclose(out["estimate"], w @ b, **TOL)
+    np.testing.assert_allclose(out["se"], np.sqrt(w @ V @ w), **TOL)
+    np.testing.assert_allclose(out["pval"], 2 * stats.norm.sf(abs(out["z"])), **TOL)
+
+
+def test_joint_result_methods_select_horizons(panel):
+    joint = lp_joint_panel(panel, ["log_RGDP"], "forecasterror", CTRL, 2, 3)
+    b, V = joint.block("log_RGDP")
+    pos = [1, 3]
+    sub_b, sub_V = b[pos], V[np.ix_(pos, pos)]
+
+    assert joint.wald("log_RGDP", horizons=[1, 3]) == wald_test(sub_b, sub_V)
+    assert joint.sum_effect("log_RGDP", horizons=[1, 3]) == sum_test(sub_b, sub_V)
+    got = joint.sup_t("log_RGDP", horizons=[1, 3])
+    ref = sup_t_test(sub_b, sub_V)
+    assert got["stat"] == ref["stat"] and got["crit"] == ref["crit"]
+    np.testing.assert_array_equal(got["lo"], ref["lo"])
+    assert joint.wald("log_RGDP") == wald_test(b, V)
@@ -0,0 +1,80 @@
+"""
+Moltiplicatore dal sistema PIL + rapporto (lp_engine.mult_system_panel):
+campione comune, delta method sulla covarianza congiunta e quote multiple.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lp_engine import lp_joint_panel, mult_system_panel
+from lp_panel import lp_lin_panel_multi, mult_from_ratio
+
+
+CTRL = ["growth_RGDP", "PDEBT", "NOMLRATE", "REER"]
+SHOCK = "forecasterror"
+ENDOG = ["log_RGDP", "PUBINVRATIO"]
+R_SHARE = 0.035
+TOL = {"rtol": 1e-8, "atol": 1e-12}
+
+
+def _mult(theta, r, H1):
+    C = np.tril(np.ones((H1, H1)))
+    X, R = 100.0 * C @ theta[:H1], C @ theta[H1:]
+    return X / (R + r * X)
+
+
+def test_ratio_bands_on_separate_samples_match_script(panel):
+    got = mult_system_panel(panel, SHOCK, CTRL, 2, 3, R_SHARE, common_sample=False,
+                            bands="ratio")
+    lp = lp_lin_panel_multi(panel, ENDOG, SHOCK, CTRL, 2, 3)
+    ref = mult_from_ratio(lp["log_RGDP"], lp["PUBINVRATIO"], R_SHARE)
+    cols = ["h", "multiplier", "lo_1se", "hi_1se"]
+    np.testing.assert_allclose(got[cols].to_numpy(), ref[cols].to_numpy(), **TOL)
+    np.testing.assert_allclose(got["se"], got["hi_1se"] - got["multiplier"], **TOL)
+
+
+def test_common_sample_equals_aligned_panel(panel):
+    # PIL e rapporto mancanti sulle stesse righe: campioni separati = comune
+    aligned = panel.copy()
+    miss = aligned[ENDOG].isna().any(axis=1)
+    aligned.loc[miss, ENDOG] = np.nan
+    got = mult_system_panel(panel, SHOCK, CTRL, 2, 3, R_SHARE)
+    ref = mult_system_panel(aligned, SHOCK, CTRL, 2, 3, R_SHARE, common_sample=False)
+    pd.testing.assert_frame_equal(got, ref, check_exact=False, rtol=1e-8, atol=1e-12)
+    sep = mult_system_panel(panel, SHOCK, CTRL, 2, 3, R_SHARE, common_sample=False)
+    assert not np.allclose(got["multiplier"], sep["multiplier"])
+
+
+def test_joint_se_is_delta_method(panel):
+    got = mult_system_panel(panel, SHOCK, CTRL, 2, 3, R_SHARE, confint=1.645)
+    joint = lp_joint_panel(panel, ENDOG, SHOCK, CTRL, 2, 3, common_sample=True)
+    bx, _ = joint.block("log_RGDP")
+    br, _ = joint.block("PUBINVRATIO")
+    theta = np.r_[bx, br]
+    sel = np.r_[[joint.coef.index.get_loc((e, h, SHOCK)) for e in ENDOG for h in range(4)]]
+    V = joint.cov.to_numpy()[np.ix_(sel, sel)]
+
+    # jacobiano numerico (differenze centrali) di M_h rispetto alle IRF impilate
+    eps = 1e-7
+    J = np.column_stack([
+        (_mult(theta + eps * e, R_SHARE, 4) - _mult(theta - eps * e, R_SHARE, 4)) / (2 * eps)
+        for e in np.eye(len(theta))
+    ])
+    np.testing.assert_allclose(got["multiplier"], _mult(theta, R_SHARE, 4), **TOL)
+    np.testing.assert_allclose(got["se"], np.sqrt(np.diag(J @ V @ J.T)), rtol=1e-5)
+    np.testing.assert_allclose(got["hi_1se"] - got["lo_1se"], 2 * 1.645 * got["se"], **TOL)
+
+
+def test_many_shares_in_one_call(panel):
+    shares = pd.Series([0.03, 0.04], index=["rob1", "rob2"])
+    got = mult_system_panel(panel, SHOCK, CTRL, 2, 3, shares)
+    assert list(got["spec"]) == ["rob1"] * 4 + ["rob2"] * 4
+    for key, r in shares.items():
+        one = mult_system_panel(panel, SHOCK, CTRL, 2, 3, r)
+        sub = got[got["spec"] == key].drop(columns=["spec", "r_share"]).reset_index(drop=True)
+        pd.testing.assert_frame_equal(sub, one, check_exact=False, rtol=1e-12)
+    arr = mult_system_panel(panel, SHOCK, CTRL, 2, 3, shares.to_numpy())
+    assert list(arr["spec"]) == [0] * 4 + [1] * 4
+    with pytest.raises(ValueError):
+        mult_system_panel(panel, SHOCK, CTRL, 2, 3, R_SHARE, bands="sum")
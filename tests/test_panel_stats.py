@@ -0,0 +1,158 @@
+"""
+Statistiche diagnostiche vettorizzate (panel_stats) contro i calcoli
+coppia per coppia (CD) e serie per serie (ADF) che sostituiscono.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import panel_stats
+from panel_stats import (
+    adf_batch, cips_null, ips_moments, ips_test, pairwise_corr, panel_matrix,
+    panel_unit_root, pesaran_cd,
+)
+
+
+def _resid_matrix(T=20, N=15, missing=0.15, seed=0):
+    rng = np.random.default_rng(seed)
+    f = rng.standard_normal(T)
+    E = 0.6 * f[:, None] + rng.standard_normal((T, N))
+    E[rng.random((T, N)) < missing] = np.nan
+    E[:, 3] = np.nan                    # paese senza residui
+    E[:17, 7] = np.nan                  # coppie con T_ij < 3
+    return E
+
+
+def _cd_loop(E, min_T=3, w=None):
+    """
+    Formula del codice originale (coppie i < j sugli anni comuni).
+    """
+    E = E[:, np.isfinite(E).sum(axis=0) > 0]
+    N = E.shape[1]
+    w = np.ones(N) if w is None else w
+    cd_sum, pairs, Ts = 0.0, 0, []
+    for i in range(N):
+        for j in range(i + 1, N):
+            mask = np.isfinite(E[:, i]) & np.isfinite(E[:, j])
+            if mask.sum() < min_T:
+                continue
+            rho = np.corrcoef(E[mask, i], E[mask, j])[0, 1]
+            cd_sum += np.sqrt(mask.sum()) * rho * w[i] * w[j]
+            pairs += 1
+            Ts.append(mask.sum())
+    return np.sqrt(2.0 / (N * (N - 1))) * cd_sum, pairs, min(Ts), max(Ts)
+
+
+@pytest.mark.parametrize("block", [4, 1024])
+def test_pesaran_cd_matches_pair_loop(block):
+    E = _resid_matrix()
+    cd = pesaran_cd(E, block=block)
+    stat, pairs, t_min, t_max = _cd_loop(E)
+    assert cd["CD"] == pytest.approx(stat, rel=1e-10)
+    assert (cd["N"], cd["pairs"], cd["T_min"], cd["T_max"]) == (14, pairs, t_min, t_max)
+
+    w = np.random.default_rng(12345).choice([-1.0, 1.0], size=cd["N"])
+    assert cd["CDw"] == pytest.approx(_cd_loop(E, w=w)[0], rel=1e-10)
+
+
+def test_pairwise_corr_matches_corrcoef():
+    E = np.delete(_resid_matrix(seed=1), 3, axis=1)
+    rho, T_ij = pairwise_corr(E, block=5)
+    for i, j in [(0, 1), (2, 9), (5, 13)]:
+        mask = np.isfinite(E[:, i]) & np.isfinite(E[:, j])
+        assert T_ij[i, j] == mask.sum()
+        assert rho[i, j] == pytest.approx(np.corrcoef(E[mask, i], E[mask, j])[0, 1])
+
+
+def test_panel_matrix_matches_pivot():
+    rng = np.random.default_rng(2)
+    idx = pd.MultiIndex.from_product([["B", "A", "C"], [2001, 2000, 2003]],
+                                     names=["ccode", "year_int"])
+    s = pd.Series(rng.standard_normal(len(idx)), index=idx).drop(("C", 2000))
+    E, years, codes = panel_matrix(s)
+    pivot = s.reset_index().pivot(index="year_int", columns="ccode", values=0)
+    np.testing.assert_array_equal(E, pivot.to_numpy())
+    assert list(years) == list(pivot.index) and list(codes) == list(pivot.columns)
+
+
+# ============================================================
+# RADICI UNITARIE
+# ============================================================
+
+def _adf_loop(y, p, ybar=None):
+    """
+    ADF(p) con costante (CADF se ybar) per una serie, con lstsq.
+    """
+    def lag(a, k):
+        return np.concatenate([np.full(k, np.nan), a[:len(a) - k]]) if k else a
+
+    dy = np.diff(y, prepend=np.nan)
+    cols = [np.ones_like(y), lag(y, 1)]
+    if ybar is not None:
+        db = np.diff(ybar, prepend=np.nan)
+        cols += [lag(ybar, 1), db] + [lag(db, j) for j in range(1, p + 1)]
+    cols += [lag(dy, j) for j in range(1, p + 1)]
+    X = np.column_stack(cols)
+    ok = np.isfinite(dy) & np.isfinite(X).all(axis=1)
+    X, dy = X[ok], dy[ok]
+    b, ssr, _, _ = np.linalg.lstsq(X, dy, rcond=None)
+    s2 = ssr[0] / (len(dy) - X.shape[1])
+    return b[1] / np.sqrt(s2 * np.linalg.inv(X.T @ X)[1, 1])
+
+
+def _walks(N=12, T=25, rho=1.0, seed=3):
+    rng = np.random.default_rng(seed)
+    e = rng.standard_normal((N, T))
+    Y = np.zeros((N, T))
+    Y[:, 0] = e[:, 0]
+    for t in range(1, T):
+        Y[:, t] = rho * Y[:, t - 1] + e[:, t]
+    return Y
+
+
+def test_adf_batch_matches_series_loop():
+    Y = _walks()
+    Y[2, :4] = np.nan                   # serie che inizia piu tardi
+    lags = np.array([0, 1, 2] * 4)
+    tau = adf_batch(Y, lags)["tau"]
+    for i in range(len(Y)):
+        assert tau[i] == pytest.approx(_adf_loop(Y[i], lags[i]), rel=1e-8)
+
+
+def test_cadf_matches_series_loop():
+    Y = _walks(seed=4)
+    ybar = np.broadcast_to(Y.mean(axis=0), Y.shape)
+    tau = adf_batch(Y, 1, cross=ybar)["tau"]
+    for i in (0, 5, 11):
+        assert tau[i] == pytest.approx(_adf_loop(Y[i], 1, ybar[i]), rel=1e-8)
+
+
+def test_ips_statistic_from_table_moments():
+    tau = np.array([-2.1, -1.4, np.nan, -0.8])
+    n_levels, lags = np.array([24, 24, 24, 20]), np.array([0, 1, 1, 2])
+    out = ips_test(tau, n_levels, lags)
+    mom = np.array([ips_moments(T, p) for T, p in zip(n_levels, lags)])[[0, 1, 3]]
+    W = np.sqrt(3) * (np.nanmean(tau) - mom[:, 0].mean()) / np.sqrt(mom[:, 1].mean())
+    assert out["N"] == 3 and out["W"] == pytest.approx(W)
+    assert ips_moments(20, 0) == (-1.516, 0.863)
+
+
+def test_unit_root_battery_separates_stationary_and_random_walks():
+    N, T = 20, 30
+    frame = pd.DataFrame({
+        "ccode": np.repeat(np.arange(N), T), "year_int": np.tile(np.arange(2000, 2000 + T), N),
+        "stat": _walks(N, T, rho=0.3, seed=5).ravel(), "rw": _walks(N, T, seed=6).ravel(),
+    })
+    res = panel_unit_root(frame, ["stat", "rw"]).set_index("variable")
+    for col in ("ips_p", "llc_p", "cips_p"):
+        assert res.loc["stat", col] < 0.01
+        assert res.loc["rw", col] > 0.05
+
+
+def test_cips_null_does_not_depend_on_block(monkeypatch):
+    monkeypatch.setattr(panel_stats, "_CIPS_NULL", {})
+    whole = cips_null(6, 15, 1, reps=40)
+    monkeypatch.setattr(panel_stats, "_CIPS_NULL", {})
+    monkeypatch.setattr(panel_stats, "CIPS_BLOCK", 6 * 15 * 7)
+    np.testing.assert_array_equal(cips_null(6, 15, 1, reps=40), whole)
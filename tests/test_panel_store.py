@@ -0,0 +1,71 @@
+"""
+Store colonnare (panel_store): pulizia e validazione del CSV, lettura
+dallo store uguale alla lettura diretta, rigenerazione se il CSV cambia.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from panel_store import clean_panel, load_panel, store_path
+
+
+CSV = """Country,year,ccode,REER,PDEBT
+Italy, 2001 ,ITA,99.5,NA
+Austria,2001,AUT,100.1,66.5
+Italy,2000,ITA,98.0,108.6
+Austria,2000,AUT,99.8,66.4
+Austria,2024,AUT,101.0,70.0
+"""
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "panel.csv"
+    path.write_text(CSV)
+    return str(path)
+
+
+def test_clean_panel_types_and_order(csv_path):
+    df = clean_panel(pd.read_csv(csv_path))
+    assert list(df.columns[:2]) == ["ccode", "year_int"]
+    assert df["year_int"].dtype == np.int64
+    assert isinstance(df["ccode"].dtype, pd.CategoricalDtype)
+    assert isinstance(df["Country"].dtype, pd.CategoricalDtype)
+    assert df[["ccode", "year_int"]].astype(str).agg("-".join, axis=1).tolist() == \
+        ["AUT-2000", "AUT-2001", "AUT-2024", "ITA-2000", "ITA-2001"]
+    assert np.isnan(df.loc[4, "PDEBT"])
+
+
+@pytest.mark.parametrize("edit, match", [
+    (lambda d: pd.concat([d, d.iloc[[0]]]), "duplicata"),
+    (lambda d: d.assign(REER=d["REER"].astype(str).where(d.index != 1, "n.d.")), "non numerici"),
+    (lambda d: d.assign(year=d["year"].astype(str).where(d.index != 2, "2000.5")), "non interi"),
+    (lambda d: d.drop(columns="ccode"), "mancanti"),
+])
+def test_clean_panel_rejects_bad_input(csv_path, edit, match):
+    with pytest.raises(ValueError, match=match):
+        clean_panel(edit(pd.read_csv(csv_path)))
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "feather"])
+def test_store_matches_csv(csv_path, fmt):
+    pytest.importorskip("pyarrow")
+    direct = clean_panel(pd.read_csv(csv_path))
+    direct = direct[direct["year_int"] <= 2023].reset_index(drop=True)
+    stored = load_panel(csv_path, years=(2000, 2023), fmt=fmt)
+    assert os.path.exists(store_path(csv_path, fmt))
+    pd.testing.assert_frame_equal(stored, direct, check_categorical=False)
+
+    sub = load_panel(csv_path, columns=["PDEBT"], years=None, fmt=fmt)
+    assert list(sub.columns) == ["ccode", "year_int", "PDEBT"] and len(sub) == 5
+
+
+def test_store_is_rebuilt_when_csv_changes(csv_path):
+    pytest.importorskip("pyarrow")
+    assert load_panel(csv_path)["REER"].iloc[0] == 99.8
+    with open(csv_path, "w") as f:
+        f.write(CSV.replace("99.8", "77.7"))
+    assert load_panel(csv_path)["REER"].iloc[0] == 77.7
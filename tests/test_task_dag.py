@@ -0,0 +1,64 @@
+"""
+Scheduler dei compiti (task_dag): ordine delle dipendenze, output
+nell'ordine di dichiarazione, errori su dipendenze sconosciute e cicli.
+"""
+
+import pytest
+
+from task_dag import Task, run_dag
+
+
+def _value(x):
+    print(f"value {x}")
+    return x
+
+
+def _add(a, b):
+    print(f"add {a} {b}")
+    return a + b
+
+
+def _scale(x, factor):
+    print(f"scale {x}")
+    return x * factor
+
+
+def _tasks():
+    # dichiarati prima delle dipendenze: l'ordine di esecuzione viene dal DAG
+    return [
+        Task("total", _add, deps={"a": "left", "b": "right"}),
+        Task("left", _scale, deps={"x": "base", "factor": "k"}),
+        Task("right", _scale, args=(5,), deps={"factor": "k"}),
+        Task("base", _value, args=(2,), quiet=True),
+    ]
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_dependencies_and_output_order(capsys, n_jobs):
+    results, timing = run_dag(_tasks(), shared={"k": 10}, n_jobs=n_jobs)
+    assert results == {"base": 2, "left": 20, "right": 50, "total": 70}
+    # output nell'ordine di dichiarazione, senza i compiti quiet
+    assert capsys.readouterr().out == "add 20 50\nscale 2\nscale 5\n"
+    assert list(timing["task"]) == ["total", "left", "right", "base"]
+    t = timing.set_index("task")
+    assert t.loc["total", "start"] >= max(t.loc["left", "end"], t.loc["right", "end"])
+    assert t.loc["left", "start"] >= t.loc["base", "end"]
+
+
+def test_unknown_and_duplicate_tasks_raise():
+    with pytest.raises(ValueError, match="sconosciute"):
+        run_dag([Task("a", _value, deps={"x": "missing"})], n_jobs=1)
+    with pytest.raises(ValueError, match="duplicati"):
+        run_dag([Task("a", _value, args=(1,)), Task("a", _value, args=(2,))], n_jobs=1)
+
+
+def test_cycle_raises_before_running(capsys):
+    tasks = [
+        Task("root", _value, args=(1,)),
+        Task("a", _add, deps={"a": "root", "b": "c"}),
+        Task("b", _scale, deps={"x": "a"}, kwargs={"factor": 2}),
+        Task("c", _scale, deps={"x": "b"}, kwargs={"factor": 2}),
+    ]
+    with pytest.raises(ValueError, match=r"cicliche tra \['a', 'b', 'c'\]"):
+        run_dag(tasks, n_jobs=1)
+    assert capsys.readouterr().out == ""
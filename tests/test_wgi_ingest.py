@@ -0,0 +1,109 @@
+"""
+Ingest WGI (wgi_ingest): l'aggiornamento incrementale deve dare lo stesso
+CSV della ricostruzione completa, qualunque sia la storia degli update.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wgi_ingest import build_pub_wgi, stream_wgi, update_pub_wgi
+
+
+YEARS = [2000, 2001, 2002, 2003]
+INDICATORS = ["CC.EST", "GE.EST"]
+
+
+def _write_wgi(path, values):
+    """
+    values: {(paese, indicatore): lista di valori per YEARS (None = vuoto)}.
+    """
+    rows = []
+    for (code, ind), vals in values.items():
+        row = {"Country Name": f"Country {code}", "Country Code": code,
+               "Indicator Name": ind, "Indicator Code": ind}
+        row.update({str(y): v for y, v in zip(YEARS, vals)})
+        rows.append(row)
+    rows.append({"Country Name": "Other", "Country Code": "ZZZ", "Indicator Name": "x",
+                 "Indicator Code": "CC.EST", **{str(y): 9.0 for y in YEARS}})
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+def _write_pub(path, cells):
+    rng = np.random.default_rng(len(cells))
+    pd.DataFrame({
+        "Country": [f"Country {c}" for c, _ in cells], "year": [y for _, y in cells],
+        "ccode": [c for c, _ in cells], "REER": rng.standard_normal(len(cells)),
+    }).to_csv(path, index=False)
+
+
+def _cells(codes, years):
+    return [(c, y) for c in codes for y in years]
+
+
+def _check(tmp_path, wgi_values, old_cells, new_cells, expected_mode, **kw):
+    wgi, pub, out = (str(tmp_path / n) for n in ("wgi.csv", "pub.csv", "out.csv"))
+    _write_wgi(wgi, wgi_values)
+    _write_pub(pub, old_cells)
+    pub_old = pd.read_csv(pub)
+    _write_pub(pub, old_cells + new_cells)
+    pub_all = pd.read_csv(pub)
+    # stesse righe vecchie nei due panel investimenti
+    pub_all.iloc[:len(old_cells)] = pub_old.to_numpy()
+    pub_all.to_csv(pub, index=False)
+    pub_old.to_csv(str(tmp_path / "pub_old.csv"), index=False)
+
+    build_pub_wgi(str(tmp_path / "pub_old.csv"), wgi, out, **kw)
+    _, mode = update_pub_wgi(pub, wgi, out, **kw)
+    assert mode == expected_mode
+
+    full = str(tmp_path / "full.csv")
+    build_pub_wgi(pub, wgi, full, **kw)
+    key = ["ccode", "year_int"]
+    got = pd.read_csv(out).sort_values(key).reset_index(drop=True)
+    want = pd.read_csv(full).sort_values(key).reset_index(drop=True)
+    pd.testing.assert_frame_equal(got, want, rtol=1e-12)
+
+
+BASE = {
+    ("AAA", "CC.EST"): [0.1, None, 0.3, None],
+    ("AAA", "GE.EST"): [1.0, 1.2, None, None],
+    ("BBB", "CC.EST"): [-0.5, -0.4, -0.2, None],
+    ("BBB", "GE.EST"): [None, None, None, None],
+}
+
+
+def test_incremental_append_when_means_do_not_change(tmp_path):
+    _check(tmp_path, BASE, _cells(["AAA", "BBB"], YEARS[:3]),
+           _cells(["AAA", "BBB"], [2003]), "incremental")
+
+
+def test_new_observed_values_rebuild(tmp_path):
+    values = {**BASE, ("AAA", "CC.EST"): [0.1, None, 0.3, 0.9]}
+    _check(tmp_path, values, _cells(["AAA", "BBB"], YEARS[:3]),
+           _cells(["AAA", "BBB"], [2003]), "full")
+
+
+def test_new_country_in_new_year(tmp_path):
+    values = {**BASE, ("CCC", "CC.EST"): [None, None, None, 0.7]}
+    _check(tmp_path, values, _cells(["AAA", "BBB"], YEARS[:3]),
+           _cells(["AAA", "BBB", "CCC"], [2003]), "incremental")
+
+
+def test_new_year_outside_wgi_range(tmp_path):
+    # 2003 e fuori dagli anni WGI richiesti: buco riempito con la media, come
+    # nella ricostruzione completa, anche se il file WGI ha il valore
+    values = {**BASE, ("AAA", "CC.EST"): [0.1, None, 0.3, 0.9]}
+    _check(tmp_path, values, _cells(["AAA", "BBB"], YEARS[:3]),
+           _cells(["AAA", "BBB"], [2003]), "incremental", years=(2000, 2002))
+
+
+def test_stream_wgi_selects_countries_indicators_years(tmp_path):
+    path = str(tmp_path / "wgi.csv")
+    _write_wgi(path, BASE)
+    panel = stream_wgi(path, ["AAA", "Country BBB"], INDICATORS, years=(2001, 2002),
+                       chunksize=2)
+    assert list(panel.columns) == ["ccode", "year_int", "Country Name", "CC_EST", "GE_EST"]
+    assert sorted(set(panel["ccode"])) == ["AAA", "BBB"]
+    assert panel["year_int"].between(2001, 2002).all()
+    assert panel.set_index(["ccode", "year_int"]).loc[("AAA", 2001), "GE_EST"] == 1.2
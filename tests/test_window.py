@@ -0,0 +1,63 @@
+"""
+LP su finestre (lp_window): moderatore ricentrato sulla finestra e
+moltiplicatore per finestra come le stime sul panel filtrato.
+"""
+
+import numpy as np
+import pytest
+
+from lp_engine import PanelDesign, fit_lp_horizons, interaction_regressors
+from lp_panel import lp_lin_panel_multi, mult_from_ratio, mult_from_ratio_windows
+from lp_window import lp_window_panel, window_list, window_r_share
+
+
+CTRL = ["growth_RGDP", "PDEBT", "NOMLRATE", "REER"]
+SHOCK = "forecasterror"
+ENDOG = ["log_RGDP", "PUBINVRATIO"]
+WINDOWS = [(2000, 2012), (2006, 2023)]
+TOL = {"rtol": 1e-8, "atol": 1e-12}
+
+
+def test_window_list():
+    years = [2000, 2001, 2002, 2004, 2005]
+    assert window_list(years, "rolling", 3) == [(2000, 2002), (2001, 2004), (2002, 2005)]
+    assert window_list(years, "expanding", first_end=2002) == \
+        [(2000, 2002), (2000, 2004), (2000, 2005)]
+    with pytest.raises(ValueError):
+        window_list(years, "sliding")
+
+
+@pytest.mark.parametrize("corr_lag", [1, 2])
+def test_moderator_shift_matches_filtered_fit(panel, corr_lag):
+    tbl = lp_window_panel(panel, ["log_RGDP"], SHOCK, CTRL, 2, 2, windows=WINDOWS,
+                          moderator="GE_EST", corr_lag=corr_lag)
+    for a, b in WINDOWS:
+        sub = panel[panel["year_int"].between(a, b)]
+        design = PanelDesign(sub, ["log_RGDP", SHOCK, "GE_EST"] + CTRL)
+        regressors, inter = interaction_regressors(design, SHOCK, "GE_EST", CTRL, 2,
+                                                   corr_lag=corr_lag)
+        fits = fit_lp_horizons(design, "log_RGDP", regressors, 2)
+        for term, col in (("beta", SHOCK), ("theta", inter)):
+            win = tbl[(tbl["start"] == a) & (tbl["term"] == term)].sort_values("h")
+            np.testing.assert_allclose(win["estimate"], [r.params[col] for r in fits], **TOL)
+            np.testing.assert_allclose(win["se"], [r.std_errors[col] for r in fits], **TOL)
+
+
+def test_window_multipliers_match_filtered_fits(panel):
+    tbl = lp_window_panel(panel, ENDOG, SHOCK, CTRL, 2, 3, windows=WINDOWS)
+    mult = mult_from_ratio_windows(tbl, window_r_share(panel, WINDOWS))
+    for a, b in WINDOWS:
+        sub = panel[panel["year_int"].between(a, b)]
+        lp = lp_lin_panel_multi(sub, ENDOG, SHOCK, CTRL, 2, 3)
+        ref = mult_from_ratio(lp["log_RGDP"], lp["PUBINVRATIO"],
+                              window_r_share(panel, [(a, b)])[(a, b)])
+        got = mult[mult["start"] == a].drop(columns=["start", "end"])
+        np.testing.assert_allclose(got.to_numpy(), ref.to_numpy(), **TOL)
+
+
+def test_window_multipliers_warn_on_horizon_mismatch(panel):
+    tbl = lp_window_panel(panel, ENDOG, SHOCK, CTRL, 2, 3, windows=WINDOWS)
+    drop = (tbl["start"] == 2000) & (tbl["endog"] == "PUBINVRATIO") & (tbl["h"] == 3)
+    with pytest.warns(UserWarning, match="2000-2012"):
+        mult = mult_from_ratio_windows(tbl[~drop], window_r_share(panel, WINDOWS))
+    assert set(mult["start"]) == {2006}
@@ -0,0 +1,229 @@
+"""
+wgi_ingest.py
+=============
+Dal file grezzo WGI (data/WGI_CSV/WGICSV.csv) al panel unito
+data_pubinv_final_with_WGI.csv in un solo passaggio, senza CSV intermedi.
+
+Il file WGI e letto a blocchi (chunksize) e di ogni blocco si tengono solo
+le righe dei paesi e degli indicatori scelti e le sole colonne-anno utili:
+in memoria resta solo la selezione, anche sull'universo completo dei 200+
+paesi. Poi wide -> long -> panel (ccode, year_int, CC_EST, ...), merge con
+il panel degli investimenti e riempimento dei buchi con la media per paese
+(come nel notebook analysis_Corruption).
+
+Se il file unito esiste gia e il panel di partenza ha solo anni nuovi,
+update_pub_wgi legge dal WGI solo quelle colonne-anno e aggiunge le righe
+in coda al CSV, quando le medie per paese non cambiano (altrimenti
+ricostruisce tutto): il risultato e sempre quello di build_pub_wgi.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+EU27 = [
+    "Austria", "Belgium", "Bulgaria", "Croatia", "Cyprus", "Czechia", "Denmark", "Estonia",
+    "Finland", "France", "Germany", "Greece", "Hungary", "Ireland", "Italy", "Latvia",
+    "Lithuania", "Luxembourg", "Malta", "Netherlands", "Poland", "Portugal", "Romania",
+    "Slovak Republic", "Slovenia", "Spain", "Sweden",
+]
+
+WGI_CODES = ["CC.EST", "GE.EST", "PV.EST", "RL.EST", "RQ.EST", "VA.EST"]
+
+ID_COLS = ["Country Name", "Country Code", "Indicator Name", "Indicator Code"]
+
+
+def wgi_col(code):
+    """
+    "CC.EST" -> "CC_EST" (nome della colonna nel panel).
+    """
+    return code.replace(".", "_")
+
+
+# ============================================================
+# STREAMING DEL FILE WGI
+# ============================================================
+
+def _year_columns(path, years):
+    header = pd.read_csv(path, nrows=0).columns
+    cols = [c for c in header if c.strip().isdigit()]
+    if years is not None:
+        cols = [c for c in cols if years[0] <= int(c) <= years[1]]
+    return cols
+
+
+def stream_wgi(path="data/WGI_CSV/WGICSV.csv", countries=None, indicators=WGI_CODES,
+               years=(2000, 2023), year_list=None, chunksize=2000):
+    """
+    Panel WGI (ccode, year_int, Country Name, CC_EST, ...) letto a blocchi.
+
+    countries: nomi o codici ISO3 (None = tutti i paesi del file);
+    indicators: codici WGI (es. "GE.EST"); years: (min, max) inclusivi;
+    year_list: anni esatti da leggere (ha la precedenza su years).
+    Si leggono solo le colonne-anno richieste; le righe non selezionate di
+    ogni blocco vengono scartate subito.
+    """
+    year_cols = _year_columns(path, years if year_list is None else None)
+    if year_list is not None:
+        wanted = {int(y) for y in year_list}
+        year_cols = [c for c in year_cols if int(c) in wanted]
+    keep_c = None if countries is None else set(countries)
+    keep_i = set(indicators)
+
+    parts = []
+    reader = pd.read_csv(path, usecols=ID_COLS + year_cols, chunksize=chunksize,
+                         dtype={c: np.float64 for c in year_cols})
+    for chunk in reader:
+        m = chunk["Indicator Code"].isin(keep_i)
+        if keep_c is not None:
+            m &= chunk["Country Name"].isin(keep_c) | chunk["Country Code"].isin(keep_c)
+        if not m.any():
+            continue
+        sub = chunk.loc[m, ["Country Name", "Country Code", "Indicator Code"] + year_cols]
+        parts.append(sub.melt(
+            id_vars=["Country Name", "Country Code", "Indicator Code"],
+            value_vars=year_cols, var_name="year_int", value_name="value",
+        ))
+
+    cols = ["ccode", "year_int", "Country Name"] + [wgi_col(c) for c in sorted(keep_i)]
+    if not parts:
+        return pd.DataFrame(columns=cols)
+
+    long = pd.concat(parts, ignore_index=True)
+    long["year_int"] = long["year_int"].astype(int)
+    long["ind"] = long["Indicator Code"].map(wgi_col)
+    panel = (
+        long.pivot_table(index=["Country Name", "Country Code", "year_int"],
+                         columns="ind", values="value", aggfunc="first")
+        .reset_index()
+        .rename(columns={"Country Code": "ccode"})
+    )
+    panel.columns.name = None
+    for c in cols:
+        if c not in panel.columns:
+            panel[c] = np.nan
+    panel["ccode"] = panel["ccode"].astype(str).str.strip()
+    return panel[cols].sort_values(["ccode", "year_int"]).reset_index(drop=True)
+
+
+# ============================================================
+# MERGE
+# ============================================================
+
+def _read_pub(pub):
+    if isinstance(pub, str):
+        pub = pd.read_csv(pub)
+    pub = pub.copy()
+    if "year" in pub.columns and "year_int" not in pub.columns:
+        pub = pub.rename(columns={"year": "year_int"})
+    pub["year_int"] = pub["year_int"].astype(str).str.strip().astype(int)
+    pub["ccode"] = pub["ccode"].astype(str).str.strip()
+    return pub
+
+
+def merge_wgi(pub, wgi_panel, fill="entity_mean"):
+    """
+    Merge left del panel investimenti con il panel WGI su (ccode, year_int).
+    fill="entity_mean": buchi riempiti con la media del paese (sulle righe
+    del panel unito), come nel notebook; None: nessun riempimento.
+    """
+    merged = pub.merge(wgi_panel, on=["ccode", "year_int"], how="left")
+    if fill == "entity_mean":
+        for col in wgi_panel.columns:
+            if col in ("ccode", "year_int", "Country Name"):
+                continue
+            merged[col] = merged[col].fillna(merged.groupby("ccode")[col].transform("mean"))
+    return merged
+
+
+def build_pub_wgi(pub_path="data/data_pubinv_final.csv",
+                  wgi_path="data/WGI_CSV/WGICSV.csv",
+                  out_path="data/data_pubinv_final_with_WGI.csv",
+                  countries=None, indicators=WGI_CODES, years=(2000, 2023)):
+    """
+    Ricostruzione completa: WGI a blocchi -> panel -> merge -> CSV.
+    countries=None prende dal WGI solo i paesi presenti nel panel investimenti.
+    """
+    pub = _read_pub(pub_path)
+    if countries is None:
+        countries = pub["ccode"].unique().tolist()
+    wgi = stream_wgi(wgi_path, countries, indicators, years)
+    merged = merge_wgi(pub, wgi)
+    if out_path is not None:
+        merged.to_csv(out_path, index=False)
+    return merged
+
+
+def update_pub_wgi(pub_path="data/data_pubinv_final.csv",
+                   wgi_path="data/WGI_CSV/WGICSV.csv",
+                   out_path="data/data_pubinv_final_with_WGI.csv",
+                   countries=None, indicators=WGI_CODES, years=(2000, 2023)):
+    """
+    Aggiornamento incrementale del CSV unito, con lo stesso risultato di
+    build_pub_wgi.
+
+    Se le righe gia presenti in out_path coincidono con il panel investimenti
+    e le nuove righe riguardano solo anni nuovi, si leggono dal WGI solo le
+    colonne di quegli anni. I buchi sono riempiti con la media per paese dei
+    valori WGI osservati: se le nuove righe non hanno valori osservati per
+    un paese che ha gia righe, la sua media non cambia e le nuove righe
+    vengono aggiunte in coda; altrimenti cambierebbero anche i riempimenti
+    delle righe vecchie e si ricostruisce tutto con build_pub_wgi, come in
+    tutti gli altri casi.
+    Ritorna (DataFrame unito, "full" | "incremental" | "unchanged").
+    """
+    args = dict(countries=countries, indicators=indicators, years=years)
+    if not os.path.exists(out_path):
+        return build_pub_wgi(pub_path, wgi_path, out_path, **args), "full"
+
+    pub = _read_pub(pub_path)
+    old = pd.read_csv(out_path)
+    key = ["ccode", "year_int"]
+    old_keys = pd.MultiIndex.from_frame(old[key])
+    is_new = ~pd.MultiIndex.from_frame(pub[key]).isin(old_keys)
+
+    # le righe vecchie devono coincidere col panel investimenti attuale
+    pub_old = pub[~is_new].set_index(key).sort_index()
+    same = (
+        len(pub_old) == len(old)
+        and list(old.columns[:pub.shape[1]]) == list(pub.columns)
+        and old.set_index(key).sort_index()[pub_old.columns].equals(pub_old)
+    )
+    new_years = sorted(pub.loc[is_new, "year_int"].unique())
+    if not same or any(y <= old["year_int"].max() for y in new_years):
+        return build_pub_wgi(pub_path, wgi_path, out_path, **args), "full"
+    if not new_years:
+        return old, "unchanged"
+
+    if countries is None:
+        countries = pub["ccode"].unique().tolist()
+    # stessi anni WGI della ricostruzione completa (fuori da years: buchi)
+    wgi_years = [y for y in new_years if years is None or years[0] <= y <= years[1]]
+    wgi_new = stream_wgi(wgi_path, countries, indicators, year_list=wgi_years)
+    wgi_cols = [c for c in old.columns if c not in pub.columns]
+    for c in wgi_cols:
+        if c not in wgi_new.columns:
+            wgi_new[c] = np.nan
+    add = pub[is_new].merge(wgi_new[key + wgi_cols], on=key, how="left")
+
+    # il riempimento con la media lascia invariata la media del paese: la
+    # media delle righe vecchie e quella dei valori osservati. Valori nuovi
+    # osservati per un paese gia presente la cambiano -> ricostruzione
+    num_cols = [c for c in wgi_cols if c != "Country Name"]
+    seen = add["ccode"].isin(old["ccode"])
+    if add.loc[seen, num_cols].notna().to_numpy().any():
+        return build_pub_wgi(pub_path, wgi_path, out_path, **args), "full"
+    old_means = old.groupby("ccode")[num_cols].mean()
+    new_means = add.groupby("ccode")[num_cols].mean()
+    means = old_means.combine_first(new_means)
+    add[num_cols] = add[num_cols].fillna(means.reindex(add["ccode"]).set_axis(add.index))
+    add = add[old.columns]
+    add.to_csv(out_path, mode="a", header=False, index=False)
+    return pd.concat([old, add], ignore_index=True), "incremental"
+
+
+if __name__ == "__main__":
+    merged, mode = update_pub_wgi()
+    print(f"data/data_pubinv_final_with_WGI.csv: {mode} ({len(merged)} righe)")